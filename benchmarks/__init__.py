@@ -0,0 +1,3 @@
+"""
+Benchmarks de las funciones criticas del pipeline sobre imagenes sinteticas.
+"""
@@ -0,0 +1,221 @@
+"""
+Busca el mejor reparto de nucleos de cada perfil de src/recursos.py.
+
+Para cada perfil se ejecuta una carga representativa con imagenes
+sinteticas bajo varios repartos candidatos (procesos x hilos internos,
+pool de hilos x hilos de OpenCV, workers del DataLoader x hilos de
+torch), incluido el reparto ingenuo en el que cada biblioteca usa todos
+los nucleos. El mas rapido de cada perfil se guarda en
+resultados/recursos.json y main.py lo usa en las corridas siguientes.
+
+    python -m benchmarks.ajustar_recursos
+    python -m benchmarks.ajustar_recursos --perfiles hilos procesos --imagenes 128
+"""
+import sys
+import time
+import argparse
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from benchmarks.imagenes_sinteticas import generar_lote
+from benchmarks.ejecutar_benchmarks import info_entorno
+from src.extraccion_caracteristicas.momentos.binarizacion import binarizar_espermatozoides
+from src.extraccion_caracteristicas.momentos.zernike import calcular_zernike_momentos
+from src.extraccion_caracteristicas.HOG.HOG import calcular_hog
+from src.preprocesamiento.espermatozoides import procesar_imagen_sperm
+from src import recursos
+
+
+def _potencias(n):
+    """1, 2, 4, ... hasta n, incluido n."""
+    valores, v = [], 1
+    while v < n:
+        valores.append(v)
+        v *= 2
+    return valores + [n]
+
+
+def candidatos(perfil, n):
+    """
+    Repartos a probar para un perfil con n nucleos, sin repetidos. El
+    primero es el ingenuo (todas las bibliotecas con todos los nucleos).
+
+    Retorna:
+        list: Diccionarios parciales de recursos.CLAVES
+    """
+    unicos = []
+    for cambios in _candidatos(perfil, n):
+        if cambios not in unicos:
+            unicos.append(cambios)
+    return unicos
+
+
+def _candidatos(perfil, n):
+    if perfil == "secuencial":
+        return [{"hilos_cv2": c, "hilos_blas": c, "hilos_torch": c} for c in reversed(_potencias(n))]
+    if perfil == "hilos":
+        lista = [{"hilos": n, "hilos_cv2": n}]
+        for h in _potencias(n):
+            for c in sorted({1, max(1, n // h)}):
+                lista.append({"hilos": h, "hilos_cv2": c})
+        return lista
+    if perfil == "procesos":
+        lista = [{"procesos": n, "hilos_por_proceso": n}]
+        for p in _potencias(n):
+            for t in sorted({1, max(1, n // p)}):
+                lista.append({"procesos": p, "hilos_por_proceso": t})
+        return lista
+    if perfil == "torch":
+        # Ingenuo: el valor fijo anterior (2 workers) con torch en todos los nucleos
+        lista = [{"procesos": 2, "hilos_torch": n, "hilos_blas": n}]
+        for w in [0] + [p for p in _potencias(max(1, n - 1)) if p <= 2 * recursos.MAX_WORKERS_DATALOADER]:
+            t = max(1, n - w)
+            lista.append({"procesos": w, "hilos_torch": t, "hilos_blas": t})
+        return lista
+    raise ValueError(f"Perfil de recursos desconocido: {perfil}")
+
+
+def _binarizar_hog(img):
+    mascara = binarizar_espermatozoides(img)
+    return calcular_hog(procesar_imagen_sperm(img)[1]), mascara
+
+
+def _binarizar_zernike(img):
+    return calcular_zernike_momentos(binarizar_espermatozoides(img))
+
+
+def _carga_secuencial(reparto, imagenes):
+    for img in imagenes:
+        _binarizar_hog(img)
+
+
+def _carga_hilos(reparto, imagenes):
+    with ThreadPoolExecutor(max_workers=reparto["hilos"]) as pool:
+        list(pool.map(_binarizar_hog, imagenes))
+
+
+def _carga_procesos(reparto, imagenes):
+    procesos = reparto["procesos"]
+    with ProcessPoolExecutor(max_workers=procesos, initializer=recursos.iniciar_trabajador,
+                             initargs=(reparto,)) as pool:
+        # Arranque de los workers fuera de la medicion
+        list(pool.map(_binarizar_zernike, imagenes[:procesos]))
+        t0 = time.perf_counter()
+        list(pool.map(_binarizar_zernike, imagenes, chunksize=max(1, len(imagenes) // (4 * procesos))))
+        return time.perf_counter() - t0
+
+
+class _DatasetSintetico:
+    """Dataset de torch: preprocesa y redimensiona cada imagen en el worker."""
+    def __init__(self, imagenes, img_size):
+        self.imagenes = imagenes
+        self.img_size = img_size
+
+    def __len__(self):
+        return len(self.imagenes)
+
+    def __getitem__(self, i):
+        import torch
+        from src.embeddings.cache_tensores import redimensionar_gris
+        gris = procesar_imagen_sperm(self.imagenes[i])[1]
+        return torch.from_numpy(redimensionar_gris(gris, self.img_size)).unsqueeze(0)
+
+
+@functools.lru_cache(maxsize=1)
+def _resnet50():
+    # Misma arquitectura que los embeddings, sin pesos (mismo costo, sin descarga)
+    import torch.nn as nn
+    from torchvision import models
+
+    red = models.resnet50(weights=None)
+    red.fc = nn.Identity()
+    return red.eval()
+
+
+def _carga_torch(reparto, imagenes, img_size=112, batch_size=16):
+    import torch
+    from src.embeddings.cache_tensores import crear_dataloader, normalizar_lote
+
+    modelo = _resnet50()
+    cargador = crear_dataloader(
+        _DatasetSintetico(imagenes, img_size), batch_size=batch_size,
+        num_workers=reparto["procesos"], pin_memory=False,
+        worker_init_fn=functools.partial(recursos.iniciar_trabajador, reparto),
+    )
+    with torch.no_grad():
+        for xb in cargador:
+            modelo(normalizar_lote(xb, "cpu"))
+
+
+CARGAS = {
+    "secuencial": _carga_secuencial,
+    "hilos": _carga_hilos,
+    "procesos": _carga_procesos,
+    "torch": _carga_torch,
+}
+
+
+def medir_reparto(perfil, cambios, imagenes, repeticiones=2):
+    """
+    Imagenes por segundo de la carga del perfil con un reparto (la mejor
+    de varias repeticiones). Los cambios se aplican sobre el reparto por
+    defecto, no sobre un ajuste anterior.
+    """
+    base = recursos.reparto_por_defecto(perfil)
+    mejor = 0.0
+    with recursos.usar(perfil, **{**{k: base[k] for k in recursos.CLAVES}, **cambios}) as reparto:
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            medido = CARGAS[perfil](reparto, imagenes)
+            dt = medido if medido is not None else time.perf_counter() - t0
+            mejor = max(mejor, len(imagenes) / dt)
+    return mejor, reparto
+
+
+def ajustar(perfiles=recursos.PERFILES, n_imagenes=64, repeticiones=2, ruta_salida=recursos.RUTA_AJUSTE,
+            semilla=0):
+    """
+    Mide los candidatos de cada perfil y guarda el mejor reparto.
+
+    Retorna:
+        dict: {perfil: reparto elegido}
+    """
+    n = recursos.nucleos_disponibles()
+    imagenes = generar_lote("espermatozoides", n_imagenes, semilla)
+    elegidos, mediciones = {}, []
+    print(f"Ajuste de recursos en {n} nucleos con {n_imagenes} imagenes")
+    for perfil in perfiles:
+        print(f"\n[{perfil}]")
+        resultados = []
+        for i, cambios in enumerate(candidatos(perfil, n)):
+            img_s, reparto = medir_reparto(perfil, cambios, imagenes, repeticiones)
+            resultados.append((img_s, reparto))
+            mediciones.append({"perfil": perfil, "ingenuo": i == 0, "imagenes_por_seg": img_s, **reparto})
+            marca = "  (ingenuo)" if i == 0 else ""
+            print(f"  {img_s:8.1f} img/s  {cambios}{marca}")
+        img_s, reparto = max(resultados, key=lambda r: r[0])
+        elegidos[perfil] = {k: reparto[k] for k in recursos.CLAVES}
+        print(f"  -> {recursos.describir(reparto)} ({img_s / resultados[0][0]:.2f}x el ingenuo)")
+
+    if ruta_salida:
+        # Se conservan los perfiles medidos antes y no incluidos en esta corrida
+        previos = recursos.cargar_ajuste(ruta_salida)
+        ruta = recursos.guardar_ajuste({**previos, **elegidos}, ruta_salida,
+                                       entorno=info_entorno(), mediciones=mediciones)
+        print(f"\nAjuste guardado en {ruta}")
+    return elegidos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ajuste del reparto de nucleos por perfil")
+    parser.add_argument("--perfiles", nargs="+", default=list(recursos.PERFILES), choices=recursos.PERFILES)
+    parser.add_argument("--imagenes", type=int, default=64)
+    parser.add_argument("--repeticiones", type=int, default=2)
+    parser.add_argument("--salida", default=recursos.RUTA_AJUSTE)
+    args = parser.parse_args(argv)
+    ajustar(args.perfiles, args.imagenes, args.repeticiones, args.salida)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
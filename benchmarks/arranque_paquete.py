@@ -0,0 +1,137 @@
+"""
+Mide el arranque en frio de un worker con el paquete de inferencia y la
+memoria que comparten los workers creados con fork.
+
+Cada repeticion es un interprete nuevo que importa src.inferencia.paquete,
+abre el paquete y clasifica un embedding (la primera llamada toca las
+paginas de los arreglos). La carga del modelo se mide aparte.
+
+    python -m benchmarks.arranque_paquete paquetes/piedra_papel_tijera
+    python -m benchmarks.arranque_paquete paquetes/espermatozoides --modelo --workers 4
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+from src.inferencia.paquete import cargar_paquete, resolver_version
+
+
+_ARRANQUE = """
+import json, time
+t0 = time.perf_counter()
+import numpy as np
+from src.inferencia.paquete import cargar_paquete
+t1 = time.perf_counter()
+paquete = cargar_paquete(ruta={ruta!r})
+t2 = time.perf_counter()
+paquete.clasificar(np.zeros((1, paquete.manifiesto["dimensiones"]), dtype=np.float32))
+t3 = time.perf_counter()
+resultado = {{"importar_s": t1 - t0, "cargar_s": t2 - t1, "primera_s": t3 - t2}}
+if {modelo!r}:
+    paquete.modelo()
+    resultado["modelo_s"] = time.perf_counter() - t3
+print(json.dumps(resultado))
+"""
+
+
+def medir_arranque(ruta, repeticiones=5, modelo=False):
+    """
+    Tiempos de arranque en interpretes nuevos (el primero calienta el
+    cache de paginas y no se cuenta).
+
+    Retorna:
+        list: Diccionarios con importar_s, cargar_s, primera_s (y modelo_s)
+    """
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    codigo = _ARRANQUE.format(ruta=os.path.abspath(ruta), modelo=modelo)
+    mediciones = []
+    for _ in range(repeticiones + 1):
+        proceso = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, cwd=raiz)
+        if proceso.returncode != 0:
+            raise RuntimeError(f"Fallo el arranque:\n{proceso.stderr[-2000:]}")
+        mediciones.append(json.loads(proceso.stdout.strip().splitlines()[-1]))
+    return mediciones[1:]
+
+
+def memoria_mapeada(carpeta):
+    """
+    kB de Rss, Pss y privados de los archivos de carpeta
+    mapeados por este proceso (/proc/self/smaps; None fuera de Linux).
+    """
+    if not os.path.isfile("/proc/self/smaps"):
+        return None
+    carpeta = os.path.abspath(carpeta)
+    totales = {"Rss": 0, "Pss": 0, "Private_Clean": 0, "Private_Dirty": 0}
+    dentro = False
+    with open("/proc/self/smaps", "r", encoding="utf-8") as f:
+        for linea in f:
+            partes = linea.split()
+            if "-" in partes[0] and not partes[0].endswith(":"):
+                dentro = len(partes) >= 6 and partes[5].startswith(carpeta)
+            elif dentro and partes[0].rstrip(":") in totales:
+                totales[partes[0].rstrip(":")] += int(partes[1])
+    return totales
+
+
+_paquete = None
+_con_modelo = False
+
+
+def _worker(_):
+    # Usa el paquete heredado del padre: no vuelve a abrir nada
+    _paquete.clasificar(np.zeros((8, _paquete.manifiesto["dimensiones"]), dtype=np.float32))
+    if _con_modelo:
+        _paquete.embeber([np.zeros((64, 64), dtype=np.uint8)])
+    return memoria_mapeada(_paquete.ruta)
+
+
+def medir_fork(ruta, workers=4, modelo=False):
+    """
+    Abre el paquete en el proceso padre y crea workers con fork; cada uno
+    clasifica y reporta la memoria de los archivos del paquete que mapea.
+
+    Retorna:
+        list: memoria_mapeada() de cada worker
+    """
+    global _paquete, _con_modelo
+    _paquete, _con_modelo = cargar_paquete(ruta=ruta), modelo
+    if modelo:
+        _paquete.modelo()
+    _worker(None)
+    contexto = multiprocessing.get_context("fork")
+    with contexto.Pool(workers) as pool:
+        return pool.map(_worker, range(workers))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arranque en frio del paquete de inferencia")
+    parser.add_argument("ruta", help="Carpeta del paquete (dataset o version)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--modelo", action="store_true", help="Mide tambien la carga del modelo")
+    parser.add_argument("--workers", type=int, default=0, help="Workers con fork para medir memoria compartida")
+    args = parser.parse_args(argv)
+
+    print(f"Paquete: {resolver_version(args.ruta)}")
+    mediciones = medir_arranque(args.ruta, args.repeticiones, args.modelo)
+    for clave in mediciones[0]:
+        valores = np.array([m[clave] for m in mediciones]) * 1000.0
+        print(f"  {clave:12s} mediana {np.median(valores):8.1f} ms  max {valores.max():8.1f} ms")
+    total = np.array([m["importar_s"] + m["cargar_s"] + m["primera_s"] for m in mediciones]) * 1000.0
+    print(f"  {'arranque':12s} mediana {np.median(total):8.1f} ms  (sin el modelo)")
+
+    if args.workers and sys.platform.startswith("linux"):
+        print(f"\nMemoria de los archivos del paquete por worker (kB), {args.workers} workers con fork:")
+        for i, memoria in enumerate(medir_fork(args.ruta, args.workers, args.modelo)):
+            privada = memoria["Private_Clean"] + memoria["Private_Dirty"]
+            print(f"  worker {i}: Rss {memoria['Rss']:8d}  Pss {memoria['Pss']:8d}  "
+                  f"compartida {memoria['Rss'] - privada:8d}  privada {privada:8d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from benchmarks.imagenes_sinteticas import generar_lote
+from src.extraccion_caracteristicas.momentos.binarizacion import binarizar_rps, binarizar_espermatozoides
+from src.extraccion_caracteristicas.momentos.zernike import calcular_zernike_momentos
+from src.extraccion_caracteristicas.momentos.momentos import calcular_momentos
+from src.extraccion_caracteristicas.momentos.hu import calcular_hu_momentos
+from src.extraccion_caracteristicas.momentos.contorno import (
+    momentos_contorno, calcular_descriptores_contorno,
+)
+from src.extraccion_caracteristicas.momentos.calidad import evaluar_mascara
+from src.extraccion_caracteristicas.momentos.busqueda import IndiceFormas, descriptor_forma
+from src.extraccion_caracteristicas.HOG.HOG import extraer_hog_imagen
+from src.extraccion_caracteristicas.SIFT.SIFT import crear_sift, extraer_descriptores_imagen
+from src.preprocesamiento.espermatozoides import procesar_imagen_sperm
+from src.instrumentacion import rss_pico_mb
+
+
+TAMANOS_POR_DEFECTO = (16, 64, 256)
+
+
+def resumir_latencias(latencias_s):
+    """Estadisticas de una lista de latencias en segundos (devuelve ms)."""
+    ms = np.asarray(latencias_s) * 1000.0
+    return {
+        "media_ms": float(ms.mean()),
+        "std_ms": float(ms.std()),
+        "min_ms": float(ms.min()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def medir(funcion, entradas, en_lotes=False, calentamiento=2):
+    """
+    Mide latencia por llamada, throughput y memoria de una funcion.
+
+    Primero se hace una pasada cronometrada sin instrumentacion y luego
+    otra con tracemalloc para obtener el pico de memoria de Python/numpy,
+    de modo que el rastreo no distorsione las latencias.
+
+    Parametros:
+        funcion: Funcion a medir, recibe un elemento de entradas
+        entradas: Lista de entradas
+        en_lotes: Si True cada entrada es un lote y las imagenes se
+                  cuentan con len(lote) (el ultimo puede ser parcial);
+                  si no, una imagen por llamada
+        calentamiento: Llamadas previas no cronometradas
+
+    Retorna:
+        dict: Latencias, imagenes/seg y memoria
+    """
+    for entrada in entradas[:calentamiento]:
+        funcion(entrada)
+
+    latencias = []
+    inicio_total = time.perf_counter()
+    for entrada in entradas:
+        t0 = time.perf_counter()
+        funcion(entrada)
+        latencias.append(time.perf_counter() - t0)
+    total = time.perf_counter() - inicio_total
+
+    rss_antes = rss_pico_mb()
+    tracemalloc.start()
+    for entrada in entradas:
+        funcion(entrada)
+    _, pico_traza = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_despues = rss_pico_mb()
+
+    imagenes = sum(len(lote) for lote in entradas) if en_lotes else len(entradas)
+    resultado = resumir_latencias(latencias)
+    resultado.update({
+        "llamadas": len(entradas),
+        "imagenes": imagenes,
+        "tiempo_total_s": total,
+        "imagenes_por_seg": imagenes / total if total > 0 else None,
+        "memoria_pico_traza_mb": pico_traza / (1024 * 1024),
+        "rss_pico_mb": rss_despues,
+        "rss_pico_incremento_mb": (
+            rss_despues - rss_antes if rss_antes is not None else None
+        ),
+    })
+    return resultado
+
+
+def _guardar_grises(imagenes, carpeta):
+    """Guarda imagenes grises procesadas como PNG y devuelve sus rutas."""
+    rutas = []
+    for i, img in enumerate(imagenes):
+        _, gris = procesar_imagen_sperm(img)
+        ruta = os.path.join(carpeta, f"{i:05d}.png")
+        cv2.imwrite(ruta, gris)
+        rutas.append(ruta)
+    return rutas
+
+
+def casos_benchmark(n, carpeta_tmp, incluir_resnet=True, batch_size=32, seed=0, funciones=None):
+    """
+    Prepara las entradas sinteticas de cada funcion para un tamaño n.
+
+    Solo se preparan los casos de funciones (None: todos) y las entradas
+    que esos casos usan: filtrar no carga la ResNet50 ni genera imagenes
+    de mas.
+
+    Retorna:
+        list: Tuplas (nombre, funcion, entradas, en_lotes)
+    """
+    datos = {}
+
+    def dato(clave, crear):
+        # Entradas compartidas entre casos, generadas la primera vez que se piden
+        if clave not in datos:
+            datos[clave] = crear()
+        return datos[clave]
+
+    imgs_sperm = lambda: dato("sperm", lambda: generar_lote("espermatozoides", n, seed))
+    imgs_rps = lambda: dato("rps", lambda: generar_lote("rps", n, seed))
+    rutas = lambda: dato("rutas", lambda: _guardar_grises(imgs_sperm(), carpeta_tmp))
+    mascaras = lambda: dato("mascaras", lambda: [binarizar_espermatozoides(img) for img in imgs_sperm()])
+
+    def caso_sift():
+        sift = crear_sift()
+        return ("extraer_descriptores_imagen", lambda r: extraer_descriptores_imagen(r, sift), rutas(), False)
+
+    constructores = {
+        "binarizar_rps": lambda: ("binarizar_rps", binarizar_rps, imgs_rps(), False),
+        "binarizar_espermatozoides": lambda: (
+            "binarizar_espermatozoides", binarizar_espermatozoides, imgs_sperm(), False),
+        "extraer_hog_imagen": lambda: ("extraer_hog_imagen", extraer_hog_imagen, rutas(), False),
+        "extraer_descriptores_imagen": caso_sift,
+        "calcular_zernike_momentos": lambda: (
+            "calcular_zernike_momentos", calcular_zernike_momentos, mascaras(), False),
+        "momentos_hu_raster": lambda: (
+            "momentos_hu_raster", lambda m: (calcular_momentos(m), calcular_hu_momentos(m)), mascaras(), False),
+        "momentos_contorno": lambda: ("momentos_contorno", momentos_contorno, mascaras(), False),
+        "descriptores_contorno": lambda: (
+            "descriptores_contorno", calcular_descriptores_contorno, mascaras(), False),
+        "evaluar_mascara": lambda: ("evaluar_mascara", evaluar_mascara, mascaras(), False),
+        "buscar_formas": lambda: caso_buscar_formas(mascaras()),
+    }
+    if incluir_resnet:
+        constructores["resnet50_embeddings"] = lambda: caso_resnet50(imgs_sperm(), batch_size)
+
+    return [crear() for nombre, crear in constructores.items() if not funciones or nombre in funciones]
+
+
+def caso_buscar_formas(mascaras, k=5, lote=16):
+    """Consultas en lote al indice de formas construido con las mismas mascaras."""
+    descriptores = [descriptor_forma(m) for m in mascaras]
+    X = np.stack([d for d in descriptores if d is not None])
+    indice = IndiceFormas()
+    indice.agregar([str(i) for i in range(len(X))], ["-"] * len(X), X)
+    lotes = [X[i:i + lote] for i in range(0, len(X), lote)]
+    return ("buscar_formas", lambda Xb: indice.consultar(Xb, k), lotes, True)
+
+
+def caso_resnet50(imagenes, batch_size=32, img_size=224):
+    """
+    Caso del bucle de embeddings: lotes uint8 -> normalizacion -> ResNet50.
+    Se usa la arquitectura sin pesos preentrenados (mismo costo, sin descarga).
+    """
+    import torch
+    import torch.nn as nn
+    from torchvision import models
+    from src.embeddings.cache_tensores import normalizar_lote, redimensionar_gris
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model = models.resnet50(weights=None)
+    model.fc = nn.Identity()
+    model.eval().to(device)
+
+    grises = [redimensionar_gris(procesar_imagen_sperm(img)[1], img_size) for img in imagenes]
+    lotes = [
+        torch.from_numpy(np.stack(grises[i:i + batch_size])).unsqueeze(1)
+        for i in range(0, len(grises), batch_size)
+    ]
+
+    def forward(xb):
+        with torch.no_grad():
+            emb = model(normalizar_lote(xb, device))
+        return emb.cpu().numpy()
+
+    return ("resnet50_embeddings", forward, lotes, True)
+
+
+def info_entorno():
+    """Metadatos para comparar resultados entre commits y maquinas."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+
+    info = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+    try:
+        import torch
+        info["torch"] = torch.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def ejecutar_benchmarks(
+    tamanos=TAMANOS_POR_DEFECTO,
+    ruta_salida="resultados_benchmark.json",
+    incluir_resnet=True,
+    batch_size=32,
+    funciones=None,
+):
+    """
+    Ejecuta todos los benchmarks para cada tamaño de dataset y guarda
+    los resultados en JSON.
+
+    Parametros:
+        tamanos: Numero de imagenes sinteticas por corrida
+        ruta_salida: Archivo JSON de salida (None para no guardar)
+        incluir_resnet: Si False omite el bucle de embeddings
+        batch_size: Tamaño de lote para la ResNet50
+        funciones: Lista opcional de nombres de funciones a medir
+
+    Retorna:
+        dict: {"entorno": {...}, "resultados": [...]}
+    """
+    resultados = []
+    for n in tamanos:
+        with tempfile.TemporaryDirectory() as carpeta_tmp:
+            for nombre, funcion, entradas, en_lotes in casos_benchmark(
+                n, carpeta_tmp, incluir_resnet, batch_size, funciones=funciones
+            ):
+                print(f"[BENCH] {nombre} (n={n})...")
+                res = medir(funcion, entradas, en_lotes)
+                res.update({"funcion": nombre, "n": n})
+                resultados.append(res)
+                print(
+                    f"        p50={res['p50_ms']:.2f} ms  p99={res['p99_ms']:.2f} ms  "
+                    f"{res['imagenes_por_seg']:.1f} img/s  "
+                    f"pico={res['memoria_pico_traza_mb']:.1f} MB"
+                )
+
+    salida = {"entorno": info_entorno(), "resultados": resultados}
+    if ruta_salida:
+        os.makedirs(os.path.dirname(ruta_salida) or ".", exist_ok=True)
+        with open(ruta_salida, "w", encoding="utf-8") as f:
+            json.dump(salida, f, indent=2)
+        print(f"\nResultados guardados en {ruta_salida}")
+    return salida
+
+
+def comparar(ruta_base, ruta_nueva, umbral=0.10):
+    """
+    Compara dos archivos de resultados por (funcion, n) usando la mediana.
+
+    Parametros:
+        ruta_base: JSON de referencia (p. ej. del commit anterior)
+        ruta_nueva: JSON a evaluar
+        umbral: Aumento relativo de p50 a partir del cual se marca regresion
+
+    Retorna:
+        list: Filas (funcion, n, p50_base, p50_nuevo, cambio_relativo, regresion)
+    """
+    with open(ruta_base, "r", encoding="utf-8") as f:
+        base = {(r["funcion"], r["n"]): r for r in json.load(f)["resultados"]}
+    with open(ruta_nueva, "r", encoding="utf-8") as f:
+        nueva = {(r["funcion"], r["n"]): r for r in json.load(f)["resultados"]}
+
+    filas = []
+    print(f"{'funcion':32s} {'n':>6s} {'p50 base':>10s} {'p50 nuevo':>10s} {'cambio':>8s}")
+    for clave in sorted(base.keys() & nueva.keys()):
+        p_base = base[clave]["p50_ms"]
+        p_nuevo = nueva[clave]["p50_ms"]
+        cambio = (p_nuevo - p_base) / p_base if p_base > 0 else 0.0
+        regresion = cambio > umbral
+        filas.append((clave[0], clave[1], p_base, p_nuevo, cambio, regresion))
+        marca = "  <-- REGRESION" if regresion else ""
+        print(f"{clave[0]:32s} {clave[1]:6d} {p_base:10.2f} {p_nuevo:10.2f} {cambio:+8.1%}{marca}")
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline con imagenes sinteticas")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS_POR_DEFECTO))
+    parser.add_argument("--salida", default="resultados_benchmark.json")
+    parser.add_argument("--sin-resnet", action="store_true", help="Omite el bucle de embeddings")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--funciones", nargs="+", default=None)
+    parser.add_argument("--comparar", default=None, help="JSON de referencia para detectar regresiones")
+    parser.add_argument("--umbral", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    ejecutar_benchmarks(
+        tamanos=args.tamanos,
+        ruta_salida=args.salida,
+        incluir_resnet=not args.sin_resnet,
+        batch_size=args.batch_size,
+        funciones=args.funciones,
+    )
+    if args.comparar:
+        print()
+        filas = comparar(args.comparar, args.salida, args.umbral)
+        return 1 if any(f[5] for f in filas) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+
+
+def imagen_espermatozoide(rng, size=(256, 256)):
+    """
+    Genera una imagen BGR parecida a las de SMIDS: fondo claro con ruido,
+    una cabeza eliptica oscura y una cola delgada.
+    """
+    w, h = size
+    img = np.full((h, w, 3), rng.integers(160, 200), np.uint8)
+    cx = w // 2 + int(rng.integers(-w // 10, w // 10))
+    cy = h // 2 + int(rng.integers(-h // 10, h // 10))
+    angulo = float(rng.uniform(0, 180))
+    gris_cabeza = int(rng.integers(40, 90))
+    cv2.ellipse(img, (cx, cy), (w // 9, h // 16), angulo, 0, 360, (gris_cabeza,) * 3, -1)
+
+    rad = np.deg2rad(angulo)
+    largo = w // 3
+    fin = (int(cx + largo * np.cos(rad)), int(cy + largo * np.sin(rad)))
+    cv2.line(img, (cx, cy), fin, (gris_cabeza + 30,) * 3, 2)
+
+    ruido = rng.normal(0, 8, img.shape)
+    return np.clip(img + ruido, 0, 255).astype(np.uint8)
+
+
+def imagen_rps(rng, size=(300, 200)):
+    """
+    Genera una imagen BGR parecida a las de Rock-Paper-Scissors: fondo
+    verde y una mano (poligono color piel) entrando desde un borde.
+    """
+    w, h = size
+    img = np.zeros((h, w, 3), np.uint8)
+    img[:] = (40, 170, 60)
+    centro = np.array([w * 0.55, h * 0.5])
+    n = int(rng.integers(6, 12))
+    angulos = np.sort(rng.uniform(0, 2 * np.pi, n))
+    radios = rng.uniform(h * 0.2, h * 0.45, n)
+    puntos = np.stack([centro[0] + radios * np.cos(angulos),
+                       centro[1] + radios * np.sin(angulos)], axis=1).astype(np.int32)
+    cv2.fillPoly(img, [puntos], (120, 150, 210))
+    cv2.rectangle(img, (int(w * 0.8), int(h * 0.35)), (w, int(h * 0.65)), (120, 150, 210), -1)
+
+    ruido = rng.normal(0, 6, img.shape)
+    return np.clip(img + ruido, 0, 255).astype(np.uint8)
+
+
+def generar_lote(tipo, n, seed=0):
+    """
+    Genera n imagenes sinteticas del tipo indicado ('espermatozoides' o 'rps')
+    con una semilla fija para que las corridas sean comparables.
+    """
+    rng = np.random.default_rng(seed)
+    fabrica = imagen_espermatozoide if tipo == "espermatozoides" else imagen_rps
+    return [fabrica(rng) for _ in range(n)]
@@ -0,0 +1,144 @@
+"""
+Verifica que los momentos desde el contorno (momentos/contorno.py)
+coinciden con los del raster (calcular_momentos y calcular_hu_momentos,
+cv2.moments sobre la mascara).
+
+Usa mascaras sinteticas binarizadas (siempre) y las mascaras reales de
+los datasets procesados si existen; termina con codigo 1 si el error
+relativo maximo supera la tolerancia.
+
+    python -m benchmarks.verificar_momentos_contorno
+    python -m benchmarks.verificar_momentos_contorno --mascaras datos_procesados/espermatozoides_binarizados
+    python -m benchmarks.verificar_momentos_contorno --sinteticas 100 --max-reales 40
+"""
+import os
+import sys
+import argparse
+from itertools import islice
+
+import numpy as np
+
+from benchmarks.imagenes_sinteticas import generar_lote
+from src.extraccion_caracteristicas.momentos.binarizacion import binarizar_rps, binarizar_espermatozoides
+from src.extraccion_caracteristicas.momentos.momentos import calcular_momentos
+from src.extraccion_caracteristicas.momentos.hu import calcular_hu_momentos
+from src.extraccion_caracteristicas.momentos.contorno import momentos_contorno
+from src.extraccion_caracteristicas.momentos.objetos import hu_objetos, COLUMNAS_MOMENTOS, COLUMNAS_HU
+
+
+TOLERANCIA = 1e-6
+# Piso del denominador relativo a la escala de cada familia (m, mu, nu,
+# hu): los momentos que el raster da practicamente nulos (p. ej. mu11 de
+# una figura simetrica) se comparan en escala absoluta
+PISO = 1e-9
+MASCARAS_REALES = (
+    ("espermatozoides", "espermatozoides_binarizados"),
+    ("piedra_papel_tijera", "piedra_papel_tijera_binarizados"),
+)
+
+
+def _familia(columna):
+    return columna.rstrip("0123456789")
+
+
+def errores_relativos(mascara):
+    """
+    Error relativo de cada momento y de Hu entre contorno y raster.
+
+    Retorna:
+        dict: {columna: error}
+    """
+    raster = {**calcular_momentos(mascara), **calcular_hu_momentos(mascara)}
+    contorno = momentos_contorno(mascara)
+    fila = np.array([[contorno[c] for c in COLUMNAS_MOMENTOS]])
+    contorno.update(zip(COLUMNAS_HU, hu_objetos(fila)[0].tolist()))
+
+    escalas = {}
+    for columna, valor in raster.items():
+        familia = _familia(columna)
+        escalas[familia] = max(escalas.get(familia, 0.0), abs(valor))
+    errores = {}
+    for columna, valor in raster.items():
+        denominador = max(abs(valor), PISO * escalas[_familia(columna)], np.finfo(float).tiny)
+        errores[columna] = abs(contorno[columna] - valor) / denominador
+    return errores
+
+
+def mascaras_sinteticas(n, seed=0):
+    """Mascaras binarizadas de imagenes sinteticas de ambos datasets."""
+    for tipo, binarizar in (("espermatozoides", binarizar_espermatozoides), ("rps", binarizar_rps)):
+        for img in generar_lote(tipo, n, seed):
+            yield f"sintetica/{tipo}", binarizar(img)
+
+
+def mascaras_reales(rutas, maximo):
+    """Hasta maximo mascaras de cada ruta (carpeta, shards o .mascaras)."""
+    from scripts.extraer_caracteristicas import iterar_mascaras
+
+    for ruta in rutas:
+        if not os.path.exists(ruta):
+            print(f"Sin mascaras en {ruta}")
+            continue
+        for clase, _, mascara in islice(iterar_mascaras(ruta), maximo):
+            yield f"{os.path.basename(ruta)}/{clase}", mascara
+
+
+def verificar(mascaras):
+    """
+    Compara contorno y raster en cada mascara.
+
+    Retorna:
+        tuple: (mascaras comparadas, {columna: error maximo}, peor (origen, columna, error))
+    """
+    n = 0
+    maximos = {}
+    peor = (None, None, 0.0)
+    for origen, mascara in mascaras:
+        if not mascara.any():
+            continue
+        n += 1
+        for columna, error in errores_relativos(mascara).items():
+            maximos[columna] = max(maximos.get(columna, 0.0), error)
+            if error > peor[2]:
+                peor = (origen, columna, error)
+    return n, maximos, peor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Momentos de contorno contra momentos del raster")
+    parser.add_argument("--mascaras", nargs="*", default=None,
+                        help="Rutas de mascaras reales (por defecto las binarizadas de ambos datasets)")
+    parser.add_argument("--max-reales", type=int, default=40, help="Mascaras reales por ruta")
+    parser.add_argument("--sinteticas", type=int, default=20, help="Mascaras sinteticas por dataset")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    args = parser.parse_args(argv)
+
+    rutas = args.mascaras
+    if rutas is None:
+        from scripts.extraer_caracteristicas import ruta_datos
+        rutas = [ruta_datos(dataset, carpeta) for dataset, carpeta in MASCARAS_REALES]
+
+    def todas():
+        yield from mascaras_sinteticas(args.sinteticas)
+        yield from mascaras_reales(rutas, args.max_reales)
+
+    n, maximos, (origen, columna, error) = verificar(todas())
+    if not n:
+        print("No hay mascaras con primer plano para comparar")
+        return 1
+
+    print(f"Mascaras comparadas: {n}")
+    for familia in ("m", "mu", "nu", "hu"):
+        columnas = [c for c in maximos if _familia(c) == familia]
+        peor_col = max(columnas, key=maximos.get)
+        print(f"  {familia:3s} error relativo maximo {maximos[peor_col]:.2e} ({peor_col})")
+    print(f"Peor caso: {error:.2e} en {columna} ({origen}); tolerancia {args.tolerancia:.0e}")
+    if error > args.tolerancia:
+        print("FALLA: los momentos de contorno no coinciden con los del raster")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
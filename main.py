@@ -1,24 +1,303 @@
-from scripts.generar_dataset_espermatozoides import generar_datos as generar_dataset_espermatozoides
-from scripts.generar_dataset_rps import generar_datos as generar_dataset_rps
-from scripts.extraer_caracteristicas import extraer_todas_caracteristicas
-from scripts.generar_embeddings_espermatozoides import generar_embeddings_espermatozoides
-from scripts.generar_embeddings_rps import generar_embeddings_rps
-
-def main():
-    print("\n--- INICIANDO PIPELINE: ESPERMATOZOIDES ---")
-    generar_dataset_espermatozoides()
-
-    print("\n--- INICIANDO PIPELINE: PIEDRA, PAPEL O TIJERA ---")
-    generar_dataset_rps()
-    
-    print("\n--- EXTRAYENDO TODAS LAS CARACTERISTICAS ---")
-    extraer_todas_caracteristicas()
-
-    print("\n--- EXTRAYENDO LOS EMBEDDINGS ---")
-    generar_embeddings_espermatozoides()
-    generar_embeddings_rps()
+"""
+Punto de entrada del pipeline.
+
+Cada etapa se importa solo cuando se ejecuta, de modo que una corrida que
+solo necesita momentos no carga torch, torchvision, kagglehub, skimage ni
+pandas. Uso:
+
+    python main.py                              # pipeline completo
+    python main.py momentos sift                # solo algunas etapas
+    python main.py --listar                     # etapas disponibles
+    python main.py momentos --presupuesto-importacion 1.5
+    python main.py momentos --solo-importacion  # mide sin ejecutar
+    python main.py dataset_rps --max-por-clase -1 --balanceado
+    python main.py --config-muestreo muestreo.json
+    python main.py dataset_rps --origen-rps rps.zip --offline
+    python main.py duplicados dataset_rps       # reutiliza copias duplicadas
+    python main.py paquete                      # paquete de inferencia en paquetes/
+"""
+import os
+import re
+import sys
+import argparse
+import importlib
+import subprocess
+from datetime import datetime
+
+from src import instrumentacion as inst
+from src import recursos
+
+
+# nombre -> (modulo, funcion, mensaje). El modulo se importa al ejecutar la etapa.
+ETAPAS = {
+    "duplicados": (
+        "scripts.detectar_duplicados", "detectar_duplicados_todos",
+        "DETECCION DE DUPLICADOS EN LOS ORIGINALES",
+    ),
+    "dataset_espermatozoides": (
+        "scripts.generar_dataset_espermatozoides", "generar_datos",
+        "INICIANDO PIPELINE: ESPERMATOZOIDES",
+    ),
+    "dataset_rps": (
+        "scripts.generar_dataset_rps", "generar_datos",
+        "INICIANDO PIPELINE: PIEDRA, PAPEL O TIJERA",
+    ),
+    "caracteristicas": (
+        "scripts.extraer_caracteristicas", "extraer_todas_caracteristicas",
+        "EXTRAYENDO TODAS LAS CARACTERISTICAS",
+    ),
+    "momentos": (
+        "scripts.extraer_caracteristicas", "extraer_momentos_todos",
+        "EXTRAYENDO MOMENTOS, HU Y ZERNIKE",
+    ),
+    "contorno": (
+        "scripts.extraer_caracteristicas", "extraer_contorno_todos",
+        "EXTRAYENDO MOMENTOS POR CONTORNO Y DESCRIPTORES DE FORMA",
+    ),
+    "sift": (
+        "scripts.extraer_caracteristicas", "extraer_sift_todos",
+        "EXTRAYENDO SIFT",
+    ),
+    "hog": (
+        "scripts.extraer_caracteristicas", "extraer_hog_todos",
+        "EXTRAYENDO HOG",
+    ),
+    "indice_formas": (
+        "scripts.buscar_formas", "construir_indices_todos",
+        "INDICE DE BUSQUEDA DE FORMAS",
+    ),
+    "objetos": (
+        "scripts.extraer_objetos", "extraer_objetos_todos",
+        "SEGMENTACION MULTI-OBJETO DE CUADROS",
+    ),
+    "barrido": (
+        "scripts.barrer_segmentacion", "ejecutar_barrido",
+        "BARRIDO DE PARAMETROS DE SEGMENTACION",
+    ),
+    "embeddings_espermatozoides": (
+        "scripts.generar_embeddings_espermatozoides", "generar_embeddings_espermatozoides",
+        "EXTRAYENDO LOS EMBEDDINGS: ESPERMATOZOIDES",
+    ),
+    "embeddings_rps": (
+        "scripts.generar_embeddings_rps", "generar_embeddings_rps",
+        "EXTRAYENDO LOS EMBEDDINGS: PIEDRA, PAPEL O TIJERA",
+    ),
+    "en_memoria": (
+        "scripts.pipeline_en_memoria", "ejecutar_datasets_en_memoria",
+        "PIPELINE EN MEMORIA",
+    ),
+    "fusion": (
+        "scripts.fusionar_caracteristicas", "ejecutar_fusion",
+        "FUSION DE CARACTERISTICAS",
+    ),
+    "agrupamiento": (
+        "scripts.agrupar", "ejecutar_agrupamiento",
+        "AGRUPAMIENTO NO SUPERVISADO",
+    ),
+    "semisupervisado": (
+        "scripts.propagar_etiquetas", "ejecutar_propagacion",
+        "PROPAGACION DE ETIQUETAS",
+    ),
+    "proyeccion": (
+        "scripts.proyectar_embeddings", "ejecutar_proyeccion",
+        "PROYECCION 2D/3D DE EMBEDDINGS",
+    ),
+    "paquete": (
+        "scripts.empaquetar_inferencia", "empaquetar_todos",
+        "PAQUETE DE INFERENCIA",
+    ),
+}
+
+ETAPAS_POR_DEFECTO = (
+    "dataset_espermatozoides",
+    "dataset_rps",
+    "caracteristicas",
+    "embeddings_espermatozoides",
+    "embeddings_rps",
+    "paquete",
+)
+
+# Etapas que seleccionan muestras del dataset original o leen los datasets
+# procesados de su ruta_salida (reciben config_muestreo)
+ETAPAS_CON_MUESTREO = (
+    "duplicados", "dataset_espermatozoides", "dataset_rps", "en_memoria", "barrido",
+    "caracteristicas", "momentos", "contorno", "sift", "hog", "indice_formas",
+    "embeddings_espermatozoides", "embeddings_rps",
+)
+
+# Perfil de recursos de cada etapa (ver src/recursos.py); por defecto 'secuencial'
+PERFILES_ETAPA = {
+    "duplicados": "hilos",
+    "objetos": "hilos",
+    "barrido": "hilos",
+    "embeddings_espermatozoides": "torch",
+    "embeddings_rps": "torch",
+    "en_memoria": "torch",
+    "agrupamiento": "procesos",
+}
+
+_LINEA_IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def ejecutar_etapa(nombre, **kwargs):
+    """
+    Importa el modulo de la etapa y ejecuta su funcion con kwargs.
+
+    El tiempo de importacion se registra aparte (main/importar/<etapa>)
+    para distinguir el arranque del trabajo real. La funcion corre con el
+    reparto de nucleos de su perfil (PERFILES_ETAPA).
+    """
+    modulo, funcion, mensaje = ETAPAS[nombre]
+    print(f"\n--- {mensaje} ---")
+    with inst.etapa(f"main/importar/{nombre}"):
+        fn = getattr(importlib.import_module(modulo), funcion)
+    with recursos.usar(PERFILES_ETAPA.get(nombre, "secuencial")) as reparto:
+        print(f"Recursos: {recursos.describir(reparto)}")
+        with inst.etapa(f"main/{nombre}"):
+            return fn(**kwargs)
+
+
+def medir_importacion(modulo, top=5):
+    """
+    Mide el tiempo de importacion en frio de un modulo en un interprete
+    nuevo usando "python -X importtime".
+
+    Parametros:
+        modulo: Nombre del modulo, p. ej. "scripts.extraer_caracteristicas"
+        top: Numero de dependencias mas costosas a devolver
+
+    Retorna:
+        dict: {"modulo", "tiempo_s", "mas_costosos": [(dependencia, segundos)]}
+    """
+    # Se importa tambien main (src.instrumentacion) porque es parte del arranque
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import src.instrumentacion, {modulo}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{proceso.stderr[-2000:]}")
+
+    total_us, dependencias = 0, []
+    for linea in proceso.stderr.splitlines():
+        m = _LINEA_IMPORTTIME.match(linea)
+        if not m:
+            continue
+        acumulado, nivel, nombre = int(m.group(2)), len(m.group(3)) // 2, m.group(4)
+        # Nivel 0: modulos importados en -c; nivel 1: sus dependencias directas
+        if nivel == 0:
+            total_us += acumulado
+        elif nivel == 1:
+            dependencias.append((nombre, acumulado / 1e6))
+
+    dependencias.sort(key=lambda x: x[1], reverse=True)
+    return {"modulo": modulo, "tiempo_s": total_us / 1e6, "mas_costosos": dependencias[:top]}
+
+
+def verificar_importacion(etapas, presupuesto_s=None):
+    """
+    Mide la importacion en frio de cada etapa y la compara con el presupuesto.
+
+    Retorna:
+        bool: True si todas las etapas estan dentro del presupuesto
+    """
+    ok = True
+    print(f"\n{'etapa':28s} {'importacion(s)':>15s}")
+    for nombre in etapas:
+        medicion = medir_importacion(ETAPAS[nombre][0])
+        excede = presupuesto_s is not None and medicion["tiempo_s"] > presupuesto_s
+        marca = "  <-- EXCEDE PRESUPUESTO" if excede else ""
+        print(f"{nombre:28s} {medicion['tiempo_s']:15.3f}{marca}")
+        if excede:
+            ok = False
+            for modulo, segundos in medicion["mas_costosos"]:
+                print(f"    {modulo:40s} {segundos:.3f} s")
+    return ok
+
+
+def main(etapas=ETAPAS_POR_DEFECTO, perfilar=False, rastrear_memoria=False, ruta_reporte=None,
+         config_muestreo=None):
+    inst.iniciar(perfilar=perfilar, rastrear_memoria=rastrear_memoria)
+
+    for nombre in etapas:
+        if nombre in ETAPAS_CON_MUESTREO and config_muestreo:
+            ejecutar_etapa(nombre, config_muestreo=config_muestreo)
+        else:
+            ejecutar_etapa(nombre)
 
     print("\n--- TODOS LOS PROCESOS FINALIZADOS ---")
 
+    if ruta_reporte is None:
+        ruta_reporte = os.path.join("reportes", f"ejecucion_{datetime.now():%Y%m%d_%H%M%S}.json")
+    inst.guardar_reporte(ruta_reporte)
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline de procesamiento de imagenes")
+    parser.add_argument("etapas", nargs="*", metavar="etapa",
+                        help="Etapas a ejecutar en orden (por defecto todo el pipeline)")
+    parser.add_argument("--listar", action="store_true", help="Muestra las etapas disponibles")
+    parser.add_argument("--perfilar", action="store_true", help="Activa cProfile")
+    parser.add_argument("--memoria", action="store_true", help="Activa tracemalloc")
+    parser.add_argument("--reporte", default=None, help="Ruta del reporte JSON")
+    parser.add_argument("--presupuesto-importacion", type=float, default=None, metavar="SEG",
+                        help="Falla si la importacion en frio de alguna etapa supera SEG segundos")
+    parser.add_argument("--solo-importacion", action="store_true",
+                        help="Solo mide la importacion de las etapas, sin ejecutarlas")
+    muestreo = parser.add_argument_group("muestreo", "ver src/datos/muestreo.py")
+    muestreo.add_argument("--config-muestreo", default=None, metavar="JSON",
+                          help="Archivo JSON con la configuracion de muestreo")
+    muestreo.add_argument("--max-por-clase", type=int, default=None, metavar="N",
+                          help="Maximo de imagenes por clase (-1: todas)")
+    muestreo.add_argument("--fraccion", type=float, default=None,
+                          help="Fraccion de cada clase (muestreo estratificado)")
+    muestreo.add_argument("--balanceado", action="store_true", default=None,
+                          help="Misma cantidad de imagenes en todas las clases")
+    muestreo.add_argument("--semilla", type=int, default=None)
+    muestreo.add_argument("--salida-datos", default=None, metavar="RUTA",
+                          help="Carpeta de salida de los datasets procesados")
+    muestreo.add_argument("--reprocesar", action="store_true",
+                          help="No reutiliza las muestras procesadas en corridas anteriores")
+    origen = parser.add_argument_group("origen de datos", "ver src/datos/fuente.py")
+    origen.add_argument("--origen-espermatozoides", default=None, metavar="RUTA",
+                        help="Carpeta o .zip/.tar local con el dataset SMIDS")
+    origen.add_argument("--origen-rps", default=None, metavar="RUTA",
+                        help="Carpeta o .zip/.tar local con el dataset Rock-Paper-Scissors")
+    origen.add_argument("--offline", action="store_true", default=None,
+                        help="No descarga: usa solo origenes locales o ya escaneados")
+    args = parser.parse_args(argv)
+
+    if args.listar:
+        for nombre, (modulo, funcion, _) in ETAPAS.items():
+            defecto = " (por defecto)" if nombre in ETAPAS_POR_DEFECTO else ""
+            print(f"{nombre:28s} {modulo}.{funcion}{defecto}")
+        return 0
+
+    desconocidas = [e for e in args.etapas if e not in ETAPAS]
+    if desconocidas:
+        parser.error(f"etapas desconocidas: {', '.join(desconocidas)} (ver --listar)")
+    etapas = args.etapas or list(ETAPAS_POR_DEFECTO)
+
+    if args.presupuesto_importacion is not None or args.solo_importacion:
+        if not verificar_importacion(etapas, args.presupuesto_importacion):
+            return 1
+        if args.solo_importacion:
+            return 0
+
+    config_muestreo = {
+        "ruta_config": args.config_muestreo,
+        "max_por_clase": args.max_por_clase,
+        "fraccion": args.fraccion,
+        "balanceado": args.balanceado,
+        "semilla": args.semilla,
+        "ruta_salida": args.salida_datos,
+        "incremental": False if args.reprocesar else None,
+        "offline": args.offline,
+        "espermatozoides": {"origen": args.origen_espermatozoides},
+        "piedra_papel_tijera": {"origen": args.origen_rps},
+    }
+    main(etapas, args.perfilar, args.memoria, args.reporte, config_muestreo)
+    return 0
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(cli())
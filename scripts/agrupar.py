@@ -0,0 +1,194 @@
+import os
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from tqdm import tqdm
+
+from src.agrupamiento.conjuntos import cargar_conjunto, conjuntos_disponibles
+from src.agrupamiento.modelos import ALGORITMOS, crear_modelo
+from src.agrupamiento.reduccion import reducir_pca
+from src import instrumentacion as inst
+from src import recursos
+
+
+DATASETS = ("espermatozoides", "piedra_papel_tijera")
+VALORES_K = (2, 3, 4, 5, 6, 8)
+TAMANOS_MIN_HDBSCAN = (5, 15, 30)  # min_cluster_size; HDBSCAN no recibe k
+N_COMPONENTES = 50
+RUTA_RESULTADOS = "resultados/agrupamiento"
+
+COLUMNAS_REPORTE = (
+    "dataset", "conjunto", "algoritmo", "parametro", "n_muestras", "dimensiones",
+    "componentes", "n_grupos", "ruido", "ari", "nmi", "tiempo_s", "tiempo_reduccion_s",
+)
+
+
+def _iniciar_trabajador(reparto):
+    # Hilos de BLAS/OpenMP por proceso segun el reparto: el paralelismo lo da el pool
+    import warnings
+    from sklearn.exceptions import ConvergenceWarning
+
+    recursos.iniciar_trabajador(reparto)
+    # BIRCH avisa si encuentra menos subgrupos que k; queda en n_grupos
+    warnings.filterwarnings("ignore", category=ConvergenceWarning)
+
+
+def ejecutar_tarea(tarea):
+    """
+    Ajusta un algoritmo sobre una reduccion en cache y mide su calidad.
+
+    Se ejecuta en un proceso del pool: la matriz no se envia por pickle,
+    el proceso la abre con mmap desde la cache de reducciones.
+
+    Retorna:
+        dict: Fila del reporte (ver COLUMNAS_REPORTE)
+    """
+    from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+
+    Z = np.load(tarea["ruta_reduccion"], mmap_mode="r")
+    y = tarea["y"]
+    modelo = crear_modelo(tarea["algoritmo"], tarea["parametro"], tarea["semilla"])
+
+    t0 = time.perf_counter()
+    etiquetas = modelo.fit_predict(np.asarray(Z))
+    tiempo = time.perf_counter() - t0
+
+    fila = {k: v for k, v in tarea.items() if k in COLUMNAS_REPORTE}
+    fila.update({
+        "n_grupos": len(set(etiquetas.tolist()) - {-1}),
+        "ruido": float(np.mean(etiquetas == -1)),
+        "ari": float(adjusted_rand_score(y, etiquetas)),
+        "nmi": float(normalized_mutual_info_score(y, etiquetas)),
+        "tiempo_s": tiempo,
+    })
+    return fila
+
+
+def agrupar_dataset(
+    dataset,
+    conjuntos=None,
+    algoritmos=ALGORITMOS,
+    valores_k=VALORES_K,
+    tamanos_min_hdbscan=TAMANOS_MIN_HDBSCAN,
+    n_componentes=N_COMPONENTES,
+    procesos=None,
+    semilla=0,
+):
+    """
+    Agrupa cada conjunto de caracteristicas de un dataset con todos los
+    algoritmos y parametros, en paralelo con un pool de procesos.
+
+    Cada conjunto se estandariza y reduce con PCA una sola vez (con cache
+    en disco); todas las corridas de ese conjunto comparten la reduccion.
+
+    Parametros:
+        dataset: 'espermatozoides' o 'piedra_papel_tijera'
+        conjuntos: Lista de conjuntos (None: todos los disponibles)
+        algoritmos: Algoritmos a ejecutar
+        valores_k: Numeros de grupos para MiniBatchKMeans y BIRCH
+        tamanos_min_hdbscan: Valores de min_cluster_size para HDBSCAN
+        n_componentes: Dimensiones tras PCA
+        procesos: Procesos del pool (None: los del reparto, ver src/recursos.py)
+        semilla: Semilla para PCA y MiniBatchKMeans
+
+    Retorna:
+        list: Filas del reporte
+    """
+    tareas = []
+    for conjunto in conjuntos_disponibles(dataset, conjuntos):
+        with inst.etapa("agrupamiento/cargar"):
+            X, y, _ = cargar_conjunto(dataset, conjunto)
+        if len(X) < 3:
+            print(f"{dataset}/{conjunto}: muy pocas muestras ({len(X)}), se omite")
+            continue
+
+        t0 = time.perf_counter()
+        with inst.etapa("agrupamiento/reduccion"):
+            Z, ruta = reducir_pca(X, n_componentes, nombre=f"{dataset}_{conjunto}", semilla=semilla)
+        base = {
+            "dataset": dataset,
+            "conjunto": conjunto,
+            "n_muestras": len(X),
+            "dimensiones": X.shape[1],
+            "componentes": Z.shape[1],
+            "tiempo_reduccion_s": time.perf_counter() - t0,
+            "ruta_reduccion": ruta,
+            "y": y,
+            "semilla": semilla,
+        }
+        for algoritmo in algoritmos:
+            parametros = tamanos_min_hdbscan if algoritmo == "hdbscan" else valores_k
+            for parametro in parametros:
+                if parametro >= len(X):
+                    continue
+                tareas.append({**base, "algoritmo": algoritmo, "parametro": parametro})
+
+    if not tareas:
+        print(f"No hay caracteristicas para agrupar en {dataset}")
+        return []
+
+    print(f"\nAgrupando {dataset}: {len(tareas)} corridas")
+    resultados = []
+    reparto = recursos.actual("procesos")
+    with ProcessPoolExecutor(max_workers=procesos or reparto["procesos"],
+                             initializer=_iniciar_trabajador, initargs=(reparto,)) as pool:
+        futuros = [pool.submit(ejecutar_tarea, t) for t in tareas]
+        for futuro in tqdm(as_completed(futuros), total=len(futuros)):
+            fila = futuro.result()
+            inst.registrar(f"agrupamiento/{fila['algoritmo']}", fila["tiempo_s"])
+            resultados.append(fila)
+
+    resultados.sort(key=lambda f: (f["conjunto"], f["algoritmo"], f["parametro"]))
+    return resultados
+
+
+def guardar_resultados(resultados, ruta_base):
+    """Guarda las filas en ruta_base.csv y ruta_base.json."""
+    os.makedirs(os.path.dirname(ruta_base) or ".", exist_ok=True)
+    with open(ruta_base + ".csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNAS_REPORTE)
+        writer.writeheader()
+        writer.writerows(resultados)
+    with open(ruta_base + ".json", "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2)
+
+
+def imprimir_mejores(resultados):
+    """Imprime, por conjunto y algoritmo, la corrida con mayor ARI."""
+    mejores = {}
+    for fila in resultados:
+        clave = (fila["conjunto"], fila["algoritmo"])
+        if clave not in mejores or fila["ari"] > mejores[clave]["ari"]:
+            mejores[clave] = fila
+
+    print(f"\n{'conjunto':10s} {'algoritmo':18s} {'param':>6s} {'grupos':>7s} "
+          f"{'ARI':>7s} {'NMI':>7s} {'tiempo(s)':>10s}")
+    for (conjunto, algoritmo), fila in sorted(mejores.items()):
+        print(f"{conjunto:10s} {algoritmo:18s} {fila['parametro']:6d} {fila['n_grupos']:7d} "
+              f"{fila['ari']:7.3f} {fila['nmi']:7.3f} {fila['tiempo_s']:10.3f}")
+
+
+def ejecutar_agrupamiento(datasets=DATASETS, **kwargs):
+    """
+    Ejecuta el agrupamiento de todos los datasets y guarda un reporte por
+    dataset en resultados/agrupamiento/<dataset>.csv|json.
+
+    Parametros:
+        datasets: Datasets a procesar
+        **kwargs: Opciones de agrupar_dataset
+    """
+    for dataset in datasets:
+        print(f"\n--- AGRUPAMIENTO: {dataset.upper()} ---")
+        with inst.etapa(f"agrupamiento/{dataset}"):
+            resultados = agrupar_dataset(dataset, **kwargs)
+        if resultados:
+            guardar_resultados(resultados, os.path.join(RUTA_RESULTADOS, dataset))
+            imprimir_mejores(resultados)
+            print(f"Reporte guardado en: {os.path.join(RUTA_RESULTADOS, dataset)}.csv")
+
+
+if __name__ == "__main__":
+    ejecutar_agrupamiento()
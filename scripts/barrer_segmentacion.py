@@ -0,0 +1,128 @@
+import os
+import csv
+import json
+
+import numpy as np
+
+from src.preprocesamiento.barrido import barrer, rejilla, CADENAS, COLUMNAS_ESTADISTICAS
+from src import instrumentacion as inst
+
+
+RUTA_RESULTADOS = "resultados/barrido"
+MAX_POR_CLASE = 30  # imagenes de muestra por clase
+
+# Rejillas por defecto: alrededor de los valores actuales
+REJILLAS = {
+    "espermatozoides": {
+        "k_mediana": [3, 5],
+        "canny_bajo": [10, 20, 30],
+        "delta_umbral": [8, 12, 16],
+        "k_cierre": [3, 5],
+        "area_min": [100, 200, 400],
+    },
+    "piedra_papel_tijera": {
+        "k_gauss": [3, 5, 7],
+        "k_apertura": [3, 5, 7, 9],
+    },
+}
+METODOS = {"espermatozoides": "espermatozoides", "piedra_papel_tijera": "rps"}
+
+
+def cargar_muestras(dataset, max_por_clase=MAX_POR_CLASE, config_muestreo=None, semilla=0):
+    """
+    Lee hasta max_por_clase originales por clase de la seleccion de muestreo.
+
+    Retorna:
+        tuple: (imagenes BGR, y (N,), nombres de clase)
+    """
+    from scripts.pipeline_en_memoria import DATASETS, listar_tareas
+
+    tareas = listar_tareas(DATASETS[dataset], config_muestreo)
+    clases = sorted({clase for clase, _, _ in tareas})
+    rng = np.random.default_rng(semilla)
+    imagenes, y = [], []
+    for indice, clase in enumerate(clases):
+        rutas = [ruta for c, ruta, _ in tareas if c == clase]
+        if max_por_clase and len(rutas) > max_por_clase:
+            rutas = [rutas[i] for i in sorted(rng.choice(len(rutas), max_por_clase, replace=False))]
+        for ruta in rutas:
+            img = inst.leer_imagen(ruta)
+            if img is not None:
+                imagenes.append(img)
+                y.append(indice)
+    return imagenes, np.array(y, dtype=np.int64), clases
+
+
+def guardar_resultados(filas, resumen, ruta_base):
+    """Guarda las filas en ruta_base.csv y filas + resumen en ruta_base.json."""
+    os.makedirs(os.path.dirname(ruta_base) or ".", exist_ok=True)
+    columnas = [c for c in filas[0] if c not in COLUMNAS_ESTADISTICAS] + list(COLUMNAS_ESTADISTICAS)
+    with open(ruta_base + ".csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columnas)
+        writer.writeheader()
+        writer.writerows(filas)
+    with open(ruta_base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"resumen": resumen, "filas": filas}, f, indent=2)
+
+
+def imprimir_mejores(filas, defecto, n=5):
+    """Imprime las n mejores combinaciones y la posicion de la actual."""
+    parametros = [c for c in filas[0] if c not in COLUMNAS_ESTADISTICAS]
+    print(f"\n{'#':>3s} {'puntaje':>8s} {'ARI':>7s} {'vacias':>7s} {'comp':>6s}  parametros")
+    for i, fila in enumerate(filas[:n], start=1):
+        cambios = {k: fila[k] for k in parametros if fila[k] != defecto[k]}
+        print(f"{i:3d} {fila['puntaje']:8.3f} {fila['ari']:7.3f} {fila['frac_vacias']:7.2f} "
+              f"{fila['componentes_medios']:6.1f}  {cambios or '(valores actuales)'}")
+    for i, fila in enumerate(filas, start=1):
+        if all(fila[k] == defecto[k] for k in parametros):
+            print(f"Valores actuales: puesto {i} de {len(filas)} (puntaje {fila['puntaje']:.3f})")
+            break
+
+
+def barrer_dataset(dataset, valores=None, max_por_clase=MAX_POR_CLASE, hilos=None,
+                   config_muestreo=None, semilla=0):
+    """
+    Barrido de la segmentacion de un dataset sobre una muestra de originales.
+
+    Retorna:
+        tuple: (filas ordenadas por puntaje, resumen) o None si no hay muestras
+    """
+    metodo = METODOS[dataset]
+    valores = REJILLAS[dataset] if valores is None else valores
+    with inst.etapa("barrido/cargar"):
+        imagenes, y, clases = cargar_muestras(dataset, max_por_clase, config_muestreo, semilla)
+    if not imagenes:
+        print(f"No hay imagenes de muestra para {dataset}")
+        return None
+
+    n_combinaciones = len(rejilla(metodo, valores))
+    print(f"\nBarrido de {dataset}: {n_combinaciones} combinaciones x {len(imagenes)} imagenes "
+          f"({len(clases)} clases)")
+    with inst.etapa("barrido/segmentar", imagenes=n_combinaciones * len(imagenes)):
+        filas, resumen = barrer(imagenes, y, metodo, valores, hilos, semilla)
+    print(f"Segmentacion: {resumen['tiempo_segmentacion_s']:.1f} s, la cache evito el "
+          f"{resumen['ahorro_cache']:.0%} de las etapas; agrupamiento: "
+          f"{resumen['tiempo_agrupamiento_s']:.1f} s")
+
+    _, defecto = CADENAS[metodo]
+    defecto = {k: (list(v) if isinstance(v, tuple) else v) for k, v in defecto.items()}
+    imprimir_mejores(filas, defecto)
+    return filas, resumen
+
+
+def ejecutar_barrido(datasets=tuple(METODOS), config_muestreo=None, **kwargs):
+    """
+    Barre la segmentacion de cada dataset y guarda el reporte en
+    resultados/barrido/<dataset>.csv|json.
+    """
+    for dataset in datasets:
+        print(f"\n--- BARRIDO DE SEGMENTACION: {dataset.upper()} ---")
+        resultado = barrer_dataset(dataset, config_muestreo=config_muestreo, **kwargs)
+        if resultado:
+            ruta = os.path.join(RUTA_RESULTADOS, dataset)
+            guardar_resultados(*resultado, ruta)
+            print(f"Reporte guardado en: {ruta}.csv")
+
+
+if __name__ == "__main__":
+    ejecutar_barrido()
@@ -0,0 +1,162 @@
+"""
+Indice y busqueda de formas parecidas (ver src/extraccion_caracteristicas/momentos/busqueda.py).
+
+La extraccion de momentos ya mantiene el indice al dia; construir_indice
+lo arma desde las mascaras guardadas (p. ej. las extraidas antes de que
+existiera el indice), reutilizando los Zernike de zernike.csv.
+
+    python -m scripts.buscar_formas espermatozoides consulta1.png consulta2.png -k 5
+    python -m scripts.buscar_formas piedra_papel_tijera mascara.png --mascaras
+    python -m scripts.buscar_formas espermatozoides --construir
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from src.extraccion_caracteristicas.momentos.busqueda import IndiceFormas, descriptor_forma, DIR_INDICE
+from src.extraccion_caracteristicas.momentos.calidad import evaluar_mascara
+from src.datos.duplicados import cargar_grupos, clave_imagen
+from src import instrumentacion as inst
+from scripts.extraer_caracteristicas import iterar_mascaras, ruta_datos
+
+
+# dataset -> (carpeta de mascaras bajo la ruta_salida del muestreo, carpeta
+# de los CSV de momentos, binarizacion de las consultas)
+DATASETS = {
+    "espermatozoides": (
+        "espermatozoides_binarizados",
+        "caracteristicas_extraidas/momentos/espermatozoides",
+        "espermatozoides",
+    ),
+    "piedra_papel_tijera": (
+        "piedra_papel_tijera_binarizados",
+        "caracteristicas_extraidas/momentos/piedra_papel_tijera",
+        "rps",
+    ),
+}
+
+
+def ruta_indice(dataset):
+    return os.path.join(DATASETS[dataset][1], DIR_INDICE)
+
+
+def _zernike_csv(carpeta):
+    """{clave: fila} de zernike.csv, o {} si no existe."""
+    ruta = os.path.join(carpeta, "zernike.csv")
+    if not os.path.isfile(ruta):
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return {
+            clave_imagen(fila["clase"], fila["archivo"]): {k: float(v) for k, v in fila.items() if k[1:].isdigit()}
+            for fila in csv.DictReader(f) if fila.get("archivo")
+        }
+
+
+def construir_indice(dataset, algoritmo="ball_tree", config_muestreo=None):
+    """
+    Indice de formas de todas las mascaras validas del dataset (sin las
+    copias duplicadas), guardado junto a los CSV de momentos. Las mascaras
+    se leen de la ruta_salida de config_muestreo.
+
+    Retorna:
+        IndiceFormas o None si no hay mascaras
+    """
+    ruta_mascaras, carpeta, metodo = DATASETS[dataset]
+    ruta_mascaras = ruta_datos(dataset, ruta_mascaras, config_muestreo)
+    if not os.path.exists(ruta_mascaras):
+        print(f"No hay mascaras de {dataset} en {ruta_mascaras}")
+        return None
+
+    grupos = cargar_grupos(dataset)
+    zernike = _zernike_csv(carpeta)
+    claves, clases, X = [], [], []
+    calculados = 0
+    omitir = lambda clase, archivo: clave_imagen(clase, archivo) in grupos
+    for clase, archivo, mascara in iterar_mascaras(ruta_mascaras, omitir):
+        clave = clave_imagen(clase, archivo)
+        if mascara is None or clave in grupos or not evaluar_mascara(mascara)["valida"]:
+            continue
+        fila = zernike.get(clave)
+        calculados += fila is None
+        with inst.etapa("formas/descriptor", imagenes=1):
+            d = descriptor_forma(mascara, fila)
+        if d is not None:
+            claves.append(clave)
+            clases.append(clase)
+            X.append(d)
+    if not X:
+        print(f"No hay mascaras validas de {dataset}")
+        return None
+
+    indice = IndiceFormas(metodo, algoritmo)
+    with inst.etapa("formas/construir", imagenes=len(X)):
+        indice.agregar(claves, clases, np.stack(X))
+    indice.guardar(ruta_indice(dataset))
+    print(f"Indice de formas de {dataset}: {len(indice)} mascaras "
+          f"({calculados} sin Zernike en zernike.csv), guardado en {ruta_indice(dataset)}")
+    return indice
+
+
+def construir_indices_todos(config_muestreo=None, **kwargs):
+    """Indice de formas de ambos datasets."""
+    for dataset in DATASETS:
+        print(f"\n--- INDICE DE FORMAS: {dataset.upper()} ---")
+        construir_indice(dataset, config_muestreo=config_muestreo, **kwargs)
+
+
+def buscar(dataset, rutas, k=5, mascaras=False):
+    """
+    Busca las k formas mas parecidas a cada imagen (o mascara) en lote.
+
+    Retorna:
+        tuple: (resultados por consulta, milisegundos por consulta)
+    """
+    indice = IndiceFormas.cargar(ruta_indice(dataset))
+    if indice is None:
+        raise FileNotFoundError(f"No hay indice de formas en {ruta_indice(dataset)} (ver --construir)")
+    modo = cv2.IMREAD_GRAYSCALE if mascaras else cv2.IMREAD_COLOR
+    imagenes = [inst.leer_imagen(r, modo) for r in rutas]
+    faltantes = [r for r, img in zip(rutas, imagenes) if img is None]
+    if faltantes:
+        raise FileNotFoundError(f"No se pudieron leer: {', '.join(faltantes)}")
+
+    t0 = time.perf_counter()
+    if mascaras:
+        resultados = indice.buscar_mascaras(imagenes, k)
+    else:
+        resultados = indice.buscar_imagenes(imagenes, k)
+    return resultados, (time.perf_counter() - t0) * 1000.0 / len(rutas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Busqueda de formas por momentos de Hu y Zernike")
+    parser.add_argument("dataset", choices=list(DATASETS))
+    parser.add_argument("rutas", nargs="*", help="Imagenes (o mascaras con --mascaras) de consulta")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--mascaras", action="store_true", help="Las rutas ya son mascaras binarias")
+    parser.add_argument("--construir", action="store_true", help="Reconstruye el indice desde las mascaras")
+    args = parser.parse_intermixed_args(argv)
+
+    if args.construir:
+        construir_indice(args.dataset)
+    if not args.rutas:
+        return 0
+
+    resultados, ms = buscar(args.dataset, args.rutas, args.k, args.mascaras)
+    for ruta, encontrados in zip(args.rutas, resultados):
+        print(f"\n{ruta}")
+        if not encontrados:
+            print("   (sin mascara valida)")
+        for r in encontrados:
+            print(f"   {r['distancia']:8.4f}  {r['clave']}")
+    print(f"\n{len(args.rutas)} consultas, {ms:.2f} ms por consulta")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Clasificacion en vivo de piedra, papel o tijera sobre video o camara
+(ver src/inferencia/flujo.py).
+
+    python -m scripts.clasificar_video demo.mp4                   # todos los cuadros
+    python -m scripts.clasificar_video demo.mp4 --tiempo-real     # al ritmo del video, descarta
+    python -m scripts.clasificar_video 0 --modo formas            # camara 0, indice de formas
+    python -m scripts.clasificar_video cuadros/ --salida predicciones.csv
+
+Modo 'embeddings' usa el paquete de inferencia (python main.py paquete);
+modo 'formas', el indice de formas de las mascaras (python main.py indice_formas).
+"""
+import os
+import sys
+import csv
+import argparse
+
+from src.inferencia.flujo import (
+    FuenteCuadros, SuavizadoTemporal, ClasificadorEmbeddings, ClasificadorFormas, clasificar_flujo,
+)
+from src import instrumentacion as inst
+from src import recursos
+
+
+DATASET = "piedra_papel_tijera"
+MODOS = ("embeddings", "formas")
+COLUMNAS_PREDICCIONES = ("cuadro", "clase_cuadro", "clase", "confianza", "latencia_ms")
+
+
+def crear_clasificador(modo):
+    """Clasificador del modo con los artefactos del pipeline."""
+    if modo == "embeddings":
+        from src.inferencia.paquete import cargar_paquete
+        return ClasificadorEmbeddings(cargar_paquete(DATASET))
+    if modo == "formas":
+        from src.extraccion_caracteristicas.momentos.busqueda import IndiceFormas
+        from scripts.buscar_formas import ruta_indice
+
+        indice = IndiceFormas.cargar(ruta_indice(DATASET))
+        if indice is None:
+            raise FileNotFoundError(f"No hay indice de formas en {ruta_indice(DATASET)}")
+        return ClasificadorFormas(indice)
+    raise ValueError(f"Modo desconocido: {modo}")
+
+
+def clasificar_video(fuente, modo="embeddings", tiempo_real=None, tam_cola=2, tam_lote=8, alfa=0.4,
+                     margen=0.1, max_cuadros=None, ruta_salida=None, mostrar_cada=30):
+    """
+    Clasifica una fuente de video e informa el FPS sostenido.
+
+    Parametros:
+        fuente: Archivo de video, carpeta de cuadros o indice de camara
+        modo: 'embeddings' o 'formas'
+        tiempo_real: Ver clasificar_flujo
+        tam_cola, tam_lote: Ver clasificar_flujo
+        alfa, margen: Ver SuavizadoTemporal
+        max_cuadros: Cuadros a procesar (None: toda la fuente)
+        ruta_salida: CSV opcional con la prediccion de cada cuadro
+        mostrar_cada: Imprime una prediccion cada tantos cuadros (0: ninguna)
+
+    Retorna:
+        dict: Reporte de clasificar_flujo
+    """
+    with recursos.usar("torch" if modo == "embeddings" else "secuencial") as reparto:
+        print(f"Recursos: {recursos.describir(reparto)}")
+        if modo == "embeddings":
+            recursos.configurar_torch()
+        clasificador = crear_clasificador(modo)
+        fuente = FuenteCuadros(fuente)
+        print(f"Fuente: {'en vivo' if fuente.en_vivo else 'archivo'} a {fuente.fps:.1f} FPS, "
+              f"clases: {clasificador.clases}")
+
+        def al_predecir(p):
+            if mostrar_cada and p["cuadro"] % mostrar_cada == 0:
+                print(f"  cuadro {p['cuadro']:6d}  {p['clase']:10s} ({p['confianza']:.2f})  "
+                      f"cuadro: {p['clase_cuadro']:10s} {p['latencia_ms']:7.1f} ms")
+
+        with inst.etapa("video/flujo"):
+            reporte = clasificar_flujo(
+                fuente, clasificador, tam_cola=tam_cola, tam_lote=tam_lote, tiempo_real=tiempo_real,
+                suavizado=SuavizadoTemporal(len(clasificador.clases), alfa, margen),
+                max_cuadros=max_cuadros, al_predecir=al_predecir,
+            )
+
+    if ruta_salida:
+        os.makedirs(os.path.dirname(ruta_salida) or ".", exist_ok=True)
+        with open(ruta_salida, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNAS_PREDICCIONES)
+            writer.writeheader()
+            writer.writerows(reporte["predicciones"])
+        print(f"Predicciones guardadas en: {ruta_salida}")
+
+    print(f"\nCuadros leidos: {reporte['leidos']}, procesados: {reporte['procesados']}, "
+          f"descartados: {reporte['descartados']}")
+    if reporte["procesados"]:
+        print(f"FPS sostenido: {reporte['fps_sostenido']:.1f} (fuente: {reporte['fps_fuente']:.1f}), "
+              f"latencia p50 {reporte['latencia_p50_ms']:.1f} ms, p90 {reporte['latencia_p90_ms']:.1f} ms")
+    return reporte
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clasificacion de piedra, papel o tijera sobre video")
+    parser.add_argument("fuente", help="Archivo de video, carpeta de cuadros o indice de camara")
+    parser.add_argument("--modo", choices=MODOS, default="embeddings")
+    parser.add_argument("--tiempo-real", action="store_true", default=None,
+                        help="Lee un archivo al ritmo de sus FPS y descarta cuadros bajo carga")
+    parser.add_argument("--cola", type=int, default=2, help="Cuadros en espera entre etapas")
+    parser.add_argument("--lote", type=int, default=8, help="Maximo de cuadros por inferencia")
+    parser.add_argument("--alfa", type=float, default=0.4, help="Peso del cuadro nuevo en el suavizado")
+    parser.add_argument("--margen", type=float, default=0.1, help="Ventaja minima para cambiar de etiqueta")
+    parser.add_argument("--max-cuadros", type=int, default=None)
+    parser.add_argument("--salida", default=None, help="CSV con la prediccion de cada cuadro")
+    args = parser.parse_args(argv)
+
+    clasificar_video(args.fuente, args.modo, args.tiempo_real, args.cola, args.lote, args.alfa,
+                     args.margen, args.max_cuadros, args.salida)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+from src.datos import muestreo
+from src.datos.duplicados import (
+    hashes_imagen, agrupar, clave_imagen, cargar_indice, guardar_indice,
+    RADIO_PHASH, RADIO_DHASH,
+)
+from src import instrumentacion as inst
+from src import recursos
+from scripts import generar_dataset_espermatozoides, generar_dataset_rps
+
+
+GENERADORES = {
+    "espermatozoides": generar_dataset_espermatozoides,
+    "piedra_papel_tijera": generar_dataset_rps,
+}
+
+
+def _hashes_archivo(ruta):
+    img = inst.leer_imagen(ruta)
+    if img is None:
+        return None
+    with inst.etapa("duplicados/hash", imagenes=1):
+        return [format(h, "016x") for h in hashes_imagen(img)]
+
+
+def detectar_duplicados_dataset(dataset, config_muestreo=None, radio_phash=RADIO_PHASH,
+                                radio_dhash=RADIO_DHASH, hilos=None):
+    """
+    Calcula los hashes perceptuales de todos los originales del dataset y
+    guarda el indice de duplicados en datos_originales/duplicados/<dataset>.json.
+
+    Los hashes se guardan por hash de contenido del manifiesto, asi que en
+    las corridas siguientes solo se decodifican los archivos nuevos o
+    modificados.
+
+    Retorna:
+        dict: Indice guardado (grupos, hashes y resumen) o None si no se
+              encontro el dataset
+    """
+    modulo = GENERADORES[dataset]
+    config = muestreo.cargar_config(dataset=modulo.NOMBRE_DATASET, **(config_muestreo or {}))
+    manifiesto = modulo.localizar_origen(config)
+    if not manifiesto:
+        return None
+    traduccion = getattr(modulo, "TRADUCCION", {})
+
+    previo = cargar_indice(dataset) or {}
+    hashes = previo.get("hashes", {})
+    pendientes = {}
+    for clave_origen, info in manifiesto["archivos"].items():
+        if info["hash"] not in hashes:
+            pendientes[info["hash"]] = os.path.join(manifiesto["ruta_base"], clave_origen)
+
+    print(f"{len(manifiesto['archivos'])} originales, {len(pendientes)} sin hash perceptual")
+    if pendientes:
+        with ThreadPoolExecutor(max_workers=hilos or recursos.actual("hilos")["hilos"]) as pool:
+            calculados = list(tqdm(pool.map(_hashes_archivo, pendientes.values()), total=len(pendientes)))
+        for contenido, valores in zip(pendientes, calculados):
+            if valores is not None:
+                hashes[contenido] = valores
+
+    # Orden estable: la canonica de cada grupo es la primera por clase y nombre
+    entradas = []
+    for clave_origen, info in sorted(manifiesto["archivos"].items()):
+        if info["hash"] not in hashes:
+            continue
+        clase, nombre = clave_origen.split("/", 1)
+        clase = traduccion.get(clase.lower(), clase)
+        dh, ph = (int(h, 16) for h in hashes[info["hash"]])
+        entradas.append((clave_imagen(clase, nombre), clase, info["hash"], dh, ph))
+
+    with inst.etapa("duplicados/agrupar", imagenes=len(entradas)):
+        grupos, resumen = agrupar(entradas, radio_phash, radio_dhash)
+
+    # Solo se conservan los hashes de archivos que siguen en el dataset
+    vigentes = {info["hash"] for info in manifiesto["archivos"].values()}
+    indice = {
+        "radio_phash": radio_phash,
+        "radio_dhash": radio_dhash,
+        "grupos": grupos,
+        "resumen": resumen,
+        "hashes": {h: v for h, v in hashes.items() if h in vigentes},
+    }
+    ruta = guardar_indice(dataset, indice)
+
+    print(f"Duplicados exactos: {resumen['exactos']}, casi duplicados: {resumen['cercanos']} "
+          f"({len(grupos)} de {len(entradas)} imagenes reutilizaran la copia canonica)")
+    if resumen["entre_clases"]:
+        print(f"{len(resumen['entre_clases'])} casi duplicados entre clases distintas "
+              f"(posibles errores de etiqueta), por ejemplo:")
+        for clave, otra, d in resumen["entre_clases"][:5]:
+            print(f"   {clave} ~ {otra} (distancia {d})")
+    print(f"Indice guardado en: {ruta}")
+    return indice
+
+
+def detectar_duplicados_todos(config_muestreo=None, **kwargs):
+    """Indice de duplicados de ambos datasets (etapa previa a los generadores)."""
+    for dataset in GENERADORES:
+        print(f"\n--- DUPLICADOS: {dataset.upper()} ---")
+        detectar_duplicados_dataset(dataset, config_muestreo, **kwargs)
+
+
+if __name__ == "__main__":
+    detectar_duplicados_todos()
@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from src.agrupamiento.conjuntos import cargar_conjunto, ruta_conjunto
+from src.agrupamiento.modelos import crear_modelo
+from src.agrupamiento.reduccion import ajustar_transformacion, aplicar_transformacion, huella_matriz
+from src.embeddings.cache_tensores import MEDIA_IMAGENET, STD_IMAGENET, REDIMENSION
+from src.inferencia.paquete import DIR_PAQUETES, escribir_paquete, leer_manifiesto
+from src import instrumentacion as inst
+
+
+# Preprocesamiento de los originales que produce las imagenes de las que
+# salen los embeddings (ver scripts/generar_dataset_*); 'salida' es el
+# elemento a usar si la funcion devuelve una tupla
+PREPROCESAMIENTO = {
+    "espermatozoides": {
+        "funcion": "src.preprocesamiento.espermatozoides.procesar_imagen_sperm",
+        "size": [256, 256],
+        "salida": 1,
+    },
+    "piedra_papel_tijera": {
+        "funcion": "src.preprocesamiento.rps.procesar_rps_grises",
+        "size": [256, 256],
+        "salida": None,
+    },
+}
+N_COMPONENTES = 50
+IMG_SIZE = 224  # el de scripts/generar_embeddings_*
+
+
+def estado_resnet50(ruta_pesos=None):
+    """
+    state_dict de la ResNet50 usada para los embeddings, sin la capa fc.
+
+    Parametros:
+        ruta_pesos: state_dict propio (p. ej. una red ajustada); None usa
+                    los pesos de ImageNet de torchvision, como
+                    scripts/generar_embeddings_*
+    """
+    import torch
+
+    if ruta_pesos is not None:
+        estado = torch.load(ruta_pesos, map_location="cpu", weights_only=True)
+    else:
+        from torchvision import models
+        estado = models.resnet50(weights=models.ResNet50_Weights.DEFAULT).state_dict()
+    return {k: v for k, v in estado.items() if not k.startswith("fc.")}
+
+
+def _huella_pesos(ruta_pesos):
+    if ruta_pesos is None:
+        from torchvision import models
+        return str(models.ResNet50_Weights.DEFAULT)
+    st = os.stat(ruta_pesos)
+    return f"{os.path.abspath(ruta_pesos)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def ajustar_arreglos(X, y, n_clases, n_componentes=N_COMPONENTES, semilla=0):
+    """
+    Estandarizacion + PCA, centroides por clase y MiniBatchKMeans con un
+    grupo por clase (ver src/agrupamiento/modelos.py).
+
+    Retorna:
+        dict: Arreglos del paquete (ver src/inferencia/paquete.py)
+    """
+    arreglos = ajustar_transformacion(X, n_componentes, semilla)
+    Z = aplicar_transformacion(X, arreglos)
+    arreglos["centroides_clase"] = np.stack([
+        Z[y == c].mean(axis=0) if np.any(y == c) else np.full(Z.shape[1], np.inf, dtype=np.float32)
+        for c in range(n_clases)
+    ]).astype(np.float32)
+
+    kmeans = crear_modelo("minibatch_kmeans", min(n_clases, len(Z)), semilla).fit(Z)
+    grupos = kmeans.labels_
+    arreglos["centroides_grupos"] = kmeans.cluster_centers_.astype(np.float32)
+    arreglos["clase_grupos"] = np.array([
+        np.bincount(y[grupos == g], minlength=n_clases).argmax() if np.any(grupos == g) else -1
+        for g in range(len(kmeans.cluster_centers_))
+    ], dtype=np.int64)
+    return arreglos
+
+
+def empaquetar_dataset(dataset, dir_paquetes=DIR_PAQUETES, ruta_pesos=None, incluir_modelo=True,
+                       n_componentes=N_COMPONENTES, img_size=IMG_SIZE, semilla=0):
+    """
+    Escribe el paquete de inferencia de un dataset a partir de sus
+    embeddings ResNet50. Si los embeddings, los pesos y la configuracion
+    no cambiaron desde la version vigente, no escribe una nueva.
+
+    Retorna:
+        str: Carpeta de la version vigente o None si no hay embeddings
+    """
+    datos = cargar_conjunto(dataset, "resnet50")
+    if datos is None:
+        print(f"No hay embeddings de {dataset} ({ruta_conjunto(dataset, 'resnet50')})")
+        return None
+    X, y, clases = datos
+
+    config = {
+        "preprocesamiento": PREPROCESAMIENTO[dataset],
+        "entrada": {"img_size": img_size, "redimension": REDIMENSION,
+                    "media": list(MEDIA_IMAGENET), "std": list(STD_IMAGENET)},
+        "n_componentes": n_componentes,
+        "semilla": semilla,
+    }
+    h = hashlib.sha1()
+    h.update(huella_matriz(X).encode("utf-8"))
+    h.update(huella_matriz(y).encode("utf-8"))
+    h.update(json.dumps([clases, config], sort_keys=True).encode("utf-8"))
+    if incluir_modelo:
+        h.update(_huella_pesos(ruta_pesos).encode("utf-8"))
+    huella = h.hexdigest()
+
+    dir_dataset = os.path.join(dir_paquetes, dataset)
+    vigente = leer_manifiesto(dir_dataset)
+    if vigente is not None and vigente.get("huella") == huella:
+        print(f"Paquete sin cambios: {vigente['version']}")
+        return os.path.join(dir_dataset, vigente["version"])
+
+    with inst.etapa("paquete/ajustar", imagenes=len(X)):
+        arreglos = ajustar_arreglos(X, y, len(clases), n_componentes, semilla)
+    estado = None
+    if incluir_modelo:
+        with inst.etapa("paquete/modelo"):
+            estado = estado_resnet50(ruta_pesos)
+
+    manifiesto = {
+        "dataset": dataset,
+        "huella": huella,
+        "clases": clases,
+        "n_muestras": len(X),
+        "dimensiones": X.shape[1],
+        "componentes": arreglos["componentes"].shape[0],
+        **config,
+    }
+    with inst.etapa("paquete/escribir"):
+        ruta = escribir_paquete(dir_dataset, arreglos, estado, manifiesto)
+    print(f"Paquete guardado en: {ruta}")
+    return ruta
+
+
+def empaquetar_todos(**kwargs):
+    """Paquete de inferencia de ambos datasets (ultima etapa del pipeline)."""
+    for dataset in PREPROCESAMIENTO:
+        print(f"\n--- PAQUETE DE INFERENCIA: {dataset.upper()} ---")
+        empaquetar_dataset(dataset, **kwargs)
+
+
+if __name__ == "__main__":
+    empaquetar_todos()
@@ -3,12 +3,33 @@ import csv
 import cv2
 import numpy as np
 from tqdm import tqdm
-import pandas as pd
 from src.extraccion_caracteristicas.momentos.momentos import calcular_momentos
 from src.extraccion_caracteristicas.momentos.hu import calcular_hu_momentos
 from src.extraccion_caracteristicas.momentos.zernike import calcular_zernike_momentos
-from src.extraccion_caracteristicas.SIFT.SIFT import crear_sift, extraer_descriptores_imagen, resumir_descriptores
-from src.extraccion_caracteristicas.HOG.HOG import extraer_hog_imagen
+from src.extraccion_caracteristicas.momentos.contorno import calcular_descriptores_contorno
+from src.extraccion_caracteristicas.momentos.calidad import evaluar_mascara
+from src.extraccion_caracteristicas.momentos.busqueda import IndiceFormas, descriptor_forma, DIR_INDICE
+from src.extraccion_caracteristicas.SIFT.SIFT import crear_sift, calcular_puntos_descriptores, resumir_descriptores
+from src.extraccion_caracteristicas.SIFT.almacen import EscritorDescriptores
+from src.extraccion_caracteristicas.HOG.HOG import calcular_hog
+from src.datos.mascaras_empaquetadas import MascarasEmpaquetadas, es_archivo_mascaras, EXTENSION
+from src.datos.shards import ArchivoShards, es_archivo_shards, SUFIJO_SHARDS
+from src.datos.duplicados import cargar_grupos, clave_imagen, Reutilizacion
+from src.datos import muestreo
+from src.datos.escritura import leer_imagen_guardada, FORMATOS
+from src import instrumentacion as inst
+
+
+# 'raster': cv2.moments sobre la mascara; 'contorno': momentos por Green
+# desde el borde (mismos valores) mas descriptores de forma en forma.csv
+MODO_MOMENTOS = "raster"
+# Control de calidad de cada mascara (ver momentos/calidad.py) antes de
+# los descriptores: 'marcar' las describe igual y anota los motivos en
+# calidad.csv (los CSV conservan todas las filas), 'omitir' no describe
+# las que no lo pasan y None lo desactiva. 'omitir' saca filas de los
+# CSV y de la fusion: en espermatozoides puede dejar una clase entera
+# (Non-Sperm) sin muestras, por eso no es el valor por defecto.
+CONTROL_CALIDAD = "marcar"
 
 
 def escalar_logaritmicamente(datos):
@@ -37,7 +58,272 @@ def escalar_logaritmicamente(datos):
     return datos_escalados
 
 
-def extraer_caracteristicas_dataset(ruta_imagenes_bin, ruta_salida_csv, nombre_dataset):
+def calcular_caracteristicas_momentos(img_bin, clase, archivo=None):
+    """
+    Calcula momentos regulares, Hu y Zernike (en escala logaritmica)
+    de una mascara binaria ya cargada en memoria.
+    
+    Parametros:
+        img_bin: Imagen binaria en formato numpy array
+        clase: Nombre de la clase que se agrega a cada fila
+        archivo: Nombre de la imagen; si se indica se agrega a cada fila
+                 para poder alinear las familias (ver fusion.py)
+        
+    Retorna:
+        tuple: (momentos, hu, zernike); zernike es None si fallo su calculo
+    """
+    with inst.etapa("extraer/momentos", imagenes=1):
+        momentos_reg = calcular_momentos(img_bin)
+        momentos_reg = escalar_logaritmicamente(momentos_reg)
+        momentos_reg['clase'] = clase
+        if archivo is not None:
+            momentos_reg['archivo'] = archivo
+    
+    with inst.etapa("extraer/hu", imagenes=1):
+        hu = calcular_hu_momentos(img_bin)
+        hu = escalar_logaritmicamente(hu)
+        hu['clase'] = clase
+        if archivo is not None:
+            hu['archivo'] = archivo
+    
+    with inst.etapa("extraer/zernike", imagenes=1):
+        zernike = calcular_zernike_momentos(img_bin)
+    if zernike:
+        zernike = escalar_logaritmicamente(zernike)
+        zernike['clase'] = clase
+        if archivo is not None:
+            zernike['archivo'] = archivo
+    
+    return momentos_reg, hu, zernike
+
+
+def calcular_caracteristicas_contorno(img_bin, clase, archivo=None):
+    """
+    Igual que calcular_caracteristicas_momentos, pero momentos y Hu salen
+    del contorno (ver momentos/contorno.py) y se agregan los descriptores
+    de forma: area/perimetro, curvatura y Fourier.
+    
+    Retorna:
+        tuple: (momentos, hu, zernike, forma); zernike es None si fallo
+    """
+    with inst.etapa("extraer/contorno", imagenes=1):
+        momentos_reg, hu, forma = calcular_descriptores_contorno(img_bin)
+        momentos_reg = escalar_logaritmicamente(momentos_reg)
+        hu = escalar_logaritmicamente(hu)
+    
+    with inst.etapa("extraer/zernike", imagenes=1):
+        zernike = calcular_zernike_momentos(img_bin)
+    if zernike:
+        zernike = escalar_logaritmicamente(zernike)
+    
+    filas = [momentos_reg, hu, forma] + ([zernike] if zernike else [])
+    for fila in filas:
+        fila['clase'] = clase
+        if archivo is not None:
+            fila['archivo'] = archivo
+    return momentos_reg, hu, zernike, forma
+
+
+def calcular_filas_mascara(img_bin, clase, archivo=None, modo=MODO_MOMENTOS,
+                           control_calidad=CONTROL_CALIDAD):
+    """
+    Control de calidad y descriptores de una mascara.
+    
+    Parametros:
+        img_bin: Mascara binaria
+        clase, archivo: Se agregan a cada fila
+        modo: 'raster' o 'contorno'
+        control_calidad: 'omitir', 'marcar' o None (ver CONTROL_CALIDAD)
+        
+    Retorna:
+        tuple: (calidad, momentos, hu, zernike, forma); calidad es None sin
+               control, momentos/hu/zernike/forma son None si la mascara
+               se omitio, zernike si fallo y forma fuera del modo contorno
+    """
+    if control_calidad not in (None, "omitir", "marcar"):
+        raise ValueError(f"Control de calidad desconocido: {control_calidad}")
+    calidad = None
+    if control_calidad:
+        with inst.etapa("extraer/calidad", imagenes=1):
+            calidad = evaluar_mascara(img_bin)
+        calidad['clase'] = clase
+        if archivo is not None:
+            calidad['archivo'] = archivo
+        if control_calidad == "omitir" and not calidad['valida']:
+            return calidad, None, None, None, None
+    
+    if modo == "contorno":
+        momentos_reg, hu, zernike, forma = calcular_caracteristicas_contorno(img_bin, clase, archivo)
+    else:
+        momentos_reg, hu, zernike = calcular_caracteristicas_momentos(img_bin, clase, archivo)
+        forma = None
+    if calidad is not None and not zernike:
+        calidad['motivos'] = ";".join(filter(None, (calidad['motivos'], "zernike_fallido")))
+    return calidad, momentos_reg, hu, zernike, forma
+
+
+def mascara_valida(calidad):
+    """
+    Si una mascara entra al indice de formas: las que no pasan el control
+    de calidad quedan fuera aunque se describan (como en
+    scripts/buscar_formas.construir_indice).
+    """
+    return calidad is None or bool(calidad['valida'])
+
+
+def resumir_calidad(datos_calidad):
+    """Imprime cuantas mascaras no pasaron el control y por que."""
+    rechazadas = [fila for fila in datos_calidad if not fila['valida']]
+    if not rechazadas:
+        return
+    conteo = {}
+    for fila in rechazadas:
+        for motivo in fila['motivos'].split(";"):
+            if motivo:
+                conteo[motivo] = conteo.get(motivo, 0) + 1
+    detalle = ", ".join(f"{m}: {n}" for m, n in sorted(conteo.items(), key=lambda x: -x[1]))
+    print(f"Control de calidad: {len(rechazadas)} de {len(datos_calidad)} mascaras no lo pasan ({detalle})")
+
+
+def actualizar_indice_formas(ruta_salida_csv, metodo, formas):
+    """
+    Actualiza el indice de busqueda de formas que esta junto a los CSV
+    (ver momentos/busqueda.py) con las mascaras descritas en esta pasada:
+    agrega las nuevas, reemplaza las que cambiaron y quita las que ya no
+    estan. Las copias duplicadas no se indexan (quedan en su canonica).
+    
+    Parametros:
+        ruta_salida_csv: Carpeta de los CSV de momentos
+        metodo: Binarizacion de las consultas por imagen ('espermatozoides' o 'rps')
+        formas: {clave: (clase, descriptor)}
+    """
+    carpeta = os.path.join(ruta_salida_csv, DIR_INDICE)
+    indice = IndiceFormas.cargar(carpeta) or IndiceFormas(metodo)
+    cambios = 0
+    if formas:
+        claves = list(formas)
+        cambios = indice.agregar(claves, [formas[c][0] for c in claves],
+                                 np.stack([formas[c][1] for c in claves]))
+    quitadas = indice.quitar([c for c in list(indice.claves) if c in indice and c not in formas])
+    indice.guardar(carpeta)
+    print(f"Indice de formas: {len(indice)} mascaras ({cambios} nuevas o modificadas, {quitadas} quitadas)")
+
+
+def guardar_filas_csv(filas, ruta_csv):
+    """Guarda una lista de diccionarios como CSV (si no esta vacia)"""
+    if not filas:
+        return
+    with open(ruta_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=filas[0].keys())
+        writer.writeheader()
+        writer.writerows(filas)
+    print(f"{len(filas)} filas guardadas en {os.path.basename(ruta_csv)}")
+
+
+def iterar_imagenes(ruta_imagenes, omitir=None):
+    """
+    Recorre las imagenes en escala de grises de un dataset procesado.
+    
+    Acepta la carpeta con estructura clase/*.png|bmp|npy o un directorio de
+    shards (ver src/datos/shards.py), que se lee shard por shard.
+    
+    Parametros:
+        ruta_imagenes: Carpeta por clases o directorio de shards
+        omitir: Funcion (clase, archivo) -> bool; en carpetas, las imagenes
+                para las que devuelve True no se decodifican y se entregan
+                como None (p. ej. duplicados cuyo resultado ya se tiene)
+        
+    Retorna:
+        generator: Tuplas (clase, archivo, imagen)
+    """
+    if es_archivo_shards(ruta_imagenes):
+        archivo = ArchivoShards(ruta_imagenes)
+        print(f"Clases encontradas: {archivo.clases}")
+        print(f"\nProcesando {len(archivo)} imagenes en {archivo.num_shards} shards")
+        for idx, clase, nombre, img in tqdm(archivo.iterar(cv2.IMREAD_GRAYSCALE), total=len(archivo)):
+            if img is None:
+                continue
+            inst.registrar("decodificar", llamadas=0, bytes_leidos=archivo.muestras[idx]["largo"])
+            yield clase, nombre, img
+        return
+    
+    clases = [d for d in os.listdir(ruta_imagenes) 
+              if os.path.isdir(os.path.join(ruta_imagenes, d))]
+    print(f"Clases encontradas: {clases}")
+    
+    for clase in clases:
+        ruta_clase = os.path.join(ruta_imagenes, clase)
+        archivos = [f for f in os.listdir(ruta_clase) 
+                   if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', FORMATOS["raw"]))]
+        
+        print(f"\nProcesando clase: {clase} ({len(archivos)} imagenes)")
+        
+        for archivo in tqdm(archivos):
+            if omitir is not None and omitir(clase, archivo):
+                yield clase, archivo, None
+                continue
+            ruta_img = os.path.join(ruta_clase, archivo)
+            img = leer_imagen_guardada(ruta_img, cv2.IMREAD_GRAYSCALE)
+            
+            if img is None:
+                continue
+            
+            yield clase, archivo, img
+
+
+def iterar_mascaras(ruta_imagenes_bin, omitir=None):
+    """
+    Recorre las mascaras binarizadas de un dataset.
+    
+    Ademas de los formatos de iterar_imagenes acepta un archivo de
+    mascaras empaquetadas (ver src/datos/mascaras_empaquetadas.py); en
+    ese caso no se abre ningun archivo de imagen individual.
+    
+    Parametros:
+        ruta_imagenes_bin: Carpeta de mascaras, shards o archivo .mascaras
+        omitir: Ver iterar_imagenes
+        
+    Retorna:
+        generator: Tuplas (clase, archivo, img_bin)
+    """
+    if es_archivo_mascaras(ruta_imagenes_bin):
+        mascaras = MascarasEmpaquetadas(ruta_imagenes_bin)
+        print(f"Clases encontradas: {sorted(set(mascaras.clases))}")
+        print(f"\nProcesando {len(mascaras)} mascaras empaquetadas")
+        for img_bin, clase, archivo in tqdm(mascaras.iterar(), total=len(mascaras)):
+            yield clase, archivo, img_bin
+        return
+    
+    yield from iterar_imagenes(ruta_imagenes_bin, omitir)
+
+
+def _copiar_fila(fila, clase, archivo):
+    # Fila de otra copia del mismo grupo de duplicados con la clave propia
+    if fila is None:
+        return None
+    return {**fila, 'clase': clase, 'archivo': archivo}
+
+
+def _reutilizacion(duplicados):
+    """
+    Reutilizacion de resultados entre duplicados y la funcion omitir
+    para iterar_imagenes.
+    """
+    reutilizacion = Reutilizacion(duplicados or {})
+    return reutilizacion, lambda clase, archivo: reutilizacion.disponible(clave_imagen(clase, archivo))
+
+
+def _tiene_clases(ruta):
+    """Indica si la ruta es un formato soportado o una carpeta con subcarpetas."""
+    if es_archivo_mascaras(ruta) or es_archivo_shards(ruta):
+        return True
+    if not os.path.isdir(ruta):
+        return False
+    return any(os.path.isdir(os.path.join(ruta, d)) for d in os.listdir(ruta))
+
+
+def extraer_caracteristicas_dataset(ruta_imagenes_bin, ruta_salida_csv, nombre_dataset, modo=MODO_MOMENTOS,
+                                    duplicados=None, control_calidad=CONTROL_CALIDAD, indice_formas=None):
     """
     Extrae momentos, Hu y Zernike de imagenes binarizadas.
     
@@ -47,198 +333,261 @@ def extraer_caracteristicas_dataset(ruta_imagenes_bin, ruta_salida_csv, nombre_d
     
     Parametros:
         ruta_imagenes_bin: Ruta donde estan las imagenes binarizadas
+                           (carpeta por clases, shards o archivo .mascaras)
         ruta_salida_csv: Ruta donde se guardaran los archivos CSV
         nombre_dataset: Nombre del dataset para mensajes
+        modo: 'raster' o 'contorno' (agrega forma.csv)
+        duplicados: {clave: canonica} de src/datos/duplicados.py; las
+                    copias reutilizan las filas de la primera procesada
+        control_calidad: 'omitir', 'marcar' o None (ver CONTROL_CALIDAD)
+        indice_formas: Binarizacion ('espermatozoides' o 'rps') del indice
+                       de formas que se actualiza con estas mascaras
+                       (ver actualizar_indice_formas); None no lo toca
     """
+    if modo not in ("raster", "contorno"):
+        raise ValueError(f"Modo de momentos desconocido: {modo}")
     os.makedirs(ruta_salida_csv, exist_ok=True)
     
-    clases = [d for d in os.listdir(ruta_imagenes_bin) 
-              if os.path.isdir(os.path.join(ruta_imagenes_bin, d))]
-    
-    if not clases:
+    if not _tiene_clases(ruta_imagenes_bin):
         print(f"No se encontraron clases en {ruta_imagenes_bin}")
         return
     
     print(f"\nExtrayendo caracteristicas de {nombre_dataset}...")
-    print(f"Clases encontradas: {clases}")
     
     datos_momentos = []
     datos_hu = []
     datos_zernike = []
+    datos_forma = []
+    datos_calidad = []
+    formas = {}
+    reutilizacion, omitir = _reutilizacion(duplicados)
     
-    for clase in clases:
-        ruta_clase = os.path.join(ruta_imagenes_bin, clase)
-        archivos = [f for f in os.listdir(ruta_clase) 
-                   if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
-        
-        print(f"\nProcesando clase: {clase} ({len(archivos)} imagenes)")
-        
-        for archivo in tqdm(archivos):
-            ruta_img = os.path.join(ruta_clase, archivo)
-            img_bin = cv2.imread(ruta_img, cv2.IMREAD_GRAYSCALE)
-            
-            if img_bin is None:
-                continue
-            
-            momentos_reg = calcular_momentos(img_bin)
-            momentos_reg = escalar_logaritmicamente(momentos_reg)
-            momentos_reg['clase'] = clase
-            datos_momentos.append(momentos_reg)
-            
-            hu = calcular_hu_momentos(img_bin)
-            hu = escalar_logaritmicamente(hu)
-            hu['clase'] = clase
-            datos_hu.append(hu)
-            
-            zernike = calcular_zernike_momentos(img_bin)
-            if zernike:
-                zernike = escalar_logaritmicamente(zernike)
-                zernike['clase'] = clase
-                datos_zernike.append(zernike)
+    for clase, archivo, img_bin in iterar_mascaras(ruta_imagenes_bin, omitir):
+        clave = clave_imagen(clase, archivo)
+        previo = reutilizacion.obtener(clave)
+        if previo is not None:
+            filas = tuple(_copiar_fila(f, clase, archivo) for f in previo)
+        else:
+            filas = calcular_filas_mascara(img_bin, clase, archivo, modo, control_calidad)
+            reutilizacion.guardar(clave, filas)
+            if indice_formas and filas[3] and mascara_valida(filas[0]):
+                formas[clave] = (clase, descriptor_forma(img_bin, filas[3]))
+        calidad, momentos_reg, hu, zernike, forma = filas
+        if calidad is not None:
+            datos_calidad.append(calidad)
+        if momentos_reg is None:
+            continue
+        if forma is not None:
+            datos_forma.append(forma)
+        datos_momentos.append(momentos_reg)
+        datos_hu.append(hu)
+        if zernike:
+            datos_zernike.append(zernike)
     
     print("\nGuardando archivos CSV...")
     
-    if datos_momentos:
-        with open(os.path.join(ruta_salida_csv, 'momentos.csv'), 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=datos_momentos[0].keys())
-            writer.writeheader()
-            writer.writerows(datos_momentos)
-        print(f"{len(datos_momentos)} filas guardadas en momentos.csv")
-    
-    if datos_hu:
-        with open(os.path.join(ruta_salida_csv, 'hu_momentos.csv'), 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=datos_hu[0].keys())
-            writer.writeheader()
-            writer.writerows(datos_hu)
-        print(f"{len(datos_hu)} filas guardadas en hu_momentos.csv")
-    
-    if datos_zernike:
-        with open(os.path.join(ruta_salida_csv, 'zernike.csv'), 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=datos_zernike[0].keys())
-            writer.writeheader()
-            writer.writerows(datos_zernike)
-        print(f"{len(datos_zernike)} filas guardadas en zernike.csv")
+    guardar_filas_csv(datos_momentos, os.path.join(ruta_salida_csv, 'momentos.csv'))
+    guardar_filas_csv(datos_hu, os.path.join(ruta_salida_csv, 'hu_momentos.csv'))
+    guardar_filas_csv(datos_zernike, os.path.join(ruta_salida_csv, 'zernike.csv'))
+    guardar_filas_csv(datos_forma, os.path.join(ruta_salida_csv, 'forma.csv'))
+    guardar_filas_csv(datos_calidad, os.path.join(ruta_salida_csv, 'calidad.csv'))
+    resumir_calidad(datos_calidad)
+    if reutilizacion.reutilizadas:
+        print(f"Duplicados reutilizados: {reutilizacion.reutilizadas}")
+    if indice_formas:
+        actualizar_indice_formas(ruta_salida_csv, indice_formas, formas)
     
     print(f"\nExtraccion completada para {nombre_dataset}")
     print(f"Archivos guardados en: {os.path.abspath(ruta_salida_csv)}")
 
 
-def guardar_dataset_sift_csv(ruta_imagenes, ruta_csv, nombre_dataset):
-    """Extrae descriptores SIFT de las imagenes y los guarda en CSV"""
+def ruta_almacen_sift(ruta_csv):
+    """Carpeta del almacen de descriptores junto al CSV de SIFT."""
+    return os.path.join(os.path.dirname(ruta_csv), "descriptores")
+
+
+def guardar_dataset_sift_csv(ruta_imagenes, ruta_csv, nombre_dataset, duplicados=None):
+    """
+    Extrae descriptores SIFT de las imagenes y guarda el vector medio en
+    CSV y todos los descriptores y puntos clave en el almacen (ver
+    src/extraccion_caracteristicas/SIFT/almacen.py), de donde se pueden
+    calcular otras codificaciones sin volver a detectar.
+    """
+    if not _tiene_clases(ruta_imagenes):
+        print(f"No se encontraron clases en {ruta_imagenes}")
+        return
     os.makedirs(os.path.dirname(ruta_csv), exist_ok=True)
     
     sift = crear_sift()
     datos = []
-    clases = [d for d in os.listdir(ruta_imagenes) if os.path.isdir(os.path.join(ruta_imagenes, d))]
+    almacen = EscritorDescriptores(ruta_almacen_sift(ruta_csv))
+    reutilizacion, omitir = _reutilizacion(duplicados)
     
     print(f"\nExtrayendo descriptores SIFT de {nombre_dataset}...")
     
-    for clase in clases:
-        ruta_clase = os.path.join(ruta_imagenes, clase)
-        archivos = [f for f in os.listdir(ruta_clase) 
-                    if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
-        
-        print(f"Procesando clase: {clase} ({len(archivos)} imagenes)")
-        
-        for archivo in tqdm(archivos):
-            ruta_img = os.path.join(ruta_clase, archivo)
-            
-            descriptores = extraer_descriptores_imagen(ruta_img, sift)
-            if descriptores is not None:
-                resumen = resumir_descriptores(descriptores)
-                fila = {f'sift_{i}': val for i, val in enumerate(resumen)}
-                fila['clase'] = clase
-                fila['archivo'] = archivo
-                datos.append(fila)
+    for clase, archivo, imagen in iterar_imagenes(ruta_imagenes, omitir):
+        clave = clave_imagen(clase, archivo)
+        previo = reutilizacion.obtener(clave)
+        if previo is not None:
+            puntos, descriptores = previo
+        else:
+            with inst.etapa("extraer/sift", imagenes=1):
+                puntos, descriptores = calcular_puntos_descriptores(imagen, sift)
+            reutilizacion.guardar(clave, (puntos, descriptores))
+        with inst.etapa("escribir/descriptores_sift"):
+            almacen.agregar(descriptores, puntos, clase, archivo)
+        if descriptores is not None:
+            resumen = resumir_descriptores(descriptores)
+            fila = {f'sift_{i}': val for i, val in enumerate(resumen)}
+            fila['clase'] = clase
+            fila['archivo'] = archivo
+            datos.append(fila)
     
+    print(f"\nAlmacen de descriptores: {almacen.cerrar()}")
+    if reutilizacion.reutilizadas:
+        print(f"Duplicados reutilizados: {reutilizacion.reutilizadas}")
     if datos:
+        import pandas as pd
         df = pd.DataFrame(datos)
         df.to_csv(ruta_csv, index=False, encoding='utf-8')
         print(f"\n{len(datos)} filas guardadas en {ruta_csv}")
 
 
-def guardar_dataset_hog_csv(ruta_imagenes, ruta_csv, nombre_dataset):
+def guardar_dataset_hog_csv(ruta_imagenes, ruta_csv, nombre_dataset, duplicados=None):
     """Extrae descriptores HOG de las imagenes y los guarda en CSV"""
+    if not _tiene_clases(ruta_imagenes):
+        print(f"No se encontraron clases en {ruta_imagenes}")
+        return
     os.makedirs(os.path.dirname(ruta_csv), exist_ok=True)
     
     datos = []
-    clases = [d for d in os.listdir(ruta_imagenes) if os.path.isdir(os.path.join(ruta_imagenes, d))]
+    reutilizacion, omitir = _reutilizacion(duplicados)
     
     print(f"\nExtrayendo descriptores HOG de {nombre_dataset}...")
     
-    for clase in clases:
-        ruta_clase = os.path.join(ruta_imagenes, clase)
-        archivos = [f for f in os.listdir(ruta_clase) 
-                    if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
-        
-        print(f"Procesando clase: {clase} ({len(archivos)} imagenes)")
-        
-        for archivo in tqdm(archivos):
-            ruta_img = os.path.join(ruta_clase, archivo)
-            
-            hog_desc = extraer_hog_imagen(ruta_img)
-            if hog_desc is not None:
-                fila = {f'hog_{i}': val for i, val in enumerate(hog_desc)}
-                fila['clase'] = clase
-                fila['archivo'] = archivo
-                datos.append(fila)
+    for clase, archivo, imagen in iterar_imagenes(ruta_imagenes, omitir):
+        clave = clave_imagen(clase, archivo)
+        hog_desc = reutilizacion.obtener(clave)
+        if hog_desc is None:
+            with inst.etapa("extraer/hog", imagenes=1):
+                hog_desc = calcular_hog(imagen)
+            reutilizacion.guardar(clave, hog_desc)
+        fila = {f'hog_{i}': val for i, val in enumerate(hog_desc)}
+        fila['clase'] = clase
+        fila['archivo'] = archivo
+        datos.append(fila)
     
+    if reutilizacion.reutilizadas:
+        print(f"Duplicados reutilizados: {reutilizacion.reutilizadas}")
     if datos:
+        import pandas as pd
         df = pd.DataFrame(datos)
         df.to_csv(ruta_csv, index=False, encoding='utf-8')
         print(f"\n{len(datos)} filas guardadas en {ruta_csv}")
 
 
-def extraer_todas_caracteristicas():
+def resolver_ruta(ruta_carpeta):
     """
-    Funcion principal que extrae caracteristicas de ambos datasets.
-    
-    Usa las imagenes binarizadas generadas por generar_dataset_espermatozoides
-    y generar_dataset_rps, extrae momentos, Hu y Zernike aplicando
-    escala logaritmica y guarda los resultados en CSV.
+    Prefiere los formatos compactos si los generadores los crearon:
+    primero el archivo de mascaras empaquetadas, luego los shards y por
+    ultimo la carpeta con un archivo por imagen.
+    """
+    for candidata in (ruta_carpeta + EXTENSION, ruta_carpeta + SUFIJO_SHARDS):
+        if es_archivo_mascaras(candidata) or es_archivo_shards(candidata):
+            return candidata
+    return ruta_carpeta
+
+
+def ruta_datos(dataset, carpeta, config_muestreo=None):
     """
+    Entrada de la extraccion: la carpeta del dataset procesado bajo la
+    ruta_salida de config_muestreo (la de los generadores), en su formato
+    compacto si existe.
+    """
+    return resolver_ruta(muestreo.ruta_procesados(dataset, carpeta, config_muestreo))
+
+
+def extraer_momentos_todos(modo=MODO_MOMENTOS, config_muestreo=None):
+    """Momentos, Hu y Zernike de las mascaras binarizadas de ambos datasets."""
     print("\n--- EXTRAYENDO CARACTERISTICAS DE IMAGENES BINARIZADAS ---")
     
-    # Momentos de imagenes binarizadas
     extraer_caracteristicas_dataset(
-        ruta_imagenes_bin="datos_procesados/espermatozoides_binarizados",
+        ruta_imagenes_bin=ruta_datos("espermatozoides", "espermatozoides_binarizados", config_muestreo),
         ruta_salida_csv="caracteristicas_extraidas/momentos/espermatozoides",
-        nombre_dataset="espermatozoides"
+        nombre_dataset="espermatozoides",
+        modo=modo,
+        duplicados=cargar_grupos("espermatozoides"),
+        indice_formas="espermatozoides"
     )
     
     extraer_caracteristicas_dataset(
-        ruta_imagenes_bin="datos_procesados/piedra_papel_tijera_binarizados",
+        ruta_imagenes_bin=ruta_datos("piedra_papel_tijera", "piedra_papel_tijera_binarizados", config_muestreo),
         ruta_salida_csv="caracteristicas_extraidas/momentos/piedra_papel_tijera",
-        nombre_dataset="piedra-papel-tijera"
+        nombre_dataset="piedra-papel-tijera",
+        modo=modo,
+        duplicados=cargar_grupos("piedra_papel_tijera"),
+        indice_formas="rps"
     )
-    
-    # SIFT y HOG de imagenes en escala de grises
-    print("\n--- EXTRAYENDO SIFT Y HOG ---")
-    
+
+
+def extraer_sift_todos(config_muestreo=None):
+    """Descriptores SIFT de las imagenes en escala de grises de ambos datasets."""
     guardar_dataset_sift_csv(
-        ruta_imagenes="datos_procesados/espermatozoides",
+        ruta_imagenes=ruta_datos("espermatozoides", "espermatozoides", config_muestreo),
         ruta_csv="caracteristicas_extraidas/sift/espermatozoides/sift.csv",
-        nombre_dataset="espermatozoides"
+        nombre_dataset="espermatozoides",
+        duplicados=cargar_grupos("espermatozoides")
     )
     
     guardar_dataset_sift_csv(
-        ruta_imagenes="datos_procesados/piedra_papel_tijera",
+        ruta_imagenes=ruta_datos("piedra_papel_tijera", "piedra_papel_tijera", config_muestreo),
         ruta_csv="caracteristicas_extraidas/sift/piedra_papel_tijera/sift.csv",
-        nombre_dataset="piedra-papel-tijera"
+        nombre_dataset="piedra-papel-tijera",
+        duplicados=cargar_grupos("piedra_papel_tijera")
     )
-    
+
+
+def extraer_hog_todos(config_muestreo=None):
+    """Descriptores HOG de las imagenes en escala de grises de ambos datasets."""
     guardar_dataset_hog_csv(
-        ruta_imagenes="datos_procesados/espermatozoides",
+        ruta_imagenes=ruta_datos("espermatozoides", "espermatozoides", config_muestreo),
         ruta_csv="caracteristicas_extraidas/hog/espermatozoides/hog.csv",
-        nombre_dataset="espermatozoides"
+        nombre_dataset="espermatozoides",
+        duplicados=cargar_grupos("espermatozoides")
     )
     
     guardar_dataset_hog_csv(
-        ruta_imagenes="datos_procesados/piedra_papel_tijera",
+        ruta_imagenes=ruta_datos("piedra_papel_tijera", "piedra_papel_tijera", config_muestreo),
         ruta_csv="caracteristicas_extraidas/hog/piedra_papel_tijera/hog.csv",
-        nombre_dataset="piedra-papel-tijera"
+        nombre_dataset="piedra-papel-tijera",
+        duplicados=cargar_grupos("piedra_papel_tijera")
     )
 
 
+def extraer_contorno_todos(config_muestreo=None):
+    """Como extraer_momentos_todos, con momentos por contorno y forma.csv."""
+    extraer_momentos_todos(modo="contorno", config_muestreo=config_muestreo)
+
+
+def extraer_todas_caracteristicas(config_muestreo=None):
+    """
+    Funcion principal que extrae caracteristicas de ambos datasets.
+    
+    Usa las imagenes binarizadas generadas por generar_dataset_espermatozoides
+    y generar_dataset_rps, extrae momentos, Hu y Zernike aplicando
+    escala logaritmica y guarda los resultados en CSV. Despues extrae
+    SIFT y HOG de las imagenes en escala de grises.
+    
+    Parametros:
+        config_muestreo: Opciones de muestreo de los generadores; su
+                         ruta_salida es la carpeta de entrada
+    """
+    extraer_momentos_todos(config_muestreo=config_muestreo)
+    
+    print("\n--- EXTRAYENDO SIFT Y HOG ---")
+    extraer_sift_todos(config_muestreo)
+    extraer_hog_todos(config_muestreo)
+
+
 if __name__ == "__main__":
     extraer_todas_caracteristicas()
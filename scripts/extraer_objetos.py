@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+from tqdm import tqdm
+
+from src.extraccion_caracteristicas.momentos.binarizacion import segmentar_objetos
+from src.extraccion_caracteristicas.momentos.objetos import (
+    caracteristicas_objetos, COLUMNAS_MOMENTOS, COLUMNAS_HU,
+)
+from src.preprocesamiento.teselas import (
+    abrir_imagen_grande, procesar_por_teselas, UMBRAL_TESELAS, TAM_TESELA, SOLAPE,
+)
+from scripts.extraer_caracteristicas import guardar_filas_csv
+from src import instrumentacion as inst
+
+
+# Cuadros completos (varias celulas/manos por imagen), planos o por clase
+RUTA_CUADROS = "cuadros"
+RUTA_SALIDA = "caracteristicas_extraidas/objetos"
+EXTENSIONES = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+def escalar_logaritmicamente_arreglo(X):
+    """Version vectorizada de escalar_logaritmicamente: sign(x) * log10(|x| + 1)."""
+    return np.sign(X) * np.log10(np.abs(X) + 1)
+
+
+def iterar_cuadros(ruta_cuadros):
+    """
+    Recorre los cuadros de una carpeta. Si tiene subcarpetas se toman
+    como clases; si no, la clase queda vacia.
+
+    Retorna:
+        generator: Tuplas (clase, archivo, ruta)
+    """
+    subcarpetas = sorted(d for d in os.listdir(ruta_cuadros)
+                         if os.path.isdir(os.path.join(ruta_cuadros, d)))
+    for clase in subcarpetas or [""]:
+        carpeta = os.path.join(ruta_cuadros, clase)
+        for archivo in sorted(os.listdir(carpeta)):
+            if archivo.lower().endswith(EXTENSIONES):
+                yield clase, archivo, os.path.join(carpeta, archivo)
+
+
+def objetos_cuadro(ruta, metodo, area_min=200, area_max=None, descartar_borde=False,
+                   tam_tesela=None, solape=SOLAPE, hilos=None):
+    """
+    Objetos de un cuadro con sus caracteristicas.
+
+    Los cuadros con algun lado mayor que UMBRAL_TESELAS (o todos, si se
+    indica tam_tesela) se procesan por teselas a resolucion nativa,
+    leyendo por memmap cuando el formato lo permite.
+
+    Retorna:
+        tuple: (cajas, areas, centroides, momentos, hu, zernike) o None
+               si la imagen no se pudo leer
+    """
+    img = abrir_imagen_grande(ruta)
+    if img is None:
+        return None
+
+    if tam_tesela or max(img.shape[:2]) > UMBRAL_TESELAS:
+        r = procesar_por_teselas(img, metodo, tam_tesela or TAM_TESELA, solape, hilos,
+                                 area_min, area_max)
+        if r["cortados"]:
+            print(f"Aviso: {os.path.basename(ruta)}: {r['cortados']} objetos cortados en todas las teselas "
+                  f"(mas grandes que el solape de {solape} px); aumentar el solape para detectarlos")
+        resultado = (r["cajas"], r["areas"], r["centroides"], r["momentos"], r["hu"], r["zernike"])
+        if descartar_borde:
+            alto, ancho = img.shape[:2]
+            x, y, w, h = resultado[0].T
+            dentro = (x > 0) & (y > 0) & (x + w < ancho) & (y + h < alto)
+            resultado = tuple(
+                [z for z, d in zip(v, dentro) if d] if isinstance(v, list) else v[dentro]
+                for v in resultado
+            )
+        return resultado
+
+    etiquetas, cajas, areas, centroides = segmentar_objetos(
+        np.ascontiguousarray(img), metodo, area_min=area_min, area_max=area_max,
+        descartar_borde=descartar_borde,
+    )
+    with inst.etapa("objetos/momentos", imagenes=1):
+        momentos, hu, zernike = caracteristicas_objetos(etiquetas, cajas)
+    return cajas, areas, centroides, momentos, hu, zernike
+
+
+def extraer_objetos_carpeta(ruta_cuadros, ruta_salida_csv, metodo, area_min=200,
+                            area_max=None, descartar_borde=False, tam_tesela=None,
+                            solape=SOLAPE, hilos=None):
+    """
+    Segmenta todos los objetos de cada cuadro y extrae momentos, Hu y
+    Zernike por objeto.
+
+    Cada fila queda identificada por (clase, archivo, objeto). Ademas de
+    los tres CSV de momentos se guarda objetos.csv con la caja, el area y
+    el centroide de cada objeto en coordenadas del cuadro.
+
+    Parametros:
+        ruta_cuadros: Carpeta con los cuadros (planos o por clase)
+        ruta_salida_csv: Carpeta de salida de los CSV
+        metodo: 'espermatozoides' o 'rps'
+        area_min: Area minima de un objeto en pixeles
+        area_max: Area maxima de un objeto (None: sin limite)
+        descartar_borde: Omite los objetos cortados por el borde del cuadro
+        tam_tesela: Fuerza el modo por teselas con este lado (None: solo
+                    para cuadros mayores que UMBRAL_TESELAS)
+        solape: Solape entre teselas; debe superar el objeto mas grande
+        hilos: Hilos para las teselas (None: los del reparto, ver src/recursos.py)
+    """
+    if not os.path.isdir(ruta_cuadros):
+        print(f"No existe la carpeta de cuadros {ruta_cuadros}")
+        return
+
+    datos_objetos, datos_momentos, datos_hu, datos_zernike = [], [], [], []
+    cuadros = list(iterar_cuadros(ruta_cuadros))
+    print(f"\nSegmentando {len(cuadros)} cuadros de {ruta_cuadros}...")
+
+    for clase, archivo, ruta in tqdm(cuadros):
+        objetos = objetos_cuadro(ruta, metodo, area_min, area_max, descartar_borde,
+                                 tam_tesela, solape, hilos)
+        if objetos is None:
+            continue
+        cajas, areas, centroides, momentos, hu, zernike = objetos
+        momentos = escalar_logaritmicamente_arreglo(momentos)
+        hu = escalar_logaritmicamente_arreglo(hu)
+
+        for k in range(len(cajas)):
+            clave = {'clase': clase, 'archivo': archivo, 'objeto': k + 1}
+            x, y, w, h = cajas[k].tolist()
+            datos_objetos.append({
+                **clave, 'x': x, 'y': y, 'ancho': w, 'alto': h, 'area': int(areas[k]),
+                'cx': float(centroides[k, 0]), 'cy': float(centroides[k, 1]),
+            })
+            datos_momentos.append({**dict(zip(COLUMNAS_MOMENTOS, momentos[k].tolist())), **clave})
+            datos_hu.append({**dict(zip(COLUMNAS_HU, hu[k].tolist())), **clave})
+            if zernike[k]:
+                valores = escalar_logaritmicamente_arreglo(np.array(list(zernike[k].values())))
+                datos_zernike.append({**dict(zip(zernike[k], valores.tolist())), **clave})
+
+    os.makedirs(ruta_salida_csv, exist_ok=True)
+    print(f"\n{len(datos_objetos)} objetos en {len(cuadros)} cuadros")
+    guardar_filas_csv(datos_objetos, os.path.join(ruta_salida_csv, 'objetos.csv'))
+    guardar_filas_csv(datos_momentos, os.path.join(ruta_salida_csv, 'momentos.csv'))
+    guardar_filas_csv(datos_hu, os.path.join(ruta_salida_csv, 'hu_momentos.csv'))
+    guardar_filas_csv(datos_zernike, os.path.join(ruta_salida_csv, 'zernike.csv'))
+
+
+def extraer_objetos_todos(ruta_cuadros=RUTA_CUADROS, **kwargs):
+    """Segmentacion multi-objeto de cuadros/espermatozoides y cuadros/piedra_papel_tijera."""
+    for dataset, metodo in (("espermatozoides", "espermatozoides"), ("piedra_papel_tijera", "rps")):
+        extraer_objetos_carpeta(
+            os.path.join(ruta_cuadros, dataset),
+            os.path.join(RUTA_SALIDA, dataset),
+            metodo,
+            **kwargs,
+        )
+
+
+if __name__ == "__main__":
+    extraer_objetos_todos()
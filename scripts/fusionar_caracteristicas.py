@@ -0,0 +1,38 @@
+from src.extraccion_caracteristicas.fusion import fusionar, guardar_fusion, FAMILIAS
+from src import instrumentacion as inst
+
+
+DATASETS = ("espermatozoides", "piedra_papel_tijera")
+
+
+def ejecutar_fusion(datasets=DATASETS, familias=FAMILIAS):
+    """
+    Fusiona las familias de caracteristicas de cada dataset en una matriz
+    escalada (ver src/extraccion_caracteristicas/fusion.py).
+
+    Parametros:
+        datasets: Datasets a fusionar
+        familias: Familias a incluir; agregar 'resnet50' suma los embeddings
+    """
+    for dataset in datasets:
+        print(f"\n--- FUSION DE CARACTERISTICAS: {dataset.upper()} ---")
+        with inst.etapa("fusion/alinear"):
+            fusion = fusionar(dataset, familias)
+        if fusion is None or not fusion["ids"]:
+            print(f"No hay caracteristicas alineables para {dataset}")
+            continue
+
+        with inst.etapa("fusion/guardar", imagenes=len(fusion["ids"])):
+            carpeta = guardar_fusion(dataset, fusion)
+
+        for familia, n in fusion["descartadas"].items():
+            if n:
+                print(f"{familia}: {n} imagenes sin las demas familias")
+        if fusion["no_finitas"]:
+            print(f"{fusion['no_finitas']} imagenes descartadas por valores no finitos")
+        print(f"Familias: {', '.join(fusion['familias'])}")
+        print(f"Matriz fusionada: {fusion['X'].shape} -> {carpeta}")
+
+
+if __name__ == "__main__":
+    ejecutar_fusion()
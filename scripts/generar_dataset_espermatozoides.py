@@ -1,81 +1,194 @@
 import os
-import random
-import cv2
-import kagglehub
 from tqdm import tqdm
 
 from src.preprocesamiento.espermatozoides import (
     procesar_imagen_sperm,
     procesar_imagen_sperm_bin,
 )
+from src.datos.mascaras_empaquetadas import EscritorMascaras, EXTENSION
+from src.datos.shards import EscritorShards, SUFIJO_SHARDS
+from src.datos.escritura import EscritorImagenes, leer_imagen_guardada, COMPRESION_PNG
+from src.datos import muestreo, fuente
+from src.datos.duplicados import cargar_grupos, clave_imagen, Reutilizacion
+from src import instrumentacion as inst
+
+NOMBRE_DATASET = "espermatozoides"
+SEED = 56  # semilla por defecto si la configuracion de muestreo no define otra
+EXT_VALIDAS = (".bmp", ".jpg", ".jpeg", ".png")
+PROCESADORES = (
+    ("espermatozoides", procesar_imagen_sperm),
+    ("espermatozoides_binarizados", procesar_imagen_sperm_bin),
+)
+# Conjuntos que ademas se guardan como mascaras empaquetadas (1 bit/pixel)
+CONJUNTOS_EMPAQUETADOS = ("espermatozoides_binarizados",)
+# "carpetas": un archivo por imagen; "shards": archivo de shards con indice
+FORMATO_SALIDA = "carpetas"
+# Con "carpetas": formato de cada imagen (None: el del original, 'png',
+# 'bmp' o 'raw') y nivel de compresion PNG; la escritura es en segundo plano
+FORMATO_IMAGEN = None
+HILOS_ESCRITURA = 2
 
-def generar_datos():
-    # ---------------- CONFIGURACIÓN ----------------
-    SEED = 56
-    random.seed(SEED)
-
-    NUM_MUESTRAS = 100  # <-- máximo de imágenes a procesar por clase
-    RUTA_SALIDA_BASE = "datos_procesados"
-    EXT_VALIDAS = (".bmp", ".jpg", ".jpeg", ".png")
-    PROCESADORES = (
-        ("espermatozoides", procesar_imagen_sperm),
-        ("espermatozoides_binarizados", procesar_imagen_sperm_bin),
-    )
 
-    # ---------------- DESCARGA DATASET ----------------
+def _descargar():
+    import kagglehub  # diferido: solo hace falta al descargar
+
     print("⬇Descargando dataset de espermatozoides...")
-    path_origen = kagglehub.dataset_download(
+    return kagglehub.dataset_download(
         "orvile/sperm-morphology-image-data-set-smids"
     )
 
-    # ---------------- BUSCAR CARPETAS ----------------
-    ruta_base = ""
-    clases = []
 
+def _buscar_clases(path_origen):
+    """Recorre la descarga hasta la carpeta que contiene las clases."""
     for root, dirs, _ in os.walk(path_origen):
         candidatos = [d for d in dirs if "sperm" in d.lower() or "normal" in d.lower()]
         if len(candidatos) >= 2:
-            ruta_base = root
-            clases = candidatos
-            break
-
-    if not clases:
+            return root, candidatos
+    return "", []
+
+
+def localizar_origen(config=None):
+    """
+    Localiza el dataset SMIDS (carpeta o comprimido local, copia ya
+    escaneada o descarga) y actualiza su manifiesto (ver src/datos/fuente.py).
+
+    Parametros:
+        config: Configuracion de muestreo (usa "origen" y "offline")
+
+    Retorna:
+        dict: Manifiesto con ruta_base, clases, archivos y cambios
+    """
+    if config is None:
+        config = muestreo.cargar_config(dataset=NOMBRE_DATASET)
+    manifiesto = fuente.localizar(
+        NOMBRE_DATASET, _buscar_clases, _descargar, EXT_VALIDAS,
+        origen=config["origen"], offline=config["offline"],
+    )
+    if manifiesto is None:
         raise RuntimeError("No se encontraron las carpetas del dataset.")
 
-    print(f"Clases encontradas: {clases}")
+    print(f"Clases encontradas: {manifiesto['clases']}")
+    return manifiesto
 
-    # ---------------- CREAR ESTRUCTURA DE SALIDA ----------------
-    for nombre_tipo, _ in PROCESADORES:
-        for clase in clases:
-            os.makedirs(os.path.join(RUTA_SALIDA_BASE, nombre_tipo, clase), exist_ok=True)
 
-    muestras_por_clase = {}
+def localizar_dataset(config=None):
+    """
+    Localiza la carpeta que contiene las clases del dataset SMIDS.
+
+    Retorna:
+        tuple: (ruta_base, clases)
+    """
+    manifiesto = localizar_origen(config)
+    return manifiesto["ruta_base"], manifiesto["clases"]
+
+
+def seleccionar_muestras(ruta_base, clases, config=None, archivos=None):
+    """
+    Selecciona las imagenes de cada clase segun la configuracion de muestreo
+    (por defecto hasta 100 por clase con SEED, ver src/datos/muestreo.py).
+
+    Parametros:
+        ruta_base: Carpeta que contiene las clases
+        clases: Nombres de las carpetas de clase
+        config: Configuracion de muestreo (None: valores por defecto)
+        archivos: {clase: [nombres]} ya listados (p. ej. del manifiesto);
+                  si es None se lista cada carpeta
+
+    Retorna:
+        dict: {clase: {"origen": ruta_clase, "muestras": [nombres], "total": n}}
+    """
+    if config is None:
+        config = muestreo.cargar_config(dataset=NOMBRE_DATASET)
+
+    archivos_por_clase = {}
     for clase in clases:
         path_clase = os.path.join(ruta_base, clase)
-        archivos = [
-            f for f in os.listdir(path_clase)
-            if os.path.splitext(f)[1].lower() in EXT_VALIDAS
-        ]
-
-        if not archivos:
+        if archivos is not None:
+            archivos_clase = archivos.get(clase, [])
+        else:
+            archivos_clase = [
+                f for f in os.listdir(path_clase)
+                if os.path.splitext(f)[1].lower() in EXT_VALIDAS
+            ]
+
+        if not archivos_clase:
             print(f"No hay imágenes válidas en: {path_clase}")
             continue
+        archivos_por_clase[clase] = archivos_clase
 
-        archivos = sorted(archivos)
-        muestras = random.sample(archivos, k=min(NUM_MUESTRAS, len(archivos)))
-        muestras_por_clase[clase] = {
-            "muestras": muestras,
-            "total": len(archivos)
+    if not archivos_por_clase:
+        raise RuntimeError("No se pudo construir ninguna muestra procesable para las clases encontradas.")
+
+    seleccion = muestreo.muestrear(archivos_por_clase, config, SEED)
+    return {
+        clase: {
+            "origen": os.path.join(ruta_base, clase),
+            "muestras": seleccion[clase],
+            "total": len(archivos_clase),
         }
+        for clase, archivos_clase in archivos_por_clase.items()
+    }
 
-    if not muestras_por_clase:
-        raise RuntimeError("No se pudo construir ninguna muestra procesable para las clases encontradas.")
+
+def generar_datos(config_muestreo=None):
+    """
+    Genera los conjuntos procesados de espermatozoides.
+
+    Parametros:
+        config_muestreo: dict opcional con "ruta_config" (JSON) y/o claves
+                         de src/datos/muestreo.py que sobrescriben al archivo
+    """
+    config = muestreo.cargar_config(dataset=NOMBRE_DATASET, **(config_muestreo or {}))
+    RUTA_SALIDA_BASE = config["ruta_salida"]
+
+    # ---------------- DESCARGA Y BUSQUEDA DE CARPETAS ----------------
+    manifiesto = localizar_origen(config)
+    ruta_base, clases = manifiesto["ruta_base"], manifiesto["clases"]
+
+    # ---------------- CREAR ESTRUCTURA DE SALIDA ----------------
+    if FORMATO_SALIDA == "carpetas":
+        for nombre_tipo, _ in PROCESADORES:
+            for clase in clases:
+                os.makedirs(os.path.join(RUTA_SALIDA_BASE, nombre_tipo, clase), exist_ok=True)
+
+    muestras_por_clase = seleccionar_muestras(
+        ruta_base, clases, config, fuente.archivos_por_clase(manifiesto)
+    )
+
+    # Las muestras de la corrida anterior que siguen seleccionadas no se
+    # reprocesan (salvo que el original haya cambiado); las que ya no lo
+    # estan se eliminan de las carpetas.
+    escritor_img = EscritorImagenes(FORMATO_IMAGEN, COMPRESION_PNG, HILOS_ESCRITURA)
+    ruta_registro = muestreo.ruta_registro(config, NOMBRE_DATASET)
+    previas = {}
+    if config["incremental"] and FORMATO_SALIDA == "carpetas":
+        previas = muestreo.cargar_registro(ruta_registro)
+        for clase, nombre in manifiesto["cambios"]["modificados"]:
+            previas.get(clase, set()).discard(nombre)
+        for clase, nombre in muestreo.sobrantes(previas, muestras_por_clase):
+            for nombre_tipo, _ in PROCESADORES:
+                ruta = escritor_img.ruta_final(os.path.join(RUTA_SALIDA_BASE, nombre_tipo, clase, nombre))
+                if os.path.exists(ruta):
+                    os.remove(ruta)
 
     # ---------------- PROCESAMIENTO Y GUARDADO ----------------
     print("\nGenerando dataset procesado...")
+    # Duplicados (ver scripts/detectar_duplicados.py): las copias de una
+    # imagen ya procesada en esta corrida reutilizan su resultado
+    grupos = cargar_grupos(NOMBRE_DATASET)
+    claves = [clave_imagen(clase, nombre)
+              for clase, datos in muestras_por_clase.items() for nombre in datos["muestras"]]
 
     for nombre_tipo, procesar in PROCESADORES:
         print(f"\nProcesando conjunto: {nombre_tipo}")
+        reutilizacion = Reutilizacion(grupos, claves)
+        escritor = None
+        if nombre_tipo in CONJUNTOS_EMPAQUETADOS:
+            escritor = EscritorMascaras(os.path.join(RUTA_SALIDA_BASE, nombre_tipo + EXTENSION))
+        escritor_shards = None
+        if FORMATO_SALIDA == "shards":
+            escritor_shards = EscritorShards(os.path.join(RUTA_SALIDA_BASE, nombre_tipo + SUFIJO_SHARDS))
+
         for clase, datos in muestras_por_clase.items():
             path_clase = os.path.join(ruta_base, clase)
             salida_clase = os.path.join(RUTA_SALIDA_BASE, nombre_tipo, clase)
@@ -83,22 +196,56 @@ def generar_datos():
             total_archivos = datos["total"]
 
             print(f"Procesando clase: {clase} ({len(muestras)} de {total_archivos} imágenes)")
+            ya_procesadas = previas.get(clase, set())
 
             for nombre in tqdm(muestras):
-                ruta_img = os.path.join(path_clase, nombre)
-                img = cv2.imread(ruta_img)
-
-                if img is None:
+                ruta_salida = os.path.join(salida_clase, nombre)
+                ruta_existente = escritor_img.ruta_final(ruta_salida)
+                if nombre in ya_procesadas and os.path.exists(ruta_existente):
+                    if escritor is not None:
+                        mascara = leer_imagen_guardada(ruta_existente)
+                        with inst.etapa("escribir/empaquetar"):
+                            escritor.agregar(mascara, clase, nombre)
                     continue
 
-                _, mascara = procesar(img)
+                clave = clave_imagen(clase, nombre)
+                mascara = reutilizacion.obtener(clave)
+                if mascara is None:
+                    ruta_img = os.path.join(path_clase, nombre)
+                    img = inst.leer_imagen(ruta_img)
+
+                    if img is None:
+                        continue
+
+                    _, mascara = procesar(img)
+                    reutilizacion.guardar(clave, mascara)
 
                 if mascara is None:
                     continue
 
-                ruta_salida = os.path.join(salida_clase, nombre)
-                cv2.imwrite(ruta_salida, mascara)
+                if escritor_shards is not None:
+                    with inst.etapa("escribir", imagenes=1):
+                        escritor_shards.agregar_imagen(mascara, clase, nombre, os.path.splitext(nombre)[1])
+                else:
+                    escritor_img.escribir(ruta_salida, mascara)
+
+                if escritor is not None:
+                    with inst.etapa("escribir/empaquetar"):
+                        escritor.agregar(mascara, clase, nombre)
+
+        if reutilizacion.reutilizadas:
+            print(f"Duplicados reutilizados: {reutilizacion.reutilizadas}")
+        if escritor is not None:
+            print(f"Mascaras empaquetadas: {escritor.cerrar()}")
+        if escritor_shards is not None:
+            print(f"Shards: {escritor_shards.cerrar()}")
+
+    # Espera las escrituras pendientes; si alguna fallo lanza OSError
+    # antes de guardar el registro incremental
+    print(f"Imagenes escritas: {escritor_img.cerrar()}")
+    muestreo.guardar_registro(ruta_registro, config, muestras_por_clase)
 
     print("\nDataset de espermatozoides generado correctamente.")
+    sufijo = SUFIJO_SHARDS if FORMATO_SALIDA == "shards" else ""
     for nombre_tipo, _ in PROCESADORES:
-        print(f"Ubicación ({nombre_tipo}): {os.path.join(RUTA_SALIDA_BASE, nombre_tipo)}")
\ No newline at end of file
+        print(f"Ubicación ({nombre_tipo}): {os.path.join(RUTA_SALIDA_BASE, nombre_tipo + sufijo)}")
\ No newline at end of file
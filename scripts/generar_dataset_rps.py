@@ -1,93 +1,259 @@
 import os
-import random
-import cv2
-import kagglehub
 import shutil
 from tqdm import tqdm
 from src.preprocesamiento.rps import procesar_resta_canales, procesar_rps_grises
+from src.datos.mascaras_empaquetadas import EscritorMascaras, EXTENSION
+from src.datos.shards import EscritorShards, SUFIJO_SHARDS
+from src.datos.escritura import EscritorImagenes, leer_imagen_guardada, COMPRESION_PNG
+from src.datos import muestreo, fuente
+from src.datos.duplicados import cargar_grupos, clave_imagen, Reutilizacion
+from src import instrumentacion as inst
 
-def generar_datos():
-    SEED = 42
-    random.seed(SEED)
-    NUM_MUESTRAS = 100  # semilla
+NOMBRE_DATASET = "piedra_papel_tijera"
+SEED = 42  # semilla por defecto si la configuracion de muestreo no define otra
+EXT_VALIDAS = (".png", ".jpg", ".jpeg")
+TRADUCCION = {'rock': 'piedra', 'paper': 'papel', 'scissors': 'tijeras'}
+# "carpetas": un archivo por imagen; "shards": archivo de shards con indice
+FORMATO_SALIDA = "carpetas"
+# Con "carpetas": formato de cada imagen (None: el del original, 'png',
+# 'bmp' o 'raw') y nivel de compresion PNG; la escritura es en segundo plano
+FORMATO_IMAGEN = None
+HILOS_ESCRITURA = 2
+
+
+def _descargar():
+    import kagglehub  # diferido: solo hace falta al descargar
+
+    print("Descargando dataset Rock-Paper-Scissors...")
+    return kagglehub.dataset_download("drgfreeman/rockpaperscissors")
+
+
+def _buscar_clases(path_origen):
+    """Recorre la descarga hasta la carpeta con rock/paper/scissors."""
+    for root, dirs, _ in os.walk(path_origen):
+        cands = [d for d in dirs if d.lower() in ["rock", "paper", "scissors"]]
+        if len(cands) >= 2:
+            return root, cands
+    return None, []
+
+
+def localizar_origen(config=None):
+    """
+    Localiza el dataset Rock-Paper-Scissors (carpeta o comprimido local,
+    copia ya escaneada o descarga) y actualiza su manifiesto
+    (ver src/datos/fuente.py).
+
+    Retorna:
+        dict: Manifiesto con ruta_base, clases, archivos y cambios, o None si falla
+    """
+    if config is None:
+        config = muestreo.cargar_config(dataset=NOMBRE_DATASET)
+    try:
+        manifiesto = fuente.localizar(
+            NOMBRE_DATASET, _buscar_clases, _descargar, EXT_VALIDAS,
+            origen=config["origen"], offline=config["offline"],
+        )
+    except Exception as e:
+        print(f"Error descargando: {e}")
+        return None
+
+    if manifiesto is None:
+        print("No se encontraron carpetas.")
+        return None
+
+    print(f"Carpetas encontradas: {manifiesto['clases']}")
+    return manifiesto
+
+
+def localizar_dataset(config=None):
+    """
+    Localiza las carpetas de clase del dataset Rock-Paper-Scissors.
+
+    Retorna:
+        tuple: (ruta_base_img, carpetas_encontradas) o (None, []) si falla
+    """
+    manifiesto = localizar_origen(config)
+    if manifiesto is None:
+        return None, []
+    return manifiesto["ruta_base"], manifiesto["clases"]
+
+
+def seleccionar_muestras(ruta_base_img, carpetas_encontradas, config=None, archivos=None):
+    """
+    Selecciona las imagenes de cada clase segun la configuracion de muestreo
+    (por defecto hasta 100 por clase con SEED, ver src/datos/muestreo.py)
+    y traduce el nombre de la clase al espanol.
+
+    Parametros:
+        ruta_base_img: Carpeta que contiene las clases
+        carpetas_encontradas: Carpetas de clase (nombres en ingles)
+        config: Configuracion de muestreo (None: valores por defecto)
+        archivos: {carpeta: [nombres]} ya listados (p. ej. del manifiesto);
+                  si es None se lista cada carpeta
+
+    Retorna:
+        dict: {nombre_espanol: {"origen": ruta_clase, "muestras": [nombres], "total": n}}
+    """
+    if config is None:
+        config = muestreo.cargar_config(dataset=NOMBRE_DATASET)
+
+    origenes, archivos_por_clase = {}, {}
+    for clase_ingles in carpetas_encontradas:
+        nombre_espanol = TRADUCCION.get(clase_ingles.lower(), clase_ingles)
+        path_in = os.path.join(ruta_base_img, clase_ingles)
+        origenes[nombre_espanol] = path_in
+        if archivos is not None:
+            archivos_por_clase[nombre_espanol] = archivos.get(clase_ingles, [])
+        else:
+            archivos_por_clase[nombre_espanol] = [
+                f for f in os.listdir(path_in) if f.lower().endswith(EXT_VALIDAS)
+            ]
+
+    seleccion = muestreo.muestrear(archivos_por_clase, config, SEED)
+    return {
+        nombre_espanol: {
+            "origen": origenes[nombre_espanol],
+            "muestras": seleccion[nombre_espanol],
+            "total": len(archivos),
+        }
+        for nombre_espanol, archivos in archivos_por_clase.items()
+    }
+
+
+def generar_datos(config_muestreo=None):
+    """
+    Genera las versiones binarizada y en grises del dataset RPS.
+
+    Parametros:
+        config_muestreo: dict opcional con "ruta_config" (JSON) y/o claves
+                         de src/datos/muestreo.py que sobrescriben al archivo
+    """
+    config = muestreo.cargar_config(dataset=NOMBRE_DATASET, **(config_muestreo or {}))
     BASE_DIR = os.getcwd()
     
     # Rutas de Salida
-    RUTA_RAIZ = os.path.join(BASE_DIR, "datos_procesados")
+    RUTA_RAIZ = os.path.join(BASE_DIR, config["ruta_salida"])
     RUTA_BINARIAS = os.path.join(RUTA_RAIZ, "piedra_papel_tijera_binarizados")
     RUTA_GRISES = os.path.join(RUTA_RAIZ, "piedra_papel_tijera")
         
-    EXT_VALIDAS = (".png", ".jpg", ".jpeg")
-    TRADUCCION = {'rock': 'piedra', 'paper': 'papel', 'scissors': 'tijeras'}
     os.makedirs(RUTA_BINARIAS, exist_ok=True)
     os.makedirs(RUTA_GRISES, exist_ok=True)
 
-    # --- Descarga ---
-    print("Descargando dataset Rock-Paper-Scissors...")
-    try:
-        path_origen = kagglehub.dataset_download("drgfreeman/rockpaperscissors")
-    except Exception as e:
-        print(f"Error descargando: {e}")
-        return
-
-    # --- Buscar Carpetas ---
-    ruta_base_img = ""
-    carpetas_encontradas = []
-    for root, dirs, _ in os.walk(path_origen):
-        cands = [d for d in dirs if d.lower() in ["rock", "paper", "scissors"]]
-        if len(cands) >= 2:
-            ruta_base_img = root
-            carpetas_encontradas = cands
-            break
-    
-    if not carpetas_encontradas:
-        print("No se encontraron carpetas.")
+    # --- Descarga y busqueda de carpetas ---
+    manifiesto = localizar_origen(config)
+    if manifiesto is None:
         return
+    ruta_base_img, carpetas_encontradas = manifiesto["ruta_base"], manifiesto["clases"]
 
-    print(f"Carpetas encontradas: {carpetas_encontradas}")
     print("\nIniciando procesamiento DOBLE (Binarizadas y Grises)...")
+    escritor = EscritorMascaras(RUTA_BINARIAS + EXTENSION)
+    escritor_img = EscritorImagenes(FORMATO_IMAGEN, COMPRESION_PNG, HILOS_ESCRITURA)
+    shards_bin = shards_gris = None
+    if FORMATO_SALIDA == "shards":
+        shards_bin = EscritorShards(RUTA_BINARIAS + SUFIJO_SHARDS)
+        shards_gris = EscritorShards(RUTA_GRISES + SUFIJO_SHARDS)
+
+    muestras_por_clase = seleccionar_muestras(
+        ruta_base_img, carpetas_encontradas, config, fuente.archivos_por_clase(manifiesto)
+    )
+
+    # Las muestras de la corrida anterior que siguen seleccionadas no se
+    # reprocesan (salvo que el original haya cambiado); las que ya no lo
+    # estan se eliminan de las carpetas.
+    ruta_registro = muestreo.ruta_registro(config, NOMBRE_DATASET)
+    previas = {}
+    if config["incremental"] and FORMATO_SALIDA == "carpetas":
+        previas = muestreo.cargar_registro(ruta_registro)
+        for clase_ingles, nombre in manifiesto["cambios"]["modificados"]:
+            clase = TRADUCCION.get(clase_ingles.lower(), clase_ingles)
+            previas.get(clase, set()).discard(nombre)
+        for clase, nombre in muestreo.sobrantes(previas, muestras_por_clase):
+            for ruta in (escritor_img.ruta_final(os.path.join(RUTA_BINARIAS, clase, nombre)),
+                         escritor_img.ruta_final(os.path.join(RUTA_GRISES, clase, nombre))):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+
+    # Duplicados (ver scripts/detectar_duplicados.py): las copias de una
+    # imagen ya procesada en esta corrida reutilizan su resultado
+    reutilizacion = Reutilizacion(cargar_grupos(NOMBRE_DATASET), [
+        clave_imagen(clase, nombre)
+        for clase, datos in muestras_por_clase.items() for nombre in datos["muestras"]
+    ])
 
     # --- Loop Principal ---
-    for clase_ingles in carpetas_encontradas:
-        nombre_espanol = TRADUCCION.get(clase_ingles.lower(), clase_ingles)
-        
-        path_in = os.path.join(ruta_base_img, clase_ingles)
+    for nombre_espanol, datos in muestras_por_clase.items():
+        path_in = datos["origen"]
+        muestras = datos["muestras"]
+        ya_procesadas = previas.get(nombre_espanol, set())
         
         # Rutas especificas para esta clase
         path_out_bin = os.path.join(RUTA_BINARIAS, nombre_espanol)
         path_out_gris = os.path.join(RUTA_GRISES, nombre_espanol)
         
         # Creamos las carpetas si no existen
-        os.makedirs(path_out_bin, exist_ok=True)
-        os.makedirs(path_out_gris, exist_ok=True)
-
-        # Seleccionar imagenes
-        archivos = [f for f in os.listdir(path_in) if f.lower().endswith(EXT_VALIDAS)]
-        archivos = sorted(archivos)
-        cantidad = len(archivos) if NUM_MUESTRAS == -1 else min(NUM_MUESTRAS, len(archivos))
-        muestras = random.sample(archivos, k=cantidad)
-        
-        print(f"   -> Procesando '{nombre_espanol}': {cantidad} imagenes...")
+        if shards_bin is None:
+            os.makedirs(path_out_bin, exist_ok=True)
+            os.makedirs(path_out_gris, exist_ok=True)
+
+        print(f"   -> Procesando '{nombre_espanol}': {len(muestras)} de {datos['total']} imagenes...")
 
         for nombre in tqdm(muestras):
-            ruta_img = os.path.join(path_in, nombre)
-            img_original = cv2.imread(ruta_img)
-            
-            if img_original is None: continue
+            ruta_bin = os.path.join(path_out_bin, nombre)
+            ruta_existente = escritor_img.ruta_final(ruta_bin)
+            # Se reutiliza solo si estan las dos salidas (binaria y gris)
+            if (nombre in ya_procesadas and os.path.exists(ruta_existente)
+                    and os.path.exists(escritor_img.ruta_final(os.path.join(path_out_gris, nombre)))):
+                with inst.etapa("escribir/empaquetar"):
+                    escritor.agregar(leer_imagen_guardada(ruta_existente), nombre_espanol, nombre)
+                continue
+
+            clave = clave_imagen(nombre_espanol, nombre)
+            reutilizado = reutilizacion.obtener(clave)
+            if reutilizado is not None:
+                res_binaria, res_gris = reutilizado
+            else:
+                ruta_img = os.path.join(path_in, nombre)
+                img_original = inst.leer_imagen(ruta_img)
 
-            # 1. Generar y Guardar BINARIA
-            res_binaria = procesar_resta_canales(img_original)
+                if img_original is None: continue
+
+                res_binaria = procesar_resta_canales(img_original)
+                res_gris = procesar_rps_grises(img_original)
+                reutilizacion.guardar(clave, (res_binaria, res_gris))
+
+            # 1. Guardar BINARIA
             if res_binaria is not None:
-                cv2.imwrite(os.path.join(path_out_bin, nombre), res_binaria)
+                if shards_bin is not None:
+                    with inst.etapa("escribir", imagenes=1):
+                        shards_bin.agregar_imagen(res_binaria, nombre_espanol, nombre)
+                else:
+                    escritor_img.escribir(ruta_bin, res_binaria)
+                with inst.etapa("escribir/empaquetar"):
+                    escritor.agregar(res_binaria, nombre_espanol, nombre)
 
-            # 2. Generar y Guardar GRISES (Realce de bordes)
-            res_gris = procesar_rps_grises(img_original)
+            # 2. Guardar GRISES (Realce de bordes)
             if res_gris is not None:
-                cv2.imwrite(os.path.join(path_out_gris, nombre), res_gris)
+                if shards_gris is not None:
+                    with inst.etapa("escribir", imagenes=1):
+                        shards_gris.agregar_imagen(res_gris, nombre_espanol, nombre)
+                else:
+                    escritor_img.escribir(os.path.join(path_out_gris, nombre), res_gris)
+
+    # Espera las escrituras pendientes; si alguna fallo lanza OSError
+    # antes de guardar el registro incremental
+    print(f"Imagenes escritas: {escritor_img.cerrar()}")
+    if reutilizacion.reutilizadas:
+        print(f"Duplicados reutilizados: {reutilizacion.reutilizadas}")
+    escritor.cerrar()
+    if shards_bin is not None:
+        shards_bin.cerrar()
+        shards_gris.cerrar()
+    muestreo.guardar_registro(ruta_registro, config, muestras_por_clase)
 
     print("\n" + "="*50)
     print("PROCESO FINALIZADO.")
     print(f"Ubicacion Binarizadas: {RUTA_BINARIAS}")
+    print(f"Mascaras empaquetadas: {RUTA_BINARIAS + EXTENSION}")
     print(f"Ubicacion Grises:      {RUTA_GRISES}")
     print("="*50)
 
@@ -1,66 +1,18 @@
 import os
+import time
+import functools
 import numpy as np
 
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader
 from torchvision import models, transforms
-from PIL import Image
 
-
-class FolderImageDataset(Dataset):
-    """
-    Espera estructura:
-      root_dir/
-        clase1/*.bmp|png|jpg
-        clase2/*.bmp|png|jpg
-
-    Devuelve:
-      (tensor, filename, label_idx)
-    """
-    def __init__(self, root_dir: str, tfm):
-        self.root_dir = root_dir
-        self.tfm = tfm
-        self.exts = (".bmp", ".jpg", ".jpeg", ".png", ".webp")
-
-        print(f"[INFO] Escaneando directorio: {root_dir}")
-
-        self.class_names = sorted([
-            d for d in os.listdir(root_dir)
-            if os.path.isdir(os.path.join(root_dir, d))
-        ])
-        if not self.class_names:
-            raise RuntimeError(f"No se encontraron subcarpetas de clase en: {root_dir}")
-
-        print(f"[INFO] Clases encontradas ({len(self.class_names)}): {self.class_names}")
-
-        self.class_to_idx = {c: i for i, c in enumerate(self.class_names)}
-        self.samples = []
-
-        for c in self.class_names:
-            cdir = os.path.join(root_dir, c)
-            archivos = [
-                f for f in os.listdir(cdir)
-                if f.lower().endswith(self.exts)
-            ]
-            print(f"[INFO] {c}: {len(archivos)} imágenes")
-            for f in sorted(archivos):
-                self.samples.append((os.path.join(cdir, f), self.class_to_idx[c]))
-
-        if not self.samples:
-            raise RuntimeError(f"No se encontraron imágenes válidas en: {root_dir}")
-
-        print(f"[INFO] Total de imágenes cargadas: {len(self.samples)}")
-
-    def __len__(self):
-        return len(self.samples)
-
-    def __getitem__(self, idx):
-        path, label = self.samples[idx]
-        img = Image.open(path).convert("RGB")
-        x = self.tfm(img)
-        fname = os.path.basename(path)
-        return x, fname, label
+from src.embeddings.cache_tensores import CacheTensorDataset, normalizar_lote, crear_dataloader
+from src.embeddings.dataset import FolderImageDataset
+from src.datos.duplicados import cargar_grupos
+from src.datos import muestreo
+from src import instrumentacion as inst
+from src import recursos
 
 
 def build_resnet50_extractor(device: str) -> nn.Module:
@@ -74,12 +26,21 @@ def build_resnet50_extractor(device: str) -> nn.Module:
 
 
 def generar_embeddings_espermatozoides(
-    carpeta_imgs: str = "datos_procesados/espermatozoides",
+    carpeta_imgs: str = None,
     salida_dir: str = "embeddings/Espermatozoides",
     img_size: int = 224,
     batch_size: int = 32,
-    num_workers: int = 2,
+    num_workers: int = None,
+    usar_cache: bool = True,  # False: ruta PIL anterior (ver cache_tensores.REDIMENSION)
+    pin_memory: bool = None,
+    persistent_workers: bool = False,
+    prefetch_factor: int = None,
+    omitir_duplicados: bool = True,
+    config_muestreo=None,
 ):
+    # Por defecto lee lo que escribio el generador con la misma configuracion
+    if carpeta_imgs is None:
+        carpeta_imgs = muestreo.ruta_procesados("espermatozoides", "espermatozoides", config_muestreo)
     os.makedirs(salida_dir, exist_ok=True)
 
     device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -97,11 +58,38 @@ def generar_embeddings_espermatozoides(
     ])
 
     dataset = FolderImageDataset(carpeta_imgs, tfm)
-    dataloader = DataLoader(
-        dataset,
+    if omitir_duplicados:
+        dataset.omitir_duplicados(cargar_grupos("espermatozoides"))
+    if usar_cache:
+        # Imagenes ya decodificadas y redimensionadas en uint8; la
+        # normalizacion se hace por lote en el dispositivo
+        datos = CacheTensorDataset(
+            dataset.samples,
+            os.path.join(salida_dir, f"cache_tensores_{img_size}.npy"),
+            img_size,
+            lector=dataset.leer_gris,
+            firma_fuente=dataset.firma(),
+        )
+    else:
+        # Torchvision sobre PIL: embeddings levemente distintos a los del
+        # paquete de inferencia, que redimensiona como la cache
+        print("[INFO] Sin cache: redimension PIL, distinta a la del paquete de inferencia")
+        datos = dataset
+
+    # Workers del DataLoader e hilos de cada uno segun el reparto de la
+    # etapa (src/recursos.py); torch usa el resto de los nucleos
+    reparto = recursos.actual("torch")
+    if num_workers is None:
+        num_workers = reparto["procesos"]
+    recursos.configurar_torch()
+    dataloader = crear_dataloader(
+        datos,
         batch_size=batch_size,
-        shuffle=False,
         num_workers=num_workers,
+        worker_init_fn=functools.partial(recursos.iniciar_trabajador, reparto),
+        pin_memory=pin_memory,
+        persistent_workers=persistent_workers,
+        prefetch_factor=prefetch_factor,
     )
 
     model = build_resnet50_extractor(device)
@@ -111,17 +99,32 @@ def generar_embeddings_espermatozoides(
     all_labels = []
 
     print("[INFO] Iniciando extracción de embeddings")
+    num_lotes = len(dataloader)
+    t_inicio = time.perf_counter()
+    t_lote = t_inicio
     with torch.no_grad():
         for i, (xb, names, labels) in enumerate(dataloader, start=1):
-            xb = xb.to(device)
-            emb = model(xb).cpu().numpy()
+            # Tiempo esperando al DataLoader (lectura/decodificacion)
+            inst.registrar("embeddings/carga", time.perf_counter() - t_lote, imagenes=len(names))
+
+            with inst.etapa("embeddings/forward", imagenes=len(names)):
+                xb = normalizar_lote(xb, device) if usar_cache else xb.to(device)
+                emb = model(xb).cpu().numpy()
             all_embeddings.append(emb)
             all_filenames.extend(list(names))
             all_labels.extend(labels.numpy().tolist())
 
-            print(f"[INFO] *** Cargando y generando embeddings ****")
+            if i % 10 == 0 or i == num_lotes:
+                transcurrido = time.perf_counter() - t_inicio
+                print(
+                    f"[INFO] Lote {i}/{num_lotes} - {len(all_filenames)} imágenes - "
+                    f"{len(all_filenames) / transcurrido:.1f} img/s"
+                )
+            t_lote = time.perf_counter()
 
     X = np.vstack(all_embeddings)
+    # Las copias duplicadas toman el embedding de su canonica
+    X, all_filenames, all_labels = dataset.expandir(X)
     y_true = np.array(all_labels, dtype=np.int64)
 
     print(f"[INFO] Embeddings generados con forma: {X.shape}")
@@ -147,7 +150,7 @@ def generar_embeddings_espermatozoides(
 
     return {
         "X_shape": X.shape,
-        "num_images": len(dataset),
+        "num_images": len(X),
         "num_classes": len(dataset.class_names),
         "output_dir": salida_dir,
     }
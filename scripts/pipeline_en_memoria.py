@@ -0,0 +1,363 @@
+import os
+import time
+import queue
+import threading
+
+import numpy as np
+from tqdm import tqdm
+
+from src.preprocesamiento.espermatozoides import procesar_imagen_sperm, procesar_imagen_sperm_bin
+from src.preprocesamiento.rps import procesar_resta_canales, procesar_rps_grises
+from src.extraccion_caracteristicas.SIFT.SIFT import crear_sift, calcular_puntos_descriptores, resumir_descriptores
+from src.extraccion_caracteristicas.SIFT.almacen import EscritorDescriptores
+from src.extraccion_caracteristicas.HOG.HOG import calcular_hog
+from src.datos import muestreo, fuente
+from src import instrumentacion as inst
+from src import recursos
+from scripts import generar_dataset_espermatozoides, generar_dataset_rps
+from scripts.extraer_caracteristicas import (
+    calcular_filas_mascara, guardar_filas_csv, resumir_calidad, ruta_almacen_sift,
+    actualizar_indice_formas, mascara_valida, _copiar_fila,
+)
+from src.extraccion_caracteristicas.momentos.busqueda import descriptor_forma
+from src.datos.duplicados import cargar_grupos, clave_imagen, Reutilizacion
+
+
+# Configuracion de cada dataset: como localizar y muestrear los originales,
+# como preprocesarlos y donde quedan las salidas de cada etapa. salida_gris
+# y salida_binaria son relativas a la ruta_salida del muestreo.
+DATASETS = {
+    "espermatozoides": {
+        "modulo": generar_dataset_espermatozoides,
+        "gris": lambda img: procesar_imagen_sperm(img)[1],
+        "binaria": lambda img: procesar_imagen_sperm_bin(img)[1],
+        "salida_gris": "espermatozoides",
+        "salida_binaria": "espermatozoides_binarizados",
+        "momentos": "caracteristicas_extraidas/momentos/espermatozoides",
+        "formas": "espermatozoides",
+        "sift": "caracteristicas_extraidas/sift/espermatozoides/sift.csv",
+        "hog": "caracteristicas_extraidas/hog/espermatozoides/hog.csv",
+        "embeddings": "embeddings/Espermatozoides",
+    },
+    "piedra_papel_tijera": {
+        "modulo": generar_dataset_rps,
+        "gris": procesar_rps_grises,
+        "binaria": procesar_resta_canales,
+        "salida_gris": "piedra_papel_tijera",
+        "salida_binaria": "piedra_papel_tijera_binarizados",
+        "momentos": "caracteristicas_extraidas/momentos/piedra_papel_tijera",
+        "formas": "rps",
+        "sift": "caracteristicas_extraidas/sift/piedra_papel_tijera/sift.csv",
+        "hog": "caracteristicas_extraidas/hog/piedra_papel_tijera/hog.csv",
+        "embeddings": "embeddings/RPS",
+    },
+}
+
+_FIN = None
+
+
+def listar_tareas(config, config_muestreo=None):
+    """
+    Localiza el dataset original y devuelve la lista de muestras a procesar.
+
+    Parametros:
+        config: Entrada de DATASETS
+        config_muestreo: Opciones de muestreo (ver generar_datos de los generadores)
+
+    Retorna:
+        list: Tuplas (clase, ruta_original, nombre_archivo)
+    """
+    modulo = config["modulo"]
+    opciones = muestreo.cargar_config(dataset=modulo.NOMBRE_DATASET, **(config_muestreo or {}))
+    manifiesto = modulo.localizar_origen(opciones)
+    if not manifiesto:
+        return []
+
+    seleccion = modulo.seleccionar_muestras(
+        manifiesto["ruta_base"], manifiesto["clases"], opciones,
+        fuente.archivos_por_clase(manifiesto),
+    )
+    tareas = []
+    for clase, datos in seleccion.items():
+        for nombre in datos["muestras"]:
+            tareas.append((clase, os.path.join(datos["origen"], nombre), nombre))
+    return tareas
+
+
+def producir(tareas, config, cola, guardar_intermedios=False, errores=None, grupos=None):
+    """
+    Lee y preprocesa cada imagen y deja el resultado en la cola.
+
+    La cola es acotada, asi que el productor se bloquea si el consumidor
+    va mas lento y la memoria usada queda limitada a tam_cola imagenes.
+    Como en los generadores, las copias de un grupo de duplicados (grupos,
+    ver src/datos/duplicados.py) no se leen: reciben el resultado de la
+    primera procesada. Al terminar (o fallar) siempre encola _FIN.
+    """
+    try:
+        reutilizacion = Reutilizacion(grupos or {}, [clave_imagen(c, n) for c, _, n in tareas])
+        for clase, ruta_img, nombre in tareas:
+            clave = clave_imagen(clase, nombre)
+            previo = reutilizacion.obtener(clave)
+            if previo is not None:
+                gris, binaria = previo
+            else:
+                img = inst.leer_imagen(ruta_img)
+                if img is None:
+                    continue
+
+                gris = config["gris"](img)
+                binaria = config["binaria"](img)
+                reutilizacion.guardar(clave, (gris, binaria))
+
+            if guardar_intermedios:
+                for carpeta, resultado in ((config["salida_gris"], gris),
+                                           (config["salida_binaria"], binaria)):
+                    if resultado is None:
+                        continue
+                    os.makedirs(os.path.join(carpeta, clase), exist_ok=True)
+                    inst.escribir_imagen(os.path.join(carpeta, clase, nombre), resultado)
+
+            cola.put((clase, nombre, gris, binaria))
+    except Exception as e:
+        if errores is not None:
+            errores.append(e)
+    finally:
+        cola.put(_FIN)
+
+
+def _guardar_embeddings(salida_dir, X, y_true, filenames, class_names):
+    os.makedirs(salida_dir, exist_ok=True)
+    np.save(os.path.join(salida_dir, "X_resnet50.npy"), X)
+    np.save(os.path.join(salida_dir, "y_true.npy"), y_true)
+
+    with open(os.path.join(salida_dir, "filenames.txt"), "w", encoding="utf-8") as f:
+        for n in filenames:
+            f.write(n + "\n")
+
+    with open(os.path.join(salida_dir, "classes.txt"), "w", encoding="utf-8") as f:
+        for c in class_names:
+            f.write(c + "\n")
+
+
+def ejecutar_en_memoria(
+    dataset: str = "espermatozoides",
+    tareas=None,
+    guardar_intermedios: bool = False,
+    generar_embeddings: bool = True,
+    tam_cola: int = 64,
+    img_size: int = 224,
+    batch_size: int = 32,
+    config_muestreo=None,
+):
+    """
+    Ejecuta preprocesamiento, extraccion de caracteristicas y embeddings
+    sin escribir ni volver a leer las imagenes intermedias.
+
+    Un hilo productor lee y preprocesa las imagenes originales; el hilo
+    principal consume los arreglos de la cola, calcula momentos/Hu/Zernike
+    sobre la mascara, SIFT/HOG sobre la imagen gris y agrupa las imagenes
+    grises en lotes para la ResNet50. Las salidas (CSV y .npy) son las
+    mismas que las del pipeline por disco, incluido el manejo de
+    duplicados: las copias reutilizan filas, descriptores y embedding de
+    la primera procesada y no entran al indice de formas.
+
+    Parametros:
+        dataset: 'espermatozoides' o 'piedra_papel_tijera'
+        tareas: Lista opcional de (clase, ruta_original, nombre); si es None
+                se descarga y muestrea el dataset como en los generadores
+        guardar_intermedios: Si True tambien escribe las imagenes procesadas
+        generar_embeddings: Si False omite la etapa de ResNet50
+        tam_cola: Maximo de imagenes preprocesadas en espera
+        img_size: Tamaño de entrada de la red
+        batch_size: Tamaño de lote para la red
+        config_muestreo: Opciones de muestreo si tareas es None; su
+                         ruta_salida es donde se guardan los intermedios
+
+    Retorna:
+        dict: Resumen con el numero de imagenes procesadas por etapa
+    """
+    config = DATASETS[dataset]
+    config = {
+        **config,
+        "salida_gris": muestreo.ruta_procesados(dataset, config["salida_gris"], config_muestreo),
+        "salida_binaria": muestreo.ruta_procesados(dataset, config["salida_binaria"], config_muestreo),
+    }
+    if tareas is None:
+        tareas = listar_tareas(config, config_muestreo)
+    if not tareas:
+        print(f"No hay imagenes para procesar en {dataset}")
+        return None
+
+    class_names = sorted({clase for clase, _, _ in tareas})
+    class_to_idx = {c: i for i, c in enumerate(class_names)}
+    grupos = cargar_grupos(dataset)
+
+    model = None
+    if generar_embeddings:
+        # torch/torchvision solo se cargan si se van a generar embeddings
+        import torch
+        from src.embeddings.cache_tensores import redimensionar_gris, normalizar_lote
+        from scripts.generar_embeddings_espermatozoides import build_resnet50_extractor
+
+        recursos.configurar_torch()
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        model = build_resnet50_extractor(device)
+
+    cola = queue.Queue(maxsize=tam_cola)
+    errores = []
+    productor = threading.Thread(
+        target=producir,
+        args=(tareas, config, cola, guardar_intermedios, errores, grupos),
+        daemon=True,
+    )
+    productor.start()
+
+    datos_momentos, datos_hu, datos_zernike, datos_calidad = [], [], [], []
+    formas = {}
+    datos_sift, datos_hog = [], []
+    sift = crear_sift()
+    almacen_sift = EscritorDescriptores(ruta_almacen_sift(config["sift"]))
+
+    reutilizacion = Reutilizacion(grupos, [clave_imagen(c, n) for c, _, n in tareas])
+
+    # Los embeddings se calculan solo para las imagenes no reutilizadas;
+    # fuente_embeddings indica, para cada fila de salida, cual le corresponde
+    lote, embeddings = [], []
+    filenames, labels, fuente_embeddings = [], [], []
+    calculados = 0
+
+    def procesar_lote():
+        with inst.etapa("embeddings/forward", imagenes=len(lote)):
+            xb = normalizar_lote(torch.from_numpy(np.stack(lote)).unsqueeze(1), device)
+            with torch.no_grad():
+                embeddings.append(model(xb).cpu().numpy())
+        lote.clear()
+
+    print(f"\nProcesando {dataset} en memoria ({len(tareas)} imagenes)...")
+    barra = tqdm(total=len(tareas))
+    while True:
+        t0 = time.perf_counter()
+        item = cola.get()
+        inst.registrar("en_memoria/espera_cola", time.perf_counter() - t0)
+        if item is _FIN:
+            break
+        clase, nombre, gris, binaria = item
+        barra.update(1)
+
+        clave = clave_imagen(clase, nombre)
+        previo = reutilizacion.obtener(clave)
+        if previo is not None:
+            filas, sift_res, hog_desc, pos_embedding = previo
+            filas = tuple(_copiar_fila(f, clase, nombre) for f in filas)
+        else:
+            filas, sift_res, hog_desc, pos_embedding = (None,) * 5, None, None, None
+            if binaria is not None:
+                filas = calcular_filas_mascara(binaria, clase, nombre)
+                if filas[3] and mascara_valida(filas[0]):
+                    formas[clave] = (clase, descriptor_forma(binaria, filas[3]))
+            if gris is not None:
+                with inst.etapa("extraer/sift", imagenes=1):
+                    sift_res = calcular_puntos_descriptores(gris, sift)
+                with inst.etapa("extraer/hog", imagenes=1):
+                    hog_desc = calcular_hog(gris)
+                if model is not None:
+                    lote.append(redimensionar_gris(gris, img_size))
+                    pos_embedding = calculados
+                    calculados += 1
+                    if len(lote) == batch_size:
+                        procesar_lote()
+            reutilizacion.guardar(clave, (filas, sift_res, hog_desc, pos_embedding))
+
+        calidad, momentos_reg, hu, zernike, _ = filas
+        if calidad is not None:
+            datos_calidad.append(calidad)
+        if momentos_reg is not None:
+            datos_momentos.append(momentos_reg)
+            datos_hu.append(hu)
+            if zernike:
+                datos_zernike.append(zernike)
+
+        if sift_res is not None:
+            puntos, descriptores = sift_res
+            with inst.etapa("escribir/descriptores_sift"):
+                almacen_sift.agregar(descriptores, puntos, clase, nombre)
+            if descriptores is not None:
+                fila = {f'sift_{i}': val for i, val in enumerate(resumir_descriptores(descriptores))}
+                fila['clase'] = clase
+                fila['archivo'] = nombre
+                datos_sift.append(fila)
+
+        if hog_desc is not None:
+            fila = {f'hog_{i}': val for i, val in enumerate(hog_desc)}
+            fila['clase'] = clase
+            fila['archivo'] = nombre
+            datos_hog.append(fila)
+
+        if pos_embedding is not None:
+            fuente_embeddings.append(pos_embedding)
+            filenames.append(nombre)
+            labels.append(class_to_idx[clase])
+    barra.close()
+    productor.join()
+
+    almacen_sift.cerrar()
+
+    if errores:
+        raise RuntimeError(f"Fallo el preprocesamiento en memoria: {errores[0]}") from errores[0]
+
+    print("\nGuardando archivos CSV...")
+    os.makedirs(config["momentos"], exist_ok=True)
+    guardar_filas_csv(datos_momentos, os.path.join(config["momentos"], 'momentos.csv'))
+    guardar_filas_csv(datos_hu, os.path.join(config["momentos"], 'hu_momentos.csv'))
+    guardar_filas_csv(datos_zernike, os.path.join(config["momentos"], 'zernike.csv'))
+    guardar_filas_csv(datos_calidad, os.path.join(config["momentos"], 'calidad.csv'))
+    resumir_calidad(datos_calidad)
+    if reutilizacion.reutilizadas:
+        print(f"Duplicados reutilizados: {reutilizacion.reutilizadas}")
+    actualizar_indice_formas(config["momentos"], config["formas"], formas)
+
+    for filas, ruta_csv in ((datos_sift, config["sift"]), (datos_hog, config["hog"])):
+        if filas:
+            import pandas as pd
+            os.makedirs(os.path.dirname(ruta_csv), exist_ok=True)
+            pd.DataFrame(filas).to_csv(ruta_csv, index=False, encoding='utf-8')
+            print(f"{len(filas)} filas guardadas en {ruta_csv}")
+
+    if model is not None:
+        if lote:
+            procesar_lote()
+        if embeddings:
+            X = np.vstack(embeddings)[fuente_embeddings]
+            _guardar_embeddings(config["embeddings"], X, np.array(labels, dtype=np.int64),
+                                filenames, class_names)
+            print(f"[INFO] Embeddings generados con forma: {X.shape}")
+
+    return {
+        "dataset": dataset,
+        "imagenes": len(datos_hog),
+        "momentos": len(datos_momentos),
+        "zernike": len(datos_zernike),
+        "sift": len(datos_sift),
+        "embeddings": len(filenames),
+    }
+
+
+def ejecutar_datasets_en_memoria(guardar_intermedios: bool = False, config_muestreo=None):
+    """Ejecuta el pipeline en memoria para ambos datasets (sin reporte)."""
+    for dataset in DATASETS:
+        print(f"\n--- PIPELINE EN MEMORIA: {dataset.upper()} ---")
+        with inst.etapa(f"en_memoria/{dataset}"):
+            ejecutar_en_memoria(dataset, guardar_intermedios=guardar_intermedios,
+                                config_muestreo=config_muestreo)
+
+
+def ejecutar_todo_en_memoria(guardar_intermedios: bool = False, ruta_reporte=None):
+    """Ejecuta el pipeline en memoria para ambos datasets."""
+    inst.iniciar()
+    ejecutar_datasets_en_memoria(guardar_intermedios)
+    inst.guardar_reporte(ruta_reporte or os.path.join("reportes", "en_memoria.json"))
+
+
+if __name__ == "__main__":
+    ejecutar_todo_en_memoria()
@@ -0,0 +1,146 @@
+import os
+import csv
+import json
+import time
+
+import numpy as np
+
+from src.agrupamiento.conjuntos import cargar_conjunto, conjuntos_disponibles
+from src.agrupamiento.reduccion import reducir_pca
+from src.agrupamiento.propagacion import PropagacionEtiquetas, ocultar_etiquetas, SIN_ETIQUETA
+from src import instrumentacion as inst
+
+
+DATASETS = ("espermatozoides", "piedra_papel_tijera")
+FRACCIONES_ETIQUETADAS = (0.05, 0.1, 0.2)
+FRACCION_INCREMENTAL = 0.2  # puntos que se agregan despues de ajustar
+N_COMPONENTES = 50
+RUTA_RESULTADOS = "resultados/semisupervisado"
+
+COLUMNAS_REPORTE = (
+    "dataset", "conjunto", "metodo", "k", "fraccion_etiquetada", "n_muestras",
+    "n_agregados", "precision", "precision_agregados", "iteraciones",
+    "tiempo_ajuste_s", "tiempo_agregar_s",
+)
+
+
+def evaluar_dataset(
+    dataset,
+    conjuntos=None,
+    fracciones=FRACCIONES_ETIQUETADAS,
+    k=10,
+    metodo="spreading",
+    fraccion_incremental=FRACCION_INCREMENTAL,
+    n_componentes=N_COMPONENTES,
+    semilla=0,
+):
+    """
+    Evalua la propagacion de etiquetas de cada conjunto de caracteristicas.
+
+    Se separa fraccion_incremental de los puntos, que se agrega despues
+    sin etiqueta con agregar() para medir el costo de incorporar imagenes
+    nuevas. Con el resto se ajusta el grafo conservando, para cada
+    fraccion, esa parte de sus etiquetas reales (por clase).
+
+    Retorna:
+        list: Filas del reporte con la precision sobre los puntos sin
+              etiqueta y sobre los agregados
+    """
+    filas = []
+    for conjunto in conjuntos_disponibles(dataset, conjuntos):
+        with inst.etapa("semisupervisado/cargar"):
+            X, y, _ = cargar_conjunto(dataset, conjunto)
+        if len(X) <= k:
+            print(f"{dataset}/{conjunto}: muy pocas muestras ({len(X)}), se omite")
+            continue
+        with inst.etapa("semisupervisado/reduccion"):
+            Z, _ = reducir_pca(X, n_componentes, nombre=f"{dataset}_{conjunto}", semilla=semilla)
+        Z = np.asarray(Z)
+
+        orden = np.random.default_rng(semilla).permutation(len(Z))
+        n_base = len(Z) - int(fraccion_incremental * len(Z))
+        base, agregados = orden[:n_base], orden[n_base:]
+
+        for fraccion in fracciones:
+            # Las etiquetas conservadas salen solo de base (al menos una por
+            # clase); los agregados son imagenes nuevas sin etiqueta
+            y_parcial = np.full_like(y, SIN_ETIQUETA)
+            y_parcial[base] = ocultar_etiquetas(y[base], fraccion, semilla)
+
+            try:
+                t0 = time.perf_counter()
+                with inst.etapa("semisupervisado/ajustar", imagenes=len(base)):
+                    modelo = PropagacionEtiquetas(k=k, metodo=metodo).ajustar(Z[base], y_parcial[base])
+                tiempo_ajuste = time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                pred_agregados = np.array([], dtype=np.int64)
+                if len(agregados):
+                    with inst.etapa("semisupervisado/agregar", imagenes=len(agregados)):
+                        pred_agregados = modelo.agregar(Z[agregados])
+                tiempo_agregar = time.perf_counter() - t0
+            except ValueError as e:
+                print(f"{dataset}/{conjunto} con {fraccion:.0%} etiquetado: {e}, se omite")
+                continue
+
+            indices = np.concatenate([base, agregados])
+            sin_etiqueta = y_parcial[indices] == SIN_ETIQUETA
+            pred = modelo.predecir()
+            filas.append({
+                "dataset": dataset,
+                "conjunto": conjunto,
+                "metodo": metodo,
+                "k": k,
+                "fraccion_etiquetada": fraccion,
+                "n_muestras": len(Z),
+                "n_agregados": len(agregados),
+                "precision": float(np.mean(pred[sin_etiqueta] == y[indices][sin_etiqueta])),
+                "precision_agregados": (
+                    float(np.mean(pred_agregados == y[agregados])) if len(agregados) else None
+                ),
+                "iteraciones": modelo.iteraciones,
+                "tiempo_ajuste_s": tiempo_ajuste,
+                "tiempo_agregar_s": tiempo_agregar,
+            })
+    return filas
+
+
+def ejecutar_propagacion(datasets=DATASETS, **kwargs):
+    """
+    Ejecuta la evaluacion semisupervisada de todos los datasets y guarda
+    resultados/semisupervisado/<dataset>.csv|json.
+    """
+    for dataset in datasets:
+        print(f"\n--- PROPAGACION DE ETIQUETAS: {dataset.upper()} ---")
+        try:
+            with inst.etapa(f"semisupervisado/{dataset}"):
+                filas = evaluar_dataset(dataset, **kwargs)
+        except Exception as e:
+            # Un dataset que falla no detiene al resto del pipeline
+            print(f"Fallo la propagacion de {dataset}: {type(e).__name__}: {e}")
+            continue
+        if not filas:
+            print(f"No hay caracteristicas para {dataset}")
+            continue
+
+        ruta = os.path.join(RUTA_RESULTADOS, dataset)
+        os.makedirs(RUTA_RESULTADOS, exist_ok=True)
+        with open(ruta + ".csv", "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNAS_REPORTE)
+            writer.writeheader()
+            writer.writerows(filas)
+        with open(ruta + ".json", "w", encoding="utf-8") as f:
+            json.dump(filas, f, indent=2)
+
+        print(f"\n{'conjunto':10s} {'etiquetado':>10s} {'precision':>10s} {'agregados':>10s} "
+              f"{'ajuste(s)':>10s} {'agregar(s)':>11s}")
+        for fila in filas:
+            agregados = fila["precision_agregados"]
+            agregados = f"{agregados:.3f}" if agregados is not None else "-"
+            print(f"{fila['conjunto']:10s} {fila['fraccion_etiquetada']:10.0%} {fila['precision']:10.3f} "
+                  f"{agregados:>10s} {fila['tiempo_ajuste_s']:10.2f} {fila['tiempo_agregar_s']:11.2f}")
+        print(f"Reporte guardado en: {ruta}.csv")
+
+
+if __name__ == "__main__":
+    ejecutar_propagacion()
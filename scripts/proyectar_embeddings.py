@@ -0,0 +1,51 @@
+import os
+import time
+
+from src.agrupamiento.conjuntos import CARPETAS_EMBEDDINGS
+from src.agrupamiento.proyeccion import proyectar_carpeta, MAX_AJUSTE
+from src import instrumentacion as inst
+
+
+PROYECCIONES = (("pca", 2), ("pca", 3), ("umap", 2), ("umap", 3))
+
+
+def ejecutar_proyeccion(
+    datasets=tuple(CARPETAS_EMBEDDINGS),
+    proyecciones=PROYECCIONES,
+    max_ajuste=MAX_AJUSTE,
+    reajustar=False,
+):
+    """
+    Proyecta los embeddings ResNet50 de cada dataset a 2D/3D y guarda
+    X_<metodo><n>d.npy junto a X_resnet50.npy.
+
+    El proyector se ajusta solo la primera vez (o con reajustar=True); en
+    corridas siguientes se reutiliza y solo se proyectan las imagenes
+    nuevas.
+
+    Parametros:
+        datasets: Datasets a proyectar
+        proyecciones: Pares (metodo, dimensiones)
+        max_ajuste: Filas maximas para ajustar cada proyector
+        reajustar: Fuerza un nuevo ajuste
+    """
+    for dataset in datasets:
+        carpeta = CARPETAS_EMBEDDINGS[dataset]
+        if not os.path.isfile(os.path.join(carpeta, "X_resnet50.npy")):
+            print(f"No hay embeddings de {dataset} en {carpeta}")
+            continue
+
+        print(f"\n--- PROYECCION: {dataset.upper()} ---")
+        for metodo, n_dim in proyecciones:
+            t0 = time.perf_counter()
+            with inst.etapa(f"proyeccion/{metodo}{n_dim}d"):
+                resumen = proyectar_carpeta(carpeta, metodo, n_dim, max_ajuste, reajustar)
+            estado = (f"ajustado con {resumen['n_ajuste']} filas" if resumen["ajustado"]
+                      else "modelo reutilizado")
+            print(f"{metodo}{n_dim}d: {resumen['proyectadas']} proyectadas, "
+                  f"{resumen['ajuste']} del ajuste, {resumen['reutilizadas']} reutilizadas ({estado}) "
+                  f"en {time.perf_counter() - t0:.2f} s -> {resumen['ruta']}")
+
+
+if __name__ == "__main__":
+    ejecutar_proyeccion()
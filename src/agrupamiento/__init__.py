@@ -0,0 +1,4 @@
+"""
+Modulo de aprendizaje no supervisado y semisupervisado sobre
+caracteristicas y embeddings.
+"""
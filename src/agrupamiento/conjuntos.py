@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+
+
+# Carpeta de embeddings de cada dataset (ver scripts/generar_embeddings_*)
+CARPETAS_EMBEDDINGS = {
+    "espermatozoides": "embeddings/Espermatozoides",
+    "piedra_papel_tijera": "embeddings/RPS",
+}
+
+# Conjunto de caracteristicas -> ruta (con {dataset}) del archivo que lo contiene
+CONJUNTOS = {
+    "momentos": "caracteristicas_extraidas/momentos/{dataset}/momentos.csv",
+    "hu": "caracteristicas_extraidas/momentos/{dataset}/hu_momentos.csv",
+    "zernike": "caracteristicas_extraidas/momentos/{dataset}/zernike.csv",
+    "forma": "caracteristicas_extraidas/momentos/{dataset}/forma.csv",
+    "sift": "caracteristicas_extraidas/sift/{dataset}/sift.csv",
+    "hog": "caracteristicas_extraidas/hog/{dataset}/hog.csv",
+    "resnet50": "{embeddings}/X_resnet50.npy",
+    "fusion": "caracteristicas_extraidas/fusion/{dataset}/X_fusion.npy",
+}
+
+COLUMNAS_NO_NUMERICAS = ("clase", "archivo", "objeto")
+
+
+def ruta_conjunto(dataset, conjunto):
+    return CONJUNTOS[conjunto].format(
+        dataset=dataset, embeddings=CARPETAS_EMBEDDINGS[dataset]
+    )
+
+
+def _leer_lineas(ruta):
+    with open(ruta, "r", encoding="utf-8") as f:
+        return [linea.strip() for linea in f if linea.strip()]
+
+
+def cargar_conjunto(dataset, conjunto):
+    """
+    Carga un conjunto de caracteristicas como matriz float32 y etiquetas.
+
+    Para los CSV las etiquetas salen de la columna 'clase'; para los
+    embeddings, de y_true.npy y classes.txt.
+
+    Parametros:
+        dataset: 'espermatozoides' o 'piedra_papel_tijera'
+        conjunto: Clave de CONJUNTOS
+
+    Retorna:
+        tuple: (X float32 (N, D), y int64 (N,), nombres de clase) o None
+               si el archivo no existe
+    """
+    ruta = ruta_conjunto(dataset, conjunto)
+    if not os.path.isfile(ruta):
+        return None
+
+    if ruta.endswith(".npy"):
+        carpeta = os.path.dirname(ruta)
+        X = np.load(ruta).astype(np.float32, copy=False)
+        y = np.load(os.path.join(carpeta, "y_true.npy")).astype(np.int64)
+        clases = _leer_lineas(os.path.join(carpeta, "classes.txt"))
+        return X, y, clases
+
+    import pandas as pd
+
+    df = pd.read_csv(ruta)
+    columnas = [c for c in df.columns if c not in COLUMNAS_NO_NUMERICAS]
+    X = df[columnas].to_numpy(dtype=np.float32)
+    clases = sorted(df["clase"].astype(str).unique())
+    indice = {c: i for i, c in enumerate(clases)}
+    y = df["clase"].astype(str).map(indice).to_numpy(dtype=np.int64)
+
+    # Zernike u otros pueden traer NaN/inf si algun calculo fallo
+    validas = np.isfinite(X).all(axis=1)
+    if not validas.all():
+        X, y = X[validas], y[validas]
+    return X, y, clases
+
+
+def conjuntos_disponibles(dataset, conjuntos=None):
+    """Nombres de los conjuntos del dataset cuyo archivo existe."""
+    return [
+        c for c in (conjuntos or CONJUNTOS)
+        if os.path.isfile(ruta_conjunto(dataset, c))
+    ]
@@ -0,0 +1,33 @@
+"""
+Estimadores de agrupamiento con su configuracion.
+
+Los usan el barrido de scripts/agrupar.py y el paquete de inferencia
+(scripts/empaquetar_inferencia.py), de modo que un grupo del paquete se
+ajusta igual que en el reporte de agrupamiento.
+"""
+
+ALGORITMOS = ("minibatch_kmeans", "birch", "hdbscan")
+TAMANO_LOTE_KMEANS = 1024
+INICIOS_KMEANS = 3
+UMBRAL_BIRCH = 0.5
+
+
+def crear_modelo(algoritmo, parametro, semilla=0):
+    """
+    Construye el estimador de sklearn para un algoritmo.
+
+    Parametros:
+        algoritmo: 'minibatch_kmeans', 'birch' o 'hdbscan'
+        parametro: k para los dos primeros, min_cluster_size para HDBSCAN
+        semilla: random_state (solo MiniBatchKMeans)
+    """
+    from sklearn.cluster import MiniBatchKMeans, Birch, HDBSCAN
+
+    if algoritmo == "minibatch_kmeans":
+        return MiniBatchKMeans(n_clusters=parametro, batch_size=TAMANO_LOTE_KMEANS,
+                               n_init=INICIOS_KMEANS, random_state=semilla)
+    if algoritmo == "birch":
+        return Birch(n_clusters=parametro, threshold=UMBRAL_BIRCH)
+    if algoritmo == "hdbscan":
+        return HDBSCAN(min_cluster_size=parametro, copy=True)
+    raise ValueError(f"Algoritmo desconocido: {algoritmo}")
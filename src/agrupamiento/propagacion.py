@@ -0,0 +1,242 @@
+"""
+Propagacion de etiquetas semisupervisada sobre un grafo kNN disperso.
+
+El grafo se construye por bloques de filas: cada bloque consulta sus k
+vecinos y solo se guardan esas k aristas, de modo que la memoria es
+O(N*k) y nunca se forma la matriz de afinidad densa N x N. Los pesos son
+gaussianos con escala local (Zelnik-Manor y Perona):
+
+    w_ij = exp(-d_ij^2 / (sigma_i * sigma_j)),  sigma_i = distancia al k-esimo vecino
+
+y el grafo se simetriza con max(W, W^T).
+
+Metodos:
+  - "spreading" (Zhou et al.): F <- alpha * S F + (1 - alpha) Y, S = D^-1/2 W D^-1/2
+  - "propagacion" (Zhu y Ghahramani): F <- D^-1 W F, fijando las filas etiquetadas
+
+Los puntos nuevos se agregan sin reconstruir el grafo: se calculan solo
+sus vecinos (contra el indice existente y los puntos agregados despues)
+y las iteraciones parten de la solucion anterior.
+"""
+import numpy as np
+from scipy import sparse
+
+
+SIN_ETIQUETA = -1
+
+
+class PropagacionEtiquetas:
+    """
+    Parametros:
+        k: Vecinos por punto
+        metodo: 'spreading' o 'propagacion'
+        alpha: Peso de la difusion frente a las etiquetas (solo spreading)
+        max_iter: Iteraciones maximas
+        tol: Cambio maximo entre iteraciones para detenerse
+        tam_bloque: Filas por bloque al buscar vecinos
+        fraccion_reindexar: Al superar esta fraccion de puntos agregados
+                            fuera del indice, el indice de vecinos se
+                            reconstruye (el grafo no)
+    """
+    def __init__(self, k=10, metodo="spreading", alpha=0.99, max_iter=1000, tol=1e-4,
+                 tam_bloque=2048, fraccion_reindexar=0.5):
+        if metodo not in ("spreading", "propagacion"):
+            raise ValueError(f"Metodo desconocido: {metodo}")
+        self.k = k
+        self.metodo = metodo
+        self.alpha = alpha
+        self.max_iter = max_iter
+        self.tol = tol
+        self.tam_bloque = tam_bloque
+        self.fraccion_reindexar = fraccion_reindexar
+
+        self.X = None
+        self.y = None
+        self.clases = None
+        self.W = None
+        self.sigma = None
+        self.F = None
+        self.iteraciones = 0
+        self._indice = None
+        self._n_indexado = 0
+
+    # ------------------------------------------------------------------
+    # Grafo
+    # ------------------------------------------------------------------
+    def _reindexar(self):
+        from sklearn.neighbors import NearestNeighbors
+
+        self._indice = NearestNeighbors().fit(self.X)
+        self._n_indexado = len(self.X)
+
+    def _vecinos(self, inicio, fin):
+        """
+        k vecinos (sin contarse a si mismo) de las filas X[inicio:fin],
+        procesadas en bloques de tam_bloque.
+
+        Retorna:
+            tuple: (distancias (m, k), indices (m, k))
+        """
+        from sklearn.metrics import pairwise_distances
+
+        k = min(self.k, len(self.X) - 1)
+        extra = self.X[self._n_indexado:]
+        distancias, indices = [], []
+        for a in range(inicio, fin, self.tam_bloque):
+            b = min(a + self.tam_bloque, fin)
+            consulta = self.X[a:b]
+            propios = np.arange(a, b)
+
+            n_consulta = min(k + 1, self._n_indexado)
+            d, i = self._indice.kneighbors(consulta, n_consulta)
+            if len(extra):
+                # Puntos agregados despues de construir el indice
+                d_extra = pairwise_distances(consulta, extra)
+                i_extra = np.broadcast_to(np.arange(self._n_indexado, len(self.X)), d_extra.shape)
+                d = np.hstack([d, d_extra])
+                i = np.hstack([i, i_extra])
+
+            d = np.where(i == propios[:, None], np.inf, d)
+            orden = np.argsort(d, axis=1)[:, :k]
+            distancias.append(np.take_along_axis(d, orden, axis=1))
+            indices.append(np.take_along_axis(i, orden, axis=1))
+        return np.vstack(distancias), np.vstack(indices)
+
+    def _aristas(self, inicio, fin):
+        """Matriz dispersa (N, N) con las aristas salientes de X[inicio:fin]."""
+        d, i = self._vecinos(inicio, fin)
+        self.sigma[inicio:fin] = np.maximum(d[:, -1], 1e-12)
+        filas = np.repeat(np.arange(inicio, fin), d.shape[1])
+        columnas = i.ravel()
+        escala = self.sigma[filas] * self.sigma[columnas]
+        pesos = np.exp(-(d.ravel() ** 2) / escala)
+        n = len(self.X)
+        return sparse.csr_matrix((pesos, (filas, columnas)), shape=(n, n))
+
+    # ------------------------------------------------------------------
+    # Propagacion
+    # ------------------------------------------------------------------
+    def _matriz_etiquetas(self):
+        Y = np.zeros((len(self.y), len(self.clases)), dtype=np.float64)
+        etiquetados = self.y != SIN_ETIQUETA
+        Y[etiquetados, np.searchsorted(self.clases, self.y[etiquetados])] = 1.0
+        return Y, etiquetados
+
+    def _propagar(self):
+        Y, etiquetados = self._matriz_etiquetas()
+        grados = np.asarray(self.W.sum(axis=1)).ravel()
+        grados[grados == 0] = 1.0
+
+        if self.metodo == "spreading":
+            d = sparse.diags(1.0 / np.sqrt(grados))
+            S = (d @ self.W @ d).tocsr()
+        else:
+            S = (sparse.diags(1.0 / grados) @ self.W).tocsr()
+
+        F = Y.copy() if self.F is None else self.F
+        for iteracion in range(1, self.max_iter + 1):
+            if self.metodo == "spreading":
+                F_nueva = self.alpha * (S @ F) + (1 - self.alpha) * Y
+            else:
+                F_nueva = S @ F
+                F_nueva[etiquetados] = Y[etiquetados]
+            cambio = np.abs(F_nueva - F).max()
+            F = F_nueva
+            if cambio < self.tol:
+                break
+        self.F = F
+        self.iteraciones = iteracion
+        return self
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def ajustar(self, X, y):
+        """
+        Construye el grafo y propaga las etiquetas.
+
+        Parametros:
+            X: Matriz (N, D) de caracteristicas o embeddings
+            y: Etiquetas enteras (N,), SIN_ETIQUETA (-1) para no etiquetados
+        """
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
+        self.y = np.asarray(y, dtype=np.int64).copy()
+        self.clases = np.unique(self.y[self.y != SIN_ETIQUETA])
+        if len(self.clases) == 0:
+            raise ValueError("Se necesita al menos un punto etiquetado")
+
+        self.sigma = np.zeros(len(self.X), dtype=np.float64)
+        self.F = None
+        self._reindexar()
+        W = self._aristas(0, len(self.X))
+        self.W = W.maximum(W.T).tocsr()
+        return self._propagar()
+
+    def agregar(self, X_nuevos, y_nuevos=None):
+        """
+        Agrega puntos al grafo sin reconstruirlo y actualiza la propagacion.
+
+        Solo se buscan los vecinos de los puntos nuevos; las listas de
+        vecinos de los puntos existentes no se recalculan, pero reciben las
+        aristas hacia los nuevos al simetrizar.
+
+        Parametros:
+            X_nuevos: Matriz (m, D)
+            y_nuevos: Etiquetas opcionales (m,), -1 para no etiquetados
+
+        Retorna:
+            np.ndarray: Etiquetas predichas para los puntos nuevos
+        """
+        X_nuevos = np.ascontiguousarray(X_nuevos, dtype=np.float32)
+        m = len(X_nuevos)
+        n0 = len(self.X)
+        if y_nuevos is None:
+            y_nuevos = np.full(m, SIN_ETIQUETA, dtype=np.int64)
+        y_nuevos = np.asarray(y_nuevos, dtype=np.int64)
+        desconocidas = set(np.unique(y_nuevos[y_nuevos != SIN_ETIQUETA])) - set(self.clases.tolist())
+        if desconocidas:
+            raise ValueError(f"Clases no vistas al ajustar: {sorted(desconocidas)}")
+
+        self.X = np.vstack([self.X, X_nuevos])
+        self.y = np.concatenate([self.y, y_nuevos])
+        self.sigma = np.concatenate([self.sigma, np.zeros(m)])
+        if len(self.X) - self._n_indexado > self.fraccion_reindexar * self._n_indexado:
+            self._reindexar()
+
+        W_previo = sparse.bmat([[self.W, None], [None, sparse.csr_matrix((m, m))]]).tocsr()
+        nuevas = self._aristas(n0, n0 + m)
+        self.W = W_previo.maximum(nuevas).maximum(nuevas.T).tocsr()
+
+        self.F = np.vstack([self.F, np.zeros((m, len(self.clases)))])
+        self._propagar()
+        return self.predecir()[n0:]
+
+    def distribuciones(self):
+        """Probabilidad por clase de cada punto (filas normalizadas de F)."""
+        suma = self.F.sum(axis=1, keepdims=True)
+        suma[suma == 0] = 1.0
+        return self.F / suma
+
+    def predecir(self):
+        """Etiqueta asignada a cada punto (-1 si no le llego informacion)."""
+        etiquetas = self.clases[self.F.argmax(axis=1)]
+        etiquetas[self.F.max(axis=1) == 0] = SIN_ETIQUETA
+        return etiquetas
+
+
+def ocultar_etiquetas(y, fraccion_etiquetada, semilla=0):
+    """
+    Conserva una fraccion de etiquetas por clase (estratificado) y marca
+    el resto como SIN_ETIQUETA.
+
+    Retorna:
+        np.ndarray: Etiquetas parciales
+    """
+    rng = np.random.default_rng(semilla)
+    parcial = np.full_like(y, SIN_ETIQUETA)
+    for clase in np.unique(y):
+        indices = np.flatnonzero(y == clase)
+        n = max(1, int(round(fraccion_etiquetada * len(indices))))
+        elegidos = rng.choice(indices, size=min(n, len(indices)), replace=False)
+        parcial[elegidos] = clase
+    return parcial
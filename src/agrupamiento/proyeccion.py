@@ -0,0 +1,282 @@
+"""
+Proyeccion de embeddings a 2D/3D con PCA o UMAP reutilizando el modelo
+ajustado.
+
+El proyector se ajusta una sola vez (opcionalmente sobre una submuestra)
+y se guarda con joblib junto a los embeddings; las imagenes nuevas se
+proyectan con transform() sin volver a ajustar. UMAP se aplica sobre una
+reduccion PCA previa, que es la que abarata tanto el ajuste como el
+transform de puntos nuevos.
+
+Cada fila se identifica por clase/archivo y un hash de su embedding. Si
+los embeddings se regeneran (otros pesos, imagenes reprocesadas) cambian
+los hashes: el proyector se reajusta cuando cambio alguna fila de su
+ajuste y una coordenada guardada solo se reutiliza si el hash de su fila
+no cambio.
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+
+
+METODOS = ("pca", "umap")
+N_PCA_UMAP = 50          # dimensiones de la PCA previa a UMAP
+MAX_AJUSTE = 5000        # filas usadas para ajustar (submuestra si N es mayor)
+
+
+class Proyector:
+    """
+    Estandarizacion + PCA (+ UMAP) ajustados sobre un conjunto de
+    embeddings.
+
+    Parametros:
+        metodo: 'pca' o 'umap'
+        n_dim: Dimensiones de salida (2 o 3)
+        n_pca: Dimensiones de la PCA previa a UMAP
+        n_vecinos: n_neighbors de UMAP
+        semilla: random_state
+    """
+    def __init__(self, metodo="umap", n_dim=2, n_pca=N_PCA_UMAP, n_vecinos=15, semilla=42):
+        if metodo not in METODOS:
+            raise ValueError(f"Metodo desconocido: {metodo}")
+        self.metodo = metodo
+        self.n_dim = n_dim
+        self.n_pca = n_pca
+        self.n_vecinos = n_vecinos
+        self.semilla = semilla
+        self.escalador = None
+        self.pca = None
+        self.umap = None
+        self.n_ajuste = 0
+        # {clase/archivo: hash de la fila} de las filas del ajuste
+        self.huellas_ajuste = {}
+
+    def ajustar(self, X, max_ajuste=MAX_AJUSTE):
+        """
+        Ajusta el proyector. Si X tiene mas de max_ajuste filas se usa una
+        submuestra aleatoria (el resto se proyecta despues con transformar).
+
+        Retorna:
+            tuple: (indices de las filas usadas para ajustar, sus
+                    coordenadas (n, n_dim) float32)
+        """
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.decomposition import PCA
+
+        X = np.asarray(X, dtype=np.float32)
+        indices = np.arange(len(X))
+        if max_ajuste and len(X) > max_ajuste:
+            rng = np.random.default_rng(self.semilla)
+            indices = np.sort(rng.choice(len(X), size=max_ajuste, replace=False))
+        X_ajuste = X[indices]
+
+        self.escalador = StandardScaler().fit(X_ajuste)
+        Z = self.escalador.transform(X_ajuste)
+        n_pca = self.n_dim if self.metodo == "pca" else self.n_pca
+        n_pca = min(n_pca, Z.shape[0], Z.shape[1])
+        self.pca = PCA(n_components=n_pca, random_state=self.semilla)
+        Z = self.pca.fit_transform(Z)
+
+        if self.metodo == "umap":
+            import umap
+
+            # n_jobs=1: con random_state UMAP no paraleliza de todos modos
+            self.umap = umap.UMAP(
+                n_components=self.n_dim,
+                n_neighbors=min(self.n_vecinos, len(X_ajuste) - 1),
+                random_state=self.semilla,
+                n_jobs=1,
+            )
+            # Las filas del ajuste toman la incrustacion del propio ajuste
+            Z = self.umap.fit_transform(Z)
+        self.n_ajuste = len(indices)
+        return indices, np.ascontiguousarray(Z, dtype=np.float32)
+
+    def transformar(self, X):
+        """Proyecta filas nuevas con el modelo ya ajustado -> (N, n_dim) float32."""
+        if self.pca is None:
+            raise RuntimeError("El proyector no esta ajustado")
+        Z = self.pca.transform(self.escalador.transform(np.asarray(X, dtype=np.float32)))
+        if self.umap is not None:
+            Z = self.umap.transform(Z)
+        return np.ascontiguousarray(Z, dtype=np.float32)
+
+    @property
+    def nombre(self):
+        return f"{self.metodo}{self.n_dim}d"
+
+    def guardar(self, ruta):
+        import joblib
+
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        ruta_tmp = ruta + ".tmp"
+        joblib.dump(self, ruta_tmp)
+        os.replace(ruta_tmp, ruta)
+
+    @staticmethod
+    def cargar(ruta):
+        import joblib
+
+        return joblib.load(ruta)
+
+
+def ruta_proyector(carpeta, metodo, n_dim):
+    return os.path.join(carpeta, f"proyector_{metodo}{n_dim}d.joblib")
+
+
+def ruta_coordenadas(carpeta, metodo, n_dim):
+    return os.path.join(carpeta, f"X_{metodo}{n_dim}d.npy")
+
+
+def _ruta_archivos(carpeta, metodo, n_dim):
+    # clase/archivo y hash del embedding de cada fila de X_<metodo><n>d.npy
+    return os.path.join(carpeta, f"X_{metodo}{n_dim}d_archivos.json")
+
+
+def _guardar_npy(ruta, arreglo):
+    ruta_tmp = ruta + ".tmp"
+    with open(ruta_tmp, "wb") as f:
+        np.save(f, arreglo)
+    os.replace(ruta_tmp, ruta)
+
+
+def huellas_filas(X):
+    """Hash corto del embedding de cada fila."""
+    return [
+        hashlib.blake2b(fila.tobytes(), digest_size=8).hexdigest()
+        for fila in np.asarray(X, dtype=np.float32)
+    ]
+
+
+def claves_filas(carpeta, n):
+    """
+    Clave clase/archivo de cada fila de X_resnet50.npy (el mismo nombre de
+    archivo puede repetirse en dos clases). Sin filenames.txt, el numero
+    de fila.
+    """
+    rutas = [os.path.join(carpeta, nombre) for nombre in ("filenames.txt", "y_true.npy", "classes.txt")]
+    if not all(os.path.isfile(r) for r in rutas):
+        return [str(i) for i in range(n)]
+    with open(rutas[0], "r", encoding="utf-8") as f:
+        archivos = [linea.strip() for linea in f if linea.strip()]
+    y = np.load(rutas[1])
+    with open(rutas[2], "r", encoding="utf-8") as f:
+        clases = [linea.strip() for linea in f if linea.strip()]
+    return [f"{clases[c]}/{a}" for c, a in zip(y, archivos)]
+
+
+def _ajuste_vigente(proyector, claves, huellas):
+    """True si las filas del ajuste que siguen en X no cambiaron."""
+    ajuste = getattr(proyector, "huellas_ajuste", None)
+    if not ajuste:
+        return False
+    actuales = dict(zip(claves, huellas))
+    comunes = [c for c in ajuste if c in actuales]
+    return bool(comunes) and all(actuales[c] == ajuste[c] for c in comunes)
+
+
+def obtener_proyector(carpeta, X, metodo="umap", n_dim=2, max_ajuste=MAX_AJUSTE,
+                      reajustar=False, claves=None, huellas=None, **opciones):
+    """
+    Carga el proyector guardado en la carpeta de embeddings o lo ajusta y
+    lo guarda si no existe, si cambiaron los embeddings con los que se
+    ajusto o si reajustar=True.
+
+    Parametros:
+        claves: clase/archivo de cada fila (ver claves_filas)
+        huellas: Hash de cada fila (ver huellas_filas)
+
+    Retorna:
+        tuple: (Proyector, coordenadas del ajuste {fila: (n_dim,)} o None
+                si el proyector se cargo de disco)
+    """
+    if claves is None:
+        claves = [str(i) for i in range(len(X))]
+    if huellas is None:
+        huellas = huellas_filas(X)
+
+    ruta = ruta_proyector(carpeta, metodo, n_dim)
+    if os.path.isfile(ruta) and not reajustar:
+        proyector = Proyector.cargar(ruta)
+        if _ajuste_vigente(proyector, claves, huellas):
+            return proyector, None
+        print(f"Los embeddings de {carpeta} cambiaron desde el ajuste de {proyector.nombre}: se reajusta")
+
+    proyector = Proyector(metodo, n_dim, **opciones)
+    indices, Z = proyector.ajustar(X, max_ajuste)
+    proyector.huellas_ajuste = {claves[i]: huellas[i] for i in indices.tolist()}
+    proyector.guardar(ruta)
+    return proyector, dict(zip(indices.tolist(), Z))
+
+
+def proyectar_carpeta(carpeta, metodo="umap", n_dim=2, max_ajuste=MAX_AJUSTE,
+                      reajustar=False, **opciones):
+    """
+    Escribe X_<metodo><n>d.npy junto a X_resnet50.npy.
+
+    Las filas cuyo clase/archivo ya tenia coordenadas con el mismo
+    proyector y cuyo embedding no cambio se reutilizan; solo las imagenes
+    nuevas o con embedding distinto pasan por transformar().
+
+    Parametros:
+        carpeta: Carpeta con X_resnet50.npy y filenames.txt
+        metodo: 'pca' o 'umap'
+        n_dim: 2 o 3
+        max_ajuste: Filas maximas para ajustar el proyector
+        reajustar: Ignora el proyector guardado y lo vuelve a ajustar
+
+    Retorna:
+        dict: Resumen (filas totales, proyectadas, reutilizadas de la corrida
+              anterior, ajuste: filas con la coordenada del ajuste, ajustado)
+    """
+    X = np.load(os.path.join(carpeta, "X_resnet50.npy"), mmap_mode="r")
+    claves = claves_filas(carpeta, len(X))
+    huellas = huellas_filas(X)
+
+    proyector, del_ajuste = obtener_proyector(carpeta, X, metodo, n_dim, max_ajuste, reajustar,
+                                              claves, huellas, **opciones)
+    ajustado = del_ajuste is not None
+    del_ajuste = del_ajuste or {}
+
+    ruta_coord = ruta_coordenadas(carpeta, metodo, n_dim)
+    ruta_arch = _ruta_archivos(carpeta, metodo, n_dim)
+    previas = {}
+    if not ajustado and os.path.isfile(ruta_coord) and os.path.isfile(ruta_arch):
+        with open(ruta_arch, "r", encoding="utf-8") as f:
+            filas_previas = json.load(f)
+        coord_previas = np.load(ruta_coord)
+        # Formato anterior (lista de nombres sin hash): no se reutiliza nada
+        if isinstance(filas_previas, dict) and len(filas_previas["claves"]) == len(coord_previas):
+            previas = {
+                (clave, huella): i
+                for i, (clave, huella) in enumerate(zip(filas_previas["claves"], filas_previas["huellas"]))
+            }
+
+    coordenadas = np.empty((len(X), n_dim), dtype=np.float32)
+    filas = list(zip(claves, huellas))
+    reutilizadas = [i for i, fila in enumerate(filas) if fila in previas]
+    if reutilizadas:
+        coordenadas[reutilizadas] = coord_previas[[previas[filas[i]] for i in reutilizadas]]
+    for i, z in del_ajuste.items():
+        coordenadas[i] = z
+    faltantes = [i for i, fila in enumerate(filas) if fila not in previas and i not in del_ajuste]
+    if faltantes:
+        coordenadas[faltantes] = proyector.transformar(X[faltantes])
+
+    _guardar_npy(ruta_coord, coordenadas)
+    ruta_tmp = ruta_arch + ".tmp"
+    with open(ruta_tmp, "w", encoding="utf-8") as f:
+        json.dump({"claves": claves, "huellas": huellas}, f)
+    os.replace(ruta_tmp, ruta_arch)
+
+    return {
+        "filas": len(X),
+        "proyectadas": len(faltantes),
+        "reutilizadas": len(reutilizadas),
+        "ajuste": len(del_ajuste),
+        "ajustado": ajustado,
+        "n_ajuste": proyector.n_ajuste,
+        "ruta": ruta_coord,
+    }
@@ -0,0 +1,91 @@
+import os
+import hashlib
+
+import numpy as np
+
+
+DIR_CACHE = os.path.join("cache", "reducciones")
+
+
+def huella_matriz(X):
+    """Hash corto del contenido, forma y tipo de una matriz."""
+    X = np.ascontiguousarray(X)
+    h = hashlib.blake2b(digest_size=8)
+    h.update(f"{X.shape}|{X.dtype}".encode("utf-8"))
+    h.update(memoryview(X).cast("B"))
+    return h.hexdigest()
+
+
+def reducir_pca(X, n_componentes=50, nombre="X", dir_cache=DIR_CACHE, semilla=0):
+    """
+    Estandariza por columna y reduce con PCA, guardando el resultado en
+    cache. La clave de la cache es el hash de X y el numero de componentes,
+    de modo que si las caracteristicas no cambian la reduccion no se
+    vuelve a calcular entre corridas.
+
+    Si n_componentes >= numero de columnas solo se estandariza.
+
+    Parametros:
+        X: Matriz (N, D)
+        n_componentes: Dimensiones de salida
+        nombre: Prefijo del archivo de cache (p. ej. 'espermatozoides_hog')
+        dir_cache: Carpeta de la cache
+        semilla: random_state del PCA
+
+    Retorna:
+        tuple: (Z float32 (N, n) abierta con mmap, ruta del .npy en cache)
+    """
+    n = min(n_componentes, X.shape[0], X.shape[1])
+    ruta = os.path.join(dir_cache, f"{nombre}_pca{n}_{huella_matriz(X)}.npy")
+    if os.path.isfile(ruta):
+        return np.load(ruta, mmap_mode="r"), ruta
+
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.decomposition import PCA
+
+    Z = StandardScaler().fit_transform(X)
+    if n < X.shape[1]:
+        Z = PCA(n_components=n, random_state=semilla).fit_transform(Z)
+    Z = np.ascontiguousarray(Z, dtype=np.float32)
+
+    os.makedirs(dir_cache, exist_ok=True)
+    ruta_tmp = ruta + ".tmp"
+    with open(ruta_tmp, "wb") as f:
+        np.save(f, Z)
+    os.replace(ruta_tmp, ruta)
+    return np.load(ruta, mmap_mode="r"), ruta
+
+
+def ajustar_transformacion(X, n_componentes=50, semilla=0):
+    """
+    Ajusta la misma estandarizacion + PCA de reducir_pca y devuelve sus
+    parametros como arreglos, para aplicarla a puntos nuevos sin sklearn
+    (ver aplicar_transformacion).
+
+    Retorna:
+        dict: media y desv (D,) del escalado; componentes (n, D) y
+              media_pca (D,) del PCA (identidad si n >= D)
+    """
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.decomposition import PCA
+
+    escala = StandardScaler().fit(X)
+    parametros = {
+        "media": escala.mean_.astype(np.float32),
+        "desv": escala.scale_.astype(np.float32),
+    }
+    n = min(n_componentes, X.shape[0], X.shape[1])
+    if n < X.shape[1]:
+        pca = PCA(n_components=n, random_state=semilla).fit(escala.transform(X))
+        parametros["componentes"] = pca.components_.astype(np.float32)
+        parametros["media_pca"] = pca.mean_.astype(np.float32)
+    else:
+        parametros["componentes"] = np.eye(X.shape[1], dtype=np.float32)
+        parametros["media_pca"] = np.zeros(X.shape[1], dtype=np.float32)
+    return parametros
+
+
+def aplicar_transformacion(X, parametros):
+    """Z float32 (N, n) de X (N, D) con los parametros de ajustar_transformacion."""
+    Z = (np.asarray(X, dtype=np.float32) - parametros["media"]) / parametros["desv"]
+    return (Z - parametros["media_pca"]) @ parametros["componentes"].T
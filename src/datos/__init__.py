@@ -0,0 +1,3 @@
+"""
+Modulo con formatos de almacenamiento (y escritura) para imagenes y mascaras procesadas.
+"""
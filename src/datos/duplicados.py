@@ -0,0 +1,274 @@
+"""
+Deteccion de imagenes duplicadas y casi duplicadas con hashes perceptuales.
+
+Cada original se resume en dos hashes de 64 bits:
+
+  - dHash: signo del gradiente horizontal sobre la imagen reducida a 9x8.
+  - pHash: signo (respecto a la mediana) de los coeficientes de baja
+    frecuencia de la DCT de la imagen reducida a 32x32.
+
+Dos imagenes son casi duplicadas si ambos hashes estan a distancia de
+Hamming pequeña (recompresion, cambio leve de brillo o de tamaño). La
+busqueda usa un arbol BK sobre el pHash: la desigualdad triangular de la
+distancia de Hamming descarta ramas enteras, asi que cada consulta
+visita una fraccion de las imagenes en vez de compararlas todas.
+
+Los duplicados exactos (mismo hash de contenido del manifiesto) se
+agrupan aunque esten en clases distintas; los casi duplicados solo
+dentro de la misma clase, y los que cruzan clases se informan como
+posibles errores de etiqueta.
+
+El resultado es un indice {clave: canonica} con claves 'clase/nombre'
+(clase de salida, nombre sin extension) que las etapas siguientes usan
+para reutilizar el resultado de la copia canonica con Reutilizacion.
+"""
+import os
+import json
+from collections import Counter
+
+import cv2
+import numpy as np
+
+
+DIR_DUPLICADOS = os.path.join("datos_originales", "duplicados")
+RADIO_PHASH = 6    # bits distintos (de 64) para considerar casi duplicado
+RADIO_DHASH = 10
+
+
+def clave_imagen(clase, archivo):
+    """Clave 'clase/nombre' sin extension (la salida puede cambiar de formato)."""
+    return f"{clase}/{os.path.splitext(archivo)[0]}"
+
+
+def _a_gris(img):
+    if img.ndim == 3:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return img
+
+
+def _bits_a_entero(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash(img, tam=8):
+    """Hash de diferencias de tam*tam bits."""
+    reducida = cv2.resize(_a_gris(img), (tam + 1, tam), interpolation=cv2.INTER_AREA)
+    return _bits_a_entero(reducida[:, 1:] > reducida[:, :-1])
+
+
+def phash(img, tam=8, factor=4):
+    """Hash perceptual por DCT de tam*tam bits (sin el termino de continua)."""
+    lado = tam * factor
+    reducida = cv2.resize(_a_gris(img), (lado, lado), interpolation=cv2.INTER_AREA)
+    bajas = cv2.dct(reducida.astype(np.float32))[:tam, :tam].ravel()
+    return _bits_a_entero(bajas > np.median(bajas[1:]))
+
+
+def hashes_imagen(img):
+    """(dhash, phash) de una imagen BGR o gris."""
+    return dhash(img), phash(img)
+
+
+def distancia(a, b):
+    """Distancia de Hamming entre dos hashes enteros."""
+    return (a ^ b).bit_count()
+
+
+class ArbolBK:
+    """
+    Arbol BK para busqueda por radio con distancia de Hamming.
+
+    Cada nodo guarda un hash, sus valores y sus hijos indexados por la
+    distancia al nodo; una consulta con radio r solo baja por los hijos
+    con distancia en [d - r, d + r].
+    """
+    def __init__(self):
+        self._raiz = None
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def agregar(self, h, valor):
+        self._n += 1
+        if self._raiz is None:
+            self._raiz = [h, [valor], {}]
+            return
+        nodo = self._raiz
+        while True:
+            d = distancia(h, nodo[0])
+            if d == 0:
+                nodo[1].append(valor)
+                return
+            hijo = nodo[2].get(d)
+            if hijo is None:
+                nodo[2][d] = [h, [valor], {}]
+                return
+            nodo = hijo
+
+    def buscar(self, h, radio):
+        """
+        Retorna:
+            list: Tuplas (distancia, valor) a distancia <= radio
+        """
+        resultado = []
+        pendientes = [self._raiz] if self._raiz is not None else []
+        while pendientes:
+            nodo = pendientes.pop()
+            d = distancia(h, nodo[0])
+            if d <= radio:
+                resultado.extend((d, v) for v in nodo[1])
+            for dh, hijo in nodo[2].items():
+                if d - radio <= dh <= d + radio:
+                    pendientes.append(hijo)
+        return resultado
+
+
+def agrupar(entradas, radio_phash=RADIO_PHASH, radio_dhash=RADIO_DHASH):
+    """
+    Asigna cada imagen a su copia canonica.
+
+    Parametros:
+        entradas: Lista de (clave, clase, hash_contenido, dhash, phash); la
+                  primera imagen de cada grupo en este orden es la canonica
+        radio_phash, radio_dhash: Distancias maximas de casi duplicado
+
+    Retorna:
+        tuple: (grupos {clave: canonica} solo de las duplicadas,
+                resumen con exactos, cercanos y entre_clases)
+    """
+    por_contenido = {}
+    arboles = {}
+    dhashes = {}
+    grupos = {}
+    exactos = cercanos = 0
+    entre_clases = []
+
+    for clave, clase, contenido, dh, ph in entradas:
+        canonica = por_contenido.get(contenido)
+        if canonica is not None:
+            grupos[clave] = canonica
+            exactos += 1
+            continue
+        por_contenido[contenido] = clave
+
+        candidatos = [
+            (d, c) for d, c in arboles.setdefault(clase, ArbolBK()).buscar(ph, radio_phash)
+            if distancia(dh, dhashes[c]) <= radio_dhash
+        ]
+        if candidatos:
+            grupos[clave] = min(candidatos)[1]
+            cercanos += 1
+            continue
+
+        # Casi duplicada de otra clase: se informa pero no se agrupa
+        for otra, arbol in arboles.items():
+            if otra == clase:
+                continue
+            for d, c in arbol.buscar(ph, radio_phash):
+                if distancia(dh, dhashes[c]) <= radio_dhash:
+                    entre_clases.append([clave, c, d])
+
+        arboles[clase].agregar(ph, clave)
+        dhashes[clave] = dh
+
+    resumen = {"exactos": exactos, "cercanos": cercanos, "entre_clases": entre_clases}
+    return grupos, resumen
+
+
+def ruta_indice(dataset, dir_duplicados=DIR_DUPLICADOS):
+    return os.path.join(dir_duplicados, dataset + ".json")
+
+
+def cargar_indice(dataset, dir_duplicados=DIR_DUPLICADOS):
+    ruta = ruta_indice(dataset, dir_duplicados)
+    if not os.path.isfile(ruta):
+        return None
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_indice(dataset, indice, dir_duplicados=DIR_DUPLICADOS):
+    ruta = ruta_indice(dataset, dir_duplicados)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(indice, f)
+    os.replace(ruta + ".tmp", ruta)
+    return ruta
+
+
+def cargar_grupos(dataset, dir_duplicados=DIR_DUPLICADOS):
+    """{clave: canonica} del dataset, vacio si no se corrio la deteccion."""
+    indice = cargar_indice(dataset, dir_duplicados)
+    return indice["grupos"] if indice else {}
+
+
+def representantes(claves, grupos):
+    """
+    Primera aparicion de cada grupo dentro de una lista de claves.
+
+    Retorna:
+        tuple: (indices de las claves a procesar, fuente (N,) con el indice
+                de la clave procesada que corresponde a cada posicion)
+    """
+    primera = {}
+    unicos, fuente = [], np.empty(len(claves), dtype=np.int64)
+    for i, clave in enumerate(claves):
+        canonica = grupos.get(clave, clave)
+        if canonica not in primera:
+            primera[canonica] = i
+            unicos.append(i)
+        fuente[i] = primera[canonica]
+    return unicos, fuente
+
+
+class Reutilizacion:
+    """
+    Conserva el resultado de la primera copia procesada de cada grupo de
+    duplicados para entregarlo a las demas. En los duplicados exactos el
+    resultado es el mismo; en los casi duplicados todas las copias quedan
+    con el de la primera que se procese, sea o no la canonica.
+
+    Parametros:
+        grupos: {clave: canonica} (ver cargar_grupos)
+        claves: Claves que se procesaran en esta pasada; si se conocen,
+                solo se guardan los grupos con mas de una copia y cada
+                resultado se libera al entregar la ultima copia
+    """
+    def __init__(self, grupos, claves=None):
+        self.grupos = grupos
+        self.reutilizadas = 0
+        self._resultados = {}
+        if claves is None:
+            self._pendientes = None
+            self._con_copias = set(grupos.values())
+        else:
+            self._pendientes = Counter(grupos.get(c, c) for c in claves)
+            self._con_copias = {c for c, n in self._pendientes.items() if n > 1}
+
+    def _consumir(self, canonica):
+        if self._pendientes is None:
+            return
+        self._pendientes[canonica] -= 1
+        if self._pendientes[canonica] <= 0:
+            self._resultados.pop(canonica, None)
+
+    def disponible(self, clave):
+        """Indica si obtener(clave) devolvera un resultado (sin consumirlo)."""
+        return self.grupos.get(clave, clave) in self._resultados
+
+    def obtener(self, clave):
+        """Resultado de otra copia del grupo de clave, o None si hay que calcularlo."""
+        canonica = self.grupos.get(clave, clave)
+        if canonica not in self._resultados:
+            return None
+        resultado = self._resultados[canonica]
+        self.reutilizadas += 1
+        self._consumir(canonica)
+        return resultado
+
+    def guardar(self, clave, resultado):
+        canonica = self.grupos.get(clave, clave)
+        if canonica in self._con_copias:
+            self._resultados[canonica] = resultado
+        self._consumir(canonica)
@@ -0,0 +1,192 @@
+"""
+Escritura de imagenes en segundo plano.
+
+cv2.imwrite bloquea el bucle de procesamiento mientras codifica y
+escribe; con PNG la compresion puede ser una parte importante del tiempo
+por imagen. EscritorImagenes codifica y escribe en un pool de hilos
+(cv2.imencode y la escritura a disco liberan el GIL), de modo que el
+bucle ya esta procesando la siguiente imagen mientras se guarda la
+anterior.
+
+  - Cola acotada: a lo sumo max_pendientes imagenes esperan en memoria;
+    si el disco va mas lento, escribir() se bloquea (y ese tiempo queda
+    en la etapa "escribir/espera").
+  - Formatos: el de la extension de la ruta, o 'png' (nivel de
+    compresion configurable), 'bmp' o 'raw' (.npy sin codificar, se lee
+    con np.load o abrir_imagen_grande).
+  - Cada archivo se escribe en un temporal y se renombra, asi una
+    corrida interrumpida no deja imagenes truncadas que la corrida
+    incremental tome por validas.
+  - cerrar() espera todas las escrituras, informa las que fallaron y
+    lanza OSError si hubo alguna: ninguna se pierde en silencio.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from src import instrumentacion as inst
+
+
+FORMATOS = {"png": ".png", "bmp": ".bmp", "raw": ".npy"}
+COMPRESION_PNG = 3   # 0 (sin compresion, mas rapido) a 9 (archivo mas chico)
+HILOS = 2
+MAX_PENDIENTES = 16
+
+
+def leer_imagen_guardada(ruta, flags=cv2.IMREAD_GRAYSCALE):
+    """Lee una imagen escrita por EscritorImagenes en cualquier formato."""
+    if ruta.endswith(FORMATOS["raw"]):
+        return np.load(ruta)
+    return inst.leer_imagen(ruta, flags)
+
+
+class EscritorImagenes:
+    """
+    Pool de escritura de imagenes con cola acotada.
+
+    Parametros:
+        formato: None (el de la extension de cada ruta), 'png', 'bmp' o
+                 'raw'; con formato se reemplaza la extension
+        compresion: Nivel de compresion PNG (0-9)
+        hilos: Hilos de codificacion/escritura
+        max_pendientes: Imagenes en cola como maximo (None: 4 * hilos)
+
+    Uso:
+        with EscritorImagenes("png", compresion=1) as escritor:
+            for ...:
+                escritor.escribir(ruta, img)
+    """
+    def __init__(self, formato=None, compresion=COMPRESION_PNG, hilos=HILOS, max_pendientes=MAX_PENDIENTES):
+        if formato is not None and formato not in FORMATOS:
+            raise ValueError(f"Formato desconocido: {formato} (opciones: {sorted(FORMATOS)})")
+        self.formato = formato
+        self.compresion = compresion
+        self.errores = []
+        self.escritas = 0
+        self.bytes_escritos = 0
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="escritor")
+        self._cupos = threading.BoundedSemaphore(max_pendientes or 4 * hilos)
+        self._lock = threading.Lock()
+        self._sin_pendientes = threading.Condition(self._lock)
+        self._pendientes = 0
+        self._cerrado = False
+
+    def ruta_final(self, ruta):
+        """Ruta con la que se guardara la imagen (cambia la extension si hay formato)."""
+        if self.formato is None:
+            return ruta
+        return os.path.splitext(ruta)[0] + FORMATOS[self.formato]
+
+    def escribir(self, ruta, img):
+        """
+        Encola la escritura de img. La imagen no debe modificarse despues
+        de encolarla.
+
+        Retorna:
+            str: Ruta final del archivo
+        """
+        if self._cerrado:
+            raise RuntimeError("El escritor ya esta cerrado")
+        ruta = self.ruta_final(ruta)
+
+        t0 = time.perf_counter()
+        self._cupos.acquire()
+        inst.registrar("escribir/espera", time.perf_counter() - t0, llamadas=1)
+
+        with self._lock:
+            self._pendientes += 1
+        try:
+            self._pool.submit(self._escribir, ruta, img)
+        except Exception:
+            self._terminar_tarea()
+            raise
+        return ruta
+
+    def _codificar(self, ruta, img):
+        extension = os.path.splitext(ruta)[1].lower()
+        if extension == FORMATOS["raw"]:
+            return None
+        params = [cv2.IMWRITE_PNG_COMPRESSION, int(self.compresion)] if extension == ".png" else []
+        ok, buf = cv2.imencode(extension, img, params)
+        if not ok:
+            raise OSError(f"No se pudo codificar como {extension}")
+        return buf
+
+    def _escribir(self, ruta, img):
+        t0 = time.perf_counter()
+        escritos = 0
+        try:
+            buf = self._codificar(ruta, img)
+            ruta_tmp = ruta + ".tmp"
+            with open(ruta_tmp, "wb") as f:
+                if buf is None:
+                    np.save(f, np.ascontiguousarray(img))
+                else:
+                    f.write(buf.data)
+                escritos = f.tell()
+            os.replace(ruta_tmp, ruta)
+        except Exception as e:
+            with self._lock:
+                self.errores.append((ruta, e))
+        else:
+            with self._lock:
+                self.escritas += 1
+                self.bytes_escritos += escritos
+        finally:
+            inst.registrar("escribir", time.perf_counter() - t0, imagenes=int(escritos > 0),
+                           bytes_escritos=escritos)
+            self._terminar_tarea()
+
+    def _terminar_tarea(self):
+        with self._lock:
+            self._pendientes -= 1
+            if self._pendientes == 0:
+                self._sin_pendientes.notify_all()
+        self._cupos.release()
+
+    def vaciar(self):
+        """Espera a que terminen todas las escrituras encoladas."""
+        t0 = time.perf_counter()
+        with self._sin_pendientes:
+            while self._pendientes:
+                self._sin_pendientes.wait()
+        inst.registrar("escribir/vaciar", time.perf_counter() - t0)
+
+    def cerrar(self):
+        """
+        Vacia la cola, libera el pool e informa los errores.
+
+        Retorna:
+            int: Imagenes escritas
+
+        Lanza:
+            OSError: Si alguna escritura fallo (despues de listarlas)
+        """
+        if not self._cerrado:
+            self._cerrado = True
+            self.vaciar()
+            self._pool.shutdown(wait=True)
+        if self.errores:
+            for ruta, e in self.errores[:10]:
+                print(f"Error escribiendo {ruta}: {e}")
+            if len(self.errores) > 10:
+                print(f"... y {len(self.errores) - 10} errores mas")
+            raise OSError(f"Fallaron {len(self.errores)} de "
+                          f"{len(self.errores) + self.escritas} escrituras de imagenes")
+        return self.escritas
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.cerrar()
+        else:
+            # Ya hay una excepcion en curso: terminar sin ocultarla
+            self._cerrado = True
+            self.vaciar()
+            self._pool.shutdown(wait=True)
@@ -0,0 +1,215 @@
+"""
+Origen de los datasets originales con manifiesto en cache.
+
+El origen puede ser una carpeta local, un archivo comprimido (.zip/.tar/
+.tar.gz/.tgz, que se extrae una sola vez) o, si no se indica ninguno, la
+descarga de Kaggle. Tras el primer escaneo se guarda un manifiesto con la
+carpeta base, las clases y, por archivo, tamaño, mtime y hash:
+
+    datos_originales/manifiestos/<dataset>.json
+
+En las corridas siguientes no se llama a kagglehub ni se recorre el arbol
+completo con os.walk: se listan solo las carpetas de clase y se vuelve a
+calcular el hash unicamente de los archivos cuyo tamaño o mtime cambio.
+Asi se puede trabajar sin red y se detectan archivos nuevos, modificados
+o eliminados de forma incremental.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tarfile
+import zipfile
+
+
+DIR_CACHE = "datos_originales"
+EXT_COMPRIMIDOS = (".zip", ".tar", ".tar.gz", ".tgz")
+TAM_BLOQUE_HASH = 1 << 20
+
+
+def es_comprimido(ruta):
+    return os.path.isfile(ruta) and ruta.lower().endswith(EXT_COMPRIMIDOS)
+
+
+def extraer_comprimido(ruta, dir_cache=DIR_CACHE):
+    """
+    Extrae un .zip/.tar en dir_cache/extraidos/<nombre> si no se extrajo
+    antes (o si el archivo cambio desde la ultima extraccion).
+
+    Retorna:
+        str: Carpeta con el contenido extraido
+    """
+    st = os.stat(ruta)
+    firma = f"{os.path.abspath(ruta)}|{st.st_size}|{st.st_mtime_ns}"
+    nombre = os.path.basename(ruta)
+    for ext in EXT_COMPRIMIDOS:
+        if nombre.lower().endswith(ext):
+            nombre = nombre[:-len(ext)]
+            break
+    destino = os.path.join(dir_cache, "extraidos", nombre)
+    marca = os.path.join(destino, ".extraido")
+
+    if os.path.isfile(marca):
+        with open(marca, "r", encoding="utf-8") as f:
+            if f.read() == firma:
+                return destino
+
+    print(f"Extrayendo {ruta} en {destino}...")
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+    os.makedirs(destino)
+    if ruta.lower().endswith(".zip"):
+        with zipfile.ZipFile(ruta) as z:
+            z.extractall(destino)
+    else:
+        with tarfile.open(ruta) as t:
+            t.extractall(destino, filter="data")
+    with open(marca, "w", encoding="utf-8") as f:
+        f.write(firma)
+    return destino
+
+
+def hash_archivo(ruta):
+    """Hash blake2b (128 bits) del contenido de un archivo."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(TAM_BLOQUE_HASH), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def ruta_manifiesto(dataset, dir_cache=DIR_CACHE):
+    return os.path.join(dir_cache, "manifiestos", dataset + ".json")
+
+
+def cargar_manifiesto(ruta):
+    if not os.path.isfile(ruta):
+        return None
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_manifiesto(ruta, manifiesto):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    ruta_tmp = ruta + ".tmp"
+    with open(ruta_tmp, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f)
+    os.replace(ruta_tmp, ruta)
+
+
+def escanear_clases(ruta_base, clases, ext_validas, previos=None):
+    """
+    Lista los archivos de cada carpeta de clase y calcula su hash,
+    reutilizando el del manifiesto anterior si tamaño y mtime no cambiaron.
+
+    Parametros:
+        ruta_base: Carpeta que contiene las clases
+        clases: Nombres de las carpetas de clase
+        ext_validas: Extensiones aceptadas
+        previos: Entradas "archivos" del manifiesto anterior (o None)
+
+    Retorna:
+        tuple: (archivos, cambios) con archivos = {"clase/nombre": {"tam",
+               "mtime_ns", "hash"}} y cambios = {"nuevos", "modificados",
+               "eliminados"} como listas de (clase, nombre)
+    """
+    previos = previos or {}
+    archivos = {}
+    cambios = {"nuevos": [], "modificados": [], "eliminados": []}
+
+    for clase in clases:
+        with os.scandir(os.path.join(ruta_base, clase)) as entradas:
+            for e in entradas:
+                if not e.is_file() or not e.name.lower().endswith(ext_validas):
+                    continue
+                st = e.stat()
+                clave = f"{clase}/{e.name}"
+                anterior = previos.get(clave)
+                if anterior and anterior["tam"] == st.st_size and anterior["mtime_ns"] == st.st_mtime_ns:
+                    archivos[clave] = anterior
+                    continue
+
+                entrada = {"tam": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": hash_archivo(e.path)}
+                archivos[clave] = entrada
+                if anterior is None:
+                    cambios["nuevos"].append((clase, e.name))
+                elif anterior["hash"] != entrada["hash"]:
+                    cambios["modificados"].append((clase, e.name))
+
+    for clave in sorted(set(previos) - set(archivos)):
+        cambios["eliminados"].append(tuple(clave.split("/", 1)))
+    return archivos, cambios
+
+
+def localizar(dataset, buscar_clases, descargar, ext_validas, origen=None, offline=False,
+              dir_cache=DIR_CACHE):
+    """
+    Resuelve el origen de un dataset y actualiza su manifiesto.
+
+    Prioridad del origen: el indicado en origen (carpeta o comprimido), la
+    raiz del manifiesto anterior si sigue existiendo y, por ultimo, la
+    descarga (salvo en modo offline).
+
+    Parametros:
+        dataset: Nombre del dataset (nombre del manifiesto)
+        buscar_clases: Funcion raiz -> (ruta_base, clases) que localiza las
+                       carpetas de clase (solo se usa si cambia la raiz)
+        descargar: Funcion sin argumentos que descarga y devuelve la raiz
+        ext_validas: Extensiones de imagen aceptadas
+        origen: Carpeta o archivo comprimido local (opcional)
+        offline: Si True nunca se intenta descargar
+        dir_cache: Carpeta de manifiestos y extracciones
+
+    Retorna:
+        dict: Manifiesto con "raiz", "ruta_base", "clases", "archivos" y
+              "cambios" de esta corrida
+    """
+    ruta = ruta_manifiesto(dataset, dir_cache)
+    previo = cargar_manifiesto(ruta)
+
+    if origen:
+        if not os.path.exists(origen):
+            raise FileNotFoundError(f"No existe el origen indicado: {origen}")
+        raiz = extraer_comprimido(origen, dir_cache) if es_comprimido(origen) else origen
+    elif previo and os.path.isdir(previo["raiz"]):
+        raiz = previo["raiz"]
+        print(f"Usando copia local de {dataset}: {raiz}")
+    elif offline:
+        raise RuntimeError(
+            f"Modo offline: no hay origen local ni manifiesto valido para {dataset}"
+        )
+    else:
+        raiz = descargar()
+
+    if previo and previo["raiz"] == raiz and all(
+        os.path.isdir(os.path.join(previo["ruta_base"], c)) for c in previo["clases"]
+    ):
+        ruta_base, clases = previo["ruta_base"], previo["clases"]
+        previos = previo["archivos"]
+    else:
+        ruta_base, clases = buscar_clases(raiz)
+        previos = None
+        if not clases:
+            return None
+
+    archivos, cambios = escanear_clases(ruta_base, clases, ext_validas, previos)
+    manifiesto = {"raiz": raiz, "ruta_base": ruta_base, "clases": clases, "archivos": archivos}
+    guardar_manifiesto(ruta, manifiesto)
+
+    if previos is not None:
+        print(
+            f"Manifiesto de {dataset}: {len(archivos)} archivos "
+            f"({len(cambios['nuevos'])} nuevos, {len(cambios['modificados'])} modificados, "
+            f"{len(cambios['eliminados'])} eliminados)"
+        )
+    manifiesto["cambios"] = cambios
+    return manifiesto
+
+
+def archivos_por_clase(manifiesto):
+    """Agrupa las entradas del manifiesto en {clase: [nombres]}."""
+    por_clase = {clase: [] for clase in manifiesto["clases"]}
+    for clave in manifiesto["archivos"]:
+        clase, nombre = clave.split("/", 1)
+        por_clase[clase].append(nombre)
+    return por_clase
@@ -0,0 +1,175 @@
+import os
+import json
+import struct
+
+import cv2
+import numpy as np
+
+
+MAGIA = b"MASKPK01"
+ALINEACION = 64
+EXTENSION = ".mascaras"
+EXT_VALIDAS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class EscritorMascaras:
+    """
+    Acumula mascaras binarias empaquetadas a 1 bit por pixel y las escribe
+    en un unico archivo indexado.
+
+    Formato del archivo:
+        MAGIA (8 bytes) | longitud del encabezado (uint64) | encabezado JSON
+        | relleno hasta multiplo de 64 | datos (N, H, ceil(W/8)) uint8
+
+    El encabezado guarda la forma, las clases y el nombre de archivo de
+    cada mascara, en el mismo orden que los datos.
+    """
+    def __init__(self, ruta_salida, size=(256, 256)):
+        self.ruta_salida = ruta_salida
+        self.ancho, self.alto = size
+        self.clases = []
+        self.archivos = []
+        self._datos = []
+
+    def agregar(self, mascara, clase, archivo):
+        """
+        Empaqueta y agrega una mascara (cualquier valor > 0 cuenta como 1).
+        """
+        if mascara.shape != (self.alto, self.ancho):
+            raise ValueError(
+                f"Mascara de forma {mascara.shape}, se esperaba {(self.alto, self.ancho)}"
+            )
+        self._datos.append(np.packbits(mascara > 0, axis=-1))
+        self.clases.append(clase)
+        self.archivos.append(archivo)
+
+    def __len__(self):
+        return len(self._datos)
+
+    def cerrar(self):
+        """Escribe el archivo en disco y devuelve su ruta."""
+        encabezado = json.dumps({
+            "forma": [len(self._datos), self.alto, self.ancho],
+            "clases": self.clases,
+            "archivos": self.archivos,
+        }).encode("utf-8")
+
+        inicio = len(MAGIA) + 8 + len(encabezado)
+        relleno = (-inicio) % ALINEACION
+
+        os.makedirs(os.path.dirname(self.ruta_salida) or ".", exist_ok=True)
+        ruta_tmp = self.ruta_salida + ".tmp"
+        with open(ruta_tmp, "wb") as f:
+            f.write(MAGIA)
+            f.write(struct.pack("<Q", len(encabezado)))
+            f.write(encabezado)
+            f.write(b"\0" * relleno)
+            for fila in self._datos:
+                f.write(fila.tobytes())
+        os.replace(ruta_tmp, self.ruta_salida)
+        return self.ruta_salida
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.cerrar()
+
+
+class MascarasEmpaquetadas:
+    """
+    Lector de un archivo de mascaras empaquetadas.
+
+    Los bits se mapean en memoria y solo se desempaquetan las mascaras
+    pedidas, de modo que m[i] o m[a:b] se comportan como una vista
+    N x H x W de uint8 con valores 0/255 (igual que las imagenes .png/.bmp).
+
+    Atributos:
+        clases: Lista con la clase de cada mascara
+        archivos: Lista con el nombre de archivo original de cada mascara
+        empaquetadas: memmap (N, H, ceil(W/8)) con los bits crudos
+    """
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(ruta, "rb") as f:
+            if f.read(len(MAGIA)) != MAGIA:
+                raise ValueError(f"No es un archivo de mascaras empaquetadas: {ruta}")
+            (largo,) = struct.unpack("<Q", f.read(8))
+            meta = json.loads(f.read(largo).decode("utf-8"))
+
+        inicio = len(MAGIA) + 8 + largo
+        inicio += (-inicio) % ALINEACION
+
+        n, self.alto, self.ancho = meta["forma"]
+        self.shape = (n, self.alto, self.ancho)
+        self.clases = meta["clases"]
+        self.archivos = meta["archivos"]
+        bytes_fila = (self.ancho + 7) // 8
+        self.empaquetadas = (
+            np.memmap(ruta, dtype=np.uint8, mode="r", offset=inicio,
+                      shape=(n, self.alto, bytes_fila))
+            if n > 0 else np.zeros((0, self.alto, bytes_fila), np.uint8)
+        )
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, idx):
+        bits = np.unpackbits(self.empaquetadas[idx], axis=-1, count=self.ancho)
+        return bits * np.uint8(255)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def iterar(self):
+        """Itera sobre (mascara, clase, archivo)."""
+        for i in range(len(self)):
+            yield self[i], self.clases[i], self.archivos[i]
+
+
+def es_archivo_mascaras(ruta):
+    """Indica si la ruta apunta a un archivo de mascaras empaquetadas."""
+    if not os.path.isfile(ruta):
+        return False
+    with open(ruta, "rb") as f:
+        return f.read(len(MAGIA)) == MAGIA
+
+
+def empaquetar_carpeta(ruta_carpeta, ruta_salida=None, size=(256, 256)):
+    """
+    Convierte una carpeta de mascaras con estructura clase/*.png|bmp
+    a un unico archivo empaquetado.
+
+    Parametros:
+        ruta_carpeta: Carpeta con subcarpetas por clase
+        ruta_salida: Archivo de salida (por defecto ruta_carpeta + EXTENSION)
+        size: Tamaño (ancho, alto) esperado; se redimensiona si no coincide
+
+    Retorna:
+        str: Ruta del archivo generado
+    """
+    if ruta_salida is None:
+        ruta_salida = ruta_carpeta.rstrip("/\\") + EXTENSION
+
+    clases = sorted(
+        d for d in os.listdir(ruta_carpeta)
+        if os.path.isdir(os.path.join(ruta_carpeta, d))
+    )
+
+    escritor = EscritorMascaras(ruta_salida, size)
+    for clase in clases:
+        ruta_clase = os.path.join(ruta_carpeta, clase)
+        for archivo in sorted(os.listdir(ruta_clase)):
+            if not archivo.lower().endswith(EXT_VALIDAS):
+                continue
+            mascara = cv2.imread(os.path.join(ruta_clase, archivo), cv2.IMREAD_GRAYSCALE)
+            if mascara is None:
+                continue
+            if mascara.shape != (size[1], size[0]):
+                mascara = cv2.resize(mascara, size, interpolation=cv2.INTER_NEAREST)
+            escritor.agregar(mascara, clase, archivo)
+
+    print(f"{len(escritor)} mascaras empaquetadas en {ruta_salida}")
+    return escritor.cerrar()
@@ -0,0 +1,221 @@
+"""
+Muestreo reproducible y configurable de los datasets originales.
+
+Cada archivo recibe una prioridad fija derivada de un hash de
+(semilla, clase, nombre) y la muestra de tamaño k de una clase son los k
+archivos de menor prioridad. Asi:
+
+  - la misma configuracion produce siempre el mismo subconjunto;
+  - aumentar el limite solo agrega archivos: la muestra de 100 esta
+    contenida en la de 500, que a su vez esta en la completa;
+  - agregar archivos nuevos al dataset no cambia el orden de los demas.
+
+La configuracion puede venir de un JSON y/o de argumentos:
+
+    {
+      "max_por_clase": 500,          # -1 o null: todas
+      "limites_por_clase": {"Normal_Sperm": 200},
+      "fraccion": null,              # estratificado: fraccion de cada clase
+      "balanceado": false,           # misma cantidad en todas las clases
+      "semilla": null,               # null: semilla propia del generador
+      "ruta_salida": "datos_procesados",
+      "incremental": true,           # reutiliza las salidas ya generadas
+      "origen": null,                # carpeta o .zip/.tar local (ver fuente.py)
+      "offline": false,              # nunca descargar de Kaggle
+      "piedra_papel_tijera": {"max_por_clase": -1, "origen": "rps.zip"}
+    }
+
+Las claves generales aplican a todos los datasets; una seccion con el
+nombre del dataset las sobrescribe solo para ese dataset.
+"""
+import os
+import json
+import math
+import hashlib
+
+
+CONFIG_POR_DEFECTO = {
+    "max_por_clase": 100,
+    "limites_por_clase": {},
+    "fraccion": None,
+    "balanceado": False,
+    "semilla": None,
+    "ruta_salida": "datos_procesados",
+    "incremental": True,
+    "origen": None,
+    "offline": False,
+}
+SUFIJO_REGISTRO = "_muestreo.json"
+
+
+def cargar_config(ruta_config=None, dataset=None, **sobrescrituras):
+    """
+    Construye la configuracion de muestreo de un dataset.
+
+    Orden de precedencia: valores por defecto < claves generales del JSON
+    < seccion del dataset en el JSON < sobrescrituras distintas de None.
+
+    Parametros:
+        ruta_config: Archivo JSON opcional
+        dataset: Nombre de la seccion especifica ('espermatozoides', ...)
+        **sobrescrituras: Valores que reemplazan a los del archivo (CLI);
+                          admite tambien secciones por dataset
+
+    Retorna:
+        dict: Configuracion completa
+    """
+    def separar(datos):
+        # Claves generales y seccion propia del dataset; las secciones de
+        # otros datasets se ignoran
+        generales = {
+            k: v for k, v in datos.items()
+            if not isinstance(v, dict) or k == "limites_por_clase"
+        }
+        seccion = datos.get(dataset) if isinstance(datos.get(dataset), dict) else {}
+        return [generales, seccion]
+
+    config = dict(CONFIG_POR_DEFECTO)
+    capas = []
+    if ruta_config:
+        with open(ruta_config, "r", encoding="utf-8") as f:
+            capas.extend(separar(json.load(f)))
+    capas.extend(
+        {k: v for k, v in capa.items() if v is not None} for capa in separar(sobrescrituras)
+    )
+
+    for capa in capas:
+        desconocidas = set(capa) - set(CONFIG_POR_DEFECTO)
+        if desconocidas:
+            raise ValueError(f"Claves de muestreo desconocidas: {sorted(desconocidas)}")
+        config.update(capa)
+
+    if config["fraccion"] is not None and not 0 < config["fraccion"] <= 1:
+        raise ValueError(f"fraccion debe estar en (0, 1]: {config['fraccion']}")
+    return config
+
+
+def prioridad(semilla, clase, nombre):
+    """Prioridad determinista de un archivo (no depende del resto del dataset)."""
+    h = hashlib.blake2b(f"{semilla}|{clase}|{nombre}".encode("utf-8"), digest_size=8)
+    return int.from_bytes(h.digest(), "big")
+
+
+def cantidades_por_clase(totales, config):
+    """
+    Numero de muestras a tomar de cada clase.
+
+    Parametros:
+        totales: {clase: archivos disponibles}
+        config: Configuracion de muestreo
+
+    Retorna:
+        dict: {clase: cantidad}
+    """
+    cantidades = {}
+    for clase, total in totales.items():
+        cantidad = total
+        if config["fraccion"] is not None:
+            cantidad = math.ceil(config["fraccion"] * total)
+        limite = config["limites_por_clase"].get(clase, config["max_por_clase"])
+        if limite is not None and limite >= 0:
+            cantidad = min(cantidad, limite)
+        cantidades[clase] = cantidad
+
+    if config["balanceado"] and cantidades:
+        minimo = min(cantidades.values())
+        cantidades = {clase: minimo for clase in cantidades}
+    return cantidades
+
+
+def muestrear(archivos_por_clase, config, semilla):
+    """
+    Selecciona el subconjunto de cada clase segun la configuracion.
+
+    Parametros:
+        archivos_por_clase: {clase: [nombres de archivo]}
+        config: Configuracion de muestreo (ver cargar_config)
+        semilla: Semilla a usar si config["semilla"] es None
+
+    Retorna:
+        dict: {clase: [nombres]} en orden de prioridad
+    """
+    if config["semilla"] is not None:
+        semilla = config["semilla"]
+    cantidades = cantidades_por_clase(
+        {clase: len(archivos) for clase, archivos in archivos_por_clase.items()}, config
+    )
+    seleccion = {}
+    for clase, archivos in archivos_por_clase.items():
+        ordenados = sorted(archivos, key=lambda n: (prioridad(semilla, clase, n), n))
+        seleccion[clase] = ordenados[:cantidades[clase]]
+    return seleccion
+
+
+def ruta_procesados(dataset, carpeta, config_muestreo=None):
+    """
+    Carpeta de un dataset procesado bajo la ruta_salida de la configuracion,
+    la misma en la que escriben los generadores.
+
+    Parametros:
+        dataset: Seccion de la configuracion ('espermatozoides', 'piedra_papel_tijera')
+        carpeta: Subcarpeta, p. ej. 'espermatozoides_binarizados'
+        config_muestreo: Opciones de muestreo (ver cargar_config)
+
+    Retorna:
+        str: Ruta de la carpeta
+    """
+    config = cargar_config(dataset=dataset, **(config_muestreo or {}))
+    return os.path.join(config["ruta_salida"], carpeta)
+
+
+def ruta_registro(config, nombre_dataset):
+    return os.path.join(config["ruta_salida"], nombre_dataset + SUFIJO_REGISTRO)
+
+
+def cargar_registro(ruta):
+    """
+    Lee las muestras procesadas en la corrida anterior.
+
+    Retorna:
+        dict: {clase: set(nombres)} (vacio si no hay registro)
+    """
+    if not os.path.isfile(ruta):
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        registro = json.load(f)
+    return {clase: set(datos["muestras"]) for clase, datos in registro["clases"].items()}
+
+
+def sobrantes(previas, muestras_por_clase):
+    """
+    Muestras de la corrida anterior que ya no estan seleccionadas (p. ej.
+    al reducir el limite), para eliminar sus salidas.
+
+    Retorna:
+        list: Tuplas (clase, nombre)
+    """
+    resultado = []
+    for clase, nombres in previas.items():
+        actuales = set(muestras_por_clase.get(clase, {}).get("muestras", ()))
+        resultado.extend((clase, nombre) for nombre in sorted(nombres - actuales))
+    return resultado
+
+
+def guardar_registro(ruta, config, muestras_por_clase):
+    """
+    Guarda la configuracion usada y las muestras seleccionadas por clase,
+    para poder reproducir o extender el subconjunto en la siguiente corrida.
+    """
+    registro = {
+        "config": config,
+        "clases": {
+            clase: {"total": datos.get("total"), "muestras": list(datos["muestras"])}
+            for clase, datos in muestras_por_clase.items()
+        },
+    }
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    ruta_tmp = ruta + ".tmp"
+    with open(ruta_tmp, "w", encoding="utf-8") as f:
+        json.dump(registro, f, indent=2)
+    os.replace(ruta_tmp, ruta)
+    return ruta
@@ -0,0 +1,232 @@
+import os
+import json
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+
+NOMBRE_INDICE = "indice.json"
+PATRON_SHARD = "shard-{:05d}.bin"
+TAM_MAX_SHARD = 256 * 1024 * 1024  # bytes por shard
+SUFIJO_SHARDS = "_shards"
+EXT_VALIDAS = (".bmp", ".jpg", ".jpeg", ".png", ".webp")
+
+
+class EscritorShards:
+    """
+    Escribe imagenes (codificadas o crudas) de forma secuencial en archivos
+    shard-NNNNN.bin y mantiene un indice con el desplazamiento de cada una.
+
+    Estructura en disco:
+      ruta_salida/
+        shard-00000.bin
+        shard-00001.bin
+        indice.json   <- clases y, por muestra: shard, offset, largo,
+                         clase, archivo, formato y forma (si es cruda)
+    """
+    def __init__(self, ruta_salida, tam_max_shard=TAM_MAX_SHARD):
+        self.ruta_salida = ruta_salida
+        self.tam_max_shard = tam_max_shard
+        self.muestras = []
+        self._shard = -1
+        self._archivo = None
+        self._offset = 0
+        os.makedirs(ruta_salida, exist_ok=True)
+
+    def _abrir_siguiente(self):
+        if self._archivo is not None:
+            self._archivo.close()
+        self._shard += 1
+        self._offset = 0
+        self._archivo = open(os.path.join(self.ruta_salida, PATRON_SHARD.format(self._shard)), "wb")
+
+    def agregar_bytes(self, datos, clase, archivo, formato=None, forma=None):
+        """
+        Agrega una muestra ya serializada.
+
+        Parametros:
+            datos: bytes de la imagen
+            clase: Nombre de la clase
+            archivo: Nombre de archivo original
+            formato: Extension de la codificacion ('.png', '.bmp', ...) o 'raw'
+            forma: Forma del arreglo si formato es 'raw'
+        """
+        if self._archivo is None or (
+            self._offset > 0 and self._offset + len(datos) > self.tam_max_shard
+        ):
+            self._abrir_siguiente()
+
+        self._archivo.write(datos)
+        entrada = {
+            "shard": self._shard,
+            "offset": self._offset,
+            "largo": len(datos),
+            "clase": clase,
+            "archivo": archivo,
+            "formato": formato or os.path.splitext(archivo)[1].lower(),
+        }
+        if forma is not None:
+            entrada["forma"] = list(forma)
+        self.muestras.append(entrada)
+        self._offset += len(datos)
+
+    def agregar_imagen(self, img, clase, archivo, formato=".png"):
+        """
+        Codifica y agrega una imagen en memoria. Con formato 'raw' se guardan
+        los bytes del arreglo sin comprimir (sin costo de codificacion).
+        """
+        if formato == "raw":
+            img = np.ascontiguousarray(img, dtype=np.uint8)
+            self.agregar_bytes(img.tobytes(), clase, archivo, "raw", img.shape)
+            return
+        ok, buf = cv2.imencode(formato, img)
+        if not ok:
+            raise ValueError(f"No se pudo codificar la imagen: {archivo}")
+        self.agregar_bytes(buf.tobytes(), clase, archivo, formato)
+
+    def __len__(self):
+        return len(self.muestras)
+
+    def cerrar(self):
+        """Cierra el shard actual y escribe el indice."""
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+        indice = {
+            "clases": sorted({m["clase"] for m in self.muestras}),
+            "num_shards": self._shard + 1,
+            "muestras": self.muestras,
+        }
+        ruta_tmp = os.path.join(self.ruta_salida, NOMBRE_INDICE + ".tmp")
+        with open(ruta_tmp, "w", encoding="utf-8") as f:
+            json.dump(indice, f)
+        os.replace(ruta_tmp, os.path.join(self.ruta_salida, NOMBRE_INDICE))
+        return self.ruta_salida
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cerrar()
+
+
+class ArchivoShards:
+    """
+    Lector de un archivo de shards.
+
+    El acceso aleatorio hace un seek directo al desplazamiento de la
+    muestra; iterar() recorre los shards en orden leyendo cada uno de
+    forma secuencial, que es lo mas eficiente en sistemas de archivos
+    de red.
+    """
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(os.path.join(ruta, NOMBRE_INDICE), "r", encoding="utf-8") as f:
+            indice = json.load(f)
+        self.clases = indice["clases"]
+        self.num_shards = indice["num_shards"]
+        self.muestras = indice["muestras"]
+        self._abiertos = {}
+
+    def __len__(self):
+        return len(self.muestras)
+
+    def __getstate__(self):
+        # Los manejadores de archivo no se comparten entre procesos (DataLoader)
+        estado = self.__dict__.copy()
+        estado["_abiertos"] = {}
+        return estado
+
+    def _archivo(self, shard):
+        f = self._abiertos.get(shard)
+        if f is None:
+            f = open(os.path.join(self.ruta, PATRON_SHARD.format(shard)), "rb")
+            self._abiertos[shard] = f
+        return f
+
+    def leer_bytes(self, idx):
+        m = self.muestras[idx]
+        f = self._archivo(m["shard"])
+        f.seek(m["offset"])
+        return f.read(m["largo"])
+
+    def leer_imagen(self, idx, flags=cv2.IMREAD_UNCHANGED):
+        """Decodifica la muestra idx (respeta flags solo si esta codificada)."""
+        return decodificar(self.leer_bytes(idx), self.muestras[idx], flags)
+
+    def iterar(self, flags=cv2.IMREAD_UNCHANGED, decodificar_imagenes=True):
+        """
+        Recorre todas las muestras shard por shard.
+
+        Retorna:
+            generator: Tuplas (idx, clase, archivo, imagen o bytes)
+        """
+        orden = sorted(range(len(self.muestras)),
+                       key=lambda i: (self.muestras[i]["shard"], self.muestras[i]["offset"]))
+        shard_actual, datos_shard = -1, None
+        for idx in orden:
+            m = self.muestras[idx]
+            if m["shard"] != shard_actual:
+                shard_actual = m["shard"]
+                with open(os.path.join(self.ruta, PATRON_SHARD.format(shard_actual)), "rb") as f:
+                    datos_shard = memoryview(f.read())
+            datos = bytes(datos_shard[m["offset"]:m["offset"] + m["largo"]])
+            if decodificar_imagenes:
+                datos = decodificar(datos, m, flags)
+            yield idx, m["clase"], m["archivo"], datos
+
+    def cerrar(self):
+        for f in self._abiertos.values():
+            f.close()
+        self._abiertos = {}
+
+
+def decodificar(datos, muestra, flags=cv2.IMREAD_UNCHANGED):
+    """Convierte los bytes de una muestra en un arreglo numpy."""
+    if muestra["formato"] == "raw":
+        img = np.frombuffer(datos, dtype=np.uint8).reshape(muestra["forma"])
+        if flags == cv2.IMREAD_GRAYSCALE and img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return img
+    return cv2.imdecode(np.frombuffer(datos, dtype=np.uint8), flags)
+
+
+def es_archivo_shards(ruta):
+    """Indica si la ruta es un directorio de shards con indice."""
+    return os.path.isfile(os.path.join(ruta, NOMBRE_INDICE))
+
+
+def convertir_carpeta_a_shards(ruta_carpeta, ruta_salida=None, tam_max_shard=TAM_MAX_SHARD):
+    """
+    Construye un archivo de shards a partir de una carpeta clase/*.ext.
+
+    Los archivos se copian tal cual (sin decodificar ni recomprimir).
+
+    Parametros:
+        ruta_carpeta: Carpeta con subcarpetas por clase
+        ruta_salida: Directorio de salida (por defecto ruta_carpeta + SUFIJO_SHARDS)
+        tam_max_shard: Tamaño maximo de cada shard en bytes
+
+    Retorna:
+        str: Ruta del archivo de shards
+    """
+    if ruta_salida is None:
+        ruta_salida = ruta_carpeta.rstrip("/\\") + SUFIJO_SHARDS
+
+    clases = sorted(
+        d for d in os.listdir(ruta_carpeta)
+        if os.path.isdir(os.path.join(ruta_carpeta, d))
+    )
+
+    print(f"Convirtiendo {ruta_carpeta} a shards en {ruta_salida}")
+    with EscritorShards(ruta_salida, tam_max_shard) as escritor:
+        for clase in clases:
+            ruta_clase = os.path.join(ruta_carpeta, clase)
+            archivos = sorted(f for f in os.listdir(ruta_clase) if f.lower().endswith(EXT_VALIDAS))
+            for archivo in tqdm(archivos, desc=clase):
+                with open(os.path.join(ruta_clase, archivo), "rb") as f:
+                    escritor.agregar_bytes(f.read(), clase, archivo)
+    print(f"{len(escritor)} imagenes en {escritor._shard + 1} shards")
+    return ruta_salida
@@ -0,0 +1,3 @@
+"""
+Modulo de utilidades para la generacion de embeddings con redes preentrenadas.
+"""
@@ -0,0 +1,224 @@
+import os
+import json
+import hashlib
+
+import cv2
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+from tqdm import tqdm
+
+from src import instrumentacion as inst
+
+
+MEDIA_IMAGENET = (0.485, 0.456, 0.406)
+STD_IMAGENET = (0.229, 0.224, 0.225)
+# Redimension de esta ruta (la misma del paquete de inferencia y del
+# pipeline en memoria). No coincide bit a bit con la de torchvision sobre
+# PIL (Resize bilineal con antialias): en las imagenes grises de 256x256
+# llevadas a 224x224 la diferencia media es de 0.3-0.6 niveles de gris,
+# con maximos de ~26 en bordes finos, asi que los embeddings cambian
+# levemente respecto a los de la ruta PIL. VERSION_CACHE invalida las
+# caches escritas antes de registrar la redimension.
+REDIMENSION = "cv2_inter_area"
+VERSION_CACHE = 2
+
+
+def leer_gris_redimensionada(ruta_imagen, img_size):
+    """
+    Decodifica una imagen con OpenCV directamente en escala de grises
+    y la redimensiona a (img_size, img_size).
+
+    Las imagenes de datos_procesados ya son de un solo canal, por lo que
+    no se convierten a RGB aqui: la replica a 3 canales se hace una sola
+    vez sobre el lote ya en el dispositivo (ver normalizar_lote).
+
+    Parametros:
+        ruta_imagen: Ruta de la imagen
+        img_size: Lado de la imagen de salida
+
+    Retorna:
+        numpy array: Imagen uint8 de forma (img_size, img_size)
+    """
+    img = inst.leer_imagen(ruta_imagen, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError(f"No se pudo cargar la imagen: {ruta_imagen}")
+    return redimensionar_gris(img, img_size)
+
+
+def redimensionar_gris(img, img_size):
+    """Redimensiona una imagen gris uint8 a (img_size, img_size) (ver REDIMENSION)."""
+    if img.shape != (img_size, img_size):
+        img = cv2.resize(img, (img_size, img_size), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def firma_muestras(samples, img_size, firma_fuente=None):
+    """
+    Calcula una firma de la lista de muestras (ruta, tamaño, fecha de
+    modificacion y etiqueta) para invalidar la cache si algo cambia.
+
+    Si la fuente ya provee su propia firma (p. ej. un archivo de shards)
+    se usa esa en lugar de consultar cada archivo.
+    """
+    h = hashlib.sha1()
+    h.update(str(img_size).encode("utf-8"))
+    if firma_fuente is not None:
+        h.update(firma_fuente.encode("utf-8"))
+        return h.hexdigest()
+    for path, label in samples:
+        st = os.stat(path)
+        h.update(f"{path}|{st.st_size}|{st.st_mtime_ns}|{label}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def construir_cache(samples, ruta_cache, img_size, lector=None, firma_fuente=None):
+    """
+    Decodifica y redimensiona todas las muestras una sola vez y las guarda
+    en un archivo .npy uint8 de forma (N, img_size, img_size).
+
+    Junto al .npy se escribe un .json con la firma de las muestras para
+    detectar si la cache esta desactualizada.
+
+    Parametros:
+        samples: Lista de tuplas (ruta, etiqueta)
+        ruta_cache: Ruta del archivo .npy de salida
+        img_size: Lado de las imagenes almacenadas
+        lector: Funcion opcional idx -> imagen gris; por defecto se lee
+                la ruta de cada muestra con OpenCV
+        firma_fuente: Firma opcional provista por la fuente de datos
+
+    Retorna:
+        str: Firma de las muestras almacenadas
+    """
+    os.makedirs(os.path.dirname(ruta_cache) or ".", exist_ok=True)
+    firma = firma_muestras(samples, img_size, firma_fuente)
+
+    ruta_tmp = ruta_cache + ".tmp.npy"
+    arr = np.lib.format.open_memmap(
+        ruta_tmp, mode="w+", dtype=np.uint8,
+        shape=(len(samples), img_size, img_size)
+    )
+    print(f"[INFO] Construyendo cache de tensores: {ruta_cache}")
+    for i, (path, _) in enumerate(tqdm(samples)):
+        if lector is None:
+            arr[i] = leer_gris_redimensionada(path, img_size)
+        else:
+            arr[i] = redimensionar_gris(lector(i), img_size)
+    arr.flush()
+    del arr
+    os.replace(ruta_tmp, ruta_cache)
+
+    meta = {
+        "version": VERSION_CACHE,
+        "redimension": REDIMENSION,
+        "firma": firma,
+        "img_size": img_size,
+        "num_muestras": len(samples),
+        "archivos": [os.path.basename(p) for p, _ in samples],
+        "etiquetas": [int(l) for _, l in samples],
+    }
+    with open(_ruta_meta(ruta_cache), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return firma
+
+
+def _ruta_meta(ruta_cache):
+    return os.path.splitext(ruta_cache)[0] + ".json"
+
+
+def cache_valida(samples, ruta_cache, img_size, firma_fuente=None):
+    """Indica si la cache en disco corresponde a las muestras actuales."""
+    ruta_meta = _ruta_meta(ruta_cache)
+    if not (os.path.exists(ruta_cache) and os.path.exists(ruta_meta)):
+        return False
+    with open(ruta_meta, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != VERSION_CACHE:
+        return False
+    return meta.get("firma") == firma_muestras(samples, img_size, firma_fuente)
+
+
+class CacheTensorDataset(Dataset):
+    """
+    Dataset respaldado por una cache .npy de imagenes uint8 ya
+    redimensionadas. La primera vez decodifica todo; las epocas y
+    ejecuciones siguientes solo leen la cache mapeada en memoria.
+
+    Devuelve:
+      (tensor uint8 de forma (1, H, W), filename, label_idx)
+    """
+    def __init__(self, samples, ruta_cache: str, img_size: int = 224,
+                 lector=None, firma_fuente: str = None):
+        self.samples = list(samples)
+        self.ruta_cache = ruta_cache
+        self.img_size = img_size
+
+        if cache_valida(self.samples, ruta_cache, img_size, firma_fuente):
+            print(f"[INFO] Usando cache de tensores: {ruta_cache}")
+        else:
+            with inst.etapa("embeddings/cache", imagenes=len(self.samples)):
+                construir_cache(self.samples, ruta_cache, img_size, lector, firma_fuente)
+
+        self._arr = None
+
+    def _datos(self):
+        # Se abre de forma perezosa para que cada worker tenga su propio mmap
+        if self._arr is None:
+            self._arr = np.load(self.ruta_cache, mmap_mode="r")
+        return self._arr
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        path, label = self.samples[idx]
+        x = torch.from_numpy(np.array(self._datos()[idx], copy=True)).unsqueeze(0)
+        fname = os.path.basename(path)
+        return x, fname, label
+
+
+def normalizar_lote(xb, device, mean=MEDIA_IMAGENET, std=STD_IMAGENET):
+    """
+    Convierte un lote uint8 (N, 1, H, W) a float normalizado (N, 3, H, W).
+
+    La transferencia al dispositivo se hace en uint8 (4 veces menos datos)
+    y la replica del canal gris a RGB se hace una sola vez sobre el lote.
+    """
+    xb = xb.to(device, non_blocking=True).float().div_(255.0)
+    mean_t = torch.tensor(mean, device=xb.device).view(1, 3, 1, 1)
+    std_t = torch.tensor(std, device=xb.device).view(1, 3, 1, 1)
+    return (xb.expand(-1, 3, -1, -1) - mean_t) / std_t
+
+
+def crear_dataloader(
+    dataset,
+    batch_size: int = 32,
+    num_workers: int = 2,
+    pin_memory: bool = None,
+    persistent_workers: bool = False,
+    prefetch_factor: int = None,
+    worker_init_fn=None,
+):
+    """
+    Crea un DataLoader exponiendo pin_memory, persistent_workers y
+    prefetch_factor. pin_memory por defecto se activa solo si hay CUDA.
+    worker_init_fn configura cada worker (ver recursos.iniciar_trabajador).
+    """
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+
+    kwargs = {
+        "batch_size": batch_size,
+        "shuffle": False,
+        "num_workers": num_workers,
+        "pin_memory": pin_memory,
+    }
+    # persistent_workers y prefetch_factor solo son validos con workers
+    if num_workers > 0:
+        kwargs["persistent_workers"] = persistent_workers
+        kwargs["worker_init_fn"] = worker_init_fn
+        if prefetch_factor is not None:
+            kwargs["prefetch_factor"] = prefetch_factor
+
+    return DataLoader(dataset, **kwargs)
@@ -0,0 +1,169 @@
+import os
+import hashlib
+
+import cv2
+import numpy as np
+from torch.utils.data import Dataset
+from PIL import Image
+
+from src.datos.shards import ArchivoShards, es_archivo_shards, NOMBRE_INDICE
+from src.datos.duplicados import clave_imagen, representantes
+from src.datos.escritura import leer_imagen_guardada, FORMATOS
+
+
+class FolderImageDataset(Dataset):
+    """
+    Espera estructura:
+      root_dir/
+        clase1/*.bmp|png|jpg|npy
+        clase2/*.bmp|png|jpg|npy
+
+    o bien un directorio de shards (ver src/datos/shards.py), en cuyo caso
+    las imagenes se leen del archivo con un seek directo, sin os.listdir
+    ni un archivo por imagen.
+
+    Devuelve:
+      (tensor, filename, label_idx)
+    """
+    def __init__(self, root_dir: str, tfm):
+        self.root_dir = root_dir
+        self.tfm = tfm
+        self.exts = (".bmp", ".jpg", ".jpeg", ".png", ".webp", FORMATOS["raw"])
+        self.shards = None
+        self.todas = None
+        self.fuente = None
+
+        print(f"[INFO] Escaneando directorio: {root_dir}")
+
+        if es_archivo_shards(root_dir):
+            self._cargar_shards(root_dir)
+        else:
+            self._cargar_carpetas(root_dir)
+
+        if not self.samples:
+            raise RuntimeError(f"No se encontraron imágenes válidas en: {root_dir}")
+
+        print(f"[INFO] Total de imágenes cargadas: {len(self.samples)}")
+
+    def _cargar_carpetas(self, root_dir):
+        self.class_names = sorted([
+            d for d in os.listdir(root_dir)
+            if os.path.isdir(os.path.join(root_dir, d))
+        ])
+        if not self.class_names:
+            raise RuntimeError(f"No se encontraron subcarpetas de clase en: {root_dir}")
+
+        print(f"[INFO] Clases encontradas ({len(self.class_names)}): {self.class_names}")
+
+        self.class_to_idx = {c: i for i, c in enumerate(self.class_names)}
+        self.samples = []
+
+        for c in self.class_names:
+            cdir = os.path.join(root_dir, c)
+            archivos = [
+                f for f in os.listdir(cdir)
+                if f.lower().endswith(self.exts)
+            ]
+            print(f"[INFO] {c}: {len(archivos)} imágenes")
+            for f in sorted(archivos):
+                self.samples.append((os.path.join(cdir, f), self.class_to_idx[c]))
+
+    def _cargar_shards(self, root_dir):
+        self.shards = ArchivoShards(root_dir)
+        self.class_names = list(self.shards.clases)
+        print(f"[INFO] Archivo de shards con {self.shards.num_shards} shards")
+        print(f"[INFO] Clases encontradas ({len(self.class_names)}): {self.class_names}")
+
+        self.class_to_idx = {c: i for i, c in enumerate(self.class_names)}
+        # Mismo orden que con carpetas: por clase y luego por nombre
+        orden = sorted(range(len(self.shards)),
+                       key=lambda i: (self.shards.muestras[i]["clase"], self.shards.muestras[i]["archivo"]))
+        self._indices = orden
+        self.samples = [
+            (os.path.join(root_dir, self.shards.muestras[i]["clase"], self.shards.muestras[i]["archivo"]),
+             self.class_to_idx[self.shards.muestras[i]["clase"]])
+            for i in orden
+        ]
+
+    def __len__(self):
+        return len(self.samples)
+
+    def omitir_duplicados(self, grupos):
+        """
+        Deja en samples una sola copia de cada grupo de duplicados (ver
+        src/datos/duplicados.py); expandir() repone las demas despues.
+
+        Retorna:
+            int: Imagenes omitidas
+        """
+        if not grupos:
+            return 0
+        claves = [clave_imagen(self.class_names[label], os.path.basename(path))
+                  for path, label in self.samples]
+        unicos, fuente = representantes(claves, grupos)
+        if len(unicos) == len(self.samples):
+            return 0
+        # fuente apunta a posiciones de la lista completa; se pasan a la filtrada
+        posicion = np.empty(len(self.samples), dtype=np.int64)
+        posicion[unicos] = np.arange(len(unicos))
+        self.todas = self.samples
+        self.fuente = posicion[fuente]
+        self.samples = [self.samples[i] for i in unicos]
+        if self.shards is not None:
+            self._indices = [self._indices[i] for i in unicos]
+        print(f"[INFO] Duplicados omitidos: {len(self.todas) - len(self.samples)}")
+        return len(self.todas) - len(self.samples)
+
+    def expandir(self, X):
+        """
+        Filas de X (una por muestra de samples, en orden) para todas las
+        imagenes, copiando la de la canonica en cada duplicado.
+
+        Retorna:
+            tuple: (X, nombres de archivo, etiquetas) de la lista completa
+        """
+        completas = self.todas if self.todas is not None else self.samples
+        if self.fuente is not None:
+            X = X[self.fuente]
+        return X, [os.path.basename(p) for p, _ in completas], [l for _, l in completas]
+
+    def leer_gris(self, idx):
+        """Decodifica la imagen idx en escala de grises (uint8)."""
+        if self.shards is not None:
+            img = self.shards.leer_imagen(self._indices[idx], cv2.IMREAD_GRAYSCALE)
+        else:
+            img = leer_imagen_guardada(self.samples[idx][0], cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError(f"No se pudo cargar la imagen: {self.samples[idx][0]}")
+        return img
+
+    def firma(self):
+        """
+        Firma del contenido para la cache de tensores, o None si debe
+        calcularse a partir de los archivos individuales.
+        """
+        if self.shards is None:
+            return None
+        h = hashlib.sha1()
+        st = os.stat(os.path.join(self.root_dir, NOMBRE_INDICE))
+        h.update(f"{st.st_size}|{st.st_mtime_ns}\n".encode("utf-8"))
+        for i in self._indices:
+            m = self.shards.muestras[i]
+            h.update(f"{m['shard']}|{m['offset']}|{m['largo']}|{m['clase']}|{m['archivo']}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def __getitem__(self, idx):
+        path, label = self.samples[idx]
+        if self.shards is not None:
+            img = self.shards.leer_imagen(self._indices[idx], cv2.IMREAD_COLOR)
+            if img.ndim == 3:
+                img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            img = Image.fromarray(img).convert("RGB")
+        elif path.endswith(FORMATOS["raw"]):
+            # Formato 'raw' de los generadores: arreglo uint8 sin codificar
+            img = Image.fromarray(leer_imagen_guardada(path)).convert("RGB")
+        else:
+            img = Image.open(path).convert("RGB")
+        x = self.tfm(img)
+        fname = os.path.basename(path)
+        return x, fname, label
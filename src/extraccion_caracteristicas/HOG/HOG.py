@@ -1,5 +1,4 @@
 import cv2
-from skimage.feature import hog
 
 def extraer_hog_imagen(
     ruta_imagen,
@@ -10,6 +9,20 @@ def extraer_hog_imagen(
     if imagen is None:
         raise ValueError(f"No se pudo cargar la imagen: {ruta_imagen}")
 
+    return calcular_hog(imagen, resize)
+
+
+def calcular_hog(
+    imagen,
+    resize=(128, 64)
+):
+    """
+    Calcula el descriptor HOG de una imagen en escala de grises ya cargada
+    en memoria (sin pasar por disco).
+    """
+    # skimage se importa al primer uso para no cargarlo en etapas sin HOG
+    from skimage.feature import hog
+
     imagen = cv2.resize(imagen, resize)
 
     caracteristicas = hog(
@@ -22,4 +35,4 @@ def extraer_hog_imagen(
         feature_vector=True
     )
 
-    return caracteristicas
\ No newline at end of file
+    return caracteristicas
@@ -16,10 +16,26 @@ def extraer_descriptores_imagen(ruta_imagen, sift):
     if imagen is None:
         raise ValueError(f"No se pudo cargar la imagen: {ruta_imagen}")
 
+    return calcular_descriptores(imagen, sift)
+
+
+def calcular_descriptores(imagen, sift):
+    """
+    Calcula los descriptores SIFT de una imagen en escala de grises
+    ya cargada en memoria.
+    """
     _, descriptores = sift.detectAndCompute(imagen, None)
     return descriptores
 
 
+def calcular_puntos_descriptores(imagen, sift):
+    """
+    Como calcular_descriptores, pero devuelve tambien los puntos clave
+    (para guardarlos en el almacen de descriptores).
+    """
+    return sift.detectAndCompute(imagen, None)
+
+
 def resumir_descriptores(descriptores, dimension=128):
     """
     SIFT genera descriptores de 128 dimensiones
@@ -0,0 +1,197 @@
+"""
+Almacen de descriptores SIFT por punto clave.
+
+El CSV de SIFT solo guarda el vector medio de cada imagen; para probar
+otra codificacion (bolsa de palabras, VLAD, Fisher) habia que volver a
+detectar, que es la parte cara. Aqui se guardan todos los descriptores
+de todas las imagenes en un solo arreglo contiguo y un indice de
+desplazamientos:
+
+    ruta/
+      descriptores.bin   (M, 128) uint8 o float32, filas de todas las imagenes
+      puntos.bin         (M, 5) float32: x, y, tamaño, angulo, respuesta
+      offsets.npy        (N + 1,) int64: la imagen i ocupa [offsets[i], offsets[i+1])
+      indice.json        dtype, dimension, total y clase/archivo de cada imagen
+
+Los descriptores de OpenCV son flotantes con valores enteros en 0..255,
+asi que uint8 no pierde informacion y ocupa la cuarta parte.
+
+La lectura abre los dos .bin con memmap: recorrer o codificar el
+conjunto no lo carga entero en memoria.
+"""
+import os
+import json
+
+import numpy as np
+
+
+NOMBRE_INDICE = "indice.json"
+COLUMNAS_PUNTOS = ("x", "y", "tamano", "angulo", "respuesta")
+
+
+def puntos_a_arreglo(puntos_clave):
+    """Geometria de una lista de cv2.KeyPoint como arreglo (M, 5) float32."""
+    return np.array(
+        [(p.pt[0], p.pt[1], p.size, p.angle, p.response) for p in puntos_clave],
+        dtype=np.float32,
+    ).reshape(-1, len(COLUMNAS_PUNTOS))
+
+
+class EscritorDescriptores:
+    """
+    Escribe los descriptores de cada imagen a medida que se calculan.
+
+    Parametros:
+        ruta_salida: Carpeta del almacen
+        dtype: 'uint8' (sin perdida para SIFT de OpenCV) o 'float32'
+        dimension: Largo de cada descriptor
+    """
+    def __init__(self, ruta_salida, dtype="uint8", dimension=128):
+        if dtype not in ("uint8", "float32"):
+            raise ValueError(f"dtype no soportado: {dtype}")
+        self.ruta_salida = ruta_salida
+        self.dtype = np.dtype(dtype)
+        self.dimension = dimension
+        self.clases = []
+        self.archivos = []
+        self._offsets = [0]
+        os.makedirs(ruta_salida, exist_ok=True)
+        self._desc = open(os.path.join(ruta_salida, "descriptores.bin.tmp"), "wb")
+        self._puntos = open(os.path.join(ruta_salida, "puntos.bin.tmp"), "wb")
+
+    def agregar(self, descriptores, puntos, clase, archivo):
+        """
+        Agrega los descriptores de una imagen (None o vacio si no tiene).
+
+        Parametros:
+            descriptores: (m, dimension) de detectAndCompute
+            puntos: Lista de cv2.KeyPoint o arreglo (m, 5)
+            clase: Nombre de la clase
+            archivo: Nombre de archivo de la imagen
+        """
+        cantidad = 0
+        if descriptores is not None and len(descriptores):
+            if not isinstance(puntos, np.ndarray):
+                puntos = puntos_a_arreglo(puntos)
+            if len(puntos) != len(descriptores):
+                raise ValueError(f"{archivo}: {len(puntos)} puntos para {len(descriptores)} descriptores")
+            if self.dtype == np.uint8:
+                descriptores = np.clip(np.rint(descriptores), 0, 255)
+            self._desc.write(np.ascontiguousarray(descriptores, dtype=self.dtype).tobytes())
+            self._puntos.write(np.ascontiguousarray(puntos, dtype=np.float32).tobytes())
+            cantidad = len(descriptores)
+        self._offsets.append(self._offsets[-1] + cantidad)
+        self.clases.append(clase)
+        self.archivos.append(archivo)
+
+    def __len__(self):
+        return len(self.archivos)
+
+    def cerrar(self):
+        """Cierra los archivos, escribe el indice y devuelve la ruta."""
+        self._desc.close()
+        self._puntos.close()
+        for nombre in ("descriptores.bin", "puntos.bin"):
+            os.replace(os.path.join(self.ruta_salida, nombre + ".tmp"),
+                       os.path.join(self.ruta_salida, nombre))
+        with open(os.path.join(self.ruta_salida, "offsets.npy.tmp"), "wb") as f:
+            np.save(f, np.array(self._offsets, dtype=np.int64))
+        os.replace(os.path.join(self.ruta_salida, "offsets.npy.tmp"),
+                   os.path.join(self.ruta_salida, "offsets.npy"))
+
+        indice = {
+            "dtype": self.dtype.name,
+            "dimension": self.dimension,
+            "total": self._offsets[-1],
+            "columnas_puntos": list(COLUMNAS_PUNTOS),
+            "clases": self.clases,
+            "archivos": self.archivos,
+        }
+        ruta_tmp = os.path.join(self.ruta_salida, NOMBRE_INDICE + ".tmp")
+        with open(ruta_tmp, "w", encoding="utf-8") as f:
+            json.dump(indice, f)
+        os.replace(ruta_tmp, os.path.join(self.ruta_salida, NOMBRE_INDICE))
+        return self.ruta_salida
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.cerrar()
+        else:
+            self._desc.close()
+            self._puntos.close()
+
+
+class AlmacenDescriptores:
+    """
+    Lector del almacen con memmap.
+
+    Atributos:
+        descriptores: memmap (M, dimension) con todas las filas
+        puntos: memmap (M, 5)
+        offsets: (N + 1,) desplazamientos por imagen
+        clases, archivos: Listas de largo N
+    """
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(os.path.join(ruta, NOMBRE_INDICE), "r", encoding="utf-8") as f:
+            indice = json.load(f)
+        self.clases = indice["clases"]
+        self.archivos = indice["archivos"]
+        self.offsets = np.load(os.path.join(ruta, "offsets.npy"))
+        total, dimension = indice["total"], indice["dimension"]
+        self.descriptores = self._abrir("descriptores.bin", indice["dtype"], (total, dimension))
+        self.puntos = self._abrir("puntos.bin", "float32", (total, len(indice["columnas_puntos"])))
+
+    def _abrir(self, nombre, dtype, forma):
+        # np.memmap no acepta archivos vacios
+        if forma[0] == 0:
+            return np.empty(forma, dtype=dtype)
+        return np.memmap(os.path.join(self.ruta, nombre), dtype=dtype, mode="r", shape=forma)
+
+    def __len__(self):
+        return len(self.archivos)
+
+    def cantidades(self):
+        """Numero de descriptores de cada imagen."""
+        return np.diff(self.offsets)
+
+    def imagen(self, i):
+        """
+        Retorna:
+            tuple: (descriptores (m, d), puntos (m, 5), clase, archivo); los
+                   arreglos son vistas del memmap
+        """
+        inicio, fin = self.offsets[i], self.offsets[i + 1]
+        return self.descriptores[inicio:fin], self.puntos[inicio:fin], self.clases[i], self.archivos[i]
+
+    def iterar(self):
+        for i in range(len(self)):
+            yield self.imagen(i)
+
+    def imagen_de_cada_descriptor(self):
+        """Indice de imagen (M,) de cada fila, para agrupar o muestrear."""
+        return np.repeat(np.arange(len(self)), self.cantidades())
+
+    def medias(self, bloque=262144):
+        """
+        Vector medio de cada imagen (el resumen del CSV de SIFT) sin volver
+        a detectar, recorriendo el memmap por bloques.
+
+        Retorna:
+            np.ndarray: (N, d) float64; ceros en las imagenes sin descriptores
+        """
+        cantidades = self.cantidades()
+        imagen = self.imagen_de_cada_descriptor()
+        sumas = np.zeros((len(self), self.descriptores.shape[1]), dtype=np.float64)
+        for inicio in range(0, len(imagen), bloque):
+            fin = min(inicio + bloque, len(imagen))
+            # Las filas estan ordenadas por imagen: una suma por tramo
+            tramo = imagen[inicio:fin]
+            cortes = np.flatnonzero(np.r_[True, tramo[1:] != tramo[:-1]])
+            sumas[tramo[cortes]] += np.add.reduceat(
+                self.descriptores[inicio:fin].astype(np.float64), cortes, axis=0
+            )
+        return sumas / np.maximum(cantidades, 1)[:, None]
@@ -0,0 +1,220 @@
+"""
+Fusion de las familias de caracteristicas en una sola matriz.
+
+Cada familia (momentos, Hu, Zernike, forma, SIFT, HOG y opcionalmente los
+embeddings ResNet50) se guarda en su propio archivo y con su propio
+conjunto de filas: Zernike omite las mascaras donde fallo, SIFT las
+imagenes sin descriptores. Aqui se alinean por identificador de imagen
+('clase/archivo'), se conservan solo las imagenes presentes en todas
+las familias y se estandariza cada columna.
+
+Salida en caracteristicas_extraidas/fusion/<dataset>/:
+    X_fusion.npy   float32 (N, D) ya escalada
+    y_true.npy     etiquetas (N,)
+    classes.txt    nombres de clase
+    ids.txt        'clase/archivo' de cada fila
+    escalado.npz   columnas, media y escala del ajuste
+
+El escalado guardado se aplica con EscaladoFusion, que solo usa numpy:
+el clasificador en vivo arma el vector de una imagen con los mismos
+diccionarios que producen los extractores y obtiene exactamente la
+misma transformacion.
+"""
+import os
+import csv
+
+import numpy as np
+
+from src.agrupamiento.conjuntos import ruta_conjunto, COLUMNAS_NO_NUMERICAS
+
+
+FAMILIAS = ("momentos", "hu", "zernike", "forma", "sift", "hog")
+RUTA_FUSION = "caracteristicas_extraidas/fusion"
+
+
+def id_imagen(clase, archivo, objeto=None):
+    # Las filas de scripts/extraer_objetos.py agregan el numero de objeto
+    if objeto is None:
+        return f"{clase}/{archivo}"
+    return f"{clase}/{archivo}#{objeto}"
+
+
+def leer_familia(dataset, familia):
+    """
+    Lee una familia sin pandas.
+
+    Retorna:
+        tuple: (ids, columnas, X float32 (N, D)) o None si el archivo no
+               existe o no tiene la columna 'archivo'
+    """
+    ruta = ruta_conjunto(dataset, familia)
+    if not os.path.isfile(ruta):
+        return None
+
+    if ruta.endswith(".npy"):
+        carpeta = os.path.dirname(ruta)
+        X = np.load(ruta).astype(np.float32, copy=False)
+        y = np.load(os.path.join(carpeta, "y_true.npy"))
+        with open(os.path.join(carpeta, "classes.txt"), "r", encoding="utf-8") as f:
+            clases = [linea.strip() for linea in f if linea.strip()]
+        ruta_nombres = os.path.join(carpeta, "filenames.txt")
+        if not os.path.isfile(ruta_nombres):
+            return None
+        with open(ruta_nombres, "r", encoding="utf-8") as f:
+            nombres = [linea.strip() for linea in f if linea.strip()]
+        ids = [id_imagen(clases[c], n) for c, n in zip(y, nombres)]
+        columnas = [f"{familia}:{i}" for i in range(X.shape[1])]
+        return ids, columnas, X
+
+    with open(ruta, "r", newline="", encoding="utf-8") as f:
+        lector = csv.reader(f)
+        encabezado = next(lector)
+        if "archivo" not in encabezado:
+            print(f"{ruta} no tiene columna 'archivo'; vuelva a extraer las caracteristicas")
+            return None
+        i_clase = encabezado.index("clase")
+        i_archivo = encabezado.index("archivo")
+        i_objeto = encabezado.index("objeto") if "objeto" in encabezado else None
+        numericas = [i for i, c in enumerate(encabezado) if c not in COLUMNAS_NO_NUMERICAS]
+        ids, valores = [], []
+        for fila in lector:
+            objeto = fila[i_objeto] if i_objeto is not None else None
+            ids.append(id_imagen(fila[i_clase], fila[i_archivo], objeto))
+            valores.append([fila[i] for i in numericas])
+
+    X = np.array(valores, dtype=np.float32).reshape(len(ids), len(numericas))
+    columnas = [f"{familia}:{encabezado[i]}" for i in numericas]
+    return ids, columnas, X
+
+
+class EscaladoFusion:
+    """
+    Estandarizacion por columna (x - media) / escala ajustada sobre la
+    matriz fusionada.
+
+    Parametros:
+        columnas: Nombres 'familia:columna' en el orden de la matriz
+        media: Media por columna
+        escala: Desviacion estandar por columna (1 donde es constante)
+    """
+    def __init__(self, columnas, media, escala):
+        self.columnas = list(columnas)
+        self.media = np.asarray(media, dtype=np.float32)
+        self.escala = np.asarray(escala, dtype=np.float32)
+        self._posiciones = {c: i for i, c in enumerate(self.columnas)}
+
+    @classmethod
+    def ajustar(cls, columnas, X):
+        media = X.mean(axis=0, dtype=np.float64)
+        escala = X.std(axis=0, dtype=np.float64)
+        escala[escala < 1e-12] = 1.0
+        return cls(columnas, media, escala)
+
+    def transformar(self, X):
+        """Escala una matriz (N, D) con las columnas en el orden del ajuste."""
+        X = np.asarray(X, dtype=np.float32)
+        return (X - self.media) / self.escala
+
+    def vector(self, filas):
+        """
+        Arma y escala el vector de una imagen a partir de los diccionarios
+        de cada familia (los mismos que generan los extractores).
+
+        Parametros:
+            filas: {familia: {columna: valor}}; 'clase' y 'archivo' se ignoran
+
+        Retorna:
+            np.ndarray: Vector float32 (D,)
+        """
+        v = np.full(len(self.columnas), np.nan, dtype=np.float32)
+        for familia, fila in filas.items():
+            for columna, valor in fila.items():
+                pos = self._posiciones.get(f"{familia}:{columna}")
+                if pos is not None:
+                    v[pos] = valor
+        if np.isnan(v).any():
+            faltantes = [self.columnas[i] for i in np.flatnonzero(np.isnan(v))[:5]]
+            raise ValueError(f"Faltan columnas para el vector: {faltantes}...")
+        return (v - self.media) / self.escala
+
+    def guardar(self, ruta):
+        ruta_tmp = ruta + ".tmp.npz"
+        np.savez(ruta_tmp, columnas=np.array(self.columnas), media=self.media, escala=self.escala)
+        os.replace(ruta_tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with np.load(ruta) as datos:
+            return cls(datos["columnas"].tolist(), datos["media"], datos["escala"])
+
+
+def fusionar(dataset, familias=FAMILIAS):
+    """
+    Alinea las familias disponibles por imagen y concatena sus columnas.
+
+    Retorna:
+        dict: ids, columnas, X float32 sin escalar, familias usadas y
+              cuantas imagenes se descartaron por familia
+    """
+    leidas = {}
+    for familia in familias:
+        datos = leer_familia(dataset, familia)
+        if datos is not None:
+            leidas[familia] = datos
+    if not leidas:
+        return None
+
+    # Orden estable: el de la primera familia, solo ids presentes en todas
+    comunes = set.intersection(*(set(ids) for ids, _, _ in leidas.values()))
+    primera = next(iter(leidas.values()))[0]
+    ids = [i for i in dict.fromkeys(primera) if i in comunes]
+
+    bloques, columnas, descartadas = [], [], {}
+    for familia, (ids_familia, cols, X) in leidas.items():
+        posicion = {i: p for p, i in enumerate(ids_familia)}
+        bloques.append(X[[posicion[i] for i in ids]])
+        columnas.extend(cols)
+        descartadas[familia] = len(set(ids_familia)) - len(ids)
+
+    X = np.hstack(bloques) if bloques else np.empty((0, 0), dtype=np.float32)
+    validas = np.isfinite(X).all(axis=1)
+    if not validas.all():
+        X = X[validas]
+        ids = [i for i, v in zip(ids, validas) if v]
+
+    return {
+        "ids": ids,
+        "columnas": columnas,
+        "X": np.ascontiguousarray(X, dtype=np.float32),
+        "familias": list(leidas),
+        "descartadas": descartadas,
+        "no_finitas": int((~validas).sum()),
+    }
+
+
+def guardar_fusion(dataset, fusion, ruta_base=RUTA_FUSION):
+    """
+    Ajusta el escalado y guarda la matriz, el indice y los parametros.
+
+    Retorna:
+        str: Carpeta de salida
+    """
+    carpeta = os.path.join(ruta_base, dataset)
+    os.makedirs(carpeta, exist_ok=True)
+
+    escalado = EscaladoFusion.ajustar(fusion["columnas"], fusion["X"])
+    X = escalado.transformar(fusion["X"])
+    clases = sorted({i.split("/", 1)[0] for i in fusion["ids"]})
+    indice = {c: n for n, c in enumerate(clases)}
+    y = np.array([indice[i.split("/", 1)[0]] for i in fusion["ids"]], dtype=np.int64)
+
+    for nombre, arreglo in (("X_fusion.npy", X), ("y_true.npy", y)):
+        ruta = os.path.join(carpeta, nombre)
+        with open(ruta + ".tmp", "wb") as f:
+            np.save(f, arreglo)
+        os.replace(ruta + ".tmp", ruta)
+    for nombre, lineas in (("classes.txt", clases), ("ids.txt", fusion["ids"])):
+        with open(os.path.join(carpeta, nombre), "w", encoding="utf-8") as f:
+            f.writelines(linea + "\n" for linea in lineas)
+    escalado.guardar(os.path.join(carpeta, "escalado.npz"))
+    return carpeta
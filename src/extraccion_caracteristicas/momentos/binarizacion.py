@@ -1,105 +1,196 @@
 import cv2
 import numpy as np
 
+from src.instrumentacion import medir
 
-def binarizar_espermatozoides(img, size=(256, 256)):
-    """
-    Binariza imagenes de espermatozoides con segmentacion avanzada.
-    
-    Segmenta cabeza y cola del espermatozoide, eliminando ruido y
-    preservando estructuras finas. Usa umbralizacion adaptativa,
-    deteccion de bordes y seleccion del componente mas cercano al centro.
-    
-    Parametros:
-        img: Imagen en formato BGR o escala de grises (numpy array)
-        size: Tamaño de salida (ancho, alto) para redimensionar
-        
-    Retorna:
-        numpy array: Imagen binarizada (valores 0 y 255) o None si falla
-    """
-    if img is None:
-        return None
 
-    # A. Redimensionar
-    img_resized = cv2.resize(img, size)
-    h, w = size
-    centro_img = (w // 2, h // 2)
+# Parametros de la segmentacion. Los valores por defecto son los de
+# siempre; src/preprocesamiento/barrido.py los recorre en rejilla.
+PARAMETROS_ESPERMATOZOIDES = {
+    "k_mediana": 3,       # suavizado ligero (preserva cola)
+    "canny_bajo": 20,     # bordes finos
+    "canny_alto": 60,
+    "k_dilatacion": 2,
+    "delta_umbral": 12,   # umbral sensible: fondo - delta
+    "k_cierre": 3,
+    "k_apertura": 2,
+    "area_min": 200,      # area minima del componente elegido
+}
+PARAMETROS_RPS = {
+    "k_gauss": 5,
+    "k_apertura": 5,
+}
 
-    # B. Escala de grises
-    if len(img_resized.shape) == 3:
-        gris = cv2.cvtColor(img_resized, cv2.COLOR_BGR2GRAY)
-    else:
-        gris = img_resized.copy()
 
-    # C. Suavizado ligero (preserva cola)
-    gris_suave = cv2.medianBlur(gris, 3)
+def _a_gris(img, p):
+    if len(img.shape) == 3:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return img.copy()
+
+
+def _mediana(gris, p):
+    return cv2.medianBlur(gris, p["k_mediana"])
+
+
+def _bordes(gris_suave, p):
+    bordes = cv2.Canny(gris_suave, p["canny_bajo"], p["canny_alto"])
+    k = p["k_dilatacion"]
+    bordes = cv2.dilate(bordes, np.ones((k, k), np.uint8), iterations=1)
+    return gris_suave, bordes
 
-    # D. Estimacion de fondo
-    fondo = np.median(gris_suave)
 
-    # E. Umbral sensible (cola)
+def _umbral_fondo(entrada, p):
+    gris_suave, bordes = entrada
+    # Estimacion de fondo
+    fondo = np.median(gris_suave)
     _, binaria = cv2.threshold(
         gris_suave,
-        fondo - 12,
+        fondo - p["delta_umbral"],
         255,
         cv2.THRESH_BINARY_INV
     )
+    return cv2.bitwise_or(binaria, bordes)
 
-    # F. Bordes finos
-    bordes = cv2.Canny(gris_suave, 20, 60)
-    bordes = cv2.dilate(bordes, np.ones((2, 2), np.uint8), iterations=1)
 
-    # G. Combinacion
-    combinado = cv2.bitwise_or(binaria, bordes)
+def _cierre(binaria, p):
+    k = p["k_cierre"]
+    return cv2.morphologyEx(binaria, cv2.MORPH_CLOSE, np.ones((k, k), np.uint8))
 
-    # H. Operaciones morfologicas
-    combinado = cv2.morphologyEx(
-        combinado,
-        cv2.MORPH_CLOSE,
-        np.ones((3, 3), np.uint8)
-    )
 
-    combinado = cv2.morphologyEx(
-        combinado,
-        cv2.MORPH_OPEN,
-        np.ones((2, 2), np.uint8)
-    )
+def _apertura(binaria, p):
+    k = p["k_apertura"]
+    return cv2.morphologyEx(binaria, cv2.MORPH_OPEN, np.ones((k, k), np.uint8))
 
-    # I. Seleccion del componente principal
+
+def _resta_canales(img, p):
+    # Fondo verde tiene G alto, piel tiene R alto
+    b, g, r = cv2.split(img)
+    return cv2.subtract(g, r)
+
+
+def _gauss(diferencia, p):
+    k = p["k_gauss"]
+    return cv2.GaussianBlur(diferencia, (k, k), 0)
+
+
+def _otsu_invertido(suave, p):
+    _, binaria = cv2.threshold(suave, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Queremos la mano blanca
+    return cv2.bitwise_not(binaria)
+
+
+# Cadenas de etapas (nombre, parametros que usa, funcion(entrada, p)).
+# Las etapas baratas y muy reutilizables van primero para que el barrido
+# comparta sus resultados entre combinaciones.
+ETAPAS_ESPERMATOZOIDES = (
+    ("gris", (), _a_gris),
+    ("mediana", ("k_mediana",), _mediana),
+    ("bordes", ("canny_bajo", "canny_alto", "k_dilatacion"), _bordes),
+    ("umbral", ("delta_umbral",), _umbral_fondo),
+    ("cierre", ("k_cierre",), _cierre),
+    ("apertura", ("k_apertura",), _apertura),
+)
+ETAPAS_RPS = (
+    ("resta_canales", (), _resta_canales),
+    ("gauss", ("k_gauss",), _gauss),
+    ("otsu", (), _otsu_invertido),
+    ("apertura", ("k_apertura",), _apertura),
+)
+
+
+def aplicar_etapas(img, etapas, parametros):
+    """Ejecuta una cadena de etapas sobre la imagen."""
+    salida = img
+    for _, _, funcion in etapas:
+        salida = funcion(salida, parametros)
+    return salida
+
+
+def _primer_plano_espermatozoides(img, parametros=None):
+    """Mascara de primer plano (todas las celulas) antes de elegir componentes."""
+    p = {**PARAMETROS_ESPERMATOZOIDES, **(parametros or {})}
+    return aplicar_etapas(img, ETAPAS_ESPERMATOZOIDES, p)
+
+
+def _primer_plano_rps(img, parametros=None):
+    """Mascara de primer plano (piel sobre fondo verde) antes de elegir componentes."""
+    p = {**PARAMETROS_RPS, **(parametros or {})}
+    return aplicar_etapas(img, ETAPAS_RPS, p)
+
+
+def componente_central(primer_plano, area_min=200):
+    """
+    Componente de al menos area_min pixeles mas cercano al centro.
+
+    Retorna:
+        tuple: (mascara 0/255, numero de componentes del primer plano)
+    """
     num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
-        combinado,
+        primer_plano,
         connectivity=8
     )
+    if num_labels <= 1:
+        return primer_plano, 0
+
+    h, w = primer_plano.shape
+    mascara_final = np.zeros_like(primer_plano)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    distancias = np.hypot(centroids[1:, 0] - w // 2, centroids[1:, 1] - h // 2)
+    distancias[areas < area_min] = np.inf
+    if np.isfinite(distancias).any():
+        mascara_final[labels == np.argmin(distancias) + 1] = 255
+    return mascara_final, num_labels - 1
 
-    mascara_final = np.zeros_like(combinado)
 
-    if num_labels > 1:
-        mejor_idx = -1
-        mejor_distancia = float("inf")
+def componente_mayor(primer_plano, area_min=0):
+    """
+    Componente de mayor area (si tiene al menos area_min pixeles).
 
-        for i in range(1, num_labels):
-            area = stats[i, cv2.CC_STAT_AREA]
-            if area < 200:
-                continue
+    Retorna:
+        tuple: (mascara 0/255, numero de componentes del primer plano)
+    """
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(primer_plano, connectivity=8)
+    if num_labels <= 1:
+        return primer_plano, 0
 
-            cx, cy = centroids[i]
-            distancia = np.sqrt(
-                (cx - centro_img[0]) ** 2 +
-                (cy - centro_img[1]) ** 2
-            )
+    mascara_final = np.zeros_like(primer_plano)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    idx_mayor = np.argmax(areas)
+    if areas[idx_mayor] >= area_min:
+        mascara_final[labels == idx_mayor + 1] = 255
+    return mascara_final, num_labels - 1
 
-            if distancia < mejor_distancia:
-                mejor_distancia = distancia
-                mejor_idx = i
 
-        if mejor_idx > 0:
-            mascara_final[labels == mejor_idx] = 255
-    else:
-        mascara_final = combinado
+@medir("preprocesamiento/binarizar_espermatozoides")
+def binarizar_espermatozoides(img, size=(256, 256)):
+    """
+    Binariza imagenes de espermatozoides con segmentacion avanzada.
+    
+    Segmenta cabeza y cola del espermatozoide, eliminando ruido y
+    preservando estructuras finas. Usa umbralizacion adaptativa,
+    deteccion de bordes y seleccion del componente mas cercano al centro.
+    
+    Parametros:
+        img: Imagen en formato BGR o escala de grises (numpy array)
+        size: Tamaño de salida (ancho, alto) para redimensionar
+        
+    Retorna:
+        numpy array: Imagen binarizada (valores 0 y 255) o None si falla
+    """
+    if img is None:
+        return None
 
+    # A. Redimensionar
+    img_resized = cv2.resize(img, size)
+
+    combinado = _primer_plano_espermatozoides(img_resized)
+
+    # I. Seleccion del componente principal
+    mascara_final, _ = componente_central(combinado, PARAMETROS_ESPERMATOZOIDES["area_min"])
     return mascara_final
 
 
+@medir("preprocesamiento/binarizar_rps")
 def binarizar_rps(img, size=(256, 256)):
     """
     Binariza imagenes de piedra-papel-tijera con segmentacion de mano.
@@ -121,40 +212,10 @@ def binarizar_rps(img, size=(256, 256)):
     # A. Redimensionar
     img_resized = cv2.resize(img, size)
 
-    # B. Separacion de canales
-    b, g, r = cv2.split(img_resized)
-
-    # C. Aritmetica de canales (fondo verde tiene G alto, piel tiene R alto)
-    diferencia = cv2.subtract(g, r)
-
-    # D. Filtrado espacial
-    suave = cv2.GaussianBlur(diferencia, (5, 5), 0)
-
-    # E. Umbralizacion de Otsu
-    _, binaria = cv2.threshold(suave, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-
-    # F. Inversion (queremos la mano blanca)
-    binaria = cv2.bitwise_not(binaria)
-
-    # G. Limpieza morfologica
-    kernel = np.ones((5, 5), np.uint8)
-    binaria = cv2.morphologyEx(binaria, cv2.MORPH_OPEN, kernel)
+    binaria = _primer_plano_rps(img_resized)
 
     # H. Seleccion del componente principal
-    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
-        binaria, 
-        connectivity=8
-    )
-
-    mascara_final = np.zeros_like(binaria)
-    
-    if num_labels > 1:
-        areas = stats[1:, cv2.CC_STAT_AREA]
-        idx_mayor = np.argmax(areas) + 1
-        mascara_final[labels == idx_mayor] = 255
-    else:
-        mascara_final = binaria
-
+    mascara_final, _ = componente_mayor(binaria)
     return mascara_final
 
 
@@ -186,3 +247,68 @@ def binarizar_imagen(img, metodo='espermatozoides'):
             img_gris = img.copy()
         _, img_bin = cv2.threshold(img_gris, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
         return img_bin
+
+
+@medir("preprocesamiento/segmentar_objetos")
+def segmentar_objetos(img, metodo='espermatozoides', size=None, area_min=200, area_max=None,
+                      descartar_borde=False):
+    """
+    Segmenta todos los objetos de una imagen con varias celulas (o manos).
+
+    Usa la misma mascara de primer plano que binarizar_espermatozoides o
+    binarizar_rps, pero en vez de quedarse con un solo componente
+    conserva todos los que cumplen los filtros de area.
+
+    Parametros:
+        img: Imagen en formato BGR o escala de grises (numpy array)
+        metodo: 'espermatozoides' o 'rps'
+        size: Tamaño (ancho, alto) para redimensionar; None conserva la
+              resolucion original (lo habitual en cuadros de microscopio)
+        area_min: Area minima en pixeles de un objeto
+        area_max: Area maxima en pixeles (None: sin limite)
+        descartar_borde: Omite los objetos que tocan el borde (cortados)
+
+    Retorna:
+        tuple: (etiquetas int32 con 0 de fondo y 1..K por objeto,
+                cajas int32 (K, 4) como x, y, ancho, alto,
+                areas int64 (K,), centroides float64 (K, 2))
+               o None si la imagen es None
+    """
+    if img is None:
+        return None
+    if size is not None:
+        img = cv2.resize(img, size)
+
+    if metodo == 'espermatozoides':
+        primer_plano = _primer_plano_espermatozoides(img)
+    elif metodo == 'rps':
+        primer_plano = _primer_plano_rps(img)
+    else:
+        raise ValueError(f"Metodo de segmentacion desconocido: {metodo}")
+
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
+        primer_plano,
+        connectivity=8
+    )
+
+    # Filtro vectorizado sobre las estadisticas (la fila 0 es el fondo)
+    areas = stats[:, cv2.CC_STAT_AREA]
+    validos = areas >= area_min
+    if area_max is not None:
+        validos &= areas <= area_max
+    if descartar_borde:
+        alto, ancho = labels.shape
+        x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+        w, h = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+        validos &= (x > 0) & (y > 0) & (x + w < ancho) & (y + h < alto)
+    validos[0] = False
+
+    # Reetiquetado 1..K con una tabla de busqueda (una pasada por la imagen)
+    indices = np.flatnonzero(validos)
+    tabla = np.zeros(num_labels, dtype=np.int32)
+    tabla[indices] = np.arange(1, len(indices) + 1, dtype=np.int32)
+    etiquetas = tabla[labels]
+
+    cajas = stats[indices][:, [cv2.CC_STAT_LEFT, cv2.CC_STAT_TOP,
+                              cv2.CC_STAT_WIDTH, cv2.CC_STAT_HEIGHT]].astype(np.int32)
+    return etiquetas, cajas, areas[indices].astype(np.int64), centroids[indices]
@@ -0,0 +1,338 @@
+"""
+Busqueda de formas parecidas con momentos de Hu y Zernike.
+
+Cada mascara se resume en un vector con el log10 de la magnitud de los 7
+Hu mas los momentos de Zernike con la escala de los CSV (log10(|z| + 1)).
+Ambas familias son invariantes a rotacion, asi que dos mascaras cercanas
+en este espacio tienen formas parecidas aunque esten giradas. Los Hu no
+llevan el signo (sign(h) * log10|h| de preprocesamiento/barrido.py):
+hu7 cambia de signo con el reflejo y el salto entre -7 y +5 separaba
+una forma de su imagen especular. Los Zernike se calculan con radio fijo
+(mitad del cuadro), de modo que el tamaño absoluto del objeto cuenta;
+con aumento fijo del microscopio eso es parte de la morfologia.
+
+Las columnas se estandarizan y cada familia se divide por la raiz de su
+numero de columnas, para que los 25 Zernike no pesen mas que los 7 Hu.
+La busqueda usa un BallTree (o KDTree) de sklearn sobre esos vectores.
+
+El indice se actualiza sin reconstruir el arbol en cada cambio: las
+mascaras agregadas despues quedan en un bloque aparte que se recorre por
+fuerza bruta, y las quitadas o reemplazadas se marcan como inactivas.
+Cuando ese bloque supera fraccion_reconstruir del arbol, el arbol (y la
+estandarizacion) se rehacen con todas las mascaras activas.
+"""
+import os
+import json
+
+import cv2
+import numpy as np
+
+from src.extraccion_caracteristicas.momentos.zernike import calcular_zernike_momentos
+from src import instrumentacion as inst
+
+
+N_HU = 7
+ALGORITMOS = ("ball_tree", "kd_tree")
+DIR_INDICE = "indice_formas"  # carpeta junto a los CSV de momentos
+
+
+def hu_logaritmico(mascara):
+    """log10 de la magnitud de los 7 momentos de Hu de la mascara (0/1 o 0/255)."""
+    hu = cv2.HuMoments(cv2.moments(mascara, binaryImage=True)).ravel()
+    return np.log10(np.abs(hu) + 1e-30)
+
+
+def columnas_zernike(fila):
+    """Valores z00..zNN de una fila de zernike.csv (ya en escala logaritmica)."""
+    return [fila[c] for c in sorted(c for c in fila if c.startswith("z") and c[1:].isdigit())]
+
+
+def descriptor_forma(mascara, zernike=None):
+    """
+    Vector de busqueda de una mascara.
+
+    Parametros:
+        mascara: Mascara binaria
+        zernike: Zernike ya calculados y escalados (fila de zernike.csv o
+                 lista); None los calcula
+
+    Retorna:
+        numpy array: float32 (7 + n_zernike,) o None si Zernike falla
+    """
+    if zernike is None:
+        zernike = calcular_zernike_momentos(mascara)
+        if not zernike:
+            return None
+        zernike = np.log10(np.abs(list(zernike.values())) + 1)
+    elif isinstance(zernike, dict):
+        zernike = columnas_zernike(zernike)
+    return np.concatenate([hu_logaritmico(mascara), np.asarray(zernike, dtype=np.float64)]).astype(np.float32)
+
+
+class IndiceFormas:
+    """
+    Parametros:
+        metodo: Binarizacion de las imagenes de consulta ('espermatozoides'
+                o 'rps', ver momentos/binarizacion.py)
+        algoritmo: 'ball_tree' o 'kd_tree'
+        fraccion_reconstruir: Fraccion de filas agregadas o inactivas
+                              respecto al arbol a partir de la cual se
+                              reconstruye
+        tam_hoja: leaf_size del arbol
+    """
+    def __init__(self, metodo="espermatozoides", algoritmo="ball_tree", fraccion_reconstruir=0.2,
+                 tam_hoja=40):
+        if algoritmo not in ALGORITMOS:
+            raise ValueError(f"Algoritmo desconocido: {algoritmo}")
+        self.metodo = metodo
+        self.algoritmo = algoritmo
+        self.fraccion_reconstruir = fraccion_reconstruir
+        self.tam_hoja = tam_hoja
+
+        self.claves = []
+        self.clases = []
+        self.X = np.empty((0, 0), dtype=np.float32)
+        self._activas = np.empty(0, dtype=bool)
+        self._fila = {}
+        self._arbol = None
+        self._n_arbol = 0
+        self._media = None
+        self._escala = None
+
+    def __len__(self):
+        return len(self._fila)
+
+    def __contains__(self, clave):
+        return clave in self._fila
+
+    # ------------------------------------------------------------------
+    # Actualizacion
+    # ------------------------------------------------------------------
+    def agregar(self, claves, clases, X):
+        """
+        Agrega (o reemplaza, si la clave ya existe) descriptores.
+
+        Parametros:
+            claves: Claves 'clase/archivo'
+            clases: Clase de cada clave
+            X: Descriptores (N, D) de descriptor_forma
+
+        Retorna:
+            int: Filas nuevas o modificadas (las iguales se ignoran)
+        """
+        X = np.asarray(X, dtype=np.float32).reshape(len(claves), -1)
+        if len(self.claves) == 0 and self.X.shape[1] != X.shape[1]:
+            self.X = np.empty((0, X.shape[1]), dtype=np.float32)
+        if X.shape[1] != self.X.shape[1]:
+            raise ValueError(f"Descriptores de {X.shape[1]} columnas, el indice usa {self.X.shape[1]}")
+
+        nuevas = []
+        for i, clave in enumerate(claves):
+            fila = self._fila.get(clave)
+            if fila is not None and fila >= len(self.claves):
+                # Repetida dentro del mismo lote: queda la ultima
+                nuevas[fila - len(self.claves)] = i
+                continue
+            if fila is not None:
+                if np.array_equal(self.X[fila], X[i]):
+                    continue
+                self._activas[fila] = False
+            self._fila[clave] = len(self.claves) + len(nuevas)
+            nuevas.append(i)
+        if not nuevas:
+            return 0
+
+        self.claves.extend(claves[i] for i in nuevas)
+        self.clases.extend(clases[i] for i in nuevas)
+        self.X = np.concatenate([self.X, X[nuevas]])
+        self._activas = np.concatenate([self._activas, np.ones(len(nuevas), dtype=bool)])
+        self._quizas_reconstruir()
+        return len(nuevas)
+
+    def agregar_mascaras(self, claves, clases, mascaras):
+        """agregar() con los descriptores de las mascaras (omite las que fallan)."""
+        filas, X = [], []
+        with inst.etapa("formas/descriptor", imagenes=len(mascaras)):
+            for i, mascara in enumerate(mascaras):
+                d = descriptor_forma(mascara)
+                if d is not None:
+                    filas.append(i)
+                    X.append(d)
+        if not filas:
+            return 0
+        return self.agregar([claves[i] for i in filas], [clases[i] for i in filas], np.stack(X))
+
+    def quitar(self, claves):
+        """Marca como inactivas las claves indicadas. Retorna cuantas habia."""
+        quitadas = 0
+        for clave in claves:
+            fila = self._fila.pop(clave, None)
+            if fila is not None:
+                self._activas[fila] = False
+                quitadas += 1
+        if quitadas:
+            self._quizas_reconstruir()
+        return quitadas
+
+    def _quizas_reconstruir(self):
+        pendientes = (len(self.claves) - self._n_arbol) + int((~self._activas[:self._n_arbol]).sum())
+        if self._arbol is None or pendientes > self.fraccion_reconstruir * max(self._n_arbol, 1):
+            self.reconstruir()
+
+    def reconstruir(self):
+        """Compacta las filas activas y rehace la estandarizacion y el arbol."""
+        from sklearn.neighbors import BallTree, KDTree
+
+        activas = np.flatnonzero(self._activas)
+        self.claves = [self.claves[i] for i in activas]
+        self.clases = [self.clases[i] for i in activas]
+        self.X = np.ascontiguousarray(self.X[activas])
+        self._activas = np.ones(len(activas), dtype=bool)
+        self._fila = {clave: i for i, clave in enumerate(self.claves)}
+
+        self._media = self.X.mean(axis=0) if len(self.X) else np.zeros(self.X.shape[1], np.float32)
+        desv = self.X.std(axis=0) if len(self.X) else np.ones(self.X.shape[1], np.float32)
+        desv[desv == 0] = 1.0
+        # Cada familia aporta la misma varianza total
+        peso = np.empty(self.X.shape[1], dtype=np.float32)
+        peso[:N_HU] = 1.0 / np.sqrt(N_HU)
+        peso[N_HU:] = 1.0 / np.sqrt(max(self.X.shape[1] - N_HU, 1))
+        self._escala = (peso / desv).astype(np.float32)
+
+        arbol = BallTree if self.algoritmo == "ball_tree" else KDTree
+        self._arbol = arbol(self._normalizar(self.X), leaf_size=self.tam_hoja) if len(self.X) else None
+        self._n_arbol = len(self.X)
+
+    def _normalizar(self, X):
+        return (np.asarray(X, dtype=np.float32) - self._media) * self._escala
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def consultar(self, X, k=5):
+        """
+        k vecinos activos mas cercanos de cada descriptor.
+
+        Retorna:
+            tuple: (distancias (m, k), filas (m, k)); si hay menos de k
+                   mascaras las columnas sobrantes son inf y -1
+        """
+        X = np.atleast_2d(X)
+        m = len(X)
+        distancias = np.full((m, k), np.inf)
+        filas = np.full((m, k), -1, dtype=np.int64)
+        if not len(self):
+            return distancias, filas
+        X = self._normalizar(X)
+
+        candidatos_d, candidatos_i = [], []
+        if self._arbol is not None:
+            # Las filas inactivas del arbol pueden ocupar lugares del top-k
+            inactivas = int((~self._activas[:self._n_arbol]).sum())
+            kk = min(k + inactivas, self._n_arbol)
+            d, i = self._arbol.query(X, k=kk)
+            d[~self._activas[i]] = np.inf
+            candidatos_d.append(d)
+            candidatos_i.append(i)
+        if len(self.claves) > self._n_arbol:
+            # Bloque agregado despues del arbol: fuerza bruta
+            extra = self._normalizar(self.X[self._n_arbol:])
+            d = np.sqrt(np.maximum(
+                (X * X).sum(axis=1, keepdims=True) - 2.0 * X @ extra.T + (extra * extra).sum(axis=1), 0.0
+            ))
+            i = np.broadcast_to(np.arange(self._n_arbol, len(self.claves)), d.shape)
+            d[:, ~self._activas[self._n_arbol:]] = np.inf
+            candidatos_d.append(d)
+            candidatos_i.append(i)
+
+        d = np.concatenate(candidatos_d, axis=1)
+        i = np.concatenate(candidatos_i, axis=1)
+        orden = np.argsort(d, axis=1, kind="stable")[:, :k]
+        n = orden.shape[1]
+        distancias[:, :n] = np.take_along_axis(d, orden, axis=1)
+        filas[:, :n] = np.take_along_axis(i, orden, axis=1)
+        filas[~np.isfinite(distancias)] = -1
+        return distancias, filas
+
+    def buscar(self, X, k=5):
+        """
+        Formas mas parecidas a cada descriptor.
+
+        Retorna:
+            list: Por consulta, lista de {'clave', 'clase', 'distancia'}
+        """
+        with inst.etapa("formas/buscar", imagenes=len(np.atleast_2d(X))):
+            distancias, filas = self.consultar(X, k)
+        return [
+            [{"clave": self.claves[f], "clase": self.clases[f], "distancia": float(d)}
+             for d, f in zip(fila_d, fila_f) if f >= 0]
+            for fila_d, fila_f in zip(distancias, filas)
+        ]
+
+    def buscar_mascaras(self, mascaras, k=5):
+        """buscar() a partir de mascaras; las que fallan reciben una lista vacia."""
+        with inst.etapa("formas/descriptor", imagenes=len(mascaras)):
+            descriptores = [descriptor_forma(m) for m in mascaras]
+        validos = [i for i, d in enumerate(descriptores) if d is not None]
+        resultados = [[] for _ in mascaras]
+        if validos:
+            for i, r in zip(validos, self.buscar(np.stack([descriptores[i] for i in validos]), k)):
+                resultados[i] = r
+        return resultados
+
+    def buscar_imagenes(self, imagenes, k=5):
+        """buscar_mascaras() binarizando imagenes BGR con el metodo del indice."""
+        from src.extraccion_caracteristicas.momentos.binarizacion import binarizar_imagen
+
+        mascaras = [binarizar_imagen(img, self.metodo) for img in imagenes]
+        resultados = [[] for _ in imagenes]
+        validas = [i for i, m in enumerate(mascaras) if m is not None and m.any()]
+        if validas:
+            for i, r in zip(validas, self.buscar_mascaras([mascaras[i] for i in validas], k)):
+                resultados[i] = r
+        return resultados
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+    def guardar(self, carpeta):
+        """
+        Guarda las filas activas en carpeta/descriptores.npy e indice.json
+        (el arbol se reconstruye al cargar).
+        """
+        self.reconstruir()
+        os.makedirs(carpeta, exist_ok=True)
+        ruta_npy = os.path.join(carpeta, "descriptores.npy")
+        with open(ruta_npy + ".tmp", "wb") as f:
+            np.save(f, self.X)
+        os.replace(ruta_npy + ".tmp", ruta_npy)
+
+        ruta_json = os.path.join(carpeta, "indice.json")
+        with open(ruta_json + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "metodo": self.metodo,
+                "algoritmo": self.algoritmo,
+                "fraccion_reconstruir": self.fraccion_reconstruir,
+                "tam_hoja": self.tam_hoja,
+                "claves": self.claves,
+                "clases": self.clases,
+            }, f)
+        os.replace(ruta_json + ".tmp", ruta_json)
+        return carpeta
+
+    @classmethod
+    def cargar(cls, carpeta, **kwargs):
+        """Indice guardado con guardar() o None si no existe."""
+        ruta_json = os.path.join(carpeta, "indice.json")
+        if not os.path.isfile(ruta_json):
+            return None
+        with open(ruta_json, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        config = {c: meta[c] for c in ("metodo", "algoritmo", "fraccion_reconstruir", "tam_hoja")}
+        indice = cls(**{**config, **kwargs})
+        indice.claves = meta["claves"]
+        indice.clases = meta["clases"]
+        indice.X = np.load(os.path.join(carpeta, "descriptores.npy"))
+        indice._activas = np.ones(len(indice.claves), dtype=bool)
+        indice.reconstruir()
+        return indice
@@ -0,0 +1,99 @@
+"""
+Control de calidad de mascaras antes de calcular descriptores.
+
+Momentos, Hu y sobre todo Zernike se calculaban tambien sobre mascaras
+vacias o casi vacias (clase sin objeto, segmentacion fallida), donde no
+aportan nada y Zernike suele fallar. Aqui se resume cada mascara con una
+sola pasada de connectedComponentsWithStats (area, caja envolvente y
+numero de componentes) y se decide si vale la pena describirla.
+
+Las mascaras de los generadores conservan solo el componente elegido al
+binarizar, asi que estas estadisticas son las de ese componente.
+"""
+import cv2
+import numpy as np
+
+
+UMBRALES = {
+    "area_min": 100,        # pixeles de primer plano
+    "frac_area_max": 0.9,   # fraccion del cuadro (segmentacion invertida)
+    "lado_min": 5,          # lado menor de la caja envolvente
+    "componentes_max": 3,   # mas componentes: mascara fragmentada
+}
+
+COLUMNAS_CALIDAD = (
+    "area", "frac_area", "x", "y", "ancho", "alto", "relleno", "componentes",
+    "valida", "motivos",
+)
+
+
+def estadisticas_mascara(mascara):
+    """
+    Area, caja envolvente y componentes de una mascara binaria.
+
+    Parametros:
+        mascara: Imagen binaria (cualquier valor > 0 es primer plano)
+
+    Retorna:
+        dict: area, frac_area, x, y, ancho, alto, relleno (area / caja)
+              y componentes
+    """
+    # connectedComponents trata cualquier valor distinto de cero como primer plano
+    binaria = mascara if mascara.dtype == np.uint8 else (mascara > 0).astype(np.uint8)
+    num_labels, _, stats, _ = cv2.connectedComponentsWithStats(binaria, connectivity=8)
+    stats = stats[1:]
+    area = int(stats[:, cv2.CC_STAT_AREA].sum())
+    x = y = ancho = alto = 0
+    if area:
+        x = int(stats[:, cv2.CC_STAT_LEFT].min())
+        y = int(stats[:, cv2.CC_STAT_TOP].min())
+        ancho = int((stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH]).max()) - x
+        alto = int((stats[:, cv2.CC_STAT_TOP] + stats[:, cv2.CC_STAT_HEIGHT]).max()) - y
+    return {
+        "area": area,
+        "frac_area": area / mascara.size,
+        "x": x,
+        "y": y,
+        "ancho": ancho,
+        "alto": alto,
+        "relleno": area / (ancho * alto) if area else 0.0,
+        "componentes": num_labels - 1,
+    }
+
+
+def motivos_rechazo(estadisticas, umbrales=None):
+    """
+    Motivos por los que una mascara no deberia describirse.
+
+    Retorna:
+        list: Vacia si la mascara es valida; si no, entre 'vacia',
+              'area_pequena', 'caja_pequena', 'cubre_cuadro' y 'fragmentada'
+    """
+    u = {**UMBRALES, **(umbrales or {})}
+    if estadisticas["area"] == 0:
+        return ["vacia"]
+    motivos = []
+    if estadisticas["area"] < u["area_min"]:
+        motivos.append("area_pequena")
+    if min(estadisticas["ancho"], estadisticas["alto"]) < u["lado_min"]:
+        motivos.append("caja_pequena")
+    if estadisticas["frac_area"] > u["frac_area_max"]:
+        motivos.append("cubre_cuadro")
+    if u["componentes_max"] is not None and estadisticas["componentes"] > u["componentes_max"]:
+        motivos.append("fragmentada")
+    return motivos
+
+
+def evaluar_mascara(mascara, umbrales=None):
+    """
+    Estadisticas y veredicto de una mascara.
+
+    Retorna:
+        dict: COLUMNAS_CALIDAD; 'valida' es 1/0 y 'motivos' los motivos de
+              rechazo separados por ';'
+    """
+    calidad = estadisticas_mascara(mascara)
+    motivos = motivos_rechazo(calidad, umbrales)
+    calidad["valida"] = int(not motivos)
+    calidad["motivos"] = ";".join(motivos)
+    return calidad
@@ -0,0 +1,247 @@
+"""
+Descriptores de forma a partir del contorno de una mascara binaria.
+
+Momentos por el teorema de Green: el area encerrada por un borde se puede
+integrar sobre el propio borde. Para una mascara de pixeles la frontera
+exacta esta formada por los extremos de las corridas horizontales de
+primer plano de cada fila, y esos extremos son justamente los pixeles
+del contorno con fondo a su izquierda o a su derecha. Con las sumas de
+potencias (Faulhaber)
+
+    sum_{x=a}^{b} x^p = S_p(b + 1) - S_p(a)
+
+cada corrida aporta sus momentos sin recorrer sus pixeles interiores, y
+el resultado coincide con cv2.moments sobre el raster (no es la
+aproximacion poligonal por los centros de los pixeles, que pierde la
+mitad del borde y falla en estructuras finas como la cola). Tras
+cv2.findContours, que es una sola pasada en C, el costo depende del
+largo del borde y no del numero de pixeles.
+
+Del contorno exterior salen ademas descriptores de Fourier, curvatura y
+metricas de area/perimetro.
+"""
+import cv2
+import numpy as np
+
+from src.extraccion_caracteristicas.momentos.objetos import (
+    derivar_momentos, hu_objetos, COLUMNAS_MOMENTOS, COLUMNAS_HU, ORDENES,
+)
+
+
+N_MUESTRAS = 128   # puntos del contorno remuestreado por longitud de arco
+N_FOURIER = 16     # descriptores de Fourier (mitad frecuencias positivas, mitad negativas)
+SIGMA_ARMONICOS = 8.0  # suavizado del contorno para la curvatura
+
+
+def _sumas_potencias(n):
+    """Filas S_p(n) = sum_{x=0}^{n-1} x^p para p = 0..3."""
+    s1 = n * (n - 1) / 2
+    return np.stack([n, s1, (n - 1) * n * (2 * n - 1) / 6, s1 * s1])
+
+
+def contornos(img_bin):
+    """
+    Bordes exteriores y de agujeros de la mascara (todos los pixeles de
+    primer plano con fondo en su vecindad 4).
+
+    Retorna:
+        tuple: (mascara con borde de 1 pixel, contornos en coordenadas de
+                la mascara con borde, jerarquia)
+    """
+    # El marco de ceros garantiza que los bordes de la imagen se sigan
+    binaria = cv2.copyMakeBorder((img_bin > 0).astype(np.uint8), 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    lista, jerarquia = cv2.findContours(binaria, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_NONE)
+    return binaria, lista, jerarquia
+
+
+def _momentos_desde_bordes(binaria, lista, intensidad):
+    ancho = binaria.shape[1]
+    # Pixeles de borde sin repetir (las partes finas se recorren dos veces)
+    codigos = np.unique(np.concatenate([c[:, 0, 1] * ancho + c[:, 0, 0] for c in lista]))
+    y, x = np.divmod(codigos, ancho)
+    # Inicio de corrida (fondo a la izquierda) resta S_p(a); fin de corrida
+    # (fondo a la derecha) suma S_p(b + 1)
+    inicio = binaria[y, x - 1] == 0
+    fin = binaria[y, x + 1] == 0
+    xs = np.concatenate([x[fin], x[inicio] - 1]).astype(np.float64)
+    ys = np.concatenate([y[fin], y[inicio]]).astype(np.float64) - 1.0
+    signo = np.concatenate([np.ones(fin.sum()), -np.ones(inicio.sum())])
+
+    # M[p, q] = sum sobre extremos de signo * S_p(x) * y^q
+    M = intensidad * ((_sumas_potencias(xs) * signo) @ np.vander(ys, 4, increasing=True))
+    return derivar_momentos({(p, q): M[p, q:q + 1] for p, q in ORDENES})
+
+
+def momentos_contorno(img_bin, intensidad=255.0):
+    """
+    Momentos regulares, centrales y normalizados desde el contorno.
+
+    Equivale a calcular_momentos (cv2.moments sobre la mascara 0/255).
+
+    Retorna:
+        dict: Los 24 momentos (m00-m03, mu20-mu03, nu20-nu03)
+    """
+    binaria, lista, _ = contornos(img_bin)
+    if not lista:
+        return dict.fromkeys(COLUMNAS_MOMENTOS, 0.0)
+    return dict(zip(COLUMNAS_MOMENTOS, _momentos_desde_bordes(binaria, lista, intensidad)[0].tolist()))
+
+
+def _remuestrear(puntos, n):
+    """Remuestrea un contorno cerrado a n puntos equiespaciados en longitud de arco."""
+    cerrado = np.vstack([puntos, puntos[:1]])
+    tramos = np.hypot(*np.diff(cerrado, axis=0).T)
+    s = np.concatenate([[0.0], np.cumsum(tramos)])
+    t = np.linspace(0.0, s[-1], n, endpoint=False)
+    return np.column_stack([np.interp(t, s, cerrado[:, 0]), np.interp(t, s, cerrado[:, 1])]), s[-1]
+
+
+def descriptores_fourier(muestras, n_fourier=N_FOURIER):
+    """
+    Magnitudes |F_k| / |F_1| del contorno como senal compleja x + iy.
+
+    Sin F_0 (traslacion), divididas por |F_1| (escala) y en magnitud
+    (rotacion y punto de inicio).
+    """
+    F = np.fft.fft(muestras[:, 0] + 1j * muestras[:, 1])
+    base = np.abs(F[1])
+    mitad = n_fourier // 2
+    indices = list(range(2, 2 + mitad)) + list(range(-1, -1 - (n_fourier - mitad), -1))
+    if base == 0:
+        return np.zeros(n_fourier)
+    return np.abs(F[indices]) / base
+
+
+def curvatura(muestras, largo, sigma_armonicos=SIGMA_ARMONICOS):
+    """
+    Curvatura normalizada (circulo = 1) en cada punto del contorno
+    remuestreado, positiva en las partes convexas.
+
+    Las derivadas se calculan en el dominio de Fourier con una ventana
+    gaussiana sobre los armonicos, que elimina el escalonado de pixel
+    (derivar directamente la cadena de pixeles da curvaturas espurias).
+    """
+    n = len(muestras)
+    F = np.fft.fft(muestras[:, 0] + 1j * muestras[:, 1])
+    k = np.fft.fftfreq(n, 1.0 / n)
+    F = F * np.exp(-0.5 * (k / sigma_armonicos) ** 2)
+    d1 = np.fft.ifft(1j * k * F)
+    d2 = np.fft.ifft(-(k ** 2) * F)
+    rapidez = np.maximum(np.abs(d1), 1e-12)
+    kappa = np.imag(np.conj(d1) * d2) / rapidez ** 3
+    if kappa.sum() < 0:
+        kappa = -kappa
+    # Parametro t en [0, 2*pi): |dz/dt| ~ largo / (2*pi)
+    return kappa * largo / (2 * np.pi)
+
+
+def forma_contorno(puntos, momentos, n_fourier=N_FOURIER, n_muestras=N_MUESTRAS, intensidad=255.0):
+    """
+    Metricas de area/perimetro, curvatura y Fourier del contorno exterior.
+
+    Parametros:
+        puntos: Contorno exterior (N, 2)
+        momentos: Vector de 24 momentos de la mascara
+    """
+    claves_fd = [f"fd{i:02d}" for i in range(n_fourier)]
+    forma = dict.fromkeys(
+        ["area", "perimetro", "circularidad", "solidez", "excentricidad", "relacion_aspecto",
+         "extension", "curv_media", "curv_std", "curv_max", "energia_flexion", "frac_concava"]
+        + claves_fd, 0.0,
+    )
+    area = momentos[0] / intensidad
+    forma["area"] = float(area)
+    if len(puntos) < 3:
+        return forma
+
+    contorno = puntos.reshape(-1, 1, 2).astype(np.int32)
+    area_poligono = cv2.contourArea(contorno)
+    perimetro = cv2.arcLength(contorno, True)
+    area_casco = cv2.contourArea(cv2.convexHull(contorno))
+    _, _, ancho, alto = cv2.boundingRect(contorno)
+
+    mu20, mu11, mu02 = momentos[10], momentos[11], momentos[12]
+    raiz = np.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+    l1, l2 = (mu20 + mu02) / 2 + raiz, (mu20 + mu02) / 2 - raiz
+
+    forma.update({
+        "perimetro": float(perimetro),
+        "circularidad": float(4 * np.pi * area_poligono / perimetro ** 2) if perimetro else 0.0,
+        "solidez": float(area_poligono / area_casco) if area_casco else 0.0,
+        "excentricidad": float(np.sqrt(max(0.0, 1 - l2 / l1))) if l1 > 0 else 0.0,
+        "relacion_aspecto": float(ancho / alto),
+        "extension": float(area / (ancho * alto)),
+    })
+
+    muestras, largo = _remuestrear(puntos.astype(np.float64), n_muestras)
+    if largo > 0:
+        k = curvatura(muestras, largo)
+        forma.update({
+            "curv_media": float(np.abs(k).mean()),
+            "curv_std": float(k.std()),
+            "curv_max": float(np.abs(k).max()),
+            "energia_flexion": float((k ** 2).mean()),
+            "frac_concava": float((k < 0).mean()),
+        })
+        forma.update(zip(claves_fd, descriptores_fourier(muestras, n_fourier).tolist()))
+    return forma
+
+
+def calcular_descriptores_contorno(img_bin, n_fourier=N_FOURIER, n_muestras=N_MUESTRAS, intensidad=255.0):
+    """
+    Momentos, Hu y descriptores de forma desde un unico findContours.
+
+    Parametros:
+        img_bin: Mascara binaria (0/255)
+        n_fourier: Numero de descriptores de Fourier
+        n_muestras: Puntos del contorno remuestreado
+        intensidad: Valor del primer plano (255 en las mascaras del repo)
+
+    Retorna:
+        tuple: (momentos, hu, forma) como diccionarios; momentos y hu con
+               las mismas claves que calcular_momentos y calcular_hu_momentos
+    """
+    binaria, lista, jerarquia = contornos(img_bin)
+    if not lista:
+        ceros = np.zeros(len(COLUMNAS_MOMENTOS))
+        return (dict.fromkeys(COLUMNAS_MOMENTOS, 0.0), dict.fromkeys(COLUMNAS_HU, 0.0),
+                forma_contorno(np.empty((0, 2)), ceros, n_fourier, n_muestras, intensidad))
+
+    momentos = _momentos_desde_bordes(binaria, lista, intensidad)
+    hu = hu_objetos(momentos)[0]
+
+    # Contorno exterior mas grande (sin padre en la jerarquia)
+    exteriores = [c for c, h in zip(lista, jerarquia[0]) if h[3] < 0]
+    exterior = max(exteriores, key=cv2.contourArea).reshape(-1, 2) - 1
+    forma = forma_contorno(exterior, momentos[0], n_fourier, n_muestras, intensidad)
+
+    return (dict(zip(COLUMNAS_MOMENTOS, momentos[0].tolist())),
+            dict(zip(COLUMNAS_HU, hu.tolist())), forma)
+
+
+def verificar_contra_raster(mascaras, intensidad=255.0):
+    """
+    Compara los momentos y Hu del contorno con cv2.moments/cv2.HuMoments
+    sobre el raster.
+
+    Retorna:
+        dict: Maximo error relativo de momentos regulares, centrales/
+              normalizados y Hu sobre todas las mascaras
+    """
+    errores = {"regulares": 0.0, "centrales": 0.0, "hu": 0.0}
+
+    def relativo(a, b):
+        escala = np.maximum(np.abs(b), 1e-12 * max(1.0, np.abs(b).max()))
+        return float(np.max(np.abs(a - b) / escala))
+
+    for mascara in mascaras:
+        momentos, hu, _ = calcular_descriptores_contorno(mascara, intensidad=intensidad)
+        raster = cv2.moments(mascara)
+        a = np.array([momentos[c] for c in COLUMNAS_MOMENTOS])
+        b = np.array([raster[c] for c in COLUMNAS_MOMENTOS])
+        errores["regulares"] = max(errores["regulares"], relativo(a[:10], b[:10]))
+        errores["centrales"] = max(errores["centrales"], relativo(a[10:], b[10:]))
+        errores["hu"] = max(errores["hu"], relativo(
+            np.array([hu[c] for c in COLUMNAS_HU]), cv2.HuMoments(raster).ravel()
+        ))
+    return errores
@@ -0,0 +1,150 @@
+"""
+Momentos, Hu y Zernike por objeto a partir de una imagen de etiquetas.
+
+Los momentos regulares de todos los objetos se acumulan en una sola
+pasada sobre los pixeles de primer plano con np.bincount (un acumulador
+por etiqueta), en coordenadas del recorte de cada objeto. Los centrales,
+normalizados y de Hu se derivan de forma vectorizada con las mismas
+formulas que cv2.moments / cv2.HuMoments, de modo que cada fila coincide
+con lo que daria calcular_momentos sobre el recorte binario (0/255) del
+objeto.
+
+Zernike se calcula con mahotas sobre el recorte de cada objeto.
+"""
+import numpy as np
+
+from src.extraccion_caracteristicas.momentos.zernike import calcular_zernike_momentos
+
+
+COLUMNAS_MOMENTOS = (
+    "m00", "m10", "m01", "m20", "m11", "m02", "m30", "m21", "m12", "m03",
+    "mu20", "mu11", "mu02", "mu30", "mu21", "mu12", "mu03",
+    "nu20", "nu11", "nu02", "nu30", "nu21", "nu12", "nu03",
+)
+COLUMNAS_HU = ("hu1", "hu2", "hu3", "hu4", "hu5", "hu6", "hu7")
+ORDENES = ((0, 0), (1, 0), (0, 1), (2, 0), (1, 1), (0, 2), (3, 0), (2, 1), (1, 2), (0, 3))
+
+
+def momentos_objetos(etiquetas, cajas, intensidad=255.0):
+    """
+    Momentos regulares, centrales y normalizados de todos los objetos.
+
+    Parametros:
+        etiquetas: Imagen int (H, W) con 0 de fondo y 1..K por objeto
+        cajas: (K, 4) x, y, ancho, alto de cada objeto
+        intensidad: Valor de los pixeles del objeto (255 como en las mascaras)
+
+    Retorna:
+        np.ndarray: (K, 24) en el orden de COLUMNAS_MOMENTOS
+    """
+    K = len(cajas)
+    resultado = np.zeros((K, len(COLUMNAS_MOMENTOS)), dtype=np.float64)
+    if K == 0:
+        return resultado
+
+    ys, xs = np.nonzero(etiquetas)
+    obj = etiquetas[ys, xs] - 1
+    # Coordenadas relativas al recorte de cada objeto
+    x = xs.astype(np.float64) - cajas[obj, 0]
+    y = ys.astype(np.float64) - cajas[obj, 1]
+
+    potencias_x = [np.ones_like(x), x, x * x, x * x * x]
+    potencias_y = [np.ones_like(y), y, y * y, y * y * y]
+    m = {}
+    for p, q in ORDENES:
+        m[p, q] = intensidad * np.bincount(obj, weights=potencias_x[p] * potencias_y[q], minlength=K)
+    return derivar_momentos(m)
+
+
+def derivar_momentos(m):
+    """
+    Completa centrales y normalizados a partir de los momentos regulares,
+    con las mismas formulas que cv2.moments.
+
+    Parametros:
+        m: {(p, q): arreglo (K,)} con los 10 momentos regulares de ORDENES
+
+    Retorna:
+        np.ndarray: (K, 24) en el orden de COLUMNAS_MOMENTOS
+    """
+    m00 = m[0, 0]
+    seguro = np.where(m00 != 0, m00, 1.0)
+    xc = m[1, 0] / seguro
+    yc = m[0, 1] / seguro
+
+    mu20 = m[2, 0] - xc * m[1, 0]
+    mu11 = m[1, 1] - xc * m[0, 1]
+    mu02 = m[0, 2] - yc * m[0, 1]
+    mu30 = m[3, 0] - xc * (3 * mu20 + xc * m[1, 0])
+    mu21 = m[2, 1] - xc * (2 * mu11 + xc * m[0, 1]) - yc * mu20
+    mu12 = m[1, 2] - yc * (2 * mu11 + yc * m[1, 0]) - xc * mu02
+    mu03 = m[0, 3] - yc * (3 * mu02 + yc * m[0, 1])
+
+    inv2 = 1.0 / seguro ** 2
+    inv3 = inv2 / np.sqrt(seguro)
+    columnas = [m[o] for o in ORDENES] + [
+        mu20, mu11, mu02, mu30, mu21, mu12, mu03,
+        mu20 * inv2, mu11 * inv2, mu02 * inv2,
+        mu30 * inv3, mu21 * inv3, mu12 * inv3, mu03 * inv3,
+    ]
+    resultado = np.column_stack(columnas).astype(np.float64)
+    resultado[m00 == 0, 10:] = 0.0
+    return resultado
+
+
+def hu_objetos(momentos):
+    """
+    Momentos de Hu de cada objeto a partir de la salida de momentos_objetos.
+
+    Retorna:
+        np.ndarray: (K, 7) en el orden de COLUMNAS_HU
+    """
+    nu20, nu11, nu02, nu30, nu21, nu12, nu03 = momentos[:, 17:24].T
+
+    t0 = nu30 + nu12
+    t1 = nu21 + nu03
+    q0 = t0 * t0
+    q1 = t1 * t1
+    n4 = 4 * nu11
+    s = nu20 + nu02
+    d = nu20 - nu02
+
+    hu = np.empty((len(momentos), 7), dtype=np.float64)
+    hu[:, 0] = s
+    hu[:, 1] = d * d + n4 * nu11
+    hu[:, 3] = q0 + q1
+    hu[:, 5] = d * (q0 - q1) + n4 * t0 * t1
+    t0 = t0 * (q0 - 3 * q1)
+    t1 = t1 * (3 * q0 - q1)
+    q0 = nu30 - 3 * nu12
+    q1 = 3 * nu21 - nu03
+    hu[:, 2] = q0 * q0 + q1 * q1
+    hu[:, 4] = q0 * t0 + q1 * t1
+    hu[:, 6] = q1 * t0 - q0 * t1
+    return hu
+
+
+def zernike_objetos(etiquetas, cajas):
+    """
+    Zernike de cada objeto sobre su recorte binario.
+
+    Retorna:
+        list: Diccionario de calcular_zernike_momentos por objeto (None
+              si fallo)
+    """
+    resultado = []
+    for k, (x, y, w, h) in enumerate(cajas, start=1):
+        recorte = (etiquetas[y:y + h, x:x + w] == k).astype(np.uint8) * 255
+        resultado.append(calcular_zernike_momentos(recorte))
+    return resultado
+
+
+def caracteristicas_objetos(etiquetas, cajas):
+    """
+    Momentos, Hu y Zernike de todos los objetos de una imagen.
+
+    Retorna:
+        tuple: (momentos (K, 24), hu (K, 7), lista de dicts de Zernike)
+    """
+    momentos = momentos_objetos(etiquetas, cajas)
+    return momentos, hu_objetos(momentos), zernike_objetos(etiquetas, cajas)
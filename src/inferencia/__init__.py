@@ -0,0 +1,3 @@
+"""
+Modulo de inferencia en vivo a partir de los artefactos del pipeline.
+"""
@@ -0,0 +1,366 @@
+"""
+Clasificacion de piedra, papel o tijera sobre un flujo de cuadros
+(archivo de video, camara o carpeta de imagenes).
+
+Tres etapas en hilos unidas por colas acotadas:
+
+    captura -> [cuadros] -> preprocesamiento -> [listos] -> inferencia
+
+  - captura: lee la fuente. En una fuente en vivo (camara, o video con
+    tiempo_real) si la cola esta llena se descarta el cuadro mas viejo:
+    bajo carga se procesa siempre el cuadro mas reciente y la latencia no
+    crece. En un video sin tiempo_real la captura espera y no se descarta
+    nada.
+  - preprocesamiento: procesar_resta_canales (mascara) y
+    procesar_rps_grises (gris), las mismas funciones que el generador del
+    dataset; OpenCV libera el GIL, asi que corre en paralelo con la red.
+  - inferencia (hilo que llama a clasificar_flujo): toma en un solo lote
+    todos los cuadros que ya estan listos (hasta tam_lote) y los clasifica
+    con ClasificadorEmbeddings (paquete de inferencia) o ClasificadorFormas
+    (indice de formas).
+
+Las puntuaciones de cada cuadro se suavizan en el tiempo
+(SuavizadoTemporal) para que la etiqueta no parpadee entre cuadros.
+"""
+import os
+import time
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+from src.preprocesamiento.rps import procesar_resta_canales, procesar_rps_grises
+from src import instrumentacion as inst
+
+
+EXTENSIONES_IMAGEN = (".png", ".jpg", ".jpeg", ".bmp")
+FPS_CARPETA = 30.0
+_FIN = None
+
+
+class FuenteCuadros:
+    """
+    Fuente de cuadros BGR.
+
+    Parametros:
+        fuente: Indice de camara (int o texto numerico), archivo de video o
+                carpeta de imagenes (en orden alfabetico)
+        fps: FPS de una carpeta de imagenes o si el video no lo informa
+    """
+    def __init__(self, fuente, fps=None):
+        self._archivos = None
+        self._captura = None
+        if isinstance(fuente, int) or str(fuente).isdigit():
+            self._captura = cv2.VideoCapture(int(fuente))
+            self.en_vivo = True
+        elif os.path.isdir(fuente):
+            self._archivos = sorted(
+                os.path.join(fuente, f) for f in os.listdir(fuente)
+                if f.lower().endswith(EXTENSIONES_IMAGEN)
+            )
+            self.en_vivo = False
+        else:
+            self._captura = cv2.VideoCapture(fuente)
+            self.en_vivo = False
+        if self._captura is not None and not self._captura.isOpened():
+            raise FileNotFoundError(f"No se pudo abrir la fuente de video: {fuente}")
+
+        informado = self._captura.get(cv2.CAP_PROP_FPS) if self._captura is not None else 0
+        self.fps = fps or (informado if informado and informado > 0 else FPS_CARPETA)
+        self._siguiente = 0
+
+    def leer(self):
+        """Siguiente cuadro BGR o None al terminar."""
+        if self._archivos is not None:
+            while self._siguiente < len(self._archivos):
+                ruta = self._archivos[self._siguiente]
+                self._siguiente += 1
+                img = inst.leer_imagen(ruta)
+                if img is not None:
+                    return img
+            return None
+        ok, cuadro = self._captura.read()
+        return cuadro if ok else None
+
+    def cerrar(self):
+        if self._captura is not None:
+            self._captura.release()
+
+
+def preprocesar_cuadro(cuadro, size=(256, 256)):
+    """(gris, mascara) de un cuadro BGR, como en generar_dataset_rps."""
+    return procesar_rps_grises(cuadro, size), procesar_resta_canales(cuadro, size)
+
+
+def _softmax_negativo(distancias, temperatura):
+    z = -np.asarray(distancias, dtype=np.float64) / temperatura
+    z -= z.max(axis=1, keepdims=True)
+    p = np.exp(z)
+    return p / p.sum(axis=1, keepdims=True)
+
+
+class ClasificadorEmbeddings:
+    """
+    Puntuaciones por clase a partir de la imagen gris: embedding ResNet50
+    del paquete de inferencia y softmax de la distancia negativa a los
+    centroides de clase.
+
+    Parametros:
+        paquete: PaqueteInferencia del dataset piedra_papel_tijera
+        temperatura: Escala de las distancias en el softmax
+        device: Dispositivo de la red
+    """
+    def __init__(self, paquete, temperatura=1.0, device="cpu"):
+        self.paquete = paquete
+        self.clases = list(paquete.clases)
+        self.temperatura = temperatura
+        self.device = device
+        paquete.modelo(device)
+
+    def __call__(self, grises, mascaras):
+        with inst.etapa("video/embeddings", imagenes=len(grises)):
+            X = self.paquete.embeber(grises, self.device)
+        return _softmax_negativo(self.paquete.distancias_clase(X), self.temperatura)
+
+
+class ClasificadorFormas:
+    """
+    Puntuaciones por clase a partir de la mascara: voto de los k vecinos
+    del indice de formas, ponderado por 1 / (distancia + eps). Un cuadro
+    sin mascara valida recibe puntuaciones uniformes.
+
+    Parametros:
+        indice: IndiceFormas (momentos/busqueda.py)
+        k: Vecinos por consulta
+    """
+    def __init__(self, indice, k=5, eps=1e-3):
+        self.indice = indice
+        self.clases = sorted(set(indice.clases))
+        self.k = k
+        self.eps = eps
+        self._posicion = {c: i for i, c in enumerate(self.clases)}
+
+    def __call__(self, grises, mascaras):
+        from src.extraccion_caracteristicas.momentos.busqueda import descriptor_forma
+
+        puntuaciones = np.full((len(mascaras), len(self.clases)), 1.0 / len(self.clases))
+        with inst.etapa("video/formas", imagenes=len(mascaras)):
+            descriptores = [descriptor_forma(m) if m is not None and m.any() else None for m in mascaras]
+            validos = [i for i, d in enumerate(descriptores) if d is not None]
+            if not validos:
+                return puntuaciones
+            distancias, filas = self.indice.consultar(np.stack([descriptores[i] for i in validos]), self.k)
+        for i, fila_d, fila_f in zip(validos, distancias, filas):
+            votos = np.zeros(len(self.clases))
+            for d, f in zip(fila_d, fila_f):
+                if f >= 0:
+                    votos[self._posicion[self.indice.clases[f]]] += 1.0 / (d + self.eps)
+            if votos.sum() > 0:
+                puntuaciones[i] = votos / votos.sum()
+        return puntuaciones
+
+
+class SuavizadoTemporal:
+    """
+    Media exponencial de las puntuaciones por clase con histeresis: la
+    etiqueta solo cambia cuando otra clase supera a la actual por margen.
+
+    Parametros:
+        n_clases: Numero de clases
+        alfa: Peso del cuadro nuevo (1: sin suavizado)
+        margen: Ventaja minima para cambiar de etiqueta
+    """
+    def __init__(self, n_clases, alfa=0.4, margen=0.1):
+        self.alfa = alfa
+        self.margen = margen
+        self.puntuaciones = np.full(n_clases, 1.0 / n_clases)
+        self.actual = None
+
+    def actualizar(self, puntuaciones):
+        """
+        Retorna:
+            tuple: (clase suavizada, su puntuacion suavizada)
+        """
+        self.puntuaciones = self.alfa * np.asarray(puntuaciones) + (1.0 - self.alfa) * self.puntuaciones
+        mejor = int(self.puntuaciones.argmax())
+        if self.actual is None or (
+            mejor != self.actual
+            and self.puntuaciones[mejor] - self.puntuaciones[self.actual] >= self.margen
+        ):
+            self.actual = mejor
+        return self.actual, float(self.puntuaciones[self.actual])
+
+
+def _poner_descartando(cola, item):
+    """Encola item; si la cola esta llena descarta el mas viejo. Retorna los descartados."""
+    descartados = 0
+    while True:
+        try:
+            cola.put_nowait(item)
+            return descartados
+        except queue.Full:
+            try:
+                cola.get_nowait()
+                descartados += 1
+            except queue.Empty:
+                pass
+
+
+def _capturar(fuente, cuadros, descartar, ritmo, detener, estado, errores):
+    try:
+        t_inicio = time.perf_counter()
+        indice = 0
+        while not detener.is_set():
+            if ritmo:
+                # Emula una camara: el cuadro i esta disponible en i / fps
+                espera = t_inicio + indice / fuente.fps - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+            with inst.etapa("video/captura", imagenes=1):
+                cuadro = fuente.leer()
+            if cuadro is None:
+                break
+            item = (indice, time.perf_counter(), cuadro)
+            estado["leidos"] += 1
+            if descartar:
+                estado["descartados"] += _poner_descartando(cuadros, item)
+            else:
+                cuadros.put(item)
+            indice += 1
+    except Exception as e:
+        errores.append(e)
+    finally:
+        cuadros.put(_FIN)
+
+
+def _preprocesar(cuadros, listos, size, errores):
+    try:
+        while True:
+            item = cuadros.get()
+            if item is _FIN:
+                break
+            indice, t_captura, cuadro = item
+            with inst.etapa("video/preprocesar", imagenes=1):
+                gris, mascara = preprocesar_cuadro(cuadro, size)
+            listos.put((indice, t_captura, gris, mascara))
+    except Exception as e:
+        errores.append(e)
+    finally:
+        listos.put(_FIN)
+
+
+def clasificar_flujo(fuente, clasificador, tam_cola=2, tam_lote=8, tiempo_real=None, size=(256, 256),
+                     suavizado=None, max_cuadros=None, al_predecir=None):
+    """
+    Clasifica los cuadros de una fuente con captura, preprocesamiento e
+    inferencia en paralelo.
+
+    Parametros:
+        fuente: FuenteCuadros o lo que recibe su constructor
+        clasificador: Funcion (grises, mascaras) -> puntuaciones (N, n_clases)
+                      con atributo clases (ClasificadorEmbeddings o ClasificadorFormas)
+        tam_cola: Cuadros en espera entre etapas; en vivo, lo que excede se descarta
+        tam_lote: Maximo de cuadros por llamada al clasificador
+        tiempo_real: Lee al ritmo de los FPS de la fuente y descarta cuadros
+                     si no se alcanza (None: solo en fuentes en vivo)
+        size: Tamaño del preprocesamiento
+        suavizado: SuavizadoTemporal (None: uno con los valores por defecto)
+        max_cuadros: Detiene la captura tras procesar esta cantidad
+        al_predecir: Funcion opcional llamada con cada prediccion
+
+    Retorna:
+        dict: leidos, procesados, descartados, fps_fuente, fps_sostenido,
+              latencia_p50_ms / latencia_p90_ms (captura -> prediccion)
+              y predicciones (una por cuadro procesado)
+    """
+    if not isinstance(fuente, FuenteCuadros):
+        fuente = FuenteCuadros(fuente)
+    if tiempo_real is None:
+        tiempo_real = fuente.en_vivo
+    descartar = fuente.en_vivo or tiempo_real
+    # Un archivo leido sin tiempo real se lee tan rapido como se puede
+    ritmo = tiempo_real and not fuente.en_vivo
+    if suavizado is None:
+        suavizado = SuavizadoTemporal(len(clasificador.clases))
+
+    cuadros = queue.Queue(maxsize=tam_cola)
+    listos = queue.Queue(maxsize=tam_cola)
+    detener = threading.Event()
+    estado = {"leidos": 0, "descartados": 0}
+    errores = []
+    hilos = [
+        threading.Thread(target=_capturar, args=(fuente, cuadros, descartar, ritmo, detener, estado, errores),
+                         daemon=True),
+        threading.Thread(target=_preprocesar, args=(cuadros, listos, size, errores), daemon=True),
+    ]
+    for hilo in hilos:
+        hilo.start()
+
+    predicciones, latencias = [], []
+    t_primero = None
+    terminado = False
+    try:
+        while not terminado:
+            # Lote con todo lo que ya esta listo: espera solo por el primero
+            lote = [listos.get()]
+            while len(lote) < tam_lote and lote[-1] is not _FIN:
+                try:
+                    lote.append(listos.get_nowait())
+                except queue.Empty:
+                    break
+            if lote[-1] is _FIN:
+                terminado = True
+                lote.pop()
+            if not lote:
+                continue
+            if t_primero is None:
+                t_primero = time.perf_counter()
+
+            indices, t_capturas, grises, mascaras = zip(*lote)
+            with inst.etapa("video/inferencia", imagenes=len(lote)):
+                puntuaciones = clasificador(list(grises), list(mascaras))
+            t_fin = time.perf_counter()
+            for indice, t_captura, p in zip(indices, t_capturas, puntuaciones):
+                clase_suave, confianza = suavizado.actualizar(p)
+                prediccion = {
+                    "cuadro": indice,
+                    "clase_cuadro": clasificador.clases[int(np.argmax(p))],
+                    "clase": clasificador.clases[clase_suave],
+                    "confianza": confianza,
+                    "latencia_ms": (t_fin - t_captura) * 1000.0,
+                }
+                predicciones.append(prediccion)
+                latencias.append(prediccion["latencia_ms"])
+                if al_predecir is not None:
+                    al_predecir(prediccion)
+            if max_cuadros is not None and len(predicciones) >= max_cuadros:
+                detener.set()
+    finally:
+        detener.set()
+        # Vacia las colas hasta que los hilos terminen, para que ninguno
+        # quede bloqueado en put
+        while any(hilo.is_alive() for hilo in hilos):
+            for cola in (cuadros, listos):
+                while True:
+                    try:
+                        cola.get_nowait()
+                    except queue.Empty:
+                        break
+            hilos[-1].join(timeout=0.01)
+        fuente.cerrar()
+
+    if errores:
+        raise RuntimeError(f"Fallo el flujo de video: {errores[0]}") from errores[0]
+
+    duracion = (time.perf_counter() - t_primero) if t_primero is not None else 0.0
+    return {
+        "leidos": estado["leidos"],
+        "procesados": len(predicciones),
+        "descartados": estado["descartados"],
+        "fps_fuente": fuente.fps,
+        "fps_sostenido": len(predicciones) / duracion if duracion > 0 else 0.0,
+        "latencia_p50_ms": float(np.percentile(latencias, 50)) if latencias else None,
+        "latencia_p90_ms": float(np.percentile(latencias, 90)) if latencias else None,
+        "predicciones": predicciones,
+    }
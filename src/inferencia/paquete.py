@@ -0,0 +1,309 @@
+"""
+Paquete de inferencia: todo lo que necesita un clasificador en vivo en
+una sola carpeta versionada.
+
+    paquetes/<dataset>/
+        ACTUAL                      nombre de la version vigente
+        <version>/
+            manifiesto.json         formato, clases, preprocesamiento,
+                                    normalizacion y hash de cada archivo
+            modelo.pt               state_dict de ResNet50 sin la capa fc
+            media.npy, desv.npy     estandarizacion de los embeddings
+            componentes.npy         PCA (n, D) y su media (media_pca.npy)
+            media_pca.npy
+            centroides_clase.npy    centroide de cada clase en el espacio PCA
+            centroides_grupos.npy   centroides de MiniBatchKMeans y clase
+            clase_grupos.npy        mayoritaria de cada grupo
+
+Los arreglos son .npy sin comprimir y se abren con mmap de solo lectura:
+cargar un paquete solo lee el manifiesto, y los workers creados con fork
+(o que abren los mismos archivos) comparten las paginas del cache del
+sistema en vez de tener cada uno su copia. Los pesos se cargan con
+torch.load(mmap=True) sobre un modelo construido en el dispositivo 'meta',
+asi que tampoco se copian ni se inicializan pesos aleatorios.
+
+Este modulo solo importa numpy al cargarse; torch se importa al pedir el
+modelo (PaqueteInferencia.modelo).
+"""
+import os
+import json
+import hashlib
+import importlib
+from datetime import datetime
+
+import numpy as np
+
+from src.agrupamiento.reduccion import aplicar_transformacion
+
+
+# 2: el manifiesto registra la redimension de la entrada (ver
+# src/embeddings/cache_tensores.REDIMENSION)
+FORMATO = 2
+DIR_PAQUETES = "paquetes"
+ARCHIVO_ACTUAL = "ACTUAL"
+ARCHIVO_MODELO = "modelo.pt"
+ARREGLOS = (
+    "media", "desv", "componentes", "media_pca",
+    "centroides_clase", "centroides_grupos", "clase_grupos",
+)
+
+
+def _sha256(ruta, bloque=1 << 20):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for parte in iter(lambda: f.read(bloque), b""):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def _guardar_npy(ruta, arreglo):
+    # C contiguo: np.load(mmap_mode='r') lo abre sin copiar
+    with open(ruta, "wb") as f:
+        np.save(f, np.ascontiguousarray(arreglo))
+
+
+def resolver_version(ruta):
+    """
+    Carpeta de una version: ruta si ya lo es, o la indicada por ACTUAL si
+    ruta es la carpeta del dataset.
+    """
+    puntero = os.path.join(ruta, ARCHIVO_ACTUAL)
+    if os.path.isfile(puntero):
+        with open(puntero, "r", encoding="utf-8") as f:
+            return os.path.join(ruta, f.read().strip())
+    return ruta
+
+
+def leer_manifiesto(ruta):
+    """Manifiesto de una version (o de la vigente de un dataset), o None."""
+    ruta_manifiesto = os.path.join(resolver_version(ruta), "manifiesto.json")
+    if not os.path.isfile(ruta_manifiesto):
+        return None
+    with open(ruta_manifiesto, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def escribir_paquete(dir_dataset, arreglos, estado_modelo, manifiesto):
+    """
+    Escribe una version nueva del paquete y la marca como vigente.
+
+    La version se arma en una carpeta temporal que se renombra al final,
+    y ACTUAL se reemplaza despues, de modo que un worker que carga el
+    paquete mientras se escribe ve la version anterior completa.
+
+    Parametros:
+        dir_dataset: Carpeta del dataset, p. ej. paquetes/piedra_papel_tijera
+        arreglos: {nombre: arreglo} con las claves de ARREGLOS
+        estado_modelo: state_dict de la red (None: paquete sin modelo)
+        manifiesto: Campos del manifiesto; se agregan formato, version,
+                    fecha y hashes de los archivos
+
+    Retorna:
+        str: Carpeta de la version escrita
+    """
+    faltantes = [n for n in ARREGLOS if n not in arreglos]
+    if faltantes:
+        raise ValueError(f"Faltan arreglos en el paquete: {', '.join(faltantes)}")
+
+    fecha = datetime.now()
+    version = f"v{fecha:%Y%m%d_%H%M%S}_{manifiesto.get('huella', '')[:8]}".rstrip("_")
+    ruta = os.path.join(dir_dataset, version)
+    ruta_tmp = os.path.join(dir_dataset, f".{version}.tmp")
+    os.makedirs(ruta_tmp, exist_ok=True)
+
+    archivos = {}
+    for nombre in ARREGLOS:
+        destino = os.path.join(ruta_tmp, nombre + ".npy")
+        _guardar_npy(destino, arreglos[nombre])
+        archivos[nombre + ".npy"] = _sha256(destino)
+    if estado_modelo is not None:
+        import torch
+
+        destino = os.path.join(ruta_tmp, ARCHIVO_MODELO)
+        torch.save(estado_modelo, destino)
+        archivos[ARCHIVO_MODELO] = _sha256(destino)
+
+    manifiesto = {
+        **manifiesto,
+        "formato": FORMATO,
+        "version": version,
+        "fecha": fecha.isoformat(timespec="seconds"),
+        "archivos": archivos,
+    }
+    with open(os.path.join(ruta_tmp, "manifiesto.json"), "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=2)
+
+    os.replace(ruta_tmp, ruta)
+    puntero = os.path.join(dir_dataset, ARCHIVO_ACTUAL)
+    with open(puntero + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(puntero + ".tmp", puntero)
+    return ruta
+
+
+def verificar_paquete(ruta):
+    """
+    Compara el hash de cada archivo con el del manifiesto (lee todos los
+    archivos, incluidos los pesos: usar al publicar, no al arrancar).
+
+    Retorna:
+        list: Archivos faltantes o modificados (vacia si el paquete esta integro)
+    """
+    ruta = resolver_version(ruta)
+    manifiesto = leer_manifiesto(ruta)
+    if manifiesto is None:
+        return ["manifiesto.json"]
+    return [
+        nombre for nombre, esperado in manifiesto["archivos"].items()
+        if not os.path.isfile(os.path.join(ruta, nombre))
+        or _sha256(os.path.join(ruta, nombre)) != esperado
+    ]
+
+
+class PaqueteInferencia:
+    """
+    Paquete abierto: manifiesto en memoria y arreglos con mmap.
+
+    Parametros:
+        ruta: Carpeta de una version o del dataset (usa ACTUAL)
+    """
+    def __init__(self, ruta):
+        self.ruta = resolver_version(ruta)
+        self.manifiesto = leer_manifiesto(self.ruta)
+        if self.manifiesto is None:
+            raise FileNotFoundError(f"No hay paquete de inferencia en {ruta}")
+        if self.manifiesto.get("formato") != FORMATO:
+            raise ValueError(
+                f"Formato de paquete {self.manifiesto.get('formato')} no soportado (se espera {FORMATO}); "
+                "regenerarlo con: python main.py paquete"
+            )
+        self.clases = self.manifiesto["clases"]
+        self.arreglos = {
+            nombre: np.load(os.path.join(self.ruta, nombre + ".npy"), mmap_mode="r")
+            for nombre in ARREGLOS
+        }
+        self._modelo = None
+
+    @property
+    def version(self):
+        return self.manifiesto["version"]
+
+    # ------------------------------------------------------------------
+    # Preprocesamiento y red
+    # ------------------------------------------------------------------
+    def preprocesar(self, img):
+        """
+        Aplica a una imagen BGR original el mismo preprocesamiento que el
+        generador del dataset (funcion, tamaño y salida del manifiesto).
+
+        Retorna:
+            numpy array: Imagen gris uint8 o None si la funcion falla
+        """
+        config = self.manifiesto["preprocesamiento"]
+        modulo, funcion = config["funcion"].rsplit(".", 1)
+        resultado = getattr(importlib.import_module(modulo), funcion)(img, size=tuple(config["size"]))
+        if config.get("salida") is not None and resultado is not None:
+            resultado = resultado[config["salida"]]
+        return resultado
+
+    def modelo(self, device="cpu"):
+        """
+        ResNet50 del paquete en modo evaluacion (se carga una vez).
+
+        Los tensores quedan respaldados por el archivo (mmap) y no se
+        copian: los workers comparten las paginas de los pesos.
+        """
+        if self._modelo is not None:
+            return self._modelo
+        if ARCHIVO_MODELO not in self.manifiesto["archivos"]:
+            raise FileNotFoundError(f"El paquete {self.ruta} no incluye el modelo")
+
+        import torch
+        import torch.nn as nn
+        from torchvision import models
+
+        with torch.device("meta"):
+            modelo = models.resnet50(weights=None)
+        modelo.fc = nn.Identity()
+        estado = torch.load(os.path.join(self.ruta, ARCHIVO_MODELO), mmap=True,
+                            weights_only=True, map_location="cpu")
+        modelo.load_state_dict(estado, assign=True)
+        self._modelo = modelo.eval().to(device)
+        return self._modelo
+
+    def embeber(self, imagenes, device="cpu"):
+        """
+        Embeddings de imagenes grises ya preprocesadas, con el tamaño y la
+        normalizacion usados al generar los embeddings del dataset.
+
+        Parametros:
+            imagenes: Lista de imagenes grises uint8
+
+        Retorna:
+            numpy array: (N, 2048) float32
+        """
+        import torch
+        from src.embeddings.cache_tensores import redimensionar_gris, normalizar_lote
+
+        entrada = self.manifiesto["entrada"]
+        lote = np.stack([redimensionar_gris(img, entrada["img_size"]) for img in imagenes])
+        modelo = self.modelo(device)
+        with torch.no_grad():
+            xb = normalizar_lote(torch.from_numpy(lote).unsqueeze(1), device,
+                                 entrada["media"], entrada["std"])
+            return modelo(xb).cpu().numpy()
+
+    # ------------------------------------------------------------------
+    # Reduccion y clasificacion (solo numpy)
+    # ------------------------------------------------------------------
+    def transformar(self, X):
+        """Embeddings (N, D) -> espacio PCA del paquete (N, n)."""
+        return aplicar_transformacion(X, self.arreglos)
+
+    @staticmethod
+    def _distancias(Z, centroides):
+        d2 = (
+            (Z * Z).sum(axis=1, keepdims=True)
+            - 2.0 * Z @ centroides.T
+            + (centroides * centroides).sum(axis=1)
+        )
+        return np.sqrt(np.maximum(d2, 0.0))
+
+    @classmethod
+    def _mas_cercano(cls, Z, centroides):
+        d = cls._distancias(Z, centroides)
+        indices = d.argmin(axis=1)
+        return indices, d[np.arange(len(Z)), indices]
+
+    def distancias_clase(self, X):
+        """Distancia (N, n_clases) de cada embedding al centroide de cada clase."""
+        return self._distancias(self.transformar(X), self.arreglos["centroides_clase"])
+
+    def clasificar(self, X):
+        """
+        Clase del centroide mas cercano de cada embedding.
+
+        Retorna:
+            tuple: (indices de clase (N,), distancias (N,))
+        """
+        return self._mas_cercano(self.transformar(X), self.arreglos["centroides_clase"])
+
+    def asignar_grupo(self, X):
+        """
+        Grupo de MiniBatchKMeans mas cercano de cada embedding.
+
+        Retorna:
+            tuple: (grupos (N,), clase mayoritaria de cada grupo (N,), distancias (N,))
+        """
+        grupos, distancias = self._mas_cercano(self.transformar(X), self.arreglos["centroides_grupos"])
+        return grupos, np.asarray(self.arreglos["clase_grupos"])[grupos], distancias
+
+
+def cargar_paquete(dataset=None, ruta=None, dir_paquetes=DIR_PAQUETES):
+    """
+    Abre la version vigente del paquete de un dataset (o la de ruta).
+
+    Pensado para llamarse antes de crear los workers (p. ej. gunicorn con
+    preload): los hijos heredan los mmap y comparten las paginas.
+    """
+    return PaqueteInferencia(ruta or os.path.join(dir_paquetes, dataset))
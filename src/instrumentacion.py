@@ -0,0 +1,230 @@
+"""
+Instrumentacion del pipeline: temporizadores por etapa, contadores de
+imagenes y bytes, y captura opcional con cProfile/tracemalloc.
+
+Uso tipico:
+
+    from src import instrumentacion as inst
+
+    inst.iniciar(perfilar=False, rastrear_memoria=True)
+    with inst.etapa("main/espermatozoides"):
+        ...
+    inst.guardar_reporte("reportes/ejecucion.json")
+
+Las etapas se acumulan por nombre (llamadas, tiempo, imagenes, bytes), de
+modo que una etapa que se ejecuta por imagen (p. ej. "extraer/hog") queda
+resumida en una sola fila del reporte.
+"""
+import io
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import cv2
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def rss_pico_mb():
+    """Pico de memoria residente del proceso en MB (None si no disponible)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB, macOS bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+class Instrumentacion:
+    """Acumulador de metricas por etapa (seguro entre hilos)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.etapas = {}
+        self.inicio = time.perf_counter()
+        self.perfil = None
+        self.rastrear_memoria = False
+
+    def _fila(self, nombre):
+        fila = self.etapas.get(nombre)
+        if fila is None:
+            fila = {
+                "llamadas": 0,
+                "tiempo_s": 0.0,
+                "imagenes": 0,
+                "bytes_leidos": 0,
+                "bytes_escritos": 0,
+            }
+            self.etapas[nombre] = fila
+        return fila
+
+    def registrar(self, nombre, tiempo_s=0.0, llamadas=1, imagenes=0,
+                  bytes_leidos=0, bytes_escritos=0):
+        with self._lock:
+            fila = self._fila(nombre)
+            fila["llamadas"] += llamadas
+            fila["tiempo_s"] += tiempo_s
+            fila["imagenes"] += imagenes
+            fila["bytes_leidos"] += bytes_leidos
+            fila["bytes_escritos"] += bytes_escritos
+
+    def resumen(self):
+        """Devuelve el resumen estructurado de la ejecucion."""
+        with self._lock:
+            etapas = {}
+            for nombre, fila in sorted(self.etapas.items()):
+                fila = dict(fila)
+                fila["imagenes_por_seg"] = (
+                    fila["imagenes"] / fila["tiempo_s"]
+                    if fila["imagenes"] and fila["tiempo_s"] > 0 else None
+                )
+                etapas[nombre] = fila
+
+        resumen = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "tiempo_total_s": time.perf_counter() - self.inicio,
+            "rss_pico_mb": rss_pico_mb(),
+            "bytes_leidos": sum(f["bytes_leidos"] for f in etapas.values()),
+            "bytes_escritos": sum(f["bytes_escritos"] for f in etapas.values()),
+            "etapas": etapas,
+        }
+        if self.rastrear_memoria and tracemalloc.is_tracing():
+            actual, pico = tracemalloc.get_traced_memory()
+            resumen["tracemalloc_pico_mb"] = pico / (1024 * 1024)
+        return resumen
+
+
+_actual = Instrumentacion()
+
+
+def iniciar(perfilar=False, rastrear_memoria=False):
+    """
+    Reinicia las metricas y activa opcionalmente cProfile y tracemalloc.
+    """
+    global _actual
+    _actual = Instrumentacion()
+    if rastrear_memoria:
+        tracemalloc.start()
+        _actual.rastrear_memoria = True
+    if perfilar:
+        _actual.perfil = cProfile.Profile()
+        _actual.perfil.enable()
+    return _actual
+
+
+def actual():
+    return _actual
+
+
+def registrar(nombre, tiempo_s=0.0, llamadas=1, **contadores):
+    """
+    Suma un tiempo ya medido y/o contadores (imagenes, bytes_leidos,
+    bytes_escritos) a una etapa.
+    """
+    _actual.registrar(nombre, tiempo_s, llamadas, **contadores)
+
+
+@contextmanager
+def etapa(nombre, imagenes=0):
+    """
+    Cronometra un bloque y lo acumula en la etapa indicada.
+
+    Parametros:
+        nombre: Nombre de la etapa, p. ej. "main/espermatozoides"
+        imagenes: Imagenes procesadas en el bloque (para imagenes/seg)
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _actual.registrar(nombre, time.perf_counter() - t0, imagenes=imagenes)
+
+
+def medir(nombre, imagenes=1):
+    """Decorador que acumula el tiempo de cada llamada en la etapa nombre."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                _actual.registrar(nombre, time.perf_counter() - t0, imagenes=imagenes)
+        return envoltura
+    return decorador
+
+
+def leer_imagen(ruta, flags=cv2.IMREAD_COLOR, nombre="decodificar"):
+    """cv2.imread cronometrado que ademas cuenta los bytes leidos."""
+    t0 = time.perf_counter()
+    img = cv2.imread(ruta, flags)
+    tiempo = time.perf_counter() - t0
+    leidos = os.path.getsize(ruta) if img is not None else 0
+    _actual.registrar(nombre, tiempo, imagenes=int(img is not None), bytes_leidos=leidos)
+    return img
+
+
+def escribir_imagen(ruta, img, params=None, nombre="escribir"):
+    """cv2.imwrite cronometrado que ademas cuenta los bytes escritos."""
+    t0 = time.perf_counter()
+    ok = cv2.imwrite(ruta, img, params or [])
+    tiempo = time.perf_counter() - t0
+    escritos = os.path.getsize(ruta) if ok else 0
+    _actual.registrar(nombre, tiempo, imagenes=int(ok), bytes_escritos=escritos)
+    return ok
+
+
+def imprimir_resumen(resumen=None):
+    """Imprime una tabla con el tiempo y throughput de cada etapa."""
+    resumen = resumen or _actual.resumen()
+    print(f"\n{'etapa':44s} {'llamadas':>9s} {'tiempo(s)':>10s} {'img/s':>9s} {'MB leidos':>10s} {'MB escritos':>11s}")
+    for nombre, fila in resumen["etapas"].items():
+        ips = f"{fila['imagenes_por_seg']:.1f}" if fila["imagenes_por_seg"] else "-"
+        print(
+            f"{nombre:44s} {fila['llamadas']:9d} {fila['tiempo_s']:10.2f} {ips:>9s} "
+            f"{fila['bytes_leidos'] / 1e6:10.1f} {fila['bytes_escritos'] / 1e6:11.1f}"
+        )
+    print(f"Tiempo total: {resumen['tiempo_total_s']:.1f} s")
+    if resumen.get("rss_pico_mb") is not None:
+        print(f"Pico de memoria (RSS): {resumen['rss_pico_mb']:.0f} MB")
+
+
+def guardar_reporte(ruta, imprimir=True):
+    """
+    Guarda el resumen en JSON. Si cProfile estaba activo, guarda ademas
+    las estadisticas en ruta.prof y las 30 funciones mas costosas en el JSON.
+
+    Retorna:
+        dict: El resumen guardado
+    """
+    if _actual.perfil is not None:
+        _actual.perfil.disable()
+
+    resumen = _actual.resumen()
+    if _actual.rastrear_memoria and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    if _actual.perfil is not None:
+        ruta_prof = os.path.splitext(ruta)[0] + ".prof"
+        _actual.perfil.dump_stats(ruta_prof)
+        texto = io.StringIO()
+        pstats.Stats(_actual.perfil, stream=texto).sort_stats("cumulative").print_stats(30)
+        resumen["perfil"] = {"archivo": ruta_prof, "top": texto.getvalue()}
+
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(resumen, f, indent=2)
+
+    if imprimir:
+        imprimir_resumen(resumen)
+        print(f"Reporte guardado en: {ruta}")
+    return resumen
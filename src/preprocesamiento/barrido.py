@@ -0,0 +1,232 @@
+"""
+Barrido de parametros de segmentacion.
+
+Evalua una rejilla de parametros de binarizar_espermatozoides /
+binarizar_rps (ver PARAMETROS_* y ETAPAS_* en binarizacion.py) sobre un
+conjunto de imagenes de muestra, sin tocar el codigo ni regenerar el
+dataset.
+
+  - Cache de intermedios: la segmentacion es una cadena de etapas y cada
+    etapa depende solo de sus parametros y de los de las anteriores. Las
+    combinaciones se recorren en orden lexicografico de la cadena, de
+    modo que dos combinaciones consecutivas comparten el prefijo comun
+    (redimensionado, gris, suavizado, ...) y solo se recalcula desde la
+    primera etapa cuyo parametro cambia. La cache guarda una salida por
+    etapa, asi que la memoria no depende del tamaño de la rejilla.
+  - Paralelismo: las imagenes se reparten en un pool de hilos (OpenCV
+    libera el GIL); cada hilo recorre toda la rejilla sobre su imagen.
+  - Puntaje: por combinacion se resumen estadisticas de las mascaras
+    (vacias, area, fragmentacion, contacto con el borde) y la calidad de
+    agrupar los momentos de Hu resultantes con KMeans (ARI/NMI contra
+    las clases y silueta).
+"""
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from src import recursos
+from src.extraccion_caracteristicas.momentos.binarizacion import (
+    ETAPAS_ESPERMATOZOIDES, ETAPAS_RPS, PARAMETROS_ESPERMATOZOIDES, PARAMETROS_RPS,
+    componente_central, componente_mayor,
+)
+
+
+TAMANO = (256, 256)
+
+
+def _redimensionar(img, p):
+    return cv2.resize(img, p["size"])
+
+
+def _seleccion_espermatozoides(primer_plano, p):
+    return componente_central(primer_plano, p["area_min"])
+
+
+def _seleccion_rps(primer_plano, p):
+    return componente_mayor(primer_plano)
+
+
+# Cadena completa de cada metodo: redimensionar + primer plano + seleccion
+CADENAS = {
+    "espermatozoides": (
+        (("redimensionar", ("size",), _redimensionar),) + ETAPAS_ESPERMATOZOIDES
+        + (("seleccion", ("area_min",), _seleccion_espermatozoides),),
+        {"size": TAMANO, **PARAMETROS_ESPERMATOZOIDES},
+    ),
+    "rps": (
+        (("redimensionar", ("size",), _redimensionar),) + ETAPAS_RPS
+        + (("seleccion", (), _seleccion_rps),),
+        {"size": TAMANO, **PARAMETROS_RPS},
+    ),
+}
+
+COLUMNAS_ESTADISTICAS = (
+    "frac_vacias", "area_media", "cv_area", "componentes_medios", "frac_borde",
+    "ari", "nmi", "silueta", "puntaje",
+)
+
+
+def rejilla(metodo, valores):
+    """
+    Combinaciones de parametros en el orden de la cadena.
+
+    Parametros:
+        metodo: 'espermatozoides' o 'rps'
+        valores: {parametro: lista de valores}; los que falten quedan en
+                 su valor por defecto
+
+    Retorna:
+        list: Diccionarios de parametros completos, ordenados para
+              maximizar los prefijos compartidos
+    """
+    etapas, defecto = CADENAS[metodo]
+    desconocidos = set(valores) - set(defecto)
+    if desconocidos:
+        raise ValueError(f"Parametros desconocidos para {metodo}: {sorted(desconocidos)}")
+
+    orden = [clave for _, claves, _ in etapas for clave in claves]
+    listas = [list(valores.get(clave, [defecto[clave]])) for clave in orden]
+    return [dict(zip(orden, combinacion)) for combinacion in itertools.product(*listas)]
+
+
+def _claves_etapas(etapas, combinacion):
+    """Clave acumulada de cada etapa: valores de sus parametros y los previos."""
+    claves, acumulado = [], ()
+    for _, nombres, _ in etapas:
+        acumulado = acumulado + tuple(combinacion[n] for n in nombres)
+        claves.append(acumulado)
+    return claves
+
+
+def _estadisticas_mascara(mascara, n_componentes):
+    area = int(cv2.countNonZero(mascara))
+    borde = bool(area) and bool(mascara[0].any() or mascara[-1].any()
+                                or mascara[:, 0].any() or mascara[:, -1].any())
+    hu = np.zeros(7)
+    if area:
+        hu = cv2.HuMoments(cv2.moments(mascara, binaryImage=True)).ravel()
+        hu = np.sign(hu) * np.log10(np.abs(hu) + 1e-30)
+    return area / mascara.size, n_componentes, borde, hu
+
+
+def evaluar_imagen(img, metodo, combinaciones):
+    """
+    Segmenta una imagen con todas las combinaciones reutilizando las
+    salidas intermedias.
+
+    Retorna:
+        tuple: (estadisticas (C, 3) fraccion de area, componentes y borde,
+                hu (C, 7) log-escalados, etapas recalculadas)
+    """
+    etapas, _ = CADENAS[metodo]
+    salidas = [None] * len(etapas)
+    claves_previas = [None] * len(etapas)
+    estadisticas = np.zeros((len(combinaciones), 3))
+    hu = np.zeros((len(combinaciones), 7))
+    recalculadas = 0
+
+    for c, combinacion in enumerate(combinaciones):
+        claves = _claves_etapas(etapas, combinacion)
+        # Primera etapa cuya clave cambia respecto a la combinacion anterior
+        desde = next((i for i, (a, b) in enumerate(zip(claves, claves_previas)) if a != b), len(etapas))
+        entrada = img if desde == 0 else salidas[desde - 1]
+        for i in range(desde, len(etapas)):
+            entrada = etapas[i][2](entrada, combinacion)
+            salidas[i] = entrada
+            recalculadas += 1
+        claves_previas = claves
+
+        mascara, n_componentes = salidas[-1]
+        area, comp, borde, h = _estadisticas_mascara(mascara, n_componentes)
+        estadisticas[c] = (area, comp, borde)
+        hu[c] = h
+    return estadisticas, hu, recalculadas
+
+
+def calidad_agrupamiento(hu, y, validas, semilla=0):
+    """
+    ARI, NMI y silueta de KMeans (k = numero de clases) sobre los Hu
+    estandarizados de las mascaras no vacias.
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score, silhouette_score
+
+    X, y = hu[validas], y[validas]
+    k = len(np.unique(y))
+    if k < 2 or len(X) <= k:
+        return np.nan, np.nan, np.nan
+    X = (X - X.mean(axis=0)) / np.maximum(X.std(axis=0), 1e-12)
+    etiquetas = KMeans(n_clusters=k, n_init=5, random_state=semilla).fit_predict(X)
+    silueta = silhouette_score(X, etiquetas) if len(np.unique(etiquetas)) > 1 else np.nan
+    return (adjusted_rand_score(y, etiquetas), normalized_mutual_info_score(y, etiquetas), silueta)
+
+
+def barrer(imagenes, y, metodo, valores, hilos=None, semilla=0):
+    """
+    Evalua la rejilla sobre las imagenes de muestra.
+
+    Parametros:
+        imagenes: Lista de imagenes BGR originales
+        y: Clase (entero) de cada imagen
+        metodo: 'espermatozoides' o 'rps'
+        valores: {parametro: lista de valores} (ver rejilla)
+        hilos: Hilos del pool (None: los del reparto, ver src/recursos.py)
+        semilla: Semilla de KMeans
+
+    Retorna:
+        tuple: (filas con parametros y COLUMNAS_ESTADISTICAS ordenadas por
+                puntaje, resumen con tiempos y uso de la cache)
+    """
+    etapas, _ = CADENAS[metodo]
+    combinaciones = rejilla(metodo, valores)
+    y = np.asarray(y)
+
+    t0 = time.perf_counter()
+    hilos = hilos or recursos.actual("hilos")["hilos"]
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        resultados = list(pool.map(lambda img: evaluar_imagen(img, metodo, combinaciones), imagenes))
+    tiempo_segmentacion = time.perf_counter() - t0
+
+    estadisticas = np.stack([r[0] for r in resultados], axis=1)   # (C, N, 3)
+    hu = np.stack([r[1] for r in resultados], axis=1)             # (C, N, 7)
+    recalculadas = sum(r[2] for r in resultados)
+
+    t0 = time.perf_counter()
+    filas = []
+    for c, combinacion in enumerate(combinaciones):
+        area, componentes, borde = estadisticas[c].T
+        validas = area > 0
+        frac_vacias = 1.0 - validas.mean()
+        ari, nmi, silueta = calidad_agrupamiento(hu[c], y, validas, semilla)
+        # Una mascara vacia es un fallo aunque el resto agrupe bien
+        base = ari if np.isfinite(ari) else 0.0
+        filas.append({
+            **{k: (list(v) if isinstance(v, tuple) else v) for k, v in combinacion.items()},
+            "frac_vacias": float(frac_vacias),
+            "area_media": float(area[validas].mean()) if validas.any() else 0.0,
+            "cv_area": float(area[validas].std() / area[validas].mean()) if validas.any() else 0.0,
+            "componentes_medios": float(componentes.mean()),
+            "frac_borde": float(borde.mean()),
+            "ari": float(ari),
+            "nmi": float(nmi),
+            "silueta": float(silueta),
+            "puntaje": float(base * (1.0 - frac_vacias)),
+        })
+    tiempo_agrupamiento = time.perf_counter() - t0
+
+    filas.sort(key=lambda f: f["puntaje"], reverse=True)
+    sin_cache = len(combinaciones) * len(etapas) * len(imagenes)
+    resumen = {
+        "metodo": metodo,
+        "imagenes": len(imagenes),
+        "combinaciones": len(combinaciones),
+        "etapas_recalculadas": recalculadas,
+        "etapas_sin_cache": sin_cache,
+        "ahorro_cache": 1.0 - recalculadas / sin_cache if sin_cache else 0.0,
+        "tiempo_segmentacion_s": tiempo_segmentacion,
+        "tiempo_agrupamiento_s": tiempo_agrupamiento,
+    }
+    return filas, resumen
@@ -1,6 +1,9 @@
 import cv2
 import numpy as np
 
+from src.instrumentacion import medir
+
+@medir("preprocesamiento/procesar_imagen_sperm")
 def procesar_imagen_sperm(img, size=(256, 256)):
     """
     Preprocesa una imagen de espermatozoide realzando bordes y suavizando ruido,
@@ -46,6 +49,7 @@ def procesar_imagen_sperm(img, size=(256, 256)):
     return img_resized, img_enfocada
 
 
+@medir("preprocesamiento/procesar_imagen_sperm_bin")
 def procesar_imagen_sperm_bin(img, size=(256, 256)):
     """
     Preprocesa una imagen de espermatozoide para segmentar
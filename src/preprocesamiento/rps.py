@@ -1,7 +1,10 @@
 import cv2
 import numpy as np
 
+from src.instrumentacion import medir
+
 # --- FUNCION 1: BINARIZACION (Blanco y Negro puro) ---
+@medir("preprocesamiento/procesar_resta_canales")
 def procesar_resta_canales(img, size=(256, 256)):
     """
     Segmenta la mano usando resta de canales y devuelve una MASCARA BINARIA.
@@ -44,6 +47,7 @@ def procesar_resta_canales(img, size=(256, 256)):
     return mascara_final
 
 # --- FUNCION 2: GRISES + REALCE (Sin Binarizar) ---
+@medir("preprocesamiento/procesar_rps_grises")
 def procesar_rps_grises(img, size=(256, 256)):
     """
     Preprocesamiento: Grises + Limpieza + Realce de Bordes.
@@ -0,0 +1,321 @@
+"""
+Procesamiento por teselas de imagenes de microscopio en alta resolucion.
+
+En vez de reducir el cuadro a 256x256, la imagen se recorre en teselas
+solapadas a resolucion nativa:
+
+  - Lectura: los BMP sin compresion y los .npy se abren con memmap, asi
+    cada tesela solo lee sus propias filas del disco; otros formatos se
+    decodifican completos con OpenCV.
+  - Cada tesela calcula su mascara de primer plano y sus componentes en
+    un pool de hilos (OpenCV y numpy liberan el GIL) con a lo sumo
+    2 * hilos teselas en vuelo, por lo que la memoria no depende del
+    tamaño de la imagen.
+  - Costura: cada tesela escribe solo su nucleo (la ventana recortada a
+    la mitad del solape con sus vecinas) en la mascara final, que puede
+    ser un .npy en disco abierto con memmap.
+  - Detecciones: se descartan los componentes que tocan un borde interno
+    de la tesela (estan cortados). Cada objeto completo pertenece a una
+    sola tesela, asi que no se duplica: la cuyo nucleo contiene su
+    centroide si ahi no queda cortado y, si no, la primera que lo
+    contiene sin cortar (un objeto junto a la costura puede quedar
+    cortado en la tesela de su centroide y entero en la vecina). Cada
+    tesela lo decide sola a partir de la caja del objeto y de la
+    geometria de todas las ventanas.
+    Ningun objeto se pierde si el solape es mayor que el lado de su caja;
+    los que quedan cortados en todas las teselas se informan en cortados.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import cv2
+import numpy as np
+
+from src.extraccion_caracteristicas.momentos.binarizacion import (
+    _primer_plano_espermatozoides, _primer_plano_rps,
+)
+from src.extraccion_caracteristicas.momentos.objetos import caracteristicas_objetos
+from src import instrumentacion as inst
+from src import recursos
+
+
+UMBRAL_TESELAS = 2048   # lado a partir del cual se procesa por teselas
+TAM_TESELA = 1024
+SOLAPE = 128
+
+PRIMER_PLANO = {
+    "espermatozoides": _primer_plano_espermatozoides,
+    "rps": _primer_plano_rps,
+}
+
+
+def _abrir_bmp(ruta):
+    """
+    Vista memmap (alto, ancho[, 3]) de un BMP sin compresion de 8 bits
+    (paleta de grises), 24 o 32 bits. None si el formato no lo permite.
+    """
+    with open(ruta, "rb") as f:
+        cabecera = f.read(54)
+        if len(cabecera) < 54 or cabecera[:2] != b"BM":
+            return None
+        offset = int.from_bytes(cabecera[10:14], "little")
+        tam_dib = int.from_bytes(cabecera[14:18], "little")
+        ancho = int.from_bytes(cabecera[18:22], "little", signed=True)
+        alto = int.from_bytes(cabecera[22:26], "little", signed=True)
+        bits = int.from_bytes(cabecera[28:30], "little")
+        compresion = int.from_bytes(cabecera[30:34], "little")
+        if compresion != 0 or bits not in (8, 24, 32) or ancho <= 0 or alto == 0:
+            return None
+        if bits == 8:
+            f.seek(14 + tam_dib)
+            paleta = np.frombuffer(f.read(1024), dtype=np.uint8)
+            if len(paleta) < 1024:
+                return None
+            paleta = paleta.reshape(256, 4)[:, :3]
+            if not (paleta == np.arange(256, dtype=np.uint8)[:, None]).all():
+                return None
+
+    canales = bits // 8
+    paso = ((bits * ancho + 31) // 32) * 4
+    crudo = np.memmap(ruta, dtype=np.uint8, mode="r", offset=offset, shape=(abs(alto), paso))
+    img = crudo[:, :ancho * canales]
+    img = img.reshape(abs(alto), ancho) if canales == 1 else img.reshape(abs(alto), ancho, canales)
+    if canales == 4:
+        img = img[:, :, :3]
+    # Alto positivo: las filas estan de abajo hacia arriba
+    return img[::-1] if alto > 0 else img
+
+
+def abrir_imagen_grande(ruta):
+    """
+    Abre una imagen sin cargarla en memoria cuando el formato lo permite.
+
+    Parametros:
+        ruta: BMP sin compresion o .npy (memmap); cualquier otro formato
+              se decodifica completo
+
+    Retorna:
+        np.ndarray: Imagen (alto, ancho[, 3]) BGR o gris, o None si falla
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == ".npy":
+        return np.load(ruta, mmap_mode="r")
+    if extension == ".bmp":
+        img = _abrir_bmp(ruta)
+        if img is not None:
+            return img
+    return inst.leer_imagen(ruta)
+
+
+def _cortes(largo, tam, solape):
+    """Inicios de las ventanas y limites de sus nucleos sobre un eje."""
+    if largo <= tam:
+        return [0], [(0, largo)]
+    paso = tam - solape
+    inicios = list(range(0, largo - tam + 1, paso))
+    if inicios[-1] + tam < largo:
+        inicios.append(largo - tam)
+    # El nucleo de cada ventana termina en la mitad del solape con la siguiente
+    limites = [0] + [(inicios[i] + tam + inicios[i + 1]) // 2 for i in range(len(inicios) - 1)] + [largo]
+    return inicios, list(zip(limites[:-1], limites[1:]))
+
+
+def ventanas_teselas(alto, ancho, tam=TAM_TESELA, solape=SOLAPE):
+    """
+    Ventanas solapadas que cubren la imagen.
+
+    Retorna:
+        list: Tuplas (ventana, nucleo), ambas como (y0, y1, x0, x1)
+    """
+    if solape >= tam:
+        raise ValueError("El solape debe ser menor que el tamaño de tesela")
+    ys, nucleos_y = _cortes(alto, tam, solape)
+    xs, nucleos_x = _cortes(ancho, tam, solape)
+    resultado = []
+    for y0, (ny0, ny1) in zip(ys, nucleos_y):
+        for x0, (nx0, nx1) in zip(xs, nucleos_x):
+            ventana = (y0, min(y0 + tam, alto), x0, min(x0 + tam, ancho))
+            resultado.append((ventana, (ny0, ny1, nx0, nx1)))
+    return resultado
+
+
+def _teselas_duenas(cajas, centros, ventanas, nucleos, alto, ancho):
+    """
+    Tesela a la que pertenece cada objeto.
+
+    Parametros:
+        cajas: (K, 4) x0, y0, x1, y1 (exclusivos) en coordenadas de la imagen
+        centros: (K, 2) centroides x, y
+        ventanas, nucleos: (N, 4) y0, y1, x0, x1 de cada tesela
+
+    Retorna:
+        numpy array: (K,) indice de la tesela o -1 si todas lo cortan
+    """
+    bx0, by0, bx1, by1 = (cajas[:, i:i + 1] for i in range(4))
+    y0, y1, x0, x1 = ventanas.T
+    # Dentro de la ventana sin tocar un borde que no sea borde de la imagen
+    entero = (((bx0 > x0) | (x0 == 0)) & ((by0 > y0) | (y0 == 0))
+              & ((bx1 < x1) | (x1 == ancho)) & ((by1 < y1) | (y1 == alto)))
+    ny0, ny1, nx0, nx1 = nucleos.T
+    cx, cy = centros[:, :1], centros[:, 1:]
+    preferida = entero & (cy >= ny0) & (cy < ny1) & (cx >= nx0) & (cx < nx1)
+    duena = np.where(preferida.any(axis=1), preferida.argmax(axis=1), entero.argmax(axis=1))
+    duena[~entero.any(axis=1)] = -1
+    return duena
+
+
+def _procesar_tesela(img, indice, ventanas, nucleos, metodo, area_min, area_max, extraer):
+    y0, y1, x0, x1 = ventanas[indice]
+    nucleo = tuple(int(v) for v in nucleos[indice])
+    alto, ancho = img.shape[:2]
+    with inst.etapa("teselas/leer"):
+        tesela = np.ascontiguousarray(img[y0:y1, x0:x1])
+
+    with inst.etapa("teselas/primer_plano"):
+        primer_plano = PRIMER_PLANO[metodo](tesela)
+        num, labels, stats, centroides = cv2.connectedComponentsWithStats(primer_plano, connectivity=8)
+
+    izq, arr = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+    der = izq + stats[:, cv2.CC_STAT_WIDTH]
+    aba = arr + stats[:, cv2.CC_STAT_HEIGHT]
+    areas = stats[:, cv2.CC_STAT_AREA]
+
+    # Cortado: toca un borde de la tesela que no es borde de la imagen
+    cortado = (((izq == 0) & (x0 > 0)) | ((arr == 0) & (y0 > 0))
+               | ((der == x1 - x0) & (x1 < ancho)) | ((aba == y1 - y0) & (y1 < alto)))
+    cx = centroides[:, 0] + x0
+    cy = centroides[:, 1] + y0
+    ny0, ny1, nx0, nx1 = nucleo
+    propio = (cy >= ny0) & (cy < ny1) & (cx >= nx0) & (cx < nx1)
+    valido = areas >= area_min
+    if area_max is not None:
+        valido &= areas <= area_max
+    valido[0] = False
+
+    completo = valido & ~cortado
+    duena = np.full(num, -1)
+    duena[completo] = _teselas_duenas(
+        np.column_stack([izq + x0, arr + y0, der + x0, aba + y0])[completo],
+        np.column_stack([cx, cy])[completo], ventanas, nucleos, alto, ancho,
+    )
+    indices = np.flatnonzero(completo & (duena == indice))
+    tabla = np.zeros(num, dtype=np.int32)
+    tabla[indices] = np.arange(1, len(indices) + 1, dtype=np.int32)
+    cajas = np.column_stack([izq, arr, der - izq, aba - arr])[indices].astype(np.int32)
+
+    resultado = {
+        "nucleo": nucleo,
+        "mascara": primer_plano[ny0 - y0:ny1 - y0, nx0 - x0:nx1 - x0],
+        "cajas": cajas + np.array([x0, y0, 0, 0], dtype=np.int32),
+        "areas": areas[indices].astype(np.int64),
+        "centroides": np.column_stack([cx, cy])[indices],
+        # Fragmentos cortados con el centroide en el nucleo: si ninguna
+        # otra tesela tiene el objeto entero, se perdio (ver procesar_por_teselas)
+        "fragmentos": np.column_stack([izq + x0, arr + y0, der + x0, aba + y0])[valido & propio & cortado],
+    }
+    if extraer:
+        with inst.etapa("teselas/momentos", imagenes=1):
+            resultado["momentos"], resultado["hu"], resultado["zernike"] = \
+                caracteristicas_objetos(tabla[labels], cajas)
+    return resultado
+
+
+def procesar_por_teselas(
+    img,
+    metodo="espermatozoides",
+    tam_tesela=TAM_TESELA,
+    solape=SOLAPE,
+    hilos=None,
+    area_min=200,
+    area_max=None,
+    extraer=True,
+    ruta_mascara=None,
+):
+    """
+    Segmenta una imagen grande por teselas y, opcionalmente, extrae
+    momentos, Hu y Zernike de cada objeto.
+
+    Parametros:
+        img: Imagen (o ruta) BGR/gris; se recomienda abrirla con
+             abrir_imagen_grande para leer por memmap
+        metodo: 'espermatozoides' o 'rps'
+        tam_tesela: Lado de cada tesela en pixeles
+        solape: Pixeles de solape entre teselas vecinas
+        hilos: Hilos del pool (None: los del reparto, ver src/recursos.py)
+        area_min: Area minima de un objeto
+        area_max: Area maxima de un objeto (None: sin limite)
+        extraer: Calcula momentos, Hu y Zernike por objeto
+        ruta_mascara: Si se indica, la mascara cosida se escribe en este
+                      .npy con memmap en vez de en memoria
+
+    Retorna:
+        dict: mascara (alto, ancho) uint8, cajas (K, 4) x, y, ancho, alto
+              en coordenadas de la imagen, areas, centroides, cortados
+              (objetos cortados en todas las teselas, mayores que el
+              solape, que no se detectan) y, si extraer,
+              momentos (K, 24), hu (K, 7) y zernike (lista de K dicts)
+    """
+    if isinstance(img, str):
+        img = abrir_imagen_grande(img)
+    if img is None:
+        return None
+    if metodo not in PRIMER_PLANO:
+        raise ValueError(f"Metodo de segmentacion desconocido: {metodo}")
+
+    alto, ancho = img.shape[:2]
+    if ruta_mascara:
+        mascara = np.lib.format.open_memmap(ruta_mascara, mode="w+", dtype=np.uint8, shape=(alto, ancho))
+    else:
+        mascara = np.zeros((alto, ancho), dtype=np.uint8)
+
+    partes = []
+    fragmentos = []
+
+    def integrar(futuro):
+        r = futuro.result()
+        ny0, ny1, nx0, nx1 = r.pop("nucleo")
+        mascara[ny0:ny1, nx0:nx1] = r.pop("mascara")
+        fragmentos.append(r.pop("fragmentos"))
+        partes.append(r)
+
+    teselas = ventanas_teselas(alto, ancho, tam_tesela, solape)
+    ventanas = np.array([ventana for ventana, _ in teselas], dtype=np.int64)
+    nucleos = np.array([nucleo for _, nucleo in teselas], dtype=np.int64)
+    hilos = hilos or recursos.actual("hilos")["hilos"]
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        pendientes = set()
+        for indice in range(len(teselas)):
+            if len(pendientes) >= 2 * hilos:
+                listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    integrar(futuro)
+            pendientes.add(pool.submit(
+                _procesar_tesela, img, indice, ventanas, nucleos, metodo, area_min, area_max, extraer
+            ))
+        for futuro in pendientes:
+            integrar(futuro)
+
+    if isinstance(mascara, np.memmap):
+        mascara.flush()
+
+    cajas = np.concatenate([p["cajas"] for p in partes]) if partes else np.empty((0, 4), np.int32)
+    # Orden determinista (de arriba hacia abajo, de izquierda a derecha)
+    orden = np.lexsort((cajas[:, 0], cajas[:, 1]))
+    # Un fragmento cuyo objeto entero detecto otra tesela queda dentro de su caja
+    fragmentos = np.concatenate(fragmentos) if fragmentos else np.empty((0, 4), np.int64)
+    extremos = np.column_stack([cajas[:, :2], cajas[:, :2] + cajas[:, 2:]])
+    cubierto = ((fragmentos[:, None, :2] >= extremos[None, :, :2]).all(axis=2)
+                & (fragmentos[:, None, 2:] <= extremos[None, :, 2:]).all(axis=2)).any(axis=1)
+    resultado = {
+        "mascara": mascara,
+        "cajas": cajas[orden],
+        "areas": np.concatenate([p["areas"] for p in partes])[orden] if partes else np.empty(0, np.int64),
+        "centroides": np.concatenate([p["centroides"] for p in partes])[orden] if partes else np.empty((0, 2)),
+        "cortados": int((~cubierto).sum()),
+    }
+    if extraer:
+        resultado["momentos"] = np.concatenate([p["momentos"] for p in partes])[orden] if partes else np.empty((0, 24))
+        resultado["hu"] = np.concatenate([p["hu"] for p in partes])[orden] if partes else np.empty((0, 7))
+        zernike = [z for p in partes for z in p["zernike"]]
+        resultado["zernike"] = [zernike[i] for i in orden]
+    return resultado
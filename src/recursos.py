@@ -0,0 +1,213 @@
+"""
+Reparto de nucleos entre procesos, pools de hilos y los hilos internos
+de OpenCV, PyTorch y BLAS.
+
+Cada biblioteca dimensiona sus hilos segun os.cpu_count() sin saber de
+las demas: un DataLoader con 2 workers, cada uno con los hilos de
+OpenCV, mas torch con sus hilos intra-op, mas un pool de procesos de
+sklearn con BLAS multihilo, piden varias veces los nucleos que hay y el
+rendimiento cae. Aqui cada etapa declara un perfil y recibe un reparto:
+
+    procesos           workers de procesos (pool o DataLoader)
+    hilos              hilos del pool de Python sobre imagenes
+    hilos_cv2          cv2.setNumThreads del proceso principal
+    hilos_torch        torch.set_num_threads del proceso principal
+    hilos_blas         hilos de BLAS/OpenMP (threadpoolctl) del principal
+    hilos_por_proceso  hilos internos (cv2, torch, BLAS) de cada worker
+
+Perfiles:
+
+  - 'secuencial': un bucle de Python; OpenCV y BLAS usan todos los nucleos.
+  - 'hilos': pool de hilos sobre imagenes (OpenCV libera el GIL); un hilo
+    interno por llamada.
+  - 'procesos': pool de procesos; un hilo por proceso.
+  - 'torch': red en el proceso principal y workers del DataLoader para
+    la lectura; los hilos de torch se quedan con el resto.
+
+Uso:
+
+    from src import recursos
+    with recursos.usar("hilos") as reparto:
+        ThreadPoolExecutor(max_workers=reparto["hilos"])
+
+Los repartos por defecto se pueden reemplazar con los medidos por
+benchmarks/ajustar_recursos.py (RUTA_AJUSTE), que solo se usan si se
+midieron con el mismo numero de nucleos. La variable de entorno
+PIPELINE_NUCLEOS limita los nucleos usados (nodos compartidos).
+"""
+import os
+import sys
+import json
+import threading
+from contextlib import contextmanager
+
+import cv2
+
+
+PERFILES = ("secuencial", "hilos", "procesos", "torch")
+CLAVES = ("procesos", "hilos", "hilos_cv2", "hilos_torch", "hilos_blas", "hilos_por_proceso")
+RUTA_AJUSTE = os.path.join("resultados", "recursos.json")
+MAX_WORKERS_DATALOADER = 4
+
+_lock = threading.Lock()
+_pila = []
+
+
+def nucleos_disponibles():
+    """Nucleos asignados al proceso (afinidad), limitados por PIPELINE_NUCLEOS."""
+    try:
+        n = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS / Windows
+        n = os.cpu_count() or 1
+    limite = os.environ.get("PIPELINE_NUCLEOS")
+    if limite:
+        n = min(n, max(1, int(limite)))
+    return n
+
+
+def reparto_por_defecto(perfil, nucleos=None):
+    """
+    Reparto de un perfil sin medir (regla fija).
+
+    Retorna:
+        dict: Valores de CLAVES mas 'perfil' y 'nucleos'
+    """
+    n = nucleos or nucleos_disponibles()
+    reparto = {"hilos_por_proceso": 1}
+    if perfil == "secuencial":
+        reparto.update(procesos=1, hilos=1, hilos_cv2=n, hilos_torch=n, hilos_blas=n)
+    elif perfil == "hilos":
+        reparto.update(procesos=1, hilos=n, hilos_cv2=1, hilos_torch=1, hilos_blas=1)
+    elif perfil == "procesos":
+        reparto.update(procesos=n, hilos=1, hilos_cv2=1, hilos_torch=1, hilos_blas=1)
+    elif perfil == "torch":
+        # Con pocos nucleos los workers solo compiten con la red
+        workers = 0 if n < 4 else min(MAX_WORKERS_DATALOADER, n // 4)
+        reparto.update(procesos=workers, hilos=1, hilos_cv2=1,
+                       hilos_torch=n - workers, hilos_blas=n - workers)
+    else:
+        raise ValueError(f"Perfil de recursos desconocido: {perfil}")
+    return {"perfil": perfil, "nucleos": n, **reparto}
+
+
+def cargar_ajuste(ruta=RUTA_AJUSTE):
+    """Repartos medidos {perfil: reparto} o {} si no hay ajuste para estos nucleos."""
+    if not os.path.isfile(ruta):
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        ajuste = json.load(f)
+    if ajuste.get("nucleos") != nucleos_disponibles():
+        return {}
+    return ajuste.get("perfiles", {})
+
+
+def guardar_ajuste(perfiles, ruta=RUTA_AJUSTE, **extra):
+    """Guarda los repartos medidos para que reparto() los use."""
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"nucleos": nucleos_disponibles(), "perfiles": perfiles, **extra}, f, indent=2)
+    os.replace(ruta + ".tmp", ruta)
+    return ruta
+
+
+def reparto(perfil, **sobrescrituras):
+    """
+    Reparto de un perfil: el medido si existe, si no el por defecto, con
+    las sobrescrituras distintas de None aplicadas encima.
+    """
+    base = reparto_por_defecto(perfil)
+    base.update({k: v for k, v in cargar_ajuste().get(perfil, {}).items() if k in CLAVES})
+    base.update({k: v for k, v in sobrescrituras.items() if v is not None})
+    return base
+
+
+def aplicar(reparto_):
+    """
+    Fija los hilos internos de OpenCV, torch (si ya esta importado) y BLAS.
+
+    Retorna:
+        dict: Valores previos para restaurar con aplicar()
+    """
+    previo = {"hilos_cv2": cv2.getNumThreads()}
+    cv2.setNumThreads(int(reparto_["hilos_cv2"]))
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        previo["hilos_torch"] = torch.get_num_threads()
+        torch.set_num_threads(max(1, int(reparto_["hilos_torch"])))
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        threadpool_limits = None
+    if threadpool_limits is not None:
+        previo["_blas"] = threadpool_limits(limits=max(1, int(reparto_["hilos_blas"])), user_api="blas")
+    return previo
+
+
+def _restaurar(previo):
+    cv2.setNumThreads(previo["hilos_cv2"])
+    torch = sys.modules.get("torch")
+    if torch is not None and "hilos_torch" in previo:
+        torch.set_num_threads(previo["hilos_torch"])
+    if "_blas" in previo:
+        previo["_blas"].restore_original_limits()
+
+
+@contextmanager
+def usar(perfil, **sobrescrituras):
+    """
+    Aplica el reparto de un perfil mientras dura el bloque y lo deja
+    disponible con actual(). Los bloques pueden anidarse.
+    """
+    r = reparto(perfil, **sobrescrituras)
+    with _lock:
+        previo = aplicar(r)
+        _pila.append(r)
+    try:
+        yield r
+    finally:
+        with _lock:
+            _pila.pop()
+            _restaurar(previo)
+
+
+def actual(perfil="secuencial"):
+    """Reparto activo (ver usar) o el de perfil si no hay ninguno."""
+    with _lock:
+        if _pila:
+            return dict(_pila[-1])
+    return reparto(perfil)
+
+
+def configurar_torch():
+    """Aplica hilos_torch del reparto activo (para torch importado dentro de la etapa)."""
+    import torch
+    torch.set_num_threads(max(1, int(actual()["hilos_torch"])))
+
+
+def iniciar_trabajador(reparto_, *_):
+    """
+    Inicializador de procesos hijos (ProcessPoolExecutor initializer o
+    worker_init_fn del DataLoader con functools.partial): cada worker usa
+    hilos_por_proceso en OpenCV, torch y BLAS en vez de la maquina completa.
+    """
+    hilos = max(1, int(reparto_["hilos_por_proceso"]))
+    for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = str(hilos)
+    cv2.setNumThreads(hilos)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(hilos)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=hilos)
+    except ImportError:
+        pass
+
+
+def describir(reparto_):
+    """Texto de una linea para los mensajes de las etapas."""
+    return (f"{reparto_['perfil']} en {reparto_['nucleos']} nucleos: "
+            f"{reparto_['procesos']} procesos x {reparto_['hilos_por_proceso']} hilos, "
+            f"{reparto_['hilos']} hilos de pool, "
+            f"cv2 {reparto_['hilos_cv2']}, torch {reparto_['hilos_torch']}, "
+            f"blas {reparto_['hilos_blas']}")